@@ -20,13 +20,21 @@ import sys
 import json
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 from loguru import logger
 from bundlegen.core.stb_platform import STBPlatform
 from bundlegen.core.image_downloader import ImageDownloader
 from bundlegen.core.image_unpacker import ImageUnpackager
 from bundlegen.core.bundle_processor import BundleProcessor
+from bundlegen.core.library_matching import LibraryPlanner
 from bundlegen.core.utils import Utils
+from bundlegen.core.libs_index import LibsIndex
+from bundlegen.core.symbol_index import SymbolIndex
+from bundlegen.core.libs_scanner import LibsScanner
+from bundlegen.core.schema_validator import SchemaValidator
+from bundlegen.core.result_cache import ResultCache
+from jsonschema.exceptions import ValidationError
 
 
 @click.group()
@@ -50,6 +58,39 @@ def cli(verbose):
     logger.add(sys.stderr, level=log_levels.get(verbose))
 
 
+def _get_planned_app_metadata(appmetadata):
+    """App metadata used to plan the library matching before the image is
+    unpacked. Metadata embedded in the image is not available yet, then assume
+    the app needs graphics. A wrong guess only means the plan is not used.
+    """
+    if appmetadata:
+        try:
+            with open(appmetadata) as metadata:
+                return json.load(metadata)
+        except (OSError, ValueError):
+            pass
+    return {'graphics': True}
+
+
+def _get_result_key(image_digest, selected_platform, appmetadata, options):
+    """Key of the bundle in the result cache, or None if the image digest
+    cannot be resolved
+    """
+    if not image_digest:
+        return None
+
+    app_metadata_dict = None
+    if appmetadata:
+        try:
+            with open(appmetadata) as metadata:
+                app_metadata_dict = json.load(metadata)
+        except (OSError, ValueError):
+            # Reported when the metadata is loaded
+            return None
+
+    return ResultCache.make_key(image_digest, selected_platform.get_content_hash(), app_metadata_dict, **options)
+
+
 @click.command()
 @click.argument('image')
 @click.argument('outputdir', type=click.Path())
@@ -64,16 +105,30 @@ def cli(verbose):
                                 When enabled, the dependencies of all libs indicated in gfxLibs and pluginDependencies config,
                                 will automatically also be added to the bundle. Host or OCI image version of library is decided by libmatchingmode
                                 parameter below. This logic can only work if a _libs.json file is present with libs and apiversions info.""", is_flag=True)
-@click.option('-m', '--libmatchingmode', type=click.Choice(['normal', 'image', 'host'], case_sensitive=True), default='normal',
+@click.option('-m', '--libmatchingmode', type=click.Choice(['normal', 'image', 'host', 'auto'], case_sensitive=True), default='normal',
               help=""" normal: take most recent library i.e. with most api tags like 'GLIBC_2.4'.\n
                                   image: always take lib from OCI image rootfs, if available in there.\n
                                   host: always take host lib and create mount bind. Skips the library from OCI image rootfs if it was there.\n
+                                  auto: use the mode resulting in the smallest bundle, without taking libs with fewer apiversions than 'normal' does.\n
                                   Default mode is 'normal'. When apiversion info not available the effect is the same as mode 'host'""")
 @click.option('-r', '--createmountpoints', required=False, help='Create mount points in rootfs. Main usage for platforms with RO filesystem.', is_flag=True)
 @click.option('-x', '--appid', required=False, help='Optional. Application id. Can be used to override the id inside the metadata.')
 @click.option('-u', '--crun', required=False, help='crun compatible bundle without Dobby', is_flag=True)
+@click.option('-d', '--dedup-libs', required=False, help='Replace files in the rootfs that are identical to a host lib (same sha256 and size in _libs.json) by read-only bind mounts', is_flag=True, envvar="BUNDLEGEN_DEDUP_LIBS")
+@click.option('-l', '--prune-libs', type=click.Choice(['off', 'report', 'remove'], case_sensitive=True), default='off', envvar="BUNDLEGEN_PRUNE_LIBS",
+              help=""" Find the libs in the rootfs that are not needed by the app entrypoint (DT_NEEDED), see libraryPruning in the app metadata.\n
+                                  off: do not look for unused libs.\n
+                                  report: only report the unused libs (dry run).\n
+                                  remove: remove the unused libs from the rootfs.""")
+@click.option('-k', '--ld-cache', required=False, help='Generate /etc/ld.so.cache inside the rootfs for the libs of the bundle, so the dynamic linker does not search directories at app start', is_flag=True, envvar="BUNDLEGEN_LD_CACHE")
+@click.option('-j', '--jobs', required=False, type=click.IntRange(min=1), help='Number of processes used to read library info from the image rootfs. Defaults to the number of CPUs', envvar="BUNDLEGEN_JOBS")
+@click.option('--offline', required=False, help='Build the image from the blob store only, as last downloaded for the platform, without contacting the registry. Needs the blob store, see BUNDLEGEN_BLOB_STORE_SIZE', is_flag=True, envvar="BUNDLEGEN_OFFLINE")
+@click.option('--downloader', type=click.Choice(ImageDownloader.BACKENDS, case_sensitive=True), default='skopeo', envvar="BUNDLEGEN_DOWNLOADER",
+              help=""" skopeo: download images with skopeo.\n
+                                  native: download images from registries (docker://) with the built-in client, other images with skopeo.""")
+@click.option('--no-result-cache', required=False, help='Always generate the bundle, even if the same image was already generated with the same templates, metadata and options', is_flag=True, envvar="BUNDLEGEN_NO_RESULT_CACHE")
 # @click.option('--disable-lib-mounts', required=False, help='Disable automatically bind mounting in libraries that exist on the STB. May increase bundle size', is_flag=True)
-def generate(image, outputdir, platform, searchpath, creds, ipk, appmetadata, yes, nodepwalking, libmatchingmode, createmountpoints, appid, crun):
+def generate(image, outputdir, platform, searchpath, creds, ipk, appmetadata, yes, nodepwalking, libmatchingmode, createmountpoints, appid, crun, dedup_libs, prune_libs, ld_cache, jobs, offline, downloader, no_result_cache):
     """Generate an OCI Bundle for a specified platform
     """
 
@@ -81,14 +136,11 @@ def generate(image, outputdir, platform, searchpath, creds, ipk, appmetadata, ye
 
     outputdir = os.path.abspath(outputdir)
 
-    # Check if the output dir already exists
-    if os.path.exists(outputdir):
-        if not yes:
-            click.confirm(
-                f"The directory {outputdir} already exists. Are you sure you want to continue? The contents of this directory will be deleted", abort=True)
-
-        # Delete existing directory
-        shutil.rmtree(outputdir)
+    # Check if the output dir already exists, it is deleted once it is known
+    # whether the bundle is in the result cache
+    if os.path.exists(outputdir) and not yes:
+        click.confirm(
+            f"The directory {outputdir} already exists. Are you sure you want to continue? The contents of this directory will be deleted", abort=True)
 
     # Load the config for the platform
     selected_platform = STBPlatform(platform, searchpath)
@@ -103,25 +155,66 @@ def generate(image, outputdir, platform, searchpath, creds, ipk, appmetadata, ye
         logger.error("Validation of platform config FAILED with schema")
         sys.exit(1)
 
-    # Download the image to a temp directory
-    img_downloader = ImageDownloader()
+    # Reply with the bundle of a previous build with the same inputs
+    img_downloader = ImageDownloader(downloader)
+    appmetadata = os.path.abspath(appmetadata) if appmetadata else None
+    bundle_path = f"{outputdir}.ipk" if ipk else f"{outputdir}.tar.gz"
+    result_cache = ResultCache.get_instance()
+    result_key = None
+    image_digest = None
+    if not no_result_cache:
+        image_digest = img_downloader.get_image_digest(image, creds, selected_platform.get_config(), offline)
+        result_key = _get_result_key(image_digest, selected_platform, appmetadata, {
+            'appid': appid, 'createmountpoints': createmountpoints, 'crun': crun, 'dedup_libs': dedup_libs,
+            'ipk': ipk, 'ld_cache': ld_cache, 'libmatchingmode': libmatchingmode,
+            'nodepwalking': nodepwalking, 'prune_libs': prune_libs})
+        cached_path = result_cache.get(result_key) if result_key else None
+        if cached_path:
+            # Same output as a build: the bundle directory and its archive
+            if os.path.exists(outputdir):
+                shutil.rmtree(outputdir)
+            ResultCache.copy_bundle(cached_path, bundle_path)
+            ResultCache.extract_bundle(bundle_path, outputdir)
+            logger.success(f"Successfully generated bundle at {bundle_path} (from result cache {cached_path})")
+            return
+
+    # Delete existing directory
+    if os.path.exists(outputdir):
+        shutil.rmtree(outputdir)
+
+    # Download the image to a temp directory, by the digest the result key
+    # was made from
     img_path = img_downloader.download_image(
-        image, creds, selected_platform.get_config())
+        image, creds, selected_platform.get_config(), offline, image_digest)
 
     if not img_path:
         sys.exit(1)
 
-    # Unpack the image with umoci
+    # Unpack the image with umoci. The library matching is planned from the
+    # image layers at the same time, 'auto' mode plans on the unpacked rootfs
     tag = ImageDownloader().get_image_tag(image)
+    lib_requests = None
+    if libmatchingmode != 'auto':
+        lib_requests = BundleProcessor.get_library_requests(
+            selected_platform.get_config(), _get_planned_app_metadata(appmetadata), crun)
+
     img_unpacker = ImageUnpackager(src=img_path, dst=outputdir)
-    unpack_success = img_unpacker.unpack_image(tag, delete=True)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        lib_plan_future = None
+        if lib_requests:
+            lib_plan_future = executor.submit(LibraryPlanner.plan_image, img_path, tag, selected_platform.get_config(),
+                                              outputdir, lib_requests, nodepwalking, libmatchingmode, createmountpoints)
+        unpack_success = img_unpacker.unpack_image(tag)
+        lib_plan = lib_plan_future.result() if lib_plan_future else None
 
     if not unpack_success:
         sys.exit(1)
 
+    logger.debug("Deleting downloaded image")
+    shutil.rmtree(img_path)
+
     # Load app metadata
     metadata_from_image = img_unpacker.get_app_metadata_from_img()
-    appmetadata = os.path.abspath(appmetadata) if appmetadata else None
 
     app_metadata_dict = {}
     if appmetadata:
@@ -152,10 +245,13 @@ def generate(image, outputdir, platform, searchpath, creds, ipk, appmetadata, ye
 
     # Begin processing. Work in the output dir where the img was unpacked to
     processor = BundleProcessor(
-        selected_platform.get_config(), outputdir, app_metadata_dict, nodepwalking, libmatchingmode, createmountpoints, crun)
+        selected_platform.get_config(), outputdir, app_metadata_dict, nodepwalking, libmatchingmode, createmountpoints, crun, jobs, dedup_libs, prune_libs, ld_cache)
     if processor == False:
         sys.exit(1)
 
+    if lib_plan:
+        processor.use_library_plan(lib_plan)
+
     if not processor.check_compatibility():
         # Not compatible - delete any work done so far
         shutil.rmtree(outputdir)
@@ -180,17 +276,90 @@ def generate(image, outputdir, platform, searchpath, creds, ipk, appmetadata, ye
         Utils.create_ipk(outputdir, outputdir)
         logger.success(f"Successfully generated bundle at {outputdir}.ipk")
     else:
-        tarball_settings = processor.platform_cfg.get('tarball')
-        file_ownership_user = tarball_settings.get('fileOwnershipSameAsUser') if tarball_settings else None
-        file_mask = tarball_settings.get('fileMask') if tarball_settings else None
+        processor.create_tgz(outputdir)
+        logger.success(f"Successfully generated bundle at {outputdir}.tar.gz")
 
-        container_uid_gid = processor.get_real_uid_gid()
+    if result_key:
+        result_cache.put(result_key, bundle_path)
 
-        uid = container_uid_gid[0] if container_uid_gid[0] and file_ownership_user else None
-        gid = container_uid_gid[1] if container_uid_gid[1] and file_ownership_user else None
 
-        Utils.create_tgz(outputdir, outputdir, uid, gid, file_mask)
-        logger.success(f"Successfully generated bundle at {outputdir}.tar.gz")
+@click.command()
+@click.argument('libsjson', type=click.Path(exists=True, dir_okay=False))
+@click.option('-o', '--output', required=False, help='Where to write the compiled index. Defaults to <platform>_libs.idx next to the json file', type=click.Path())
+def compile_libs(libsjson, output):
+    """Compile a <platform>_libs.json file into a binary index
+
+    The compiled index is used instead of the json file when it is newer,
+    which makes loading the libs info much faster
+    """
+    with open(libsjson) as libs_file:
+        libs_dict = json.load(libs_file)
+
+    try:
+        SchemaValidator.validate(libs_dict, "platform_libsSchema.json")
+    except ValidationError as err:
+        logger.error(f"Validation of {libsjson} FAILED with schema: {err.message}")
+        sys.exit(1)
+
+    if not output:
+        output = LibsIndex.compiled_path(libsjson)
+
+    LibsIndex.compile(libs_dict['libs'], output)
+    logger.success(f"Successfully compiled libs index at {output}")
+
+
+@click.command()
+@click.argument('sysroot', type=click.Path(exists=True, file_okay=False))
+@click.option('-l', '--libsjson', required=False, help='<platform>_libs.json of the platform, the index is written next to it as <platform>_symbols.idx', type=click.Path(dir_okay=False))
+@click.option('-o', '--output', required=False, help='Where to write the index, instead of next to the libs json file', type=click.Path())
+def compile_symbols(sysroot, libsjson, output):
+    """Compile the symbols exported by the libs of a platform sysroot into an index
+
+    With the index, 'normal' library matching takes a host lib even if it has
+    fewer apiversions, as long as it exports all symbols the image uses from it
+    """
+    if not output:
+        if not libsjson:
+            logger.error("Either --libsjson or --output is required")
+            sys.exit(1)
+        output = SymbolIndex.index_path(libsjson)
+
+    SymbolIndex.compile(sysroot, output)
+    logger.success(f"Successfully compiled symbol index at {output}")
+
+
+@click.command()
+@click.argument('sysroot', type=click.Path(exists=True, file_okay=False))
+@click.option('-o', '--output', required=True, help='Where to write the <platform>_libs.json file', type=click.Path(dir_okay=False))
+@click.option('-i', '--incremental', is_flag=True, help='Only read the libs that changed (size, mtime, inode) since the last scan into the same output')
+@click.option('-j', '--jobs', required=False, type=click.IntRange(min=1), help='Number of processes used to read the libs. Defaults to the number of CPUs', envvar="BUNDLEGEN_JOBS")
+def scan_libs(sysroot, output, incremental, jobs):
+    """Generate a <platform>_libs.json file from the sysroot of a platform
+
+    Reads the version definitions and DT_NEEDED entries of all shared libs
+    below /lib and /usr/lib of the sysroot
+    """
+    scanner = LibsScanner(sysroot, jobs)
+    state_path = LibsScanner.state_path(output)
+    if incremental:
+        scanner.load_state(state_path)
+
+    libs_dict = {'libs': scanner.scan()}
+    try:
+        SchemaValidator.validate(libs_dict, "platform_libsSchema.json")
+    except ValidationError as err:
+        logger.error(f"Generated libs info does not match the schema: {err.message}")
+        sys.exit(1)
+
+    tmp_path = f"{output}.tmp"
+    with open(tmp_path, 'w') as libs_file:
+        json.dump(libs_dict, libs_file, indent=4)
+    os.replace(tmp_path, output)
+    scanner.save_state(state_path)
+    logger.success(f"Successfully generated {output} with {len(libs_dict['libs'])} libs ({scanner.scanned} read)")
 
 
 cli.add_command(generate)
+cli.add_command(compile_libs)
+cli.add_command(compile_symbols)
+cli.add_command(scan_libs)
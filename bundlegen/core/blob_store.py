@@ -0,0 +1,312 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Consult Red
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+import json
+import time
+import fcntl
+import shutil
+import tempfile
+import threading
+from hashlib import sha256
+from contextlib import contextmanager
+from loguru import logger
+from bundlegen.core.utils import Utils
+
+
+class BlobStore:
+    """Content addressable store of the blobs (manifests, configs and layers)
+    of downloaded images, shared by all builds and worker processes on the node
+
+    skopeo downloads into the store (--dest-shared-blob-dir) and skips the
+    blobs that are already in there, so layers shared by images are only
+    pulled once. Every build gets its own OCI image layout inside the store,
+    with hard links to the blobs, which can be deleted after unpacking.
+
+    Store layout:
+        sha256/<hex>        the blobs, named by their digest
+        sha256/<hex>.partial
+                            blobs partly downloaded by the built-in registry
+                            client, resumed by the next download
+        refs/<key>.json     index.json of the last download of an image for a
+                            platform, used to build images in offline mode
+        layouts/            image layouts of the running builds
+        .lock               flock, shared while downloading or linking blobs,
+                            exclusive while evicting
+
+    The store is opt-in, it is only used when BUNDLEGEN_BLOB_STORE_SIZE is
+    set. It is bounded to that size, evicting the least recently used blobs.
+    Using a blob updates its mtime.
+    """
+    DIRNAME = 'blobs'
+    LOCK_FILENAME = '.lock'
+    # Disabled unless BUNDLEGEN_BLOB_STORE_SIZE is set
+    DEFAULT_SIZE = 0
+    DIGEST_RE = re.compile(r"^(sha256|sha512):([0-9a-f]{64,128})$")
+    MANIFEST_MEDIA_TYPES = ('application/vnd.oci.image.manifest.v1+json',
+                            'application/vnd.docker.distribution.manifest.v2+json',
+                            'application/vnd.oci.image.index.v1+json',
+                            'application/vnd.docker.distribution.manifest.list.v2+json')
+    # Layouts of builds that did not clean up after themselves
+    STALE_LAYOUT_AGE = 24 * 60 * 60
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, root, max_size):
+        self.root = root
+        self.max_size = max_size
+        self.layouts_dir = os.path.join(root, 'layouts')
+        self.refs_dir = os.path.join(root, 'refs')
+        self.lock_path = os.path.join(root, self.LOCK_FILENAME)
+        for directory in [self.layouts_dir, self.refs_dir]:
+            os.makedirs(directory, exist_ok=True)
+
+    # ==========================================================================
+    @classmethod
+    def get_instance(cls):
+        """Returns the store of the node. It is kept in BUNDLEGEN_BLOB_STORE_DIR
+        if set, otherwise inside the BundleGen cache directory. The store is
+        only enabled when its size in bytes is set using
+        BUNDLEGEN_BLOB_STORE_SIZE (default 0, disabled)
+
+        Returns:
+            BlobStore: the store or None if disabled or unavailable
+        """
+        with cls._instance_lock:
+            if not cls._instance:
+                try:
+                    max_size = int(os.environ.get('BUNDLEGEN_BLOB_STORE_SIZE', cls.DEFAULT_SIZE))
+                except ValueError:
+                    logger.warning("Invalid BUNDLEGEN_BLOB_STORE_SIZE, blob store disabled")
+                    max_size = cls.DEFAULT_SIZE
+                if max_size <= 0:
+                    return None
+
+                root = os.environ.get('BUNDLEGEN_BLOB_STORE_DIR') or Utils.get_cache_dir(cls.DIRNAME)
+                if not root:
+                    return None
+                try:
+                    cls._instance = cls(root, max_size)
+                except OSError as err:
+                    logger.warning(f"Blob store {root} unavailable: {err}")
+                    return None
+            return cls._instance
+
+    # ==========================================================================
+    @contextmanager
+    def lock(self, exclusive=False):
+        """Lock the store against eviction (shared) or against use (exclusive)
+        by other processes
+        """
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # ==========================================================================
+    def blob_path(self, digest):
+        """Returns the path of a blob inside the store
+
+        Args:
+            digest (string): e.g. sha256:<hex>
+
+        Returns:
+            string: path or None if the digest is invalid
+        """
+        m = self.DIGEST_RE.match(digest)
+        if not m:
+            return None
+        return os.path.join(self.root, m.group(1), m.group(2))
+
+    # ==========================================================================
+    def new_layout(self):
+        """Create a directory for the image layout of a build, on the same
+        filesystem as the blobs so they can be hard linked
+
+        Returns:
+            string: path to the empty directory
+        """
+        now = time.strftime("%Y%m%d-%H%M%S")
+        return tempfile.mkdtemp(prefix=f"{now}_", dir=self.layouts_dir)
+
+    # ==========================================================================
+    def _ref_path(self, url, platform):
+        key = sha256(json.dumps([url, platform], sort_keys=True).encode('utf-8')).hexdigest()
+        return os.path.join(self.refs_dir, f"{key}.json")
+
+    # ==========================================================================
+    def save_ref(self, url, platform, layout_path):
+        """Remember the index.json of an image downloaded for a platform
+
+        Args:
+            url (string): Image URL as given to skopeo
+            platform (dict): os, arch and variant the image was downloaded for
+            layout_path (string): OCI image layout of the download
+        """
+        with open(os.path.join(layout_path, 'index.json')) as index_file:
+            index = json.load(index_file)
+
+        ref_path = self._ref_path(url, platform)
+        tmp_path = f"{ref_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as ref_file:
+            json.dump({'url': url, 'platform': platform, 'index': index}, ref_file)
+        os.replace(tmp_path, ref_path)
+
+    # ==========================================================================
+    def get_ref_digest(self, url, platform):
+        """Returns the digest of the manifest of an image as last downloaded
+        for a platform
+
+        Args:
+            url (string): Image URL as given to skopeo
+            platform (dict): os, arch and variant the image was downloaded for
+
+        Returns:
+            string: digest or None if the image was never downloaded
+        """
+        try:
+            with open(self._ref_path(url, platform)) as ref_file:
+                manifests = json.load(ref_file)['index'].get('manifests', [])
+        except (OSError, ValueError, KeyError):
+            return None
+        return manifests[0].get('digest') if manifests else None
+
+    # ==========================================================================
+    def link_layout(self, layout_path):
+        """Hard link the blobs of the images of a layout from the store into it.
+        Must be called with the store locked
+
+        Args:
+            layout_path (string): OCI image layout with its index.json
+
+        Returns:
+            bool: True if all blobs are in the store
+        """
+        with open(os.path.join(layout_path, 'index.json')) as index_file:
+            index = json.load(index_file)
+
+        # (descriptor, True if the blob is a manifest or an index)
+        descriptors = [(desc, True) for desc in index.get('manifests', [])]
+        linked = set()
+        while descriptors:
+            desc, is_manifest = descriptors.pop()
+            digest = desc.get('digest', '')
+            if digest in linked:
+                continue
+            blob_path = self.blob_path(digest)
+            if not blob_path or not os.path.isfile(blob_path):
+                logger.debug(f"Blob {digest} not in store")
+                return False
+            self._link_blob(blob_path, os.path.join(layout_path, 'blobs', *digest.split(':', 1)))
+            linked.add(digest)
+
+            if is_manifest:
+                with open(blob_path) as blob_file:
+                    manifest = json.load(blob_file)
+                for child in manifest.get('manifests', []):
+                    descriptors.append((child, child.get('mediaType') in self.MANIFEST_MEDIA_TYPES))
+                if manifest.get('config'):
+                    descriptors.append((manifest['config'], False))
+                descriptors.extend((layer, False) for layer in manifest.get('layers', []))
+        return True
+
+    # ==========================================================================
+    def _link_blob(self, blob_path, dst):
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        Utils.link_or_copy(blob_path, dst)
+        # Least recently used blobs are evicted first
+        os.utime(blob_path)
+
+    # ==========================================================================
+    def create_layout(self, url, platform, layout_path):
+        """Create the image layout of an image from the store only (offline
+        mode), as it was last downloaded for the platform
+
+        Args:
+            url (string): Image URL as given to skopeo
+            platform (dict): os, arch and variant to build the image for
+            layout_path (string): Empty directory for the layout
+
+        Returns:
+            bool: True if the image and all its blobs are in the store
+        """
+        try:
+            with open(self._ref_path(url, platform)) as ref_file:
+                index = json.load(ref_file)['index']
+        except FileNotFoundError:
+            logger.error(f"Image {url} was never downloaded for {platform}")
+            return False
+        except (OSError, ValueError, KeyError) as err:
+            logger.error(f"Cannot read stored index of {url}: {err}")
+            return False
+
+        with open(os.path.join(layout_path, 'oci-layout'), 'w') as layout_file:
+            json.dump({'imageLayoutVersion': '1.0.0'}, layout_file)
+        with open(os.path.join(layout_path, 'index.json'), 'w') as index_file:
+            json.dump(index, index_file)
+
+        with self.lock():
+            if not self.link_layout(layout_path):
+                logger.error(f"Blobs of image {url} were evicted from the blob store")
+                return False
+        return True
+
+    # ==========================================================================
+    def evict(self):
+        """Remove the least recently used blobs until the store fits its
+        size, and the layouts of builds that did not remove them
+
+        Returns:
+            int: bytes freed
+        """
+        freed = 0
+        with self.lock(exclusive=True):
+            blobs = []
+            total = 0
+            for algorithm in ['sha256', 'sha512']:
+                blob_dir = os.path.join(self.root, algorithm)
+                if not os.path.isdir(blob_dir):
+                    continue
+                for entry in os.scandir(blob_dir):
+                    if entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        blobs.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                        total += stat.st_size
+
+            for _, size, path in sorted(blobs):
+                if total <= self.max_size:
+                    break
+                try:
+                    os.remove(path)
+                except OSError as err:
+                    logger.warning(f"Cannot evict blob {path}: {err}")
+                    continue
+                total -= size
+                freed += size
+
+            now = time.time()
+            for entry in os.scandir(self.layouts_dir):
+                if entry.is_dir(follow_symlinks=False) and now - entry.stat().st_mtime > self.STALE_LAYOUT_AGE:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+
+        if freed:
+            logger.debug(f"Evicted {freed} bytes from blob store {self.root}")
+        return freed
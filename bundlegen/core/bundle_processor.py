@@ -20,28 +20,33 @@ import json
 import humanfriendly
 import textwrap
 import shlex
-from jsonschema import validate
 from hashlib import sha256
 from loguru import logger
 from pathlib import Path
 from bundlegen.core.utils import Utils
-from bundlegen.core.library_matching import LibraryMatching
+from bundlegen.core.library_matching import LibraryMatching, LibraryPlanner
+from bundlegen.core.library_pruning import LibraryPruner
+from bundlegen.core.ld_cache import LdCache
+from bundlegen.core.rootfs_listing import RootfsListing
+from bundlegen.core.elf_cache import ElfInfoCache
+from bundlegen.core.mount_table import MountTable
+from bundlegen.core.schema_validator import SchemaValidator
 from bundlegen.core.capabilities import *
 from jsonschema.exceptions import ValidationError
 
 
 class BundleProcessor:
     def __new__(cls, *args):
-        if (len(args)==0) or (len(args)==7):
+        if (len(args)==0) or (7 <= len(args) <= 11):
             return object.__new__(cls)
         else:
-            logger.error("The arguments should be in a order like platform_cfg, bundle_path, app_metadata, nodepwalking, libmatchingmode, createmountpoints")
+            logger.error("The arguments should be in a order like platform_cfg, bundle_path, app_metadata, nodepwalking, libmatchingmode, createmountpoints, crun_only[, jobs[, dedup_libs[, prune_libs[, ld_cache]]]]")
             return False
 
     def __init__(self, *args):
-        if (len(args)) == 7:
+        if (len(args)) >= 7:
             # Mapping of the arguments
-            # The arguments should be given in a order like (platform_cfg, bundle_path, app_metadata, nodepwalking, libmatchingmode, createmountpoints, crun_only)
+            # The arguments should be given in a order like (platform_cfg, bundle_path, app_metadata, nodepwalking, libmatchingmode, createmountpoints, crun_only[, jobs[, dedup_libs[, prune_libs[, ld_cache]]]])
             platform_cfg = args[0]
             bundle_path = args[1]
             app_metadata = args[2]
@@ -49,6 +54,10 @@ class BundleProcessor:
             libmatchingmode = args[4]
             createmountpoints = args[5]
             crun_only = args[6]
+            jobs = args[7] if len(args) >= 8 else None
+            dedup_libs = args[8] if len(args) >= 9 else False
+            prune_libs = args[9] if len(args) >= 10 else None
+            ld_cache = args[10] if len(args) == 11 else False
             self.platform_cfg: dict = platform_cfg
             self.bundle_path = bundle_path
             self.rootfs_path = os.path.join(self.bundle_path, "rootfs")
@@ -56,11 +65,17 @@ class BundleProcessor:
             self.handled_libs = set()
             self.createmountpoints = createmountpoints
             self.oci_config: dict = self.load_config()
-            self.libmatcher = LibraryMatching(self.platform_cfg, self.bundle_path, self._add_bind_mount, nodepwalking, libmatchingmode, createmountpoints)
+            self.libmatcher = LibraryMatching(self.platform_cfg, self.bundle_path, self._add_bind_mount, nodepwalking, libmatchingmode, createmountpoints, jobs)
             self.crun_only = crun_only
+            self.dedup_libs = dedup_libs
+            self.prune_libs = prune_libs
+            self.ld_cache = ld_cache
         else:
             logger.disable("This is for L1_unit_testing")
             self.crun_only = False
+            self.dedup_libs = False
+            self.prune_libs = None
+            self.ld_cache = False
 
     # Umoci will produce a config based on a "good, sane default" configuration
     # as defined here: https://github.com/opencontainers/umoci/blob/master/oci/config/convert/default.go
@@ -87,9 +102,7 @@ class BundleProcessor:
 
         # App metadata
         try:
-            with open('bundlegen/schema/appMetadataSchema.json', "r") as f:
-                appSchema = json.load(f)
-                validate(instance=self.app_metadata, schema=appSchema)
+            SchemaValidator.validate(self.app_metadata, 'appMetadataSchema.json')
         except ValidationError:
             logger.error("ValidationError during metadata schema Validation.")
             return False
@@ -112,9 +125,16 @@ class BundleProcessor:
         self._process_root()
         self._process_mounts()
         self._process_resources()
+        if self.libmatcher.libmatchingmode == 'auto':
+            self._select_library_matching_mode()
+        self._prefetch_libs()
         self._process_gpu()
         if not self.crun_only:
             self._process_dobby_plugin_dependencies()
+        if self.dedup_libs:
+            self._process_identical_libs()
+        if self.prune_libs in ('report', 'remove'):
+            self._process_library_pruning()
         self._process_users_and_groups()
         self._process_capabilities()
         self._process_hostname()
@@ -136,10 +156,14 @@ class BundleProcessor:
         
         ## After all plugins are processed
         self._process_hooks()
+        if self.ld_cache:
+            self._process_ld_cache()
 
         self.write_config_json()
         self._cleanup_umoci_leftovers()
 
+        elf_cache = ElfInfoCache.get_instance()
+        logger.debug(f"ELF info cache: {elf_cache.hits} hits, {elf_cache.misses} misses")
         return True
 
     # ==========================================================================
@@ -256,8 +280,12 @@ class BundleProcessor:
         config_json_path = os.path.join(self.bundle_path, 'config.json')
         logger.debug(f'Saving modified OCI config to {config_json_path}')
 
+        oci_config = self.oci_config
+        if isinstance(oci_config.get('mounts'), MountTable):
+            oci_config = dict(oci_config, mounts=oci_config['mounts'].to_list())
+
         with open(config_json_path, 'w', encoding='utf-8') as config_file:
-            json.dump(self.oci_config, config_file,
+            json.dump(oci_config, config_file,
                       ensure_ascii=False, indent=4)
 
         logger.debug('Written config.json successfully')
@@ -293,7 +321,29 @@ class BundleProcessor:
         
         logger.warning("User namespacing enabled but could not resolve host uid/gid")
         return (uid, gid)
-        
+
+    # ==========================================================================
+    def create_tgz(self, dest):
+        """Create the tarball of the bundle, with the file ownership and mask
+        of the 'tarball' settings of the platform. All front ends (CLI, web UI
+        and RabbitMQ) create it the same way, as they share the result cache
+
+        Args:
+            dest (string): Where to save the tarball
+
+        Returns:
+            bool: True for success
+        """
+        tarball_settings = self.platform_cfg.get('tarball')
+        file_ownership_user = tarball_settings.get('fileOwnershipSameAsUser') if tarball_settings else None
+        file_mask = tarball_settings.get('fileMask') if tarball_settings else None
+
+        container_uid_gid = self.get_real_uid_gid()
+        uid = container_uid_gid[0] if container_uid_gid[0] and file_ownership_user else None
+        gid = container_uid_gid[1] if container_uid_gid[1] and file_ownership_user else None
+
+        return Utils.create_tgz(self.bundle_path, dest, uid, gid, file_mask)
+
 
     # ==========================================================================
     def _add_bind_mount(self, src, dst, createmountpoint=False, options=None):
@@ -330,8 +380,23 @@ class BundleProcessor:
             self._createAndWriteFileInRootfs(dst, '', 0o644)
 
         # Add bind mount
-        if not mnt_to_add in self.oci_config['mounts']:
-            self.oci_config['mounts'].append(mnt_to_add)
+        mounts = self._get_mounts()
+        if not mnt_to_add in mounts:
+            mounts.append(mnt_to_add)
+
+    # ==========================================================================
+    def _get_mounts(self):
+        """Returns the mounts of the config as MountTable. The table replaces
+        the 'mounts' list in the config until it is written by write_config_json
+
+        Returns:
+            MountTable: mounts of the config
+        """
+        mounts = self.oci_config.get('mounts')
+        if not isinstance(mounts, MountTable):
+            mounts = MountTable(mounts)
+            self.oci_config['mounts'] = mounts
+        return mounts
 
     # ==========================================================================
     def load_config(self):
@@ -526,7 +591,7 @@ class BundleProcessor:
             else:
                 self._createAndWriteFileInRootfs(mount['destination'], '', 0o644)
         if 'options' not in mount or 'X-mount.no' not in mount['options']:
-            self.oci_config['mounts'].append(mount)
+            self._get_mounts().append(mount)
 
 
     # ==========================================================================
@@ -546,6 +611,81 @@ class BundleProcessor:
                 self._add_mount(mount)
 
 
+    # ==========================================================================
+    def _prefetch_libs(self):
+        """Read the info of rootfs libs needed for library matching of the GPU
+        libs and Dobby plugin dependencies upfront and in parallel
+        """
+        libs = [srclib for _, srclib, _ in self.get_library_requests(self.platform_cfg, self.app_metadata, self.crun_only)]
+        self.libmatcher.prefetch(libs)
+
+    # ==========================================================================
+    @staticmethod
+    def get_library_requests(platform_cfg, app_metadata, crun_only):
+        """Returns the libs that will be matched while processing the bundle,
+        see _process_gpu() and _process_dobby_plugin_dependencies()
+
+        Args:
+            platform_cfg (dict): platform config
+            app_metadata (dict): app metadata
+            crun_only (bool): crun compatible bundle without Dobby
+
+        Returns:
+            list: (call, srclib, dstlib) tuples in processing order, see LibraryPlanner.plan()
+        """
+        requests = []
+        if app_metadata.get('graphics') == True and platform_cfg.get('hardware', {}).get('graphics') and platform_cfg.get('gpu'):
+            requests.extend(('mount', lib['src'], lib['dst']) for lib in platform_cfg['gpu'].get('gfxLibs', []))
+        if not crun_only and platform_cfg.get('dobby'):
+            requests.extend(('mount_or_use_rootfs', lib, lib) for lib in platform_cfg['dobby'].get('pluginDependencies', []))
+        return requests
+
+    # ==========================================================================
+    def _select_library_matching_mode(self):
+        """
+        Libmatchingmode 'auto': plans the library matching with every mode on
+        the unpacked rootfs, see LibraryPlanner.evaluate_modes(), and uses the
+        plan of the mode leaving the smallest rootfs. Modes that choose libs
+        against the apiversion rules, where 'normal' mode does not, are skipped.
+        """
+        if self.libmatcher.nodepwalking or not self.libmatcher._get_libs():
+            self.libmatcher.libmatchingmode = 'normal'
+            return
+
+        logger.debug("Evaluating library matching modes")
+        requests = self.get_library_requests(self.platform_cfg, self.app_metadata, self.crun_only)
+        results = LibraryPlanner.evaluate_modes(self.platform_cfg, self.bundle_path, requests, self.createmountpoints)
+
+        normal = results[0]
+        selected = normal
+        for result in results:
+            if set(result['violations']) - set(normal['violations']):
+                logger.info(f"Libmatching mode {result['mode']}: {humanfriendly.format_size(result['size'])}, "
+                            f"not possible because of apiversions of {sorted(set(result['violations']))}")
+                continue
+            logger.info(f"Libmatching mode {result['mode']}: {humanfriendly.format_size(result['size'])}")
+            if result['size'] < selected['size']:
+                selected = result
+
+        saved = normal['size'] - selected['size']
+        if saved:
+            logger.success(f"Libmatching mode auto selected '{selected['mode']}', "
+                           f"saved {humanfriendly.format_size(saved)} ({saved} bytes) compared to 'normal'")
+        else:
+            logger.success(f"Libmatching mode auto selected '{selected['mode']}'")
+        self.libmatcher.libmatchingmode = selected['mode']
+        self.libmatcher.use_plan(selected['plan'])
+
+    # ==========================================================================
+    def use_library_plan(self, plan):
+        """Use library matching decisions planned while the image was unpacked,
+        see LibraryPlanner
+
+        Args:
+            plan (list): steps returned by LibraryPlanner.plan()
+        """
+        self.libmatcher.use_plan(plan)
+
     # ==========================================================================
     def _process_gpu(self):
         """Adds various GPU mounts/libs
@@ -925,17 +1065,18 @@ class BundleProcessor:
                         "options": options
                     }
 
-                    self.oci_config['mounts'].append(mnt_to_add)
+                    self._get_mounts().append(mnt_to_add)
 
                     self._createEmptyDirInRootfs(tmp_mnnt['path'])
 
         # Optional mounts also use the storage plugin
+        mounts = self._get_mounts()
         optional_mounts = []
-        for mount in self.oci_config['mounts']:
+        for mount in mounts:
             if mount.get('options') and 'X-dobby.optional' in mount['options']:
                 optional_mounts.append(mount)
         for mount in optional_mounts:
-            self.oci_config['mounts'].remove(mount)
+            mounts.remove(mount)
             mount['options'].remove('X-dobby.optional')
         if len(optional_mounts)> 0:
             storage_plugin = self.oci_config['rdkPlugins'].get('storage')
@@ -1060,6 +1201,144 @@ class BundleProcessor:
             for lib in self.platform_cfg['dobby']['pluginDependencies']:
                 self.libmatcher.mount_or_use_rootfs(lib, lib)
 
+    # ==========================================================================
+    def _process_identical_libs(self):
+        """
+        Replaces files in the rootfs that are identical to a host lib with a
+        read-only bind mount of the host lib, see LibraryMatching.replace_identical_libs()
+        """
+        logger.debug("Replacing rootfs libs identical to host libs")
+        replaced, saved = self.libmatcher.replace_identical_libs()
+        if replaced:
+            logger.success(f"Replaced {replaced} rootfs files identical to host libs by mounts, "
+                           f"saved {humanfriendly.format_size(saved)} ({saved} bytes)")
+
+    # ==========================================================================
+    def _process_library_pruning(self):
+        """
+        Finds the libs in the rootfs that are not needed by the entrypoint of
+        the app, see LibraryPruner. Only reports them for prune_libs 'report',
+        removes them for 'remove'.
+
+        Libs are kept if they are needed by process.args[0], the entrypoints or
+        dlopen libs listed in the libraryPruning section of the app metadata,
+        or the libs used by the libs mounted from the host.
+
+        Nothing is pruned if an entrypoint is not a dynamically linked
+        executable, e.g. a start script or a shell. Such a process.args[0] is
+        only accepted when the binaries it runs are listed as entrypoints.
+        """
+        logger.debug("Finding libs not used by the app")
+        if self.libmatcher.nodepwalking:
+            logger.warning("Library pruning needs dependency walking, not pruning libs")
+            return
+
+        pruner = LibraryPruner(self.rootfs_path)
+        pruning = self.app_metadata.get('libraryPruning', {})
+
+        entrypoints = list(self.libmatcher.handled_libs)
+        listed = pruning.get('entrypoints', [])
+        commands = self.oci_config.get('process', {}).get('args', [])[:1] + listed
+        for command in commands:
+            entrypoint = pruner.find_entrypoint(command, self.oci_config.get('process', {}).get('env'))
+            if not entrypoint:
+                logger.warning(f"Entrypoint {command} not found in rootfs, not pruning libs")
+                return
+
+            reason = pruner.check_entrypoint(entrypoint)
+            if reason and (not listed or command in listed):
+                logger.warning(f"Entrypoint {command} {reason}, not pruning libs. "
+                               f"List the executables it runs in libraryPruning.entrypoints")
+                return
+            entrypoints.append(entrypoint)
+
+        unused = pruner.find_unused(entrypoints, pruning.get('dlopen', []))
+        total = 0
+        for path in unused:
+            size = pruner.get_size(path)
+            total += size
+            logger.info(f"Unused lib: {path} ({humanfriendly.format_size(size)})")
+
+        if self.prune_libs == 'remove':
+            pruner.remove(unused)
+            logger.success(f"Removed {len(unused)} unused libs from rootfs, saved {humanfriendly.format_size(total)} ({total} bytes)")
+        else:
+            logger.success(f"Found {len(unused)} unused libs in rootfs ({humanfriendly.format_size(total)}), "
+                           f"not removed (dry run)")
+
+    # ==========================================================================
+    def _process_ld_cache(self):
+        """
+        Writes /etc/ld.so.cache into the rootfs for the final set of libs, the
+        rootfs libs and the libs mounted from the host, see LdCache.
+
+        The directories at the end of LD_LIBRARY_PATH that are known from the
+        rootfs are moved into the cache, so the dynamic linker no longer tries
+        to open every needed lib in each of them. Directories of other mounts
+        and directories with hwcap sub directories (glibc-hwcaps, tls, ...),
+        whose optimised libs the cache would hide, are kept, as are the ones
+        before them to keep the search order.
+
+        The dynamic linker searches the DT_RUNPATH of an ELF after
+        LD_LIBRARY_PATH but before the cache, so nothing is moved if any ELF
+        file of the rootfs has a DT_RUNPATH. The cache is not written at all
+        when the dynamic linker of the rootfs is not the glibc one, as musl
+        and uClibc ignore it.
+        """
+        logger.debug("Generating ld.so.cache")
+        arch = self.platform_cfg.get('arch', {}).get('arch')
+        if not LdCache.supports(arch):
+            logger.warning(f"Cannot generate ld.so.cache for arch {arch}")
+            return
+
+        ld_cache = LdCache(self.rootfs_path, arch)
+        # Other dynamic linkers would ignore the cache and lose LD_LIBRARY_PATH
+        reason = ld_cache.check_interpreter()
+        if reason:
+            logger.warning(f"Cannot generate ld.so.cache, {reason}")
+            return
+
+        mounted_libs = []
+        mounted_dirs = []
+        for mount in self._get_mounts():
+            dst = mount['destination']
+            if mount.get('type') == 'bind' and RootfsListing.SHARED_LIB_RE.search(os.path.basename(dst)):
+                mounted_libs.append(dst)
+            else:
+                mounted_dirs.append(dst.rstrip('/') + '/')
+
+        directories = []
+        env = []
+        for var in self.oci_config['process']['env']:
+            if var.startswith('LD_LIBRARY_PATH='):
+                search_path = var[len('LD_LIBRARY_PATH='):].split(':')
+                kept = len(search_path)
+                while kept > 0 and ld_cache.is_listed(search_path[kept - 1]) and \
+                        not ld_cache.has_hwcap_subdirs(search_path[kept - 1]) and \
+                        not any((search_path[kept - 1] + '/').startswith(mounted_dir) for mounted_dir in mounted_dirs):
+                    kept -= 1
+                directories.extend(search_path[kept:])
+                if not kept:
+                    continue
+                var = 'LD_LIBRARY_PATH=' + ':'.join(search_path[:kept])
+            env.append(var)
+
+        runpath_elf = ld_cache.find_runpath() if directories else None
+        if runpath_elf:
+            logger.info(f"Keeping LD_LIBRARY_PATH, {runpath_elf} has a DT_RUNPATH searched before {LdCache.PATH}")
+            directories = []
+        else:
+            self.oci_config['process']['env'] = env
+
+        # ld.so.conf is only used through the cache, it was ignored if the image had none
+        if ld_cache.exists():
+            directories.extend(ld_cache.get_ld_so_conf_dirs())
+        directories.extend(ld_cache.get_default_dirs())
+
+        ld_cache.add_directories(directories, mounted_libs)
+        count = ld_cache.write()
+        logger.success(f"Generated {LdCache.PATH} with {count} libs")
+
     # ==========================================================================
     def _cleanup_umoci_leftovers(self):
         """Umoci creates a few extra files in the bundle we don't care about
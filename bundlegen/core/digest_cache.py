@@ -0,0 +1,117 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Consult Red
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import time
+from hashlib import sha256
+from bundlegen.core.sqlite_cache import SqliteCache
+
+
+class DigestCache(SqliteCache):
+    """Persistent cache of the manifest digests that image references
+    resolve to for a platform
+
+    Resolving a tag asks the registry for the manifest list and the image
+    manifest of the platform. The digest a tag resolved to is reused for
+    BUNDLEGEN_DIGEST_CACHE_TTL seconds (default 60). After that, the digest
+    of the manifest (list) of the tag is checked again, which is a single
+    HEAD request with the built-in registry client: if the tag did not move,
+    the cached image digest is reused. References pinned to a digest are
+    immutable and never expire.
+
+    Entries are keyed by registry, repository, reference, platform and a
+    hash of the credentials, so images are only resolved from the cache for
+    the credentials that resolved them. The size can be set using the
+    BUNDLEGEN_DIGEST_CACHE_SIZE environment variable, see SqliteCache.
+    """
+    DB_FILENAME = 'digests.sqlite'
+    DEFAULT_SIZE = 10000
+    DEFAULT_TTL = 60
+    SIZE_ENV = 'BUNDLEGEN_DIGEST_CACHE_SIZE'
+    NAME = 'Digest cache'
+    TABLES = {
+        'digests': ('key', "key TEXT PRIMARY KEY, digest TEXT NOT NULL, ref_digest TEXT, "
+                           "pinned INTEGER NOT NULL, resolved INTEGER NOT NULL, last_used INTEGER NOT NULL")
+    }
+
+    def __init__(self, db_path, max_entries=None, ttl=DEFAULT_TTL):
+        super().__init__(db_path, max_entries)
+        self.ttl = ttl
+
+    # ==========================================================================
+    @classmethod
+    def _get_settings(cls):
+        settings = super()._get_settings()
+        settings['ttl'] = cls._get_env_int('BUNDLEGEN_DIGEST_CACHE_TTL', cls.DEFAULT_TTL)
+        return settings
+
+    # ==========================================================================
+    @staticmethod
+    def make_key(ref, platform, creds=None):
+        """Returns the key of the digest of an image for a platform
+
+        Args:
+            ref (ImageReference): reference of a registry image
+            platform (dict): os, arch and variant
+            creds (string): Credentials the image is resolved with
+
+        Returns:
+            string: hex digest
+        """
+        creds_hash = sha256((creds or '').encode('utf-8')).hexdigest()
+        return sha256(json.dumps([ref.registry, ref.repository, ref.reference, platform, creds_hash],
+                                 sort_keys=True).encode('utf-8')).hexdigest()
+
+    # ==========================================================================
+    def get(self, key):
+        """Returns the cached digest of a key
+
+        Args:
+            key (string): see make_key()
+
+        Returns:
+            tuple: (image manifest digest, digest of the manifest (list) the
+                   reference pointed to or None, True if it has not expired),
+                   None if not cached
+        """
+        if not self.db_path:
+            return None
+
+        row = self._lookup('digests', key, 'digest, ref_digest, resolved, pinned')
+        if not row:
+            self.misses += 1
+            return None
+        digest, ref_digest, resolved, pinned = row
+        fresh = bool(pinned) or time.time_ns() - resolved < self.ttl * 10 ** 9
+        if fresh:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return (digest, ref_digest, fresh)
+
+    # ==========================================================================
+    def put(self, key, digest, ref_digest=None, pinned=False):
+        """Remember the digest a reference resolved to, now
+
+        Args:
+            key (string): see make_key()
+            digest (string): digest of the image manifest of the platform
+            ref_digest (string): digest of the manifest (list) the reference
+                                 pointed to, if known
+            pinned (bool): True if the reference is a digest, never expires
+        """
+        self._store('digests', key, digest, ref_digest, int(pinned), time.time_ns())
@@ -0,0 +1,135 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Consult Red
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+from hashlib import sha256
+from bundlegen.core.sqlite_cache import SqliteCache
+
+
+class ElfInfoCache(SqliteCache):
+    """Persistent cache of the info read from ELF libraries
+
+    Images usually share the same base layers, so the same libraries are
+    inspected over and over again. Results are stored in a sqlite database in
+    the BundleGen cache directory, keyed by the sha256 of the library. The
+    hash of a file is remembered by (device, inode, size, mtime) so unchanged
+    files are not hashed again. Keys include INFO_VERSION, which is bumped
+    when the info read from ELF files changes, so entries written by an older
+    BundleGen are never returned.
+
+    The size can be set using the BUNDLEGEN_ELF_CACHE_SIZE environment
+    variable, see SqliteCache.
+    """
+    DB_FILENAME = 'elf_info.sqlite'
+    DEFAULT_SIZE = 20000
+    SIZE_ENV = 'BUNDLEGEN_ELF_CACHE_SIZE'
+    NAME = 'ELF info cache'
+    # 2: DT_RUNPATH added
+    # 3: PT_INTERP added
+    INFO_VERSION = 3
+    TABLES = {
+        'elf_info': ('sha256', "sha256 TEXT PRIMARY KEY, info TEXT NOT NULL, last_used INTEGER NOT NULL"),
+        'file_hashes': ('stat_key', "stat_key TEXT PRIMARY KEY, sha256 TEXT NOT NULL, last_used INTEGER NOT NULL")
+    }
+
+    # ==========================================================================
+    def get(self, path, loader):
+        """Returns the info of an ELF file, reading it only if it is not cached
+
+        Args:
+            path (string): Path to the file
+            loader (function): Reads the info from the file, result must be
+                               json serialisable
+
+        Returns:
+            Result of loader for the file content
+        """
+        return self.get_many([path], loader)[0]
+
+    # ==========================================================================
+    def get_many(self, paths, loader, map_func=map):
+        """Returns the info of ELF files, reading only the files that are not
+        cached. The files are read with map_func, e.g. the map of a process
+        pool, and the results are cached by this process
+
+        Args:
+            paths (list): Paths to the files
+            loader (function): Reads the info from a file, result must be
+                               json serialisable
+            map_func (function): Called as map_func(loader, paths) for the
+                                 files to read, returns the results in order
+
+        Returns:
+            list: Result of loader for the content of every file
+        """
+        infos = {}
+        keys = {}
+        for path in paths:
+            if not self.db_path or path in infos or path in keys or not os.path.isfile(path):
+                continue
+            try:
+                key = f"{self.get_hash(path)}:{self.INFO_VERSION}"
+            except OSError:
+                continue
+            row = self._lookup('elf_info', key, 'info')
+            if row:
+                self.hits += 1
+                infos[path] = json.loads(row[0])
+            else:
+                keys[path] = key
+
+        missing = list(dict.fromkeys(path for path in paths if path not in infos))
+        for path, info in zip(missing, map_func(loader, missing)):
+            infos[path] = info
+            if path in keys:
+                self.misses += 1
+                self._store('elf_info', keys[path], json.dumps(info))
+        return [infos[path] for path in paths]
+
+    # ==========================================================================
+    def get_hash(self, path):
+        """Returns the sha256 of a file, using the remembered hash if the file
+        did not change
+
+        Args:
+            path (string): Path to the file
+
+        Returns:
+            string: hex digest of the file content
+        """
+        stat = os.stat(path)
+        if not self.db_path:
+            return self._hash_file(path)
+
+        stat_key = f"{stat.st_dev}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}"
+        row = self._lookup('file_hashes', stat_key, 'sha256', touch=False)
+        if row:
+            return row[0]
+
+        digest = self._hash_file(path)
+        self._store('file_hashes', stat_key, digest)
+        return digest
+
+    # ==========================================================================
+    @staticmethod
+    def _hash_file(path):
+        digest = sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
@@ -21,10 +21,24 @@ import time
 
 from loguru import logger
 from bundlegen.core.utils import Utils
+from bundlegen.core.blob_store import BlobStore
+from bundlegen.core.registry_client import RegistryClient, RegistryError
+from bundlegen.core.local_image import LocalImage, LocalImageError
+from bundlegen.core.image_reference import ImageReference
+from bundlegen.core.digest_cache import DigestCache
 
 
 class ImageDownloader():
-    def __init__(self):
+    BACKENDS = ['skopeo', 'native']
+
+    def __init__(self, backend=None):
+        # Images are downloaded with skopeo, or from registries (docker://)
+        # by the built-in client of the OCI distribution API if 'native'
+        self.backend = backend or os.environ.get('BUNDLEGEN_DOWNLOADER') or 'skopeo'
+        if self.backend not in self.BACKENDS:
+            logger.warning(f"Unknown downloader {self.backend}, using skopeo")
+            self.backend = 'skopeo'
+
         # Optimism
         self.skopeo_found = True
 
@@ -32,14 +46,18 @@ class ImageDownloader():
         if skopeo_path:
             logger.debug(f"Using skopeo: {skopeo_path}")
         else:
-            logger.error(
-                "Failed to find skopeo binary to download images", err=True)
+            if self.backend == 'skopeo':
+                logger.error(
+                    "Failed to find skopeo binary to download images", err=True)
+            else:
+                logger.debug("skopeo not found, only registry images can be downloaded")
             self.skopeo_found = False
 
     # ==========================================================================
     @staticmethod
     def get_image_tag(url):
-        """Gets the tag from a given image url
+        """Gets the tag from a given image url, which is the name of the image
+        in the image layout of the build, see ImageReference.layout_tag
 
         Args:
             url (string): URL to the image
@@ -47,7 +65,11 @@ class ImageDownloader():
         Returns:
             string: Image tag
         """
-        # Attempt to get the tag
+        ref = ImageReference.parse(url)
+        if ref:
+            return ref.layout_tag
+
+        # Other transports: attempt to get the tag
         tag = url.rsplit(':', 1)[-1]
 
         # If we found //, there probably wasn't a tag on the end and we just found
@@ -57,49 +79,143 @@ class ImageDownloader():
         return tag
 
     # ==========================================================================
-    def download_image(self, url, creds, platform_cfg):
+    def download_image(self, url, creds, platform_cfg, offline=False, digest=None):
         """Attempt to download the specified image using skopeo
 
-        Will download and extract the image to /tmp
+        Will download the image to an OCI image layout inside the blob store
+        (see BlobStore), or to /tmp if the store is disabled. Blobs already
+        in the store are not downloaded again. Local images (oci:,
+        oci-archive:, docker-archive:) are imported without skopeo, see
+        LocalImage.
 
         Args:
             url (string): URL to download the image from (e.g. docker://hello-world:latest)
             creds (string): Credentials for the OCI registry in the form username:password
             platform_cfg (dict): Platform template
+            offline (bool): Only use the blob store, do not contact the registry
+            digest (string): Digest the image was resolved to for the platform
+                             (see get_image_digest()). Registry images are
+                             downloaded by digest, so the image matches even
+                             if the tag moved since
 
         Returns:
             string: Path to downloaded image
         """
+        local = LocalImage.parse_url(url) is not None
+
         # If skopeo isn't installed, can't download
-        if not self.skopeo_found:
+        if not self.skopeo_found and not offline and not local and not self._use_native(url):
             logger.error("Cannot download image as cannot find skopeo")
             return
 
+        if creds and ':' not in creds:
+            logger.error("Registry credentials must be in the form username:password")
+            return None
+
         image_tag = self.get_image_tag(url)
+        source_url = url
+        ref = ImageReference.parse(url)
+        if digest and ref and not ref.is_local:
+            source_url = ref.with_digest(digest).to_url()
+
+        platform = self.get_platform(platform_cfg)
+        if not platform:
+            return ""
+
+        blob_store = BlobStore.get_instance()
+        if offline and not local:
+            return self._create_from_store(blob_store, url, platform)
+
+        if blob_store:
+            destination = blob_store.new_layout()
+        else:
+            # Save the image to a temp dir. Use uuid to generate a unique name
+            if not os.path.exists('/tmp/bundlegen'):
+                os.makedirs('/tmp/bundlegen')
+
+            now = time.strftime("%Y%m%d-%H%M%S")
+            destination = f'/tmp/bundlegen/{now}_{Utils.get_random_string()}'
+        logger.info(f"Downloading image to {destination}...")
+
+        if local:
+            img_path = self._import_local(url, platform, image_tag, blob_store, destination)
+            if img_path or not self.skopeo_found:
+                return img_path
+            logger.info(f"Copying {url} with skopeo instead")
+            os.makedirs(destination, exist_ok=True)
+
+        if self._use_native(url):
+            return self._download_native(url, creds, platform, image_tag, blob_store, destination, source_url)
+
+        # Build the command to skopeo
+        skopeo_command = self._get_skopeo_command(platform)
+
+        if creds:
+            skopeo_command += f'--src-creds {creds} '
+
+        skopeo_command += 'copy '
+        if blob_store:
+            skopeo_command += f'--dest-shared-blob-dir {blob_store.root} '
+        skopeo_command += f'{source_url} oci:{destination}:{image_tag}'
+
+        logger.debug(skopeo_command)
+
+        if not blob_store:
+            # Run skopeo, and stream the output to the console
+            success = Utils.run_process(skopeo_command)
+        else:
+            # Blobs cannot be evicted while skopeo writes and they are linked
+            with blob_store.lock():
+                success = Utils.run_process(skopeo_command)
+                if success == 0 and not blob_store.link_layout(destination):
+                    logger.warning("Blobs of the downloaded image are missing in the blob store")
+                    success = 1
+            if success == 0:
+                blob_store.save_ref(url, platform, destination)
+                blob_store.evict()
+            else:
+                shutil.rmtree(destination, ignore_errors=True)
+
+        if success == 0:
+            logger.success(
+                f"Downloaded image from {url} successfully to {destination}")
+            return destination
+        else:
+            logger.warning("Skopeo failed to download the image")
+            return None
 
+    # ==========================================================================
+    @staticmethod
+    def get_platform(platform_cfg):
+        """Gets the os, arch and variant to download images for from the
+        platform template
+
+        Args:
+            platform_cfg (dict): Platform template
+
+        Returns:
+            dict: os, arch and variant (None if not set), None if the template
+                  does not define the os or arch
+        """
         # Get arch from config
         if 'arch' not in platform_cfg:
             logger.error("Platform architecture is not defined", err=True)
-            return ""
-        else:
-            arch = platform_cfg['arch'].get('arch')
-            variant = platform_cfg['arch'].get('variant')
+            return None
 
         if 'os' not in platform_cfg:
             logger.error("Platform OS is not defined", err=True)
-            return ""
-        else:
-            platform_os = platform_cfg.get('os')
+            return None
 
-        # Save the image to a temp dir. Use uuid to generate a unique name
-        if not os.path.exists('/tmp/bundlegen'):
-            os.makedirs('/tmp/bundlegen')
+        return {'os': platform_cfg.get('os'),
+                'arch': platform_cfg['arch'].get('arch'),
+                'variant': platform_cfg['arch'].get('variant')}
 
-        now = time.strftime("%Y%m%d-%H%M%S")
-        destination = f'/tmp/bundlegen/{now}_{Utils.get_random_string()}'
-        logger.info(f"Downloading image to {destination}...")
-
-        # Build the command to skopeo
+    # ==========================================================================
+    @staticmethod
+    def _get_skopeo_command(platform):
+        """Returns the start of a skopeo command line, with the global options
+        selecting the policy and the platform of the image
+        """
         skopeo_command = f'skopeo '
 
         if (os.path.exists(os.path.expanduser('~/.config/containers/policy.json')) or
@@ -109,24 +225,195 @@ class ImageDownloader():
            logger.debug('Did not find a policy.json file for skopeo. Will use insecure-policy flag for skopeo!')
            skopeo_command += '--insecure-policy '
 
-        if creds:
-            skopeo_command += f'--src-creds {creds} '
+        skopeo_command += f"--override-os {platform['os']} --override-arch {platform['arch']} "
+        if platform['variant']:
+            skopeo_command += f"--override-variant {platform['variant']} "
+        return skopeo_command
 
-        if variant:
-            skopeo_command += f'--override-os {platform_os} --override-arch {arch} --override-variant {variant} '
-        else:
-            skopeo_command += f'--override-os {platform_os} --override-arch {arch} '
+    # ==========================================================================
+    def get_image_digest(self, url, creds, platform_cfg, offline=False):
+        """Resolve the digest of the manifest of an image for a platform,
+        without downloading the image. Digests of registry images are
+        cached, see DigestCache
 
-        skopeo_command += f'copy {url} oci:{destination}:{image_tag}'
+        Args:
+            url (string): URL of the image (e.g. docker://hello-world:latest)
+            creds (string): Credentials for the OCI registry in the form username:password
+            platform_cfg (dict): Platform template
+            offline (bool): Only use the blob store, do not contact the registry
 
-        logger.debug(skopeo_command)
+        Returns:
+            string: digest (e.g. sha256:<hex>) or None if it cannot be resolved
+        """
+        platform = self.get_platform(platform_cfg)
+        if not platform:
+            return None
 
-        # Run skopeo, and stream the output to the console
-        success = Utils.run_process(skopeo_command)
-        if success == 0:
-            logger.success(
-                f"Downloaded image from {url} successfully to {destination}")
-            return destination
+        ref = ImageReference.parse(url)
+        if ref and ref.transport == 'oci':
+            return LocalImage.get_digest(url, platform)
+
+        if offline and not (ref and ref.is_local):
+            blob_store = BlobStore.get_instance()
+            return blob_store.get_ref_digest(url, platform) if blob_store else None
+
+        if not ref or ref.is_local:
+            return self._inspect_digest(url, creds, platform) if self.skopeo_found else None
+
+        # Registry image, resolve tags at most once per TTL
+        cache = DigestCache.get_instance()
+        key = DigestCache.make_key(ref, platform, creds)
+        cached = cache.get(key)
+        if cached and cached[2]:
+            logger.debug(f"Using digest {cached[0]} of {url} from digest cache")
+            return cached[0]
+
+        ref_digest = None
+        if self._use_native(url):
+            client = RegistryClient(ref.registry, creds)
+            try:
+                ref_digest = ref.digest or client.get_manifest_digest(ref.repository, ref.reference)
+                if cached and ref_digest and ref_digest == cached[1]:
+                    logger.debug(f"Tag of {url} did not move, using digest {cached[0]}")
+                    digest = cached[0]
+                else:
+                    digest = client.resolve(ref.repository, ref_digest or ref.reference, platform)[2]
+            except (RegistryError, OSError, ValueError) as err:
+                logger.debug(f"Cannot resolve the digest of {url}: {err}")
+                return None
+        elif self.skopeo_found:
+            digest = self._inspect_digest(url, creds, platform)
         else:
-            logger.warning("Skopeo failed to download the image")
             return None
+
+        if digest:
+            cache.put(key, digest, ref_digest, pinned=bool(ref.digest))
+        return digest
+
+    # ==========================================================================
+    def _inspect_digest(self, url, creds, platform):
+        """Resolve the digest of the manifest of an image for a platform with
+        skopeo inspect
+
+        Returns:
+            string: digest or None if it cannot be resolved
+        """
+        skopeo_command = self._get_skopeo_command(platform)
+        if creds:
+            skopeo_command += f'--creds {creds} '
+        skopeo_command += f"inspect --format '{{{{.Digest}}}}' {url}"
+
+        code, output = Utils.run_process_and_return_output(skopeo_command)
+        digest = output.strip() if code == 0 and output else ''
+        if not BlobStore.DIGEST_RE.match(digest):
+            logger.debug(f"Cannot resolve the digest of {url}")
+            return None
+        return digest
+
+    # ==========================================================================
+    def _use_native(self, url):
+        """Returns True if the image is downloaded by the built-in registry
+        client instead of skopeo
+        """
+        return self.backend == 'native' and RegistryClient.parse_url(url) is not None
+
+    # ==========================================================================
+    def _download_native(self, url, creds, platform, image_tag, blob_store, destination, source_url=None):
+        """Download an image from a registry with the built-in client, into
+        the blob store if enabled
+
+        Args:
+            url (string): docker:// URL of the image
+            creds (string): Credentials for the OCI registry in the form username:password
+            platform (dict): os, arch and variant of the platform
+            image_tag (string): Name of the image in the layout
+            blob_store (BlobStore): the store, None if disabled
+            destination (string): Directory of the image layout
+            source_url (string): URL to download from if not url, e.g. pinned
+                                 to a digest
+
+        Returns:
+            string: Path to downloaded image or None on failure
+        """
+        registry, repository, reference = RegistryClient.parse_url(source_url or url)
+        client = RegistryClient(registry, creds)
+        try:
+            if blob_store:
+                # Blobs cannot be evicted while they are downloaded and linked
+                with blob_store.lock():
+                    client.pull(repository, reference, platform, destination, image_tag, blob_store.root)
+                    if not blob_store.link_layout(destination):
+                        raise RegistryError("Blobs of the downloaded image are missing in the blob store")
+                blob_store.save_ref(url, platform, destination)
+                blob_store.evict()
+            else:
+                client.pull(repository, reference, platform, destination, image_tag)
+        except (RegistryError, OSError, ValueError, KeyError) as err:
+            logger.warning(f"Failed to download the image: {err}")
+            shutil.rmtree(destination, ignore_errors=True)
+            return None
+
+        logger.success(f"Downloaded image from {url} successfully to {destination} "
+                       f"({client.stats['bytes_downloaded']} bytes downloaded)")
+        return destination
+
+    # ==========================================================================
+    def _import_local(self, url, platform, image_tag, blob_store, destination):
+        """Import a local image without copying it with skopeo. The blobs of
+        an OCI layout are linked, the blobs of archives are written to the
+        blob store if enabled
+
+        Args:
+            url (string): oci:, oci-archive: or docker-archive: URL
+            platform (dict): os, arch and variant of the platform
+            image_tag (string): Name of the image in the layout
+            blob_store (BlobStore): the store, None if disabled
+            destination (string): Directory of the image layout
+
+        Returns:
+            string: Path to the image or None on failure
+        """
+        transport = LocalImage.parse_url(url)[0]
+        try:
+            if blob_store and transport != 'oci':
+                # Blobs cannot be evicted while they are written and linked
+                with blob_store.lock():
+                    LocalImage.import_image(url, platform, destination, image_tag, blob_store.root)
+                    if not blob_store.link_layout(destination):
+                        raise LocalImageError("Blobs of the imported image are missing in the blob store")
+                blob_store.evict()
+            else:
+                LocalImage.import_image(url, platform, destination, image_tag)
+        except LocalImageError as err:
+            logger.warning(f"Failed to import the image: {err}")
+            shutil.rmtree(destination, ignore_errors=True)
+            return None
+
+        logger.success(f"Imported image {url} successfully to {destination}")
+        return destination
+
+    # ==========================================================================
+    def _create_from_store(self, blob_store, url, platform):
+        """Create the image layout of an image from the blob store only,
+        as last downloaded for the platform
+
+        Args:
+            blob_store (BlobStore): the store, None if disabled
+            url (string): URL the image was downloaded from
+            platform (dict): os, arch and variant of the platform
+
+        Returns:
+            string: Path to the image or None if it is not in the store
+        """
+        if not blob_store:
+            logger.error("Offline mode needs the blob store, see BUNDLEGEN_BLOB_STORE_SIZE")
+            return None
+
+        destination = blob_store.new_layout()
+        if not blob_store.create_layout(url, platform, destination):
+            logger.error(f"Image {url} is not available offline")
+            shutil.rmtree(destination, ignore_errors=True)
+            return None
+
+        logger.success(f"Created image {url} from the blob store at {destination}")
+        return destination
@@ -0,0 +1,164 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Consult Red
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+
+
+class ImageReference:
+    """Reference to an image, as given to BundleGen and skopeo
+
+    docker://[<registry>/]<repository>[:<tag>][@<digest>]
+        Image in a registry. Parsed like the docker CLI: the first component
+        is the registry only if it contains a '.' or a ':' (port) or is
+        localhost, images of the Docker Hub without a namespace are in
+        library/ and references without a tag or digest are for 'latest'.
+    oci:<dir>[:<ref>], oci-archive:<file>[:<ref>], docker-archive:<file>[:<name:tag>]
+        Local image. The path ends at the first colon, like skopeo.
+
+    A digest reference is immutable, so everything derived from it (blobs,
+    bundles) can be cached without asking the registry again, see
+    DigestCache for the resolution of tags.
+    """
+    DOCKER_HUB = 'docker.io'
+    DEFAULT_TAG = 'latest'
+    LOCAL_TRANSPORTS = ('oci', 'oci-archive', 'docker-archive')
+    TAG_RE = re.compile(r"^\w[\w.-]{0,127}$")
+    DIGEST_RE = re.compile(r"^(sha256:[0-9a-f]{64}|sha512:[0-9a-f]{128})$")
+    COMPONENT_RE = re.compile(r"^[a-z0-9]+(?:(?:[._]|__|-+)[a-z0-9]+)*$")
+    REGISTRY_RE = re.compile(r"^[a-zA-Z0-9.-]+(?::\d+)?$|^\[[0-9a-fA-F:]+\](?::\d+)?$")
+
+    def __init__(self, transport, registry=None, repository=None, tag=None, digest=None, path=None):
+        self.transport = transport
+        self.registry = registry
+        self.repository = repository
+        self.tag = tag
+        self.digest = digest
+        self.path = path
+
+    # ==========================================================================
+    @classmethod
+    def parse(cls, url):
+        """Parse the URL of an image
+
+        Args:
+            url (string): e.g. docker://localhost:5000/app:1.0,
+                          docker://hello-world@sha256:<hex>, oci:/tmp/image:latest
+
+        Returns:
+            ImageReference: the reference, None if the URL is invalid or of
+                            another transport
+        """
+        transport, sep, rest = url.partition(':')
+        if not sep or not rest:
+            return None
+        if transport in cls.LOCAL_TRANSPORTS:
+            path, _, ref = rest.partition(':')
+            return cls(transport, tag=ref or None, path=path)
+        if transport != 'docker' or not rest.startswith('//'):
+            return None
+        return cls._parse_docker(rest[2:])
+
+    # ==========================================================================
+    @classmethod
+    def _parse_docker(cls, name):
+        digest = None
+        if '@' in name:
+            name, digest = name.split('@', 1)
+            if not cls.DIGEST_RE.match(digest):
+                return None
+
+        tag = None
+        last = name.rsplit('/', 1)[-1]
+        if ':' in last:
+            name, tag = name.rsplit(':', 1)
+            if not cls.TAG_RE.match(tag):
+                return None
+
+        first, _, rest = name.partition('/')
+        if rest and ('.' in first or ':' in first or first == 'localhost'):
+            registry, repository = first, rest
+            if not cls.REGISTRY_RE.match(registry):
+                return None
+        else:
+            registry, repository = cls.DOCKER_HUB, name
+        if registry == cls.DOCKER_HUB and '/' not in repository:
+            repository = f"library/{repository}"
+
+        if not all(cls.COMPONENT_RE.match(component) for component in repository.split('/')):
+            return None
+        if not tag and not digest:
+            tag = cls.DEFAULT_TAG
+        return cls('docker', registry, repository, tag, digest)
+
+    # ==========================================================================
+    @property
+    def is_local(self):
+        """bool: True for images in local directories or archives
+        """
+        return self.transport in self.LOCAL_TRANSPORTS
+
+    @property
+    def reference(self):
+        """string: what to fetch from the registry, the digest if pinned,
+        otherwise the tag. The raw reference of local images (None if not set)
+        """
+        return self.digest or self.tag
+
+    @property
+    def layout_tag(self):
+        """string: name of the image in the OCI image layout of a build, the
+        same for the download and the unpacking. 'latest' for references
+        without a tag
+        """
+        tag = self.tag
+        if tag and self.transport == 'docker-archive':
+            # <name>:<tag>
+            tag = tag.rsplit(':', 1)[-1]
+        return tag or self.DEFAULT_TAG
+
+    # ==========================================================================
+    def with_digest(self, digest):
+        """Returns the reference pinned to a manifest digest, e.g. resolved
+        from its tag
+
+        Args:
+            digest (string): e.g. sha256:<hex>
+
+        Returns:
+            ImageReference: the pinned reference, keeping the tag
+        """
+        return ImageReference(self.transport, self.registry, self.repository, self.tag, digest, self.path)
+
+    # ==========================================================================
+    def to_url(self):
+        """Returns the URL of the reference. Registry images are given by
+        digest only if pinned, as skopeo does not accept a tag and a digest
+
+        Returns:
+            string: e.g. docker://docker.io/library/hello-world:latest
+        """
+        if self.is_local:
+            return f"{self.transport}:{self.path}" + (f":{self.tag}" if self.tag else '')
+        if self.digest:
+            return f"docker://{self.registry}/{self.repository}@{self.digest}"
+        return f"docker://{self.registry}/{self.repository}:{self.tag}"
+
+    def __str__(self):
+        return self.to_url()
+
+    def __repr__(self):
+        return f"ImageReference({self.to_url()!r})"
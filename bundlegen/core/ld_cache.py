@@ -0,0 +1,372 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Consult Red
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+import glob
+import struct
+import posixpath
+from functools import cmp_to_key
+from loguru import logger
+from bundlegen.core.readelf import ReadElf
+from bundlegen.core.elf_cache import ElfInfoCache
+from bundlegen.core.rootfs_listing import RootfsListing
+
+
+class LdCache:
+    """Builds the /etc/ld.so.cache of a bundle, in the glibc new format
+    ("glibc-ld.so.cache1.1") as written by ldconfig
+
+    The cache maps sonames to the path of the lib inside the container, for
+    the libs of the rootfs and the libs bind mounted from the host, so the
+    dynamic linker does not have to search directories when the app starts.
+    Like ldconfig, only the sonames found in the given directories are
+    listed, the first directory listing a soname wins.
+    """
+    MAGIC = b'glibc-ld.so.cache'
+    VERSION = b'1.1'
+    PATH = '/etc/ld.so.cache'
+    LD_SO_CONF = '/etc/ld.so.conf'
+
+    # magic, version, nlibs, len_strings, flags, extension_offset
+    HEADER = struct.Struct('<17s3sIIB3xI12x')
+    # flags, key, value, osversion, hwcap
+    ENTRY = struct.Struct('<iIIIQ')
+    ENDIAN_LITTLE = 2
+    DIGITS = b'0123456789'
+
+    # Entry flags the dynamic linker of the platform accepts, see
+    # sysdeps/generic/ldconfig.h and the dl-cache.h of each arch in glibc.
+    # On arm, plain FLAG_ELF_LIBC6 is accepted by hard and soft float loaders
+    FLAG_ELF_LIBC6 = 0x0003
+    ARCH_FLAGS = {
+        'arm': FLAG_ELF_LIBC6,
+        'aarch64': 0x0a00 | FLAG_ELF_LIBC6,
+        'arm64': 0x0a00 | FLAG_ELF_LIBC6,
+        'x86_64': 0x0300 | FLAG_ELF_LIBC6,
+        'amd64': 0x0300 | FLAG_ELF_LIBC6,
+        '386': FLAG_ELF_LIBC6,
+        'i386': FLAG_ELF_LIBC6,
+        'i686': FLAG_ELF_LIBC6,
+    }
+    LIB64_ARCHS = ('aarch64', 'arm64', 'x86_64', 'amd64')
+    DEFAULT_DIRS = ['/lib', '/usr/lib']
+    LIB64_DIRS = ['/lib64', '/usr/lib64']
+    # Sub directories the dynamic linker searches in each directory of
+    # LD_LIBRARY_PATH, before the directory itself, for libs optimised for the
+    # CPU: glibc-hwcaps (glibc 2.33+), tls and the legacy platform and hwcap
+    # names of the supported archs
+    HWCAP_SUBDIRS = {
+        'glibc-hwcaps', 'tls',
+        'v5l', 'v6l', 'v7l', 'v8l', 'half', 'thumb', 'fastmult', 'vfp', 'edsp', 'java', 'iwmmxt',
+        'crunch', 'thumbee', 'neon', 'vfpv3', 'vfpv3d16', 'vfpv4', 'vfpd32', 'idiva', 'idivt', 'lpae',
+        'i486', 'i586', 'i686', 'sse2', 'x86_64', 'haswell', 'xeon_phi', 'avx512_1', 'aarch64', 'asimd'
+    }
+    # PT_INTERP of the glibc dynamic linker, e.g. ld-linux-armhf.so.3,
+    # ld-linux-x86-64.so.2 or ld64.so.1
+    GLIBC_LOADER_RE = re.compile(r"^(ld-linux[-\w]*|ld64)\.so\.[0-9]+$")
+
+    def __init__(self, rootfs_path, arch):
+        self.rootfs_path = rootfs_path
+        self.arch = arch
+        self.flags = self.ARCH_FLAGS[arch]
+        self.listing = RootfsListing.from_directory(rootfs_path)
+        # soname -> path inside the container
+        self.entries = {}
+        # resolved directories already added
+        self.directories = set()
+        self._elf_files = None
+
+        self._children = {}
+        for path in self.listing.entries:
+            if path != '/':
+                self._children.setdefault(posixpath.dirname(path), []).append(posixpath.basename(path))
+
+    # ==========================================================================
+    @classmethod
+    def supports(cls, arch):
+        """Returns True if the cache can be written for a platform arch
+        """
+        return arch in cls.ARCH_FLAGS
+
+    # ==========================================================================
+    def get_default_dirs(self):
+        """Returns the trusted directories the dynamic linker always searches
+        """
+        if self.arch in self.LIB64_ARCHS:
+            return self.LIB64_DIRS + self.DEFAULT_DIRS
+        return list(self.DEFAULT_DIRS)
+
+    # ==========================================================================
+    def get_ld_so_conf_dirs(self):
+        """Read the directories listed in /etc/ld.so.conf inside the rootfs,
+        following its include statements
+
+        Returns:
+            list: directories in the order they are listed
+        """
+        directories = []
+        self._read_ld_so_conf(self.LD_SO_CONF, directories, set())
+        return directories
+
+    # ==========================================================================
+    def _read_ld_so_conf(self, conf_path, directories, visited):
+        target = self.listing.resolve(conf_path)
+        if not target or target in visited or self.listing.entries[target][0] != RootfsListing.FILE:
+            return
+        visited.add(target)
+
+        with open(self._rootfs_filepath(target), errors='replace') as conf_file:
+            for line in conf_file:
+                line = line.split('#', 1)[0].strip()
+                if not line:
+                    continue
+                if line.startswith('include') and line[len('include'):][:1].isspace():
+                    for pattern in line[len('include'):].split():
+                        if not pattern.startswith('/'):
+                            pattern = posixpath.join(posixpath.dirname(conf_path), pattern)
+                        matches = glob.glob(self._rootfs_filepath(pattern))
+                        for match in sorted(matches):
+                            path = '/' + os.path.relpath(match, self.rootfs_path)
+                            self._read_ld_so_conf(path, directories, visited)
+                elif line.startswith('hwcap'):
+                    continue
+                else:
+                    # "dir=type" is an obsolete libc5 syntax
+                    for directory in line.replace(',', ' ').split():
+                        directories.append(directory.split('=', 1)[0])
+
+    # ==========================================================================
+    def exists(self):
+        """Returns True if the image has an ld.so.cache
+        """
+        return self.listing.exists(self.PATH)
+
+    # ==========================================================================
+    def is_listed(self, directory):
+        """Returns True if the content of a directory is known from the rootfs
+        """
+        return directory.startswith('/') and self.listing.resolve(directory) is not None
+
+    # ==========================================================================
+    def has_hwcap_subdirs(self, directory):
+        """Returns True if a directory has sub directories the dynamic linker
+        searches for optimised libs, see HWCAP_SUBDIRS. The cache only lists
+        the libs of the directory itself, those would no longer be used
+        """
+        resolved = self.listing.resolve(directory) if directory.startswith('/') else None
+        if not resolved:
+            return False
+        for name in self._children.get(resolved, []):
+            if name not in self.HWCAP_SUBDIRS:
+                continue
+            target = self.listing.resolve(posixpath.join(resolved, name))
+            if target and self.listing.entries[target][0] == RootfsListing.DIRECTORY:
+                return True
+        return False
+
+    # ==========================================================================
+    def covers(self, directory):
+        """Returns True if the libs of a directory are in the cache
+        """
+        return directory.startswith('/') and self._resolve_dir(directory) in self.directories
+
+    # ==========================================================================
+    def check_interpreter(self):
+        """Check that the dynamic linker of the rootfs reads the cache. Only
+        the glibc dynamic linker does, musl and uClibc ignore ld.so.cache
+
+        Returns:
+            string: reason the cache would not be used, or None
+        """
+        interpreters = sorted({elf_info['interp'] for _, elf_info in self._get_elf_files() if elf_info.get('interp')})
+        if not interpreters:
+            return "no dynamically linked executable found"
+        unsupported = [interp for interp in interpreters if not self.GLIBC_LOADER_RE.match(posixpath.basename(interp))]
+        if unsupported:
+            return f"dynamic linker {', '.join(unsupported)} is not the glibc one"
+        return None
+
+    # ==========================================================================
+    def find_runpath(self):
+        """Find an ELF file of the rootfs with a DT_RUNPATH. The dynamic
+        linker searches LD_LIBRARY_PATH before the DT_RUNPATH of the ELF that
+        needs a lib, and the cache after it
+
+        Returns:
+            string: path inside the rootfs of the first ELF file found with a
+                    DT_RUNPATH, or None
+        """
+        for path, elf_info in self._get_elf_files():
+            if elf_info.get('runpath'):
+                return path
+        return None
+
+    # ==========================================================================
+    def _get_elf_files(self):
+        """Returns the (path, elf info) of the ELF files of the rootfs, read
+        once through the ELF info cache
+        """
+        if self._elf_files is None:
+            self._elf_files = []
+            for path, (kind, _) in sorted(self.listing.entries.items()):
+                if kind != RootfsListing.FILE:
+                    continue
+                filepath = self._rootfs_filepath(path)
+                # Only ELF files go through the ELF info cache
+                try:
+                    with open(filepath, 'rb') as f:
+                        if f.read(4) != ReadElf.ELF_MAGIC:
+                            continue
+                except OSError:
+                    continue
+                elf_info = ElfInfoCache.get_instance().get(filepath, ReadElf.read_dynamic_info)
+                if elf_info:
+                    self._elf_files.append((path, elf_info))
+        return self._elf_files
+
+    # ==========================================================================
+    def add_directories(self, directories, mounted_libs):
+        """Add the libs of directories to the cache, in search order
+
+        Args:
+            directories (list): absolute directories inside the container
+            mounted_libs (list): destinations of the libs bind mounted into
+                                 the container, they hide rootfs files
+        """
+        mounted_by_dir = {}
+        for dst in mounted_libs:
+            dst = posixpath.normpath(dst)
+            mounted_by_dir.setdefault(self._resolve_dir(posixpath.dirname(dst)), []).append(posixpath.basename(dst))
+
+        for directory in directories:
+            if not directory.startswith('/'):
+                continue
+            directory = posixpath.normpath(directory)
+            resolved = self._resolve_dir(directory)
+            if resolved in self.directories:
+                continue
+            self.directories.add(resolved)
+
+            mounted = mounted_by_dir.get(resolved, [])
+            libs = {}
+            for name in sorted(mounted):
+                libs[name] = posixpath.join(directory, name)
+            for soname, name in self._find_rootfs_libs(resolved, set(mounted)):
+                if soname not in libs or name == soname:
+                    libs[soname] = posixpath.join(directory, name)
+
+            for soname, path in libs.items():
+                self.entries.setdefault(soname, path)
+
+    # ==========================================================================
+    def _find_rootfs_libs(self, directory, hidden):
+        """Returns the (soname, filename) of the ELF libs inside a rootfs directory.
+        Like ldconfig, symlinks to a lib are listed under their own name
+        """
+        libs = []
+        for name in sorted(self._children.get(directory, [])):
+            if name in hidden or not RootfsListing.SHARED_LIB_RE.search(name):
+                continue
+            path = posixpath.join(directory, name)
+            target = self.listing.resolve(path)
+            if not target or self.listing.entries[target][0] != RootfsListing.FILE:
+                continue
+            elf_info = ElfInfoCache.get_instance().get(self._rootfs_filepath(target), ReadElf.read_dynamic_info)
+            if not elf_info:
+                continue
+            if self.listing.entries[path][0] == RootfsListing.SYMLINK:
+                libs.append((name, name))
+            else:
+                libs.append((elf_info['soname'] or name, name))
+        return libs
+
+    # ==========================================================================
+    def write(self):
+        """Write the cache to /etc/ld.so.cache inside the rootfs, replacing
+        the one of the image
+
+        Returns:
+            int: number of libs in the cache
+        """
+        # The dynamic linker does a binary search on the names in descending order
+        sonames = sorted(self.entries, key=cmp_to_key(self._libcmp), reverse=True)
+
+        strings = bytearray()
+        offsets = {}
+        strings_start = self.HEADER.size + len(sonames) * self.ENTRY.size
+
+        def add_string(string):
+            if string not in offsets:
+                offsets[string] = strings_start + len(strings)
+                strings.extend(string.encode('utf-8') + b'\0')
+            return offsets[string]
+
+        entries = bytearray()
+        for soname in sonames:
+            entries += self.ENTRY.pack(self.flags, add_string(soname), add_string(self.entries[soname]), 0, 0)
+
+        cache_path = self._rootfs_filepath(self.PATH)
+        os.makedirs(os.path.dirname(cache_path), 0o755, exist_ok=True)
+        if os.path.lexists(cache_path):
+            os.remove(cache_path)
+        with open(cache_path, 'wb') as cache_file:
+            cache_file.write(self.HEADER.pack(self.MAGIC, self.VERSION, len(sonames), len(strings), self.ENDIAN_LITTLE, 0))
+            cache_file.write(entries)
+            cache_file.write(strings)
+        os.chmod(cache_path, 0o644)
+
+        logger.debug(f"Wrote {self.PATH} with {len(sonames)} libs")
+        return len(sonames)
+
+    # ==========================================================================
+    @staticmethod
+    def _libcmp(name1, name2):
+        """Same order as _dl_cache_libcmp() in glibc, numbers are compared by value
+        """
+        p1 = name1.encode('utf-8') + b'\0'
+        p2 = name2.encode('utf-8') + b'\0'
+        i = j = 0
+        while p1[i]:
+            if p1[i] in LdCache.DIGITS:
+                if p2[j] not in LdCache.DIGITS:
+                    return 1
+                value1 = value2 = 0
+                while p1[i] in LdCache.DIGITS:
+                    value1 = value1 * 10 + p1[i] - 0x30
+                    i += 1
+                while p2[j] in LdCache.DIGITS:
+                    value2 = value2 * 10 + p2[j] - 0x30
+                    j += 1
+                if value1 != value2:
+                    return value1 - value2
+            elif p2[j] in LdCache.DIGITS:
+                return -1
+            elif p1[i] != p2[j]:
+                return p1[i] - p2[j]
+            else:
+                i += 1
+                j += 1
+        return p1[i] - p2[j]
+
+    # ==========================================================================
+    def _resolve_dir(self, directory):
+        return self.listing.resolve(directory) or posixpath.normpath(directory)
+
+    # ==========================================================================
+    def _rootfs_filepath(self, path):
+        return os.path.join(self.rootfs_path, path.lstrip('/'))
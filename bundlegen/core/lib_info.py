@@ -0,0 +1,231 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Consult Red
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+
+
+class LibInfo:
+    """Frozen record of a lib of the platform libs info, see LibsTable
+
+    Names are interned and shared through the table, the apiversions are a
+    bitset over the apiversions of the table and deps, sublibs and parentlib
+    are ids into the names of the table. Records read like the *_libs.json
+    entries they replace (lib['name'], lib.get('sublibs')), after the sublibs
+    processing of LibraryMatching: libc lists its sublibs and the sublibs
+    point to libc and have no apiversions.
+    """
+    __slots__ = ('_table', 'name', '_apiversions', '_deps', '_sublibs', '_parent', '_sha256', '_size')
+
+    KEYS = ('name', 'apiversions', 'deps', 'sublibs', 'parentlib', 'sha256', 'size')
+
+    def __init__(self, table, name, apiversions, deps, sublibs=None, parent=None, sha256=None, size=None):
+        object.__setattr__(self, '_table', table)
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, '_apiversions', apiversions)
+        object.__setattr__(self, '_deps', deps)
+        object.__setattr__(self, '_sublibs', sublibs)
+        object.__setattr__(self, '_parent', parent)
+        object.__setattr__(self, '_sha256', sha256)
+        object.__setattr__(self, '_size', size)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    # ==========================================================================
+    @property
+    def apiversions(self):
+        """tuple: version definitions of the lib, empty for sublibs of libc
+        """
+        if self._parent is not None:
+            return ()
+        return self._table.get_apiversions(self._apiversions)
+
+    @property
+    def deps(self):
+        """tuple: names of the libs the lib depends on
+        """
+        names = self._table.names
+        return tuple(names[dep_id] for dep_id in self._deps)
+
+    @property
+    def sublibs(self):
+        """tuple: names of the sublibs if the lib is libc, otherwise None
+        """
+        if self._sublibs is None:
+            return None
+        names = self._table.names
+        return tuple(names[sublib_id] for sublib_id in self._sublibs)
+
+    @property
+    def parentlib(self):
+        """string: name of libc if the lib is one of its sublibs, otherwise None
+        """
+        if self._parent is None:
+            return None
+        return self._table.names[self._parent]
+
+    @property
+    def sha256(self):
+        """string: hex digest of the lib file if known, otherwise None
+        """
+        if self._sha256 is None:
+            return None
+        return self._sha256.hex()
+
+    @property
+    def size(self):
+        """int: size of the lib file if known, otherwise None
+        """
+        return self._size
+
+    # ==========================================================================
+    def __getitem__(self, key):
+        value = getattr(self, key) if key in self.KEYS else None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return key in self.KEYS and getattr(self, key) is not None
+
+    def get(self, key, default=None):
+        """Same as dict.get() on a *_libs.json entry
+        """
+        value = getattr(self, key) if key in self.KEYS else None
+        return default if value is None else value
+
+    # ==========================================================================
+    def to_dict(self):
+        """Returns the lib entry as found in the *_libs.json file
+
+        Returns:
+            dict: name, apiversions, deps and sha256/size if known
+        """
+        entry = {
+            'name': self.name,
+            'apiversions': list(self._table.get_apiversions(self._apiversions)),
+            'deps': list(self.deps)
+        }
+        if self._sha256 is not None:
+            entry['sha256'] = self.sha256
+        if self._size is not None:
+            entry['size'] = self._size
+        return entry
+
+    def __repr__(self):
+        return f"LibInfo({self.name!r})"
+
+
+class LibsTable:
+    """Immutable, compact form of the libs section of a <platform>_libs.json file
+
+    Holds one LibInfo per lib entry, in file order, and the names and
+    apiversions they refer to. The libc/sublibs relationships are resolved
+    when the table is built, so the table can be shared by all platform
+    configs loaded from the same file and is never modified by library
+    matching. Behaves like the list of entries it replaces.
+    """
+    def __init__(self, libs):
+        # Imported here as library matching itself needs to know about libs tables
+        from bundlegen.core.library_matching import LibraryMatching
+
+        names = []
+        name_ids = {}
+
+        def get_id(name):
+            name_id = name_ids.get(name)
+            if name_id is None:
+                name_id = len(names)
+                name_ids[name] = name_id
+                names.append(sys.intern(name))
+            return name_id
+
+        for lib in libs:
+            get_id(lib['name'])
+
+        apiversions = sorted(set(apiversion for lib in libs for apiversion in lib['apiversions']))
+        apiversion_bits = {apiversion: 1 << bit for bit, apiversion in enumerate(apiversions)}
+        self.apiversions = tuple(sys.intern(apiversion) for apiversion in apiversions)
+
+        libc, sublibs = LibraryMatching.find_libc_and_sublibs(libs)
+        sublib_entries = set(id(sublib) for sublib in sublibs)
+
+        records = []
+        for lib in libs:
+            bitset = 0
+            for apiversion in lib['apiversions']:
+                bitset |= apiversion_bits[apiversion]
+
+            sublib_ids = None
+            parent_id = None
+            if lib is libc:
+                sublib_ids = tuple(get_id(sublib['name']) for sublib in sublibs)
+            elif id(lib) in sublib_entries:
+                parent_id = get_id(libc['name'])
+
+            sha256 = bytes.fromhex(lib['sha256']) if lib.get('sha256') else None
+            records.append(LibInfo(self, names[get_id(lib['name'])], bitset,
+                                   tuple(get_id(dep) for dep in lib['deps']),
+                                   sublib_ids, parent_id, sha256, lib.get('size')))
+
+        self.names = tuple(names)
+        self._records = tuple(records)
+        self._apiversion_cache = {}
+
+    # ==========================================================================
+    def get_apiversions(self, bitset):
+        """Returns the apiversions of a bitset, libs sharing the same
+        apiversions (like the sublibs of a lib) share the tuple
+
+        Args:
+            bitset (int): apiversions bitset of a LibInfo
+
+        Returns:
+            tuple: apiversions in sorted order
+        """
+        apiversions = self._apiversion_cache.get(bitset)
+        if apiversions is None:
+            apiversions = []
+            bits = bitset
+            while bits:
+                lowest = bits & -bits
+                apiversions.append(self.apiversions[lowest.bit_length() - 1])
+                bits ^= lowest
+            apiversions = tuple(apiversions)
+            self._apiversion_cache[bitset] = apiversions
+        return apiversions
+
+    # ==========================================================================
+    def to_list(self):
+        """Returns the lib entries as found in the *_libs.json file
+
+        Returns:
+            list: one dict per lib
+        """
+        return [lib.to_dict() for lib in self._records]
+
+    def __getitem__(self, position):
+        return self._records[position]
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records)
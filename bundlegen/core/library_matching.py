@@ -19,12 +19,20 @@ import os
 import re
 import json
 import glob
+import stat
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from loguru import logger
 from bundlegen.core.readelf import ReadElf
+from bundlegen.core.elf_cache import ElfInfoCache
+from bundlegen.core.libs_index import LibsIndex, LibsNameIndex, LibsClosures, LazyLibs
+from bundlegen.core.lib_info import LibsTable
+from bundlegen.core.rootfs_listing import RootfsListing
+from bundlegen.core.symbol_index import SymbolIndex
 
 
 class LibraryMatching:
-    def __init__(self, platform_cfg, bundle_path, add_mount_func, nodepwalking, libmatchingmode, createmountpoints):
+    def __init__(self, platform_cfg, bundle_path, add_mount_func, nodepwalking, libmatchingmode, createmountpoints, jobs=None):
         self.platform_cfg = platform_cfg
         self.bundle_path = bundle_path
         self.rootfs_path = os.path.join(self.bundle_path, "rootfs")
@@ -33,11 +41,18 @@ class LibraryMatching:
         self.createmountpoints = createmountpoints
         self.handled_libs = set()
         self.add_mount_func = add_mount_func
-        self._determine_sublibs()
+        self.name_index = None
+        self.closures = None
+        self.jobs = jobs or os.cpu_count() or 1
+        self.rootfs_apiversions = {}
+        self.planned_steps = None
+        self.symbols = None
+        self.rootfs_symbols = None
         if self.nodepwalking:
             logger.info("Library dependency walking is DISABLED!")
-        elif not self.platform_cfg.get('libs'):
+        elif not self._get_libs():
             logger.warning("Library dependency walking DISABLED because no _libs.json file available!")
+        self._determine_sublibs()
         logger.debug(f"Libmatching mode: {libmatchingmode}")
 
     # ==========================================================================
@@ -52,16 +67,96 @@ class LibraryMatching:
         os.remove(rootfs_filepath)
         if (link != rootfs_filepath):
             os.remove(link)
+
+    # ==========================================================================
+    def _rootfs_exists(self, rootfs_filepath):
+        return os.path.exists(rootfs_filepath)
+
+    # ==========================================================================
+    def _get_libs(self):
+        """Returns the libs info of the platform. A lazily loaded libs section
+        is loaded here on first use
+        """
+        libs = self.platform_cfg.get('libs')
+        if isinstance(libs, LazyLibs):
+            libs = libs.materialize()
+        return libs
+
+    # ==========================================================================
+    def _get_api_info(self, srclib):
+        """Look up the api info of a host lib inside *_libs.json info
+
+        Args:
+            srclib (string): libpath on host
+
+        Returns:
+            dict: lib entry or None if not found
+        """
+        libs = self._get_libs()
+        if isinstance(libs, LibsIndex):
+            return libs.get(srclib)
+
+        if self.name_index is None:
+            lazy_libs = self.platform_cfg.get('libs')
+            if isinstance(lazy_libs, LazyLibs):
+                self.name_index = lazy_libs.name_index()
+            else:
+                self.name_index = LibsNameIndex(lib['name'] for lib in libs)
+
+        position = self.name_index.find(srclib)
+        if position is None:
+            return None
+        return libs[position]
+
+    # ==========================================================================
+    def _get_closure(self, name):
+        """Look up the dependency closure of a lib, see LibsClosures
+
+        Args:
+            name (string): lib name as listed in *_libs.json
+
+        Returns:
+            tuple: libs to mount or None if no closure available
+        """
+        libs = self._get_libs()
+        if isinstance(libs, LibsIndex):
+            return libs.closure(name)
+
+        if self.closures is None:
+            lazy_libs = self.platform_cfg.get('libs')
+            if isinstance(lazy_libs, LazyLibs):
+                self.closures = lazy_libs.closures(self._get_api_info)
+            else:
+                self.closures = LibsClosures.build([lib['name'] for lib in libs], self._get_api_info)
+        return self.closures.get(name)
+
+    # ==========================================================================
+    def _take_host_closure(self, closure):
+        """Take all libs of a dependency closure from the host. Same result as
+        walking the dependencies in 'host' mode, without looking up every lib
+        """
+        for lib in closure:
+            logger.trace(f"HOST version choosen: {lib}")
+            self.handled_libs.add(lib)
+            rootfs_filepath = os.path.join(self.rootfs_path, lib.lstrip('/'))
+            if self._rootfs_exists(rootfs_filepath):
+                logger.trace(f"Removing from rootfs: {lib}")
+                self._remove_from_rootfs(rootfs_filepath)
+            self._add_bind_mount(lib, lib, self.createmountpoints)
+
     # ==========================================================================
     def _take_host_lib(self, srclib, dstlib, api_info):
         """ The lib version from the host was choosen. Log it, create mount bind
             and remove from OCI image rootfs if present there.
             Also for any sublibs if present.
+
+        Returns:
+            list: deps of the lib that still need to be walked
         """
         logger.trace(f"HOST version choosen: {srclib}")
         self.handled_libs.add(dstlib)
         rootfs_filepath = os.path.join(self.rootfs_path, dstlib.lstrip('/'))
-        if os.path.exists(rootfs_filepath):
+        if self._rootfs_exists(rootfs_filepath):
             logger.trace(f"Removing from rootfs: {dstlib}")
             self._remove_from_rootfs(rootfs_filepath)
         self._add_bind_mount(srclib, dstlib, self.createmountpoints)
@@ -70,29 +165,39 @@ class LibraryMatching:
                 logger.trace(f"HOST version choosen: {sublib}")
                 self.handled_libs.add(sublib)
                 sublib_rootfs_filepath = os.path.join(self.rootfs_path, sublib.lstrip('/'))
-                if os.path.exists(sublib_rootfs_filepath):
+                if self._rootfs_exists(sublib_rootfs_filepath):
                     logger.trace(f"Removing from rootfs: {sublib}")
                     self._remove_from_rootfs(sublib_rootfs_filepath)
                 self._add_bind_mount(sublib, sublib, self.createmountpoints)
-        if api_info and api_info.get('deps'):
-            for neededlib in api_info['deps']:
-                self._mount_or_use_rootfs(neededlib, neededlib)
+        if not api_info or not api_info.get('deps'):
+            return []
+
+        if self.libmatchingmode == 'host':
+            # Every dep will be taken from the host as well. Unless part of the
+            # deps were handled before, that is exactly the precomputed closure
+            closure = self._get_closure(api_info['name'])
+            if closure is not None and self.handled_libs.isdisjoint(closure):
+                self._take_host_closure(closure)
+                return []
+        return api_info['deps']
 
     # ==========================================================================
-    def _determine_sublibs(self):
+    @staticmethod
+    def find_libc_and_sublibs(libs):
         """
-        Determine sublibs inside libs info.
-        Specific processing for libc and its sublibs like libresolv.
+        Find libc and its sublibs like libresolv inside libs info.
         First it determines the actual libc lib by finding the one
         with the most GLIBC* versions inside its "Version definition section".
         It also looks for other libs that only contain GLIBC* entries on their
         "Version definition section". These are then assumed to be "sublibraries"
         of libc.so
-        """
-        if self.nodepwalking or not self.platform_cfg.get('libs'):
-            return
 
-        libs = self.platform_cfg['libs']
+        Args:
+            libs (list): lib entries from *_libs.json
+
+        Returns:
+            tuple: (libc entry or None, list of sublib entries)
+        """
         maxcnt = 0
         libc = None
         sublibs = []
@@ -115,10 +220,35 @@ class LibraryMatching:
                 maxcnt = cnt
 
         if (libc is None):
+            return (None, [])
+
+        sublibs.remove(libc)
+        return (libc, sublibs)
+
+    # ==========================================================================
+    def _determine_sublibs(self):
+        """
+        Determine sublibs inside libs info.
+        Specific processing for libc and its sublibs like libresolv,
+        see find_libc_and_sublibs(). A compiled libs index or a libs
+        table already contains this information.
+        """
+        if self.nodepwalking:
+            return
+
+        libs = self._get_libs()
+        if not libs or isinstance(libs, (LibsIndex, LibsTable)):
+            return
+
+        libc, sublibs = self.find_libc_and_sublibs(libs)
+        if (libc is None):
+            return
+
+        if 'sublibs' in libc:
+            # Libs info shared with another matcher, already determined
             return
 
         logger.trace(f"Found libc: {libc['name']}")
-        sublibs.remove(libc)
         libc['sublibs'] = []
         for sublib in sublibs:
             libc['sublibs'].append(sublib['name'])
@@ -138,6 +268,31 @@ class LibraryMatching:
 
     # ==========================================================================
     def _mount_or_use_rootfs(self, srclib, dstlib):
+        """Determine to mount lib from host OR use the one inside bundle/OCI rootfs,
+           see _match_lib(). The dependencies of libs taken from the host are
+           walked depth first using a worklist, so deep dependency graphs cannot
+           hit the recursion limit.
+
+        Args:
+            srclib (string): libpath on host.
+            dstlib (string): libpath in rootfs image. In most cases the same as srclib.
+        """
+        self._walk([(srclib, dstlib)])
+
+    # ==========================================================================
+    def _walk(self, worklist):
+        """Match libs and all their dependencies
+
+        Args:
+            worklist (list): (srclib, dstlib) tuples, the last one is matched first
+        """
+        while worklist:
+            srclib, dstlib = worklist.pop()
+            neededlibs = self._match_lib(srclib, dstlib)
+            worklist.extend((neededlib, neededlib) for neededlib in reversed(neededlibs))
+
+    # ==========================================================================
+    def _match_lib(self, srclib, dstlib):
         """Determine to mount lib from host OR use the one inside bundle/OCI rootfs.
            If lib exists in rootfs and apiversions info exists for it inside *_libs.json config
            then we try to use that version of the lib that has most API versions defined inside.
@@ -150,57 +305,55 @@ class LibraryMatching:
                              inside *_libs.json.
             dstlib (string): libpath in rootfs image. In most cases the same as srclib. For this lib
                              the api info will be read directly from the lib file via readelf.
+
+        Returns:
+            list: libs that need to be matched next
         """
         if dstlib in self.handled_libs:
             #logger.trace(f"Already handled: {dstlib}")
-            return
+            return []
 
         api_info = None
         if not self.nodepwalking:
-            if self.platform_cfg.get('libs'):
-                api_info = [x for x in self.platform_cfg['libs'] if x['name'] == srclib]
+            if self._get_libs():
+                api_info = self._get_api_info(srclib)
                 if not api_info:
                     logger.trace(f"No api info found for {dstlib}")
 
         if not api_info:
             if (self.libmatchingmode == 'image'):
                 rootfs_filepath = os.path.join(self.rootfs_path, dstlib.lstrip('/'))
-                if not os.path.exists(rootfs_filepath):
+                if not self._rootfs_exists(rootfs_filepath):
                     logger.trace(f"Lib not inside OCI image rootfs {dstlib}")
-                    self._take_host_lib(srclib, dstlib, None)
+                    return self._take_host_lib(srclib, dstlib, None)
                 else:
                     logger.trace(f"OCI Image {dstlib} forcibly choosen.")
                     self._take_rootfs_lib(dstlib, None)
+                    return []
             else: # normal and host modes
-                self._take_host_lib(srclib, dstlib, None)
-            return
-
-        api_info = api_info[0]
+                return self._take_host_lib(srclib, dstlib, None)
 
         # if this is a sublib then switch to logic of parentlib instead
         if self.libmatchingmode == 'normal' and api_info.get('parentlib'):
-            self._mount_or_use_rootfs(api_info['parentlib'], api_info['parentlib'])
-            return
+            return [api_info['parentlib']]
 
         rootfs_filepath = os.path.join(self.rootfs_path, dstlib.lstrip('/'))
-        if not os.path.exists(rootfs_filepath):
+        if not self._rootfs_exists(rootfs_filepath):
             logger.trace(f"Lib not inside OCI image rootfs {dstlib}")
-            self._take_host_lib(srclib, dstlib, api_info)
-            return
+            return self._take_host_lib(srclib, dstlib, api_info)
 
         if (self.libmatchingmode == 'image'):
             logger.trace(f"OCI Image {dstlib} forcibly choosen.")
             self._take_rootfs_lib(dstlib, api_info)
-            return
+            return []
         elif (self.libmatchingmode == 'host'):
             logger.trace(f"Host {dstlib} forcibly choosen.")
-            self._take_host_lib(srclib, dstlib, api_info)
-            return
+            return self._take_host_lib(srclib, dstlib, api_info)
         ## else normal mode below
 
         if len(api_info['apiversions']) > 0:
             version_defs_by_host_lib = set(api_info['apiversions'])
-            version_defs_by_rootfs_lib = set(ReadElf.retrieve_apiversions(rootfs_filepath))
+            version_defs_by_rootfs_lib = set(self._get_rootfs_apiversions(rootfs_filepath))
 
             # remove from rootfs and mount lib from host if
             # host lib contains more or same version definitions
@@ -211,7 +364,11 @@ class LibraryMatching:
                     logger.trace(f"Host {dstlib} has same set of apiversions")
                 else:
                     logger.trace(f"Host {dstlib} more: {diff}")
-                self._take_host_lib(srclib, dstlib, api_info)
+                return self._take_host_lib(srclib, dstlib, api_info)
+            elif self._host_lib_provides(srclib, rootfs_filepath):
+                ## Host lib misses API versions, but none that the binaries inside the rootfs use.
+                logger.trace(f"Host {dstlib} provides all symbols used in OCI image")
+                return self._take_host_lib(srclib, dstlib, api_info)
             elif (version_defs_by_host_lib < version_defs_by_rootfs_lib):
                 ## Library on host has less API versions than the one from bundle rootfs. Keeping the one from bundle rootfs.
                 logger.trace(f"OCI Image {dstlib} more: {version_defs_by_rootfs_lib - version_defs_by_host_lib}")
@@ -222,7 +379,156 @@ class LibraryMatching:
                 logger.error(f"Host      {dstlib} more: {version_defs_by_host_lib - version_defs_by_rootfs_lib}")
                 self._take_rootfs_lib(dstlib, api_info)
         else:
-                self._take_host_lib(srclib, dstlib, api_info)
+                return self._take_host_lib(srclib, dstlib, api_info)
+        return []
+
+    # ==========================================================================
+    def _get_symbols(self):
+        """Returns the symbol index of the platform, see SymbolIndex. Either
+           set in the platform config or found next to its *_libs.json file
+
+        Returns:
+            SymbolIndex: the index or None if the platform has none
+        """
+        if self.symbols is None:
+            symbols = self.platform_cfg.get('symbols')
+            if not isinstance(symbols, SymbolIndex):
+                libs = self.platform_cfg.get('libs')
+                symbols = SymbolIndex.load_for_libs(libs.path) if isinstance(libs, LazyLibs) else None
+            self.symbols = symbols or False
+        return self.symbols or None
+
+    # ==========================================================================
+    def _get_rootfs_symbols(self):
+        """Read the undefined symbols and DT_NEEDED entries of all ELF files
+           inside the rootfs, once
+
+        Returns:
+            tuple: (RootfsListing, dict path -> (undefined symbols, needed))
+        """
+        if self.rootfs_symbols is None:
+            listing = RootfsListing.from_directory(self.rootfs_path)
+            files = {}
+            for path, (kind, _) in listing.entries.items():
+                if kind != RootfsListing.FILE:
+                    continue
+                filepath = os.path.join(self.rootfs_path, path.lstrip('/'))
+                symbols = ReadElf.read_symbols(filepath)
+                if not symbols or not symbols['undefined']:
+                    continue
+                elf_info = ElfInfoCache.get_instance().get(filepath, ReadElf.read_dynamic_info)
+                files[path] = (symbols['undefined'], elf_info['needed'] if elf_info else [])
+            logger.debug(f"Read undefined symbols of {len(files)} ELF files inside rootfs")
+            self.rootfs_symbols = (listing, files)
+        return self.rootfs_symbols
+
+    # ==========================================================================
+    def _host_lib_provides(self, srclib, rootfs_filepath):
+        """Check against the symbol index if the host lib exports every symbol
+           that the ELF files inside the rootfs use from the rootfs lib. Those
+           are the symbols bound to a version of the lib (verneed) and the
+           unversioned ones the rootfs lib defines, used by files needing it.
+
+        Args:
+            srclib (string): libpath on host
+            rootfs_filepath (string): fullpath of the lib inside the rootfs
+
+        Returns:
+            bool: True if the host lib can replace the rootfs lib
+        """
+        symbols = self._get_symbols()
+        if not symbols or symbols.get(srclib) is None:
+            return False
+
+        listing, files = self._get_rootfs_symbols()
+        lib_path = listing.resolve('/' + os.path.relpath(rootfs_filepath, self.rootfs_path))
+        if not lib_path:
+            return False
+        lib_filepath = os.path.join(self.rootfs_path, lib_path.lstrip('/'))
+        elf_info = ElfInfoCache.get_instance().get(lib_filepath, ReadElf.read_dynamic_info)
+        soname = (elf_info and elf_info['soname']) or os.path.basename(rootfs_filepath)
+        lib_symbols = ReadElf.read_symbols(lib_filepath)
+        defined = set(lib_symbols['defined']) if lib_symbols else set()
+
+        required = set()
+        for path, (undefined, needed) in files.items():
+            if path == lib_path:
+                continue
+            for name, version, file in undefined:
+                if version:
+                    if file == soname:
+                        required.add(f"{name}@{version}")
+                elif name in defined and soname in needed:
+                    required.add(name)
+
+        missing = sorted(symbol for symbol in required if not symbols.provides(srclib, [symbol]))
+        if missing:
+            logger.trace(f"Host {srclib} misses symbols used in OCI image: {missing[:10]}")
+        return not missing
+
+    # ==========================================================================
+    def _get_rootfs_apiversions(self, rootfs_filepath):
+        """Version definitions of a lib inside the rootfs, prefetched or read now
+        """
+        apiversions = self.rootfs_apiversions.get(rootfs_filepath)
+        if apiversions is None:
+            apiversions = ReadElf.retrieve_apiversions(rootfs_filepath)
+        return apiversions
+
+    # ==========================================================================
+    def prefetch(self, libs):
+        """Read the version definitions of the rootfs libs that can be compared
+           while matching the libs and their dependencies, using a pool of
+           self.jobs processes for the libs that are not in the ELF info cache.
+           Matching then only reads them from memory.
+           Only applies to 'normal' mode, the other modes never read rootfs libs.
+
+        Args:
+            libs (list): libpaths on host that will be matched
+        """
+        if self.planned_steps or self.nodepwalking or self.libmatchingmode != 'normal' or self.jobs <= 1 or not self._get_libs():
+            return
+
+        # Same libs as the walk can visit: deps and parentlibs
+        names = set()
+        worklist = list(libs)
+        while worklist:
+            name = worklist.pop()
+            if name in names:
+                continue
+            names.add(name)
+            api_info = self._get_api_info(name)
+            if api_info:
+                if api_info.get('parentlib'):
+                    worklist.append(api_info['parentlib'])
+                worklist.extend(api_info['deps'])
+
+        # Versions are only read from the rootfs when the host lib has them
+        paths = []
+        for name in names:
+            api_info = self._get_api_info(name)
+            rootfs_filepath = os.path.join(self.rootfs_path, name.lstrip('/'))
+            if api_info and api_info['apiversions'] and self._rootfs_exists(rootfs_filepath):
+                paths.append(rootfs_filepath)
+        if not paths:
+            return
+
+        logger.debug(f"Prefetching apiversions of {len(paths)} rootfs libs using {self.jobs} jobs")
+        elf_infos = ElfInfoCache.get_instance().get_many(paths, ReadElf.read_dynamic_info, self._map_jobs)
+        for path, elf_info in zip(paths, elf_infos):
+            self.rootfs_apiversions[path] = elf_info['apiversions'] if elf_info else []
+
+    # ==========================================================================
+    def _map_jobs(self, func, items):
+        """Same as map(func, items) using a pool of self.jobs processes. The
+           ELF files are parsed in pure Python, threads would hold the GIL
+        """
+        if len(items) <= 1:
+            return [func(item) for item in items]
+
+        chunksize = max(1, len(items) // (self.jobs * 4))
+        with ProcessPoolExecutor(max_workers=min(self.jobs, len(items))) as executor:
+            return list(executor.map(func, items, chunksize=chunksize))
 
     # ==========================================================================
     def mount(self, srclib, dstlib):
@@ -235,17 +541,18 @@ class LibraryMatching:
             dstlib (string): libpath in rootfs image. In most cases the same as srclib.
         """
         logger.trace(f"Explicitely adding for host mount: {dstlib}")
+        if self._apply_planned('mount', srclib, dstlib):
+            return
         if dstlib in self.handled_libs:
             logger.trace(f"No need to add explicitely: {dstlib}")
         api_info = None
         if not self.nodepwalking:
-            if self.platform_cfg.get('libs'):
-                api_info = [x for x in self.platform_cfg['libs'] if x['name'] == srclib]
+            if self._get_libs():
+                api_info = self._get_api_info(srclib)
                 if not api_info:
                     logger.trace(f"No api info found for {dstlib}")
-                else:
-                    api_info = api_info[0]
-        self._take_host_lib(srclib, dstlib, api_info)
+        neededlibs = self._take_host_lib(srclib, dstlib, api_info)
+        self._walk([(neededlib, neededlib) for neededlib in reversed(neededlibs)])
 
     # ==========================================================================
     def mount_or_use_rootfs(self, srclib, dstlib):
@@ -257,9 +564,302 @@ class LibraryMatching:
             dstlib (string): libpath in rootfs image. In most cases the same as srclib.
         """
         logger.trace(f"Explicitely adding for host mount or from OCI: {dstlib}")
+        if self._apply_planned('mount_or_use_rootfs', srclib, dstlib):
+            return
         if dstlib in self.handled_libs:
             logger.trace(f"No need to add explicitely: {dstlib}")
         self._mount_or_use_rootfs(srclib, dstlib)
 
+    # ==========================================================================
+    def replace_identical_libs(self):
+        """Replace every file inside the rootfs that is identical to a host lib
+           by a bind mount of the host lib. Files are compared by size and
+           sha256, so only libs that have both in *_libs.json are considered.
+
+        Returns:
+            tuple: (number of files replaced, bytes removed from the rootfs)
+        """
+        libs = self._get_libs()
+        host_libs = {}
+        for lib in libs or []:
+            if lib.get('sha256') and lib.get('size'):
+                host_libs.setdefault(lib['size'], {}).setdefault(lib['sha256'], lib['name'])
+        if not host_libs:
+            logger.warning("No sha256/size info inside *_libs.json, cannot replace identical libs")
+            return (0, 0)
+
+        replaced = 0
+        saved = 0
+        saved_inodes = set()
+        for root, dirs, files in os.walk(self.rootfs_path):
+            dirs.sort()
+            for file in sorted(files):
+                rootfs_filepath = os.path.join(root, file)
+                file_stat = os.lstat(rootfs_filepath)
+                candidates = host_libs.get(file_stat.st_size)
+                if not candidates or not stat.S_ISREG(file_stat.st_mode):
+                    continue
+
+                srclib = candidates.get(ElfInfoCache.get_instance().get_hash(rootfs_filepath))
+                if not srclib:
+                    continue
+
+                dstlib = '/' + os.path.relpath(rootfs_filepath, self.rootfs_path)
+                logger.trace(f"OCI IMAGE {dstlib} identical to host {srclib}")
+                os.remove(rootfs_filepath)
+                self._add_bind_mount(srclib, dstlib, self.createmountpoints)
+                self.handled_libs.add(dstlib)
+                replaced += 1
+                # Hard links only take space once
+                if (file_stat.st_dev, file_stat.st_ino) not in saved_inodes:
+                    saved_inodes.add((file_stat.st_dev, file_stat.st_ino))
+                    saved += file_stat.st_size
+        return (replaced, saved)
+
+    # ==========================================================================
+    def use_plan(self, plan):
+        """Use the decisions of a plan made by LibraryPlanner before the image
+           was unpacked. mount() and mount_or_use_rootfs() apply the planned
+           steps as long as they are called in the planned order, after that
+           the libs are matched on the unpacked rootfs again.
+
+        Args:
+            plan (list): steps returned by LibraryPlanner.plan()
+        """
+        self.planned_steps = deque(plan)
+
+    # ==========================================================================
+    def _apply_planned(self, call, srclib, dstlib):
+        """Apply the next step of the plan if it was planned for this call
+
+        Returns:
+            bool: True if the step was applied
+        """
+        if not self.planned_steps:
+            return False
+
+        step = self.planned_steps[0]
+        if (step['call'], step['src'], step['dst']) != (call, srclib, dstlib):
+            logger.debug(f"Library plan does not match {call} of {dstlib}, matching on the rootfs instead")
+            self.planned_steps = None
+            return False
+
+        self.planned_steps.popleft()
+        for action in step['actions']:
+            if action['action'] == 'remove':
+                rootfs_filepath = os.path.join(self.rootfs_path, action['path'].lstrip('/'))
+                if os.path.exists(rootfs_filepath):
+                    logger.trace(f"Removing from rootfs: {action['path']}")
+                    self._remove_from_rootfs(rootfs_filepath)
+                else:
+                    logger.warning(f"Planned removal of {action['path']} but not inside OCI image rootfs")
+            else:
+                self._add_bind_mount(action['src'], action['dst'], self.createmountpoints)
+        self.handled_libs.update(step['handled'])
+        return True
+
+
+class LibraryPlanner(LibraryMatching):
+    """Makes the library matching decisions using a RootfsListing of the image
+       instead of the unpacked rootfs, so the plan can be made while the image
+       is still being unpacked. Apply the plan with LibraryMatching.use_plan().
+    """
+    MODES = ('normal', 'image', 'host')
+
+    class SymbolsRequired(Exception):
+        """Raised when a decision needs the symbols of the rootfs files,
+           which are not in the listing
+        """
+
+    def __init__(self, platform_cfg, bundle_path, listing, nodepwalking, libmatchingmode, createmountpoints, unpacked=False):
+        """
+        Args:
+            unpacked (bool): The rootfs is already unpacked at bundle_path. Version
+                             definitions and symbols are then read from the rootfs
+                             files, and every decision is checked against the
+                             apiversion rules, see violations
+        """
+        self.listing = listing
+        self.actions = []
+        self.unpacked = unpacked
+        # dstlibs taken from one side although the other side has more apiversions
+        self.violations = []
+        super().__init__(platform_cfg, bundle_path, self._plan_mount, nodepwalking, libmatchingmode, createmountpoints, 1)
+
+    # ==========================================================================
+    @classmethod
+    def plan_image(cls, image_path, tag, platform_cfg, bundle_path, requests, nodepwalking, libmatchingmode, createmountpoints):
+        """Plan the matching of libs for an image that is not unpacked yet,
+           listing its rootfs from the layers of the OCI image layout
+
+        Args:
+            image_path (string): Path to the OCI image layout
+            tag (string): Tag of the image inside the layout
+            platform_cfg (dict): platform config
+            bundle_path (string): Path the image will be unpacked to
+            requests (list): see plan()
+
+        Returns:
+            list: the plan, or None if the image rootfs could not be listed
+        """
+        # Only 'normal' mode compares the version definitions of rootfs libs
+        read_elf = libmatchingmode == 'normal' and not nodepwalking
+        listing = RootfsListing.from_oci_image(image_path, tag, read_elf)
+        if not listing:
+            return None
+
+        planner = cls(platform_cfg, bundle_path, listing, nodepwalking, libmatchingmode, createmountpoints)
+        return planner.plan(requests)
+
+    # ==========================================================================
+    @classmethod
+    def evaluate_modes(cls, platform_cfg, bundle_path, requests, createmountpoints):
+        """Plan the matching of libs for an unpacked rootfs with every
+           libmatchingmode, without touching the filesystem. The rootfs is
+           listed once, each mode plans on its own copy of the listing.
+
+        Args:
+            platform_cfg (dict): platform config
+            bundle_path (string): Path of the bundle with the unpacked rootfs
+            requests (list): see plan()
+            createmountpoints (bool): create mount points in the rootfs
+
+        Returns:
+            list: one dict per mode in MODES order, {'mode', 'plan', 'size', 'violations'}.
+                  size is the size of the rootfs files left by the plan in bytes,
+                  violations the libs chosen against the apiversion rules
+        """
+        rootfs_path = os.path.join(bundle_path, "rootfs")
+        listing = RootfsListing.from_directory(rootfs_path)
+        # Hard links only take space once
+        files = {}
+        for path, (kind, _) in listing.entries.items():
+            if kind != RootfsListing.DIRECTORY:
+                file_stat = os.lstat(os.path.join(rootfs_path, path.lstrip('/')))
+                files[path] = ((file_stat.st_dev, file_stat.st_ino), file_stat.st_size)
+
+        results = []
+        for mode in cls.MODES:
+            planner = cls(platform_cfg, bundle_path, listing.copy(), False, mode, createmountpoints, unpacked=True)
+            plan = planner.plan(requests)
+            inodes = dict(files[path] for path in planner.listing.entries if path in files)
+            results.append({
+                'mode': mode,
+                'plan': plan,
+                'size': sum(inodes.values()),
+                'violations': planner.violations
+            })
+            logger.debug(f"Libmatching mode {mode}: rootfs {sum(inodes.values())} bytes, "
+                         f"{len(planner.violations)} libs against the apiversion rules")
+        return results
+
+    # ==========================================================================
+    def plan(self, requests):
+        """Plan the matching of libs, without touching the filesystem
+
+        Args:
+            requests (list): (call, srclib, dstlib) tuples in the order the libs
+                             will be matched, call is 'mount' or 'mount_or_use_rootfs'
+
+        Returns:
+            list: one step per request, {'call', 'src', 'dst', 'actions', 'handled'}.
+                  Actions are {'action': 'remove', 'path'} or {'action': 'mount', 'src', 'dst'}.
+                  The plan stops before the first request that needs the symbol
+                  index, the remaining requests are matched on the unpacked rootfs.
+        """
+        steps = []
+        for call, srclib, dstlib in requests:
+            self.actions = []
+            handled_before = set(self.handled_libs)
+            try:
+                if call == 'mount':
+                    self.mount(srclib, dstlib)
+                else:
+                    self.mount_or_use_rootfs(srclib, dstlib)
+            except self.SymbolsRequired:
+                logger.debug(f"Library plan stops at {dstlib}, symbols of the rootfs are needed")
+                break
+            steps.append({
+                'call': call,
+                'src': srclib,
+                'dst': dstlib,
+                'actions': self.actions,
+                'handled': sorted(self.handled_libs - handled_before)
+            })
+        return steps
+
+    # ==========================================================================
+    def _plan_mount(self, src, dst, createmountpoint):
+        self.actions.append({'action': 'mount', 'src': src, 'dst': dst})
+
+    # ==========================================================================
+    def _listing_path(self, rootfs_filepath):
+        return '/' + os.path.relpath(rootfs_filepath, self.rootfs_path)
+
+    # ==========================================================================
+    def _rootfs_exists(self, rootfs_filepath):
+        return self.listing.exists(self._listing_path(rootfs_filepath))
+
+    # ==========================================================================
+    def _remove_from_rootfs(self, rootfs_filepath):
+        path = self._listing_path(rootfs_filepath)
+        self.listing.remove(path)
+        self.actions.append({'action': 'remove', 'path': path})
+
+    # ==========================================================================
+    def _take_host_closure(self, closure):
+        for lib in closure:
+            self._check_decision(True, lib, lib, self._get_api_info(lib))
+        super()._take_host_closure(closure)
+
+    # ==========================================================================
+    def _take_host_lib(self, srclib, dstlib, api_info):
+        self._check_decision(True, srclib, dstlib, api_info)
+        return super()._take_host_lib(srclib, dstlib, api_info)
+
+    # ==========================================================================
+    def _take_rootfs_lib(self, dstlib, api_info):
+        self._check_decision(False, dstlib, dstlib, api_info)
+        super()._take_rootfs_lib(dstlib, api_info)
+
+    # ==========================================================================
+    def _check_decision(self, host, srclib, dstlib, api_info):
+        """Record a decision that 'normal' mode would not make: a host lib
+           with fewer apiversions than the rootfs lib (unless the symbol index
+           shows it provides all used symbols), or a rootfs lib with fewer
+           apiversions than the host lib. Disjoint apiversions are kept in the
+           rootfs by 'normal' mode as well.
+        """
+        if not self.unpacked or dstlib in self.handled_libs or not api_info or not api_info['apiversions']:
+            return
+        rootfs_filepath = os.path.join(self.rootfs_path, dstlib.lstrip('/'))
+        if not self._rootfs_exists(rootfs_filepath):
+            return
+
+        version_defs_by_host_lib = set(api_info['apiversions'])
+        version_defs_by_rootfs_lib = set(self._get_rootfs_apiversions(rootfs_filepath))
+        if host:
+            allowed = version_defs_by_host_lib >= version_defs_by_rootfs_lib or self._host_lib_provides(srclib, rootfs_filepath)
+        else:
+            allowed = not version_defs_by_host_lib > version_defs_by_rootfs_lib
+        if not allowed:
+            logger.trace(f"{'Host' if host else 'OCI Image'} {dstlib} chosen against the apiversion rules")
+            self.violations.append(dstlib)
+
+    # ==========================================================================
+    def _host_lib_provides(self, srclib, rootfs_filepath):
+        if self.unpacked:
+            return super()._host_lib_provides(srclib, rootfs_filepath)
+        symbols = self._get_symbols()
+        if not symbols or symbols.get(srclib) is None:
+            return False
+        raise self.SymbolsRequired()
+
+    # ==========================================================================
+    def _get_rootfs_apiversions(self, rootfs_filepath):
+        if self.unpacked:
+            return super()._get_rootfs_apiversions(rootfs_filepath)
+        return self.listing.get_apiversions(self._listing_path(rootfs_filepath))
+
 
 
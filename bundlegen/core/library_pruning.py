@@ -0,0 +1,191 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Consult Red
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+import fnmatch
+import posixpath
+from loguru import logger
+from bundlegen.core.readelf import ReadElf
+from bundlegen.core.elf_cache import ElfInfoCache
+from bundlegen.core.rootfs_listing import RootfsListing
+
+
+class LibraryPruner:
+    """Finds the shared libraries inside a rootfs that are never loaded
+
+    Starting from the entrypoints, the DT_NEEDED entries are followed to find
+    every library the dynamic linker can load. Needed names are matched against
+    all libraries with that filename, wherever they are in the rootfs, so
+    libraries found through RPATH/RUNPATH are kept as well. Libraries that are
+    only loaded with dlopen() must be listed explicitly.
+
+    This only works for entrypoints that are dynamically linked executables.
+    The DT_NEEDED entries of a shell or an interpreter say nothing about the
+    libs used by what it runs, see check_entrypoint().
+    """
+    # The dynamic linker is loaded through PT_INTERP, not DT_NEEDED
+    LOADER_RE = re.compile(r"^ld(64)?[-.]")
+    # Shells and interpreters, also matched against the target of a symlink
+    # like /bin/sh -> busybox
+    INTERPRETER_RE = re.compile(r"^(busybox|toybox|env|(ba|da|a|k|mk|z)?sh|"
+                                r"(python|perl|ruby|lua|luajit|node|nodejs|java|php|tclsh)[\d.]*)$")
+    DEFAULT_PATH = '/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin'
+
+    def __init__(self, rootfs_path):
+        self.rootfs_path = rootfs_path
+        self.listing = RootfsListing.from_directory(rootfs_path)
+        self.libs = self.listing.find_shared_libs()
+
+    # ==========================================================================
+    def find_entrypoint(self, command, env=None):
+        """Find the executable of a command inside the rootfs, searching PATH
+        if it is not a path
+
+        Args:
+            command (string): process.args[0]
+            env (list, optional): process.env, "NAME=value" strings
+
+        Returns:
+            string: path inside the rootfs or None if not found
+        """
+        if '/' in command:
+            path = posixpath.normpath('/' + command.lstrip('/'))
+            return path if self.listing.exists(path) else None
+
+        search_path = self.DEFAULT_PATH
+        for var in env or []:
+            if var.startswith('PATH='):
+                search_path = var[len('PATH='):]
+        for directory in search_path.split(':'):
+            path = posixpath.join('/', directory, command)
+            if directory and self.listing.exists(path):
+                return path
+        return None
+
+    # ==========================================================================
+    def check_entrypoint(self, path):
+        """Check that the libs used by an entrypoint can be found by following
+        its DT_NEEDED entries
+
+        Args:
+            path (string): path of the entrypoint inside the rootfs
+
+        Returns:
+            string: why the entrypoint cannot be used for pruning or None if it can
+        """
+        target = self.listing.resolve(path)
+        if not target:
+            return "is not found in rootfs"
+        for name in (posixpath.basename(path), posixpath.basename(target)):
+            if self.INTERPRETER_RE.match(name):
+                return f"is a shell or interpreter ({name})"
+
+        # Static executables have no DT_NEEDED entries either
+        elf_info = self._get_elf_info(target)
+        if not elf_info or not elf_info['needed']:
+            return "is not a dynamically linked executable"
+        return None
+
+    # ==========================================================================
+    def find_unused(self, entrypoints, dlopen=None):
+        """Find the libraries that are not needed by any of the entrypoints
+
+        Args:
+            entrypoints (list): paths inside the rootfs of executables and libs
+                                that are used
+            dlopen (list, optional): libs loaded with dlopen(). Filenames or
+                                     absolute paths, shell-style wildcards allowed
+
+        Returns:
+            list: paths inside the rootfs of the unused libs, sorted
+        """
+        worklist = list(entrypoints)
+        for basename, paths in self.libs.items():
+            if self.LOADER_RE.match(basename):
+                worklist.extend(paths)
+        for pattern in dlopen or []:
+            for basename, paths in self.libs.items():
+                if '/' in pattern:
+                    worklist.extend(path for path in paths if fnmatch.fnmatchcase(path, pattern))
+                elif fnmatch.fnmatchcase(basename, pattern):
+                    worklist.extend(paths)
+
+        used = set()
+        visited = set()
+        while worklist:
+            path = worklist.pop()
+            links = []
+            target = self.listing.resolve(path, links)
+            if not target:
+                continue
+            used.update(links)
+            if target in visited:
+                continue
+            visited.add(target)
+            used.add(target)
+
+            elf_info = self._get_elf_info(target)
+            if not elf_info:
+                continue
+            for needed in elf_info['needed']:
+                if '/' in needed:
+                    worklist.append(needed)
+                else:
+                    worklist.extend(self.libs.get(needed, []))
+
+        # Libs first, then the links to them
+        unused = set()
+        links = []
+        for paths in self.libs.values():
+            for path in paths:
+                if path in used:
+                    continue
+                if self.listing.entries[path][0] == RootfsListing.SYMLINK:
+                    links.append(path)
+                elif self._get_elf_info(path):
+                    unused.add(path)
+        for path in links:
+            if self.listing.resolve(path) in unused:
+                unused.add(path)
+        return sorted(unused)
+
+    # ==========================================================================
+    def get_size(self, path):
+        """Returns the size the file takes in the rootfs
+        """
+        return os.lstat(self._rootfs_filepath(path)).st_size
+
+    # ==========================================================================
+    def remove(self, paths):
+        """Remove files from the rootfs
+
+        Args:
+            paths (list): paths inside the rootfs
+        """
+        for path in paths:
+            logger.trace(f"Removing from rootfs: {path}")
+            os.remove(self._rootfs_filepath(path))
+            self.listing.entries.pop(path, None)
+
+    # ==========================================================================
+    def _rootfs_filepath(self, path):
+        return os.path.join(self.rootfs_path, path.lstrip('/'))
+
+    # ==========================================================================
+    def _get_elf_info(self, path):
+        return ElfInfoCache.get_instance().get(self._rootfs_filepath(path), ReadElf.read_dynamic_info)
@@ -0,0 +1,589 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Liberty Global B.V.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+import sys
+import mmap
+import struct
+import threading
+from loguru import logger
+from bundlegen.core.platform_cache import PlatformConfigCache
+
+
+class LibsIndex:
+    """Compiled, mmap-able form of a <platform>_libs.json file
+
+    File layout (all integers little endian):
+        header      magic, version, counts and section offsets (HEADER)
+        strings     (string_count + 1) u32 offsets followed by an utf-8 blob.
+                    Ids [0, lib_count) are the lib names in sorted order, followed
+                    by names only used as dependency and by the apiversion tags
+        records     one RECORD per lib followed by the apiversions bitset
+        adjacency   u32 string ids for the deps, sublibs and dependency closure
+                    of every lib
+
+    The libc/sublibs relationships found by LibraryMatching are resolved at
+    compile time, so records already look like the output of
+    LibraryMatching._determine_sublibs(). So are the dependency closures,
+    see LibsClosures.
+    """
+    MAGIC = b'BGLIBIDX'
+    VERSION = 3
+    SUFFIX = '.idx'
+
+    # magic, version, lib_count, string_count, apiversion_base, apiversion_count,
+    # bitset_size, strings_offset, records_offset, adjacency_offset
+    HEADER = struct.Struct('<8sIIIIIIIII')
+    # deps_start, deps_count, sublibs_start, sublibs_count, parent_id,
+    # closure_start, closure_count, size, sha256 (all zero if not known)
+    RECORD = struct.Struct('<IIIIIIIQ32s')
+    U32 = struct.Struct('<I')
+    NO_PARENT = 0xFFFFFFFF
+    NO_CLOSURE = 0xFFFFFFFF
+
+    _loaded = {}
+    _loaded_lock = threading.Lock()
+
+    def __init__(self, path, buffer):
+        self.path = path
+        self._buffer = buffer
+        self._key = None
+        if len(buffer) < self.HEADER.size:
+            raise ValueError(f"{path} is too small to be a compiled libs index")
+        (magic, version, self.lib_count, self.string_count, self.apiversion_base,
+         self.apiversion_count, self.bitset_size, self.strings_offset, self.records_offset,
+         self.adjacency_offset) = self.HEADER.unpack_from(buffer, 0)
+
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"{path} is not a compiled libs index version {self.VERSION}")
+
+        self.blob_offset = self.strings_offset + (self.string_count + 1) * self.U32.size
+        self.record_size = self.RECORD.size + self.bitset_size
+        self._strings = {}
+        self._name_index = None
+
+    # ==========================================================================
+    @classmethod
+    def compiled_path(cls, libs_json_path):
+        """Returns where the compiled index of a _libs.json file is stored
+
+        Args:
+            libs_json_path (string): Path to <platform>_libs.json
+
+        Returns:
+            string: Path to <platform>_libs.idx
+        """
+        return os.path.splitext(libs_json_path)[0] + cls.SUFFIX
+
+    # ==========================================================================
+    @classmethod
+    def load(cls, path):
+        """Map a compiled libs index into memory. Indexes are immutable, so
+        the same instance is shared as long as the file does not change
+
+        Args:
+            path (string): Path to the compiled index
+
+        Returns:
+            LibsIndex: the index
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+
+        with cls._loaded_lock:
+            index = cls._loaded.get(path)
+            if index and index._key == key:
+                return index
+
+        with open(path, 'rb') as index_file:
+            buffer = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        index = cls(path, buffer)
+        index._key = key
+
+        with cls._loaded_lock:
+            cls._loaded[path] = index
+        logger.debug(f"Loaded compiled libs index {path} ({index.lib_count} libs)")
+        return index
+
+    # ==========================================================================
+    @classmethod
+    def load_compiled(cls, libs_json_path):
+        """Load the compiled form of a _libs.json file (see `bundlegen compile-libs`)
+        if there is one that is newer than the json file
+
+        Args:
+            libs_json_path (string): Path to <platform>_libs.json
+
+        Returns:
+            LibsIndex: compiled libs index or None if the json should be used
+        """
+        compiled_path = cls.compiled_path(libs_json_path)
+        try:
+            if os.path.getmtime(compiled_path) < os.path.getmtime(libs_json_path):
+                logger.warning(f"Ignoring outdated compiled libs index {compiled_path}")
+                return None
+            return cls.load(compiled_path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as err:
+            logger.warning(f"Ignoring compiled libs index {compiled_path}: {err}")
+            return None
+
+    # ==========================================================================
+    @classmethod
+    def compile(cls, libs, path):
+        """Compile the libs info of a platform into an index file
+
+        Args:
+            libs (list): lib entries as found in *_libs.json
+            path (string): Where to write the compiled index
+        """
+        # Imported here as library matching itself needs to know about compiled indexes
+        from bundlegen.core.library_matching import LibraryMatching
+
+        libs_by_name = {}
+        for lib in libs:
+            libs_by_name.setdefault(lib['name'], lib)
+        lib_names = sorted(libs_by_name)
+
+        # Resolve libc and its sublibs once, instead of on every run
+        libc, sublibs = LibraryMatching.find_libc_and_sublibs(list(libs_by_name.values()))
+        sublib_names = set(sublib['name'] for sublib in sublibs)
+
+        name_index = LibsNameIndex(lib_names)
+        def get_info(name):
+            position = name_index.find(name)
+            if position is None:
+                return None
+            lib = libs_by_name[lib_names[position]]
+            if libc is not None and lib is libc:
+                return dict(lib, sublibs=[sublib['name'] for sublib in sublibs])
+            return lib
+        closures = LibsClosures.build(lib_names, get_info)
+
+        dep_names = sorted(set(dep for lib in libs_by_name.values() for dep in lib['deps']) - set(lib_names))
+        apiversions = sorted(set(apiversion for lib in libs_by_name.values() for apiversion in lib['apiversions']))
+
+        strings = lib_names + dep_names + apiversions
+        string_ids = {name: i for i, name in enumerate(lib_names + dep_names)}
+        apiversion_base = len(lib_names) + len(dep_names)
+        apiversion_bits = {apiversion: i for i, apiversion in enumerate(apiversions)}
+        bitset_size = ((len(apiversions) + 63) // 64) * 8
+
+        records = bytearray()
+        adjacency = []
+        for name in lib_names:
+            lib = libs_by_name[name]
+            deps_start = len(adjacency)
+            adjacency.extend(string_ids[dep] for dep in lib['deps'])
+
+            sublibs_start = len(adjacency)
+            if libc is not None and name == libc['name']:
+                adjacency.extend(string_ids[sublib['name']] for sublib in sublibs)
+
+            closure = closures.get(name)
+            closure_start = len(adjacency)
+            if closure is None:
+                closure_count = cls.NO_CLOSURE
+            else:
+                adjacency.extend(string_ids[lib] for lib in closure)
+                closure_count = len(closure)
+
+            parent_id = cls.NO_PARENT
+            bitset = 0
+            if name in sublib_names:
+                parent_id = string_ids[libc['name']]
+            else:
+                for apiversion in lib['apiversions']:
+                    bitset |= 1 << apiversion_bits[apiversion]
+
+            digest = bytes.fromhex(lib['sha256']) if lib.get('sha256') else bytes(32)
+            records += cls.RECORD.pack(deps_start, len(lib['deps']), sublibs_start,
+                                       closure_start - sublibs_start, parent_id,
+                                       closure_start, closure_count, lib.get('size', 0), digest)
+            records += bitset.to_bytes(bitset_size, 'little')
+
+        encoded = [string.encode('utf-8') for string in strings]
+        string_offsets = [0]
+        for string in encoded:
+            string_offsets.append(string_offsets[-1] + len(string))
+
+        strings_offset = cls.HEADER.size
+        records_offset = strings_offset + len(string_offsets) * cls.U32.size + string_offsets[-1]
+        adjacency_offset = records_offset + len(records)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as index_file:
+            index_file.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, len(lib_names), len(strings),
+                                             apiversion_base, len(apiversions), bitset_size,
+                                             strings_offset, records_offset, adjacency_offset))
+            index_file.write(struct.pack(f'<{len(string_offsets)}I', *string_offsets))
+            index_file.write(b''.join(encoded))
+            index_file.write(records)
+            index_file.write(struct.pack(f'<{len(adjacency)}I', *adjacency))
+        os.replace(tmp_path, path)
+
+        logger.info(f"Compiled {len(lib_names)} libs ({len(apiversions)} apiversions) into {path}")
+
+    # ==========================================================================
+    def _string(self, string_id):
+        string = self._strings.get(string_id)
+        if string is None:
+            start, end = struct.unpack_from('<II', self._buffer, self.strings_offset + string_id * self.U32.size)
+            string = sys.intern(self._buffer[self.blob_offset + start:self.blob_offset + end].decode('utf-8'))
+            self._strings[string_id] = string
+        return string
+
+    # ==========================================================================
+    def _find(self, name):
+        """Binary search for a lib name, the lib names are the first, sorted strings
+        """
+        target = name.encode('utf-8')
+        lo = 0
+        hi = self.lib_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start, end = struct.unpack_from('<II', self._buffer, self.strings_offset + mid * self.U32.size)
+            candidate = self._buffer[self.blob_offset + start:self.blob_offset + end]
+            if candidate < target:
+                lo = mid + 1
+            elif candidate > target:
+                hi = mid
+            else:
+                return mid
+        return None
+
+    # ==========================================================================
+    def _ids(self, start, count):
+        offset = self.adjacency_offset + start * self.U32.size
+        return struct.unpack_from(f'<{count}I', self._buffer, offset)
+
+    # ==========================================================================
+    def _entry(self, lib_id):
+        """Decode the record of a lib into the same dict as used for _libs.json entries
+        """
+        offset = self.records_offset + lib_id * self.record_size
+        (deps_start, deps_count, sublibs_start, sublibs_count, parent_id,
+         _, _, size, digest) = self.RECORD.unpack_from(self._buffer, offset)
+
+        bitset = int.from_bytes(self._buffer[offset + self.RECORD.size:offset + self.record_size], 'little')
+        apiversions = []
+        bit = 0
+        while bitset:
+            if bitset & 1:
+                apiversions.append(self._string(self.apiversion_base + bit))
+            bitset >>= 1
+            bit += 1
+
+        entry = {
+            'apiversions': apiversions,
+            'deps': [self._string(dep_id) for dep_id in self._ids(deps_start, deps_count)],
+            'name': self._string(lib_id)
+        }
+        if sublibs_count:
+            entry['sublibs'] = [self._string(sublib_id) for sublib_id in self._ids(sublibs_start, sublibs_count)]
+        if parent_id != self.NO_PARENT:
+            entry['parentlib'] = self._string(parent_id)
+        if any(digest):
+            entry['sha256'] = digest.hex()
+            entry['size'] = size
+        return entry
+
+    # ==========================================================================
+    def get(self, name):
+        """Look up the libs info for a library
+
+        Args:
+            name (string): Library path on the host
+
+        Returns:
+            dict: lib entry (name, apiversions, deps and sublibs/parentlib if
+                  applicable) or None if the lib is unknown
+        """
+        lib_id = self._find(name)
+        if lib_id is None:
+            lib_id = self.name_index().find(name)
+        if lib_id is None:
+            return None
+        return self._entry(lib_id)
+
+    # ==========================================================================
+    def closure(self, name):
+        """Returns the dependency closure of a lib, see LibsClosures
+
+        Args:
+            name (string): Library name as listed in the libs info
+
+        Returns:
+            tuple: libs mounted when the lib is taken from the host or None if
+                   the lib is unknown or depends on itself
+        """
+        lib_id = self._find(name)
+        if lib_id is None:
+            return None
+        offset = self.records_offset + lib_id * self.record_size
+        _, _, _, _, _, closure_start, closure_count, _, _ = self.RECORD.unpack_from(self._buffer, offset)
+        if closure_count == self.NO_CLOSURE:
+            return None
+        return tuple(self._string(lib_id) for lib_id in self._ids(closure_start, closure_count))
+
+    # ==========================================================================
+    def name_index(self):
+        """Returns the name index of the libs. Only needed to resolve aliases,
+        exact names are found by binary search in the mapped file
+        """
+        if self._name_index is None:
+            self._name_index = LibsNameIndex(self._string(lib_id) for lib_id in range(self.lib_count))
+        return self._name_index
+
+    def __contains__(self, name):
+        return self._find(name) is not None
+
+    def __len__(self):
+        return self.lib_count
+
+    def __iter__(self):
+        for lib_id in range(self.lib_count):
+            yield self._entry(lib_id)
+
+
+class LibsNameIndex:
+    """Name keyed index of the lib entries of a platform
+
+    Maps every lib name to its position in the libs list. Names that are not
+    listed as such are resolved through aliases: the normalised path and, for
+    versioned file names like /usr/lib/libfoo.so.1.2.3, the names obtained by
+    stripping minor version numbers down to the soname /usr/lib/libfoo.so.1.
+    The major version is never stripped, libs of another major version have
+    another ABI. Only an unversioned /usr/lib/libfoo.so resolves to
+    /usr/lib/libfoo.so.<N>, when there is only one such lib.
+
+    Indexes only hold positions, so the same index can be shared by all copies
+    of a libs list loaded from the same file.
+    """
+    SONAME_RE = re.compile(r"^(.*\.so)((?:\.\d+)*)$")
+
+    def __init__(self, names):
+        self.positions = {}
+        stems = {}
+        for position, name in enumerate(names):
+            if name in self.positions:
+                # First entry wins, like the linear search it replaces
+                continue
+            self.positions[name] = position
+            m = self.SONAME_RE.match(name)
+            if m and m.group(2):
+                stems.setdefault(m.group(1), []).append(position)
+
+        self.aliases = {stem: positions[0] for stem, positions in stems.items()
+                        if len(positions) == 1 and stem not in self.positions}
+
+    # ==========================================================================
+    def find(self, name):
+        """Find the position of a lib, trying its aliases if the name itself is unknown
+
+        Args:
+            name (string): Library path on the host
+
+        Returns:
+            int: position inside the libs list or None if the lib is unknown
+        """
+        position = self.positions.get(name)
+        if position is not None:
+            return position
+
+        name = os.path.normpath(name)
+        m = self.SONAME_RE.match(name)
+        if m and not m.group(2):
+            # Unversioned libfoo.so -> the only libfoo.so.<N>
+            position = self.positions.get(name, self.aliases.get(name))
+            if position is not None:
+                logger.trace(f"Resolved {name} through its unversioned alias")
+            return position
+
+        candidates = [name]
+        if m:
+            # libfoo.so.1.2.3 -> libfoo.so.1.2 -> libfoo.so.1, never below the
+            # major version
+            versions = m.group(2).split('.')[1:]
+            while len(versions) > 1:
+                versions.pop()
+                candidates.append(m.group(1) + ''.join('.' + v for v in versions))
+
+        for candidate in candidates:
+            position = self.positions.get(candidate)
+            if position is not None:
+                logger.trace(f"Resolved {name} as {candidate}")
+                return position
+        return None
+
+
+class LibsClosures:
+    """Transitive dependency closures of the libs of a platform
+
+    For every lib this holds, in order, all libs that get mounted when the
+    lib is taken from the host in 'host' libmatching mode: its deps walked
+    depth first and the sublibs of every walked lib. Matching in 'host' mode
+    replays the closure instead of walking the dependency graph again for
+    every bundle.
+
+    Libs that depend on themselves through a dependency cycle have no closure,
+    these are walked by LibraryMatching as before.
+    """
+    def __init__(self, closures):
+        self.closures = closures
+
+    # ==========================================================================
+    @classmethod
+    def build(cls, names, get_info):
+        """Compute the closures of libs
+
+        Args:
+            names (iterable): Names of the libs to compute the closure for
+            get_info (function): Returns the lib entry for a name (after sublibs
+                                 processing by LibraryMatching) or None
+
+        Returns:
+            LibsClosures: closures of the libs
+        """
+        closures = {}
+        cycles = 0
+        for name in names:
+            info = get_info(name)
+            if info is None:
+                continue
+
+            # Same order as LibraryMatching walks the deps with its worklist.
+            # The lib and its sublibs are already handled when deps are walked
+            handled = set([name])
+            handled.update(info.get('sublibs', []))
+            closure = []
+            cyclic = False
+            worklist = list(reversed(info['deps']))
+            while worklist:
+                lib = worklist.pop()
+                if lib in handled:
+                    if lib == name:
+                        cyclic = True
+                    continue
+                handled.add(lib)
+                closure.append(lib)
+
+                lib_info = get_info(lib)
+                if lib_info:
+                    for sublib in lib_info.get('sublibs', []):
+                        handled.add(sublib)
+                        closure.append(sublib)
+                    worklist.extend(reversed(lib_info['deps']))
+
+            if cyclic:
+                logger.warning(f"Dependency cycle found for {name}")
+                cycles += 1
+                closures[name] = None
+            else:
+                closures[name] = tuple(closure)
+
+        logger.debug(f"Computed dependency closures of {len(closures)} libs ({cycles} cyclic)")
+        return cls(closures)
+
+    # ==========================================================================
+    def get(self, name):
+        """Returns the closure of a lib
+
+        Args:
+            name (string): Library name as listed in the libs info
+
+        Returns:
+            tuple: libs mounted when the lib is taken from the host or None if
+                   the lib is unknown or depends on itself
+        """
+        return self.closures.get(name)
+
+
+class LazyLibs:
+    """Placeholder for the libs section of a platform config
+
+    The _libs.json file is only parsed (or its compiled index mapped) when the
+    libs info is actually needed, which is not the case when dependency
+    walking is disabled. Use materialize() to get the actual libs info.
+
+    The json file is validated against the libs schema up front, see
+    STBPlatform.validate_platform_config(), loading it only parses it.
+    """
+
+    def __init__(self, libs_json_path):
+        self.path = libs_json_path
+        self._libs = None
+        self._name_index = None
+        self._closures = None
+        self._lock = threading.Lock()
+
+    # ==========================================================================
+    def materialize(self):
+        """Load the libs info on first use
+
+        Returns:
+            LibsIndex or LibsTable: compiled index if available, otherwise the
+                                    libs table of the json file
+        """
+        with self._lock:
+            if self._libs is None:
+                libs = LibsIndex.load_compiled(self.path)
+                if libs is None:
+                    logger.debug(f"Loading libs info from {self.path}")
+                    libs = PlatformConfigCache.get_instance().load_libs(self.path)
+                self._libs = libs
+            return self._libs
+
+    def __len__(self):
+        return len(self.materialize())
+
+    def __iter__(self):
+        return iter(self.materialize())
+
+    # ==========================================================================
+    def name_index(self):
+        """Returns the name index of the libs, built once for every version of
+        the libs json file and shared between platform instances through the
+        platform config cache
+        """
+        libs = self.materialize()
+        if isinstance(libs, LibsIndex):
+            return libs.name_index()
+
+        if self._name_index is None:
+            self._name_index = PlatformConfigCache.get_instance().get_derived(
+                self.path, 'name_index', lambda: LibsNameIndex(lib['name'] for lib in libs))
+        return self._name_index
+
+    # ==========================================================================
+    def closures(self, get_info):
+        """Returns the dependency closures of the libs, computed once for every
+        version of the libs json file and shared between platform instances
+        through the platform config cache
+
+        Args:
+            get_info (function): Returns the lib entry for a name (after sublibs
+                                 processing by LibraryMatching) or None
+        """
+        if self._closures is None:
+            libs = self.materialize()
+            self._closures = PlatformConfigCache.get_instance().get_derived(
+                self.path, 'closures', lambda: LibsClosures.build([lib['name'] for lib in libs], get_info))
+        return self._closures
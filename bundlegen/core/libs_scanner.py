@@ -0,0 +1,242 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Consult Red
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import hashlib
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+from loguru import logger
+from bundlegen.core.readelf import ReadElf
+from bundlegen.core.rootfs_listing import RootfsListing
+
+
+def _scan_lib(filepath):
+    """Read the ELF info and sha256 of a lib, run in the worker processes
+
+    Returns:
+        tuple: (elf info, see ReadElf.read_dynamic_info(), sha256) or
+               (None, None) if the file is not an ELF file
+    """
+    elf_info = ReadElf.read_dynamic_info(filepath)
+    if not elf_info:
+        return (None, None)
+
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as lib_file:
+        for chunk in iter(lambda: lib_file.read(LibsScanner.CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return (elf_info, digest.hexdigest())
+
+
+class LibsScanner:
+    """Generates the libs info of a platform (<platform>_libs.json) from its sysroot
+
+    Same content as the generate_libs_json bbclass: an entry for every shared
+    lib (file or symlink) below /lib and /usr/lib with the version definitions
+    of the lib and the libs its DT_NEEDED entries resolve to, plus the sha256
+    and size of the lib used by --dedup-libs.
+
+    The ELF files are read in a process pool. The results are kept in a state
+    file next to the output, so an incremental scan only reads the files
+    whose (size, mtime, inode) changed since the previous scan.
+    """
+    LIB_DIRS = ['/lib', '/usr/lib']
+    LIB64_DIRS = ['/lib64', '/usr/lib64']
+    STATE_SUFFIX = '.scan'
+    STATE_VERSION = 1
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, sysroot, jobs=None):
+        self.sysroot = os.path.abspath(sysroot)
+        self.jobs = jobs or os.cpu_count() or 1
+        self.listing = None
+        # target path -> [size, mtime_ns, inode, elf info, sha256]
+        self.files = {}
+        self.scanned = 0
+
+    # ==========================================================================
+    @classmethod
+    def state_path(cls, output):
+        """Returns where the state of the scan of an output file is kept
+        """
+        return os.path.splitext(output)[0] + cls.STATE_SUFFIX
+
+    # ==========================================================================
+    def load_state(self, path):
+        """Load the state of a previous scan of the same sysroot, used to only
+        rescan the files that changed
+
+        Args:
+            path (string): Path to the state file
+
+        Returns:
+            bool: True if the state was loaded
+        """
+        try:
+            with open(path) as state_file:
+                state = json.load(state_file)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as err:
+            logger.warning(f"Ignoring scan state {path}: {err}")
+            return False
+
+        if state.get('version') != self.STATE_VERSION or state.get('sysroot') != self.sysroot:
+            logger.info(f"Scan state {path} is for another sysroot or version, scanning all files")
+            return False
+        self.files = state.get('files', {})
+        return True
+
+    # ==========================================================================
+    def save_state(self, path):
+        """Save the state of the scan, see load_state()
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as state_file:
+            json.dump({'version': self.STATE_VERSION, 'sysroot': self.sysroot, 'files': self.files}, state_file)
+        os.replace(tmp_path, path)
+
+    # ==========================================================================
+    def scan(self):
+        """Scan the sysroot
+
+        Returns:
+            list: lib entries as found in *_libs.json, sorted by name
+        """
+        self.listing = RootfsListing.from_directory(self.sysroot)
+        names = self._find_libs()
+
+        # Stat the lib files, symlinks share the info of their target
+        targets = {}
+        for name in names:
+            target = self.listing.resolve(name)
+            if target and self.listing.entries[target][0] == RootfsListing.FILE:
+                targets[name] = target
+
+        files = {}
+        to_scan = []
+        for target in sorted(set(targets.values())):
+            try:
+                stat = os.stat(self._sysroot_filepath(target))
+            except OSError as err:
+                logger.warning(f"Cannot stat {target}: {err}")
+                continue
+            key = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+            previous = self.files.get(target)
+            if previous and previous[:3] == key:
+                files[target] = previous
+            else:
+                files[target] = key + [None, None]
+                to_scan.append(target)
+
+        self._scan_files(to_scan, files)
+        self.files = files
+        self.scanned = len(to_scan)
+        logger.debug(f"Read {len(to_scan)} of {len(files)} lib files of {self.sysroot}")
+
+        names = [name for name in names if name in targets and files.get(targets[name], [None] * 4)[3]]
+        lib_names = set(names)
+        search_dirs = [directory for directory in self.LIB64_DIRS if self.listing.exists(directory)] + self.LIB_DIRS
+        libs_by_soname = {}
+        for name in names:
+            libs_by_soname.setdefault(posixpath.basename(name), name)
+
+        libs = []
+        unresolved = set()
+        for name in names:
+            size, _, _, elf_info, sha256 = files[targets[name]]
+            deps = set()
+            for needed in elf_info['needed']:
+                dep = self._resolve_needed(needed, search_dirs, lib_names, libs_by_soname)
+                if dep:
+                    deps.add(dep)
+                else:
+                    unresolved.add(needed)
+            libs.append({
+                'apiversions': list(elf_info['apiversions']),
+                'deps': sorted(deps),
+                'name': name,
+                'sha256': sha256,
+                'size': size
+            })
+
+        if unresolved:
+            logger.warning(f"Dependencies not found in {self.sysroot}: {', '.join(sorted(unresolved))}")
+        return libs
+
+    # ==========================================================================
+    def _find_libs(self):
+        """Returns the files and symlinks below the lib directories that look
+        like a shared lib, sorted. Lib directories that are a symlink to
+        another one (merged /usr) are only listed once
+        """
+        roots = []
+        for directory in self.LIB64_DIRS + self.LIB_DIRS:
+            entry = self.listing.entries.get(directory)
+            if entry and entry[0] == RootfsListing.DIRECTORY:
+                roots.append(directory + '/')
+
+        names = []
+        for path, (kind, _) in self.listing.entries.items():
+            if kind != RootfsListing.DIRECTORY and path.startswith(tuple(roots)) and \
+                    RootfsListing.SHARED_LIB_RE.search(posixpath.basename(path)):
+                names.append(path)
+        return sorted(names)
+
+    # ==========================================================================
+    def _scan_files(self, targets, files):
+        """Read the ELF info of lib files, in a process pool if there is more
+        than one job
+        """
+        if not targets:
+            return
+
+        filepaths = [self._sysroot_filepath(target) for target in targets]
+        if self.jobs > 1 and len(targets) > 1:
+            logger.debug(f"Reading {len(targets)} lib files using {self.jobs} processes")
+            chunksize = max(1, len(targets) // (self.jobs * 4))
+            with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+                results = list(executor.map(_scan_lib, filepaths, chunksize=chunksize))
+        else:
+            results = [_scan_lib(filepath) for filepath in filepaths]
+
+        for target, (elf_info, sha256) in zip(targets, results):
+            files[target][3] = elf_info
+            files[target][4] = sha256
+
+    # ==========================================================================
+    def _resolve_needed(self, needed, search_dirs, lib_names, libs_by_soname):
+        """Resolve a DT_NEEDED entry to the name of a lib, searching the default
+        lib directories first, like the dynamic linker
+
+        Returns:
+            string: lib name or None if not found
+        """
+        if '/' in needed:
+            name = posixpath.normpath('/' + needed.lstrip('/'))
+            return name if name in lib_names else None
+
+        for directory in search_dirs:
+            name = posixpath.join(directory, needed)
+            if name in lib_names:
+                return name
+        return libs_by_soname.get(needed)
+
+    # ==========================================================================
+    def _sysroot_filepath(self, path):
+        return os.path.join(self.sysroot, path.lstrip('/'))
@@ -0,0 +1,309 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Consult Red
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+import json
+import hashlib
+import tarfile
+import posixpath
+from loguru import logger
+from bundlegen.core.utils import Utils
+from bundlegen.core.blob_store import BlobStore
+from bundlegen.core.image_reference import ImageReference
+from bundlegen.core.registry_client import RegistryClient, OCI_MANIFEST, OCI_INDEX, OCI_CONFIG, \
+    DOCKER_MANIFEST, DOCKER_MANIFEST_LIST
+
+
+class LocalImageError(Exception):
+    """Raised when a local image cannot be imported
+    """
+
+
+class LocalImage:
+    """Imports local images into the image layout of a build without
+    copying them with skopeo
+
+    oci:<dir>[:<ref>]
+        The image is resolved for the platform like skopeo does and its blobs
+        are hard linked (or reflinked, copied as a last resort) from the
+        layout, which is never modified.
+    oci-archive:<file>[:<ref>]
+        The archive (tar, optionally compressed) is read as a stream and its
+        blobs are written straight to their final place, verified against
+        their digest, without extracting the archive first.
+    docker-archive:<file>[:<name:tag>]
+        As for oci-archive, the image (docker save format) is converted to
+        an OCI image on the fly.
+    """
+    TRANSPORTS = ImageReference.LOCAL_TRANSPORTS
+    REF_NAME = 'org.opencontainers.image.ref.name'
+    OCI_LAYER = 'application/vnd.oci.image.layer.v1.tar'
+    OCI_LAYER_GZIP = 'application/vnd.oci.image.layer.v1.tar+gzip'
+    BLOB_MEMBER_RE = re.compile(r"^blobs/(sha256|sha512)/([0-9a-f]{64,128})$")
+    # Files of docker save archives that are not blobs
+    DOCKER_META_FILES = ('manifest.json', 'repositories', 'index.json', 'oci-layout')
+    CHUNK_SIZE = 1024 * 1024
+
+    # ==========================================================================
+    @classmethod
+    def parse_url(cls, url):
+        """Split the URL of a local image like skopeo: the path ends at the
+        first colon, followed by the optional reference, see ImageReference
+
+        Args:
+            url (string): e.g. oci:/tmp/image:latest
+
+        Returns:
+            tuple: (transport, path, reference or None), None if the image is
+                   not local
+        """
+        ref = ImageReference.parse(url)
+        if not ref or not ref.is_local or not ref.path:
+            return None
+        return (ref.transport, ref.path, ref.tag)
+
+    # ==========================================================================
+    @classmethod
+    def import_image(cls, url, platform, layout_path, tag, blob_dir=None):
+        """Import a local image for a platform into an OCI image layout
+
+        Args:
+            url (string): URL of the image, see parse_url()
+            platform (dict): os, arch and variant
+            layout_path (string): Directory of the layout
+            tag (string): Name of the image in the layout (index.json)
+            blob_dir (string): Where to store the blobs of archives instead of
+                               the blobs directory of the layout, e.g. a
+                               BlobStore. OCI layouts are always linked into
+                               the layout
+
+        Returns:
+            string: digest of the manifest in the layout
+        """
+        transport, path, reference = cls.parse_url(url)
+        try:
+            if transport == 'oci':
+                return cls._import_layout(path, reference, platform, layout_path, tag)
+
+            blob_dir = blob_dir or os.path.join(layout_path, 'blobs')
+            if transport == 'oci-archive':
+                return cls._import_oci_archive(path, reference, platform, layout_path, tag, blob_dir)
+            return cls._import_docker_archive(path, reference, layout_path, tag, blob_dir)
+        except (OSError, ValueError, KeyError, tarfile.TarError) as err:
+            raise LocalImageError(f"Cannot import {url}: {err}") from err
+
+    # ==========================================================================
+    @classmethod
+    def get_digest(cls, url, platform):
+        """Returns the digest of the image manifest of an OCI layout for a
+        platform. Archives would have to be read completely
+
+        Returns:
+            string: digest or None if unknown
+        """
+        transport, path, reference = cls.parse_url(url)
+        if transport != 'oci':
+            return None
+        try:
+            with open(os.path.join(path, 'index.json')) as index_file:
+                index = json.load(index_file)
+            return cls._select_manifest(index, reference, platform,
+                                        lambda digest: cls._read_blob(os.path.join(path, 'blobs'), digest))['digest']
+        except (OSError, ValueError, KeyError, LocalImageError) as err:
+            logger.debug(f"Cannot resolve the digest of {url}: {err}")
+            return None
+
+    # ==========================================================================
+    @classmethod
+    def _import_layout(cls, path, reference, platform, layout_path, tag):
+        src_blob_dir = os.path.join(path, 'blobs')
+        with open(os.path.join(path, 'index.json')) as index_file:
+            index = json.load(index_file)
+        desc = cls._select_manifest(index, reference, platform, lambda digest: cls._read_blob(src_blob_dir, digest))
+        raw = cls._read_blob(src_blob_dir, desc['digest'])
+        manifest = json.loads(raw)
+
+        blob_dir = os.path.join(layout_path, 'blobs')
+        methods = set()
+        for blob in [manifest['config']] + manifest.get('layers', []):
+            dst = cls._blob_path(blob_dir, blob['digest'])
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            methods.add(Utils.link_or_copy(cls._blob_path(src_blob_dir, blob['digest']), dst))
+        logger.debug(f"Imported blobs of {path} by {', '.join(sorted(methods))}")
+        return RegistryClient.write_layout(layout_path, blob_dir, desc.get('mediaType', OCI_MANIFEST), raw, tag)
+
+    # ==========================================================================
+    @classmethod
+    def _import_oci_archive(cls, path, reference, platform, layout_path, tag, blob_dir):
+        index = None
+        with tarfile.open(path, 'r|*') as tar:
+            for member in tar:
+                name = cls._member_name(member)
+                if not member.isfile():
+                    continue
+                if name == 'index.json':
+                    index = json.load(tar.extractfile(member))
+                    continue
+                m = cls.BLOB_MEMBER_RE.match(name)
+                if m:
+                    cls._store_blob(tar.extractfile(member), blob_dir, f"{m.group(1)}:{m.group(2)}", member.size)
+
+        if index is None:
+            raise LocalImageError(f"{path} is not an OCI archive, it has no index.json")
+        desc = cls._select_manifest(index, reference, platform, lambda digest: cls._read_blob(blob_dir, digest))
+        raw = cls._read_blob(blob_dir, desc['digest'])
+        return RegistryClient.write_layout(layout_path, blob_dir, desc.get('mediaType', OCI_MANIFEST), raw, tag)
+
+    # ==========================================================================
+    @classmethod
+    def _import_docker_archive(cls, path, reference, layout_path, tag, blob_dir):
+        # Archive path -> (digest, size, gzip compressed)
+        files = {}
+        links = {}
+        meta = {}
+        with tarfile.open(path, 'r|*') as tar:
+            for member in tar:
+                name = cls._member_name(member)
+                if member.issym():
+                    links[name] = posixpath.normpath(posixpath.join(posixpath.dirname(name), member.linkname))
+                elif member.islnk():
+                    links[name] = cls._member_name(tarfile.TarInfo(member.linkname))
+                elif member.isfile():
+                    if name in cls.DOCKER_META_FILES:
+                        meta[name] = tar.extractfile(member).read()
+                    elif not name.endswith(('/json', '/VERSION')):
+                        files[name] = cls._store_file(tar.extractfile(member), blob_dir)
+
+        if 'manifest.json' not in meta:
+            raise LocalImageError(f"{path} is not a docker archive, it has no manifest.json")
+        images = json.loads(meta['manifest.json'])
+        if reference:
+            images = [image for image in images if reference in (image.get('RepoTags') or [])]
+        if len(images) != 1:
+            raise LocalImageError(f"{path} has {len(images)} images matching {reference or 'any name'}")
+        image = images[0]
+
+        def resolve(name):
+            for _ in range(len(links) + 1):
+                if name in files:
+                    return files[name]
+                if name not in links:
+                    break
+                name = links[name]
+            raise LocalImageError(f"{name} is missing in {path}")
+
+        config_digest, config_size, _ = resolve(image['Config'])
+        layers = []
+        for layer in image['Layers']:
+            digest, size, compressed = resolve(layer)
+            layers.append({'mediaType': cls.OCI_LAYER_GZIP if compressed else cls.OCI_LAYER,
+                           'digest': digest, 'size': size})
+        manifest = {
+            'schemaVersion': 2,
+            'mediaType': OCI_MANIFEST,
+            'config': {'mediaType': OCI_CONFIG, 'digest': config_digest, 'size': config_size},
+            'layers': layers
+        }
+        raw = json.dumps(manifest, separators=(',', ':')).encode('utf-8')
+        return RegistryClient.write_layout(layout_path, blob_dir, OCI_MANIFEST, raw, tag)
+
+    # ==========================================================================
+    @classmethod
+    def _select_manifest(cls, index, reference, platform, read_blob):
+        """Select the image manifest of a layout for a reference and a
+        platform, resolving image indexes
+
+        Returns:
+            dict: descriptor of the image manifest
+        """
+        manifests = index.get('manifests', [])
+        if reference:
+            manifests = [desc for desc in manifests if desc.get('annotations', {}).get(cls.REF_NAME) == reference]
+        if not manifests:
+            raise LocalImageError(f"No image {reference or ''} in the layout")
+
+        desc = manifests[0] if len(manifests) == 1 else RegistryClient.select_manifest(manifests, platform)
+        while desc and desc.get('mediaType') in (OCI_INDEX, DOCKER_MANIFEST_LIST):
+            desc = RegistryClient.select_manifest(json.loads(read_blob(desc['digest'])).get('manifests', []), platform)
+        if not desc:
+            raise LocalImageError(f"No image for {platform} in the layout")
+        if desc.get('mediaType', OCI_MANIFEST) not in (OCI_MANIFEST, DOCKER_MANIFEST):
+            raise LocalImageError(f"Unsupported manifest type {desc.get('mediaType')}")
+        return desc
+
+    # ==========================================================================
+    @classmethod
+    def _store_blob(cls, fileobj, blob_dir, digest, size):
+        """Write a blob read from an archive, unless it is already there.
+        The content is verified against the digest
+        """
+        path = cls._blob_path(blob_dir, digest)
+        if os.path.isfile(path) and os.path.getsize(path) == size:
+            return
+        cls._store_file(fileobj, blob_dir, digest.split(':', 1)[0], digest)
+
+    # ==========================================================================
+    @classmethod
+    def _store_file(cls, fileobj, blob_dir, algorithm='sha256', expected=None):
+        """Write a file read from an archive into the blob directory, named
+        by its digest, which must be the expected one if given
+
+        Returns:
+            tuple: (digest, size, True if gzip compressed)
+        """
+        tmp_dir = os.path.join(blob_dir, algorithm)
+        os.makedirs(tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(tmp_dir, f".import.{os.getpid()}.{id(fileobj)}.tmp")
+        hasher = hashlib.new(algorithm)
+        size = 0
+        compressed = False
+        try:
+            with open(tmp_path, 'wb') as blob_file:
+                for chunk in iter(lambda: fileobj.read(cls.CHUNK_SIZE), b''):
+                    if not size:
+                        compressed = chunk[:2] == b'\x1f\x8b'
+                    hasher.update(chunk)
+                    blob_file.write(chunk)
+                    size += len(chunk)
+            digest = f"{algorithm}:{hasher.hexdigest()}"
+            if expected and digest != expected:
+                raise LocalImageError(f"Blob {expected} does not match its digest")
+            os.replace(tmp_path, cls._blob_path(blob_dir, digest))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return (digest, size, compressed)
+
+    # ==========================================================================
+    @staticmethod
+    def _member_name(member):
+        return posixpath.normpath(member.name).lstrip('/')
+
+    # ==========================================================================
+    @staticmethod
+    def _blob_path(blob_dir, digest):
+        m = BlobStore.DIGEST_RE.match(digest)
+        if not m:
+            raise LocalImageError(f"Invalid digest {digest}")
+        return os.path.join(blob_dir, m.group(1), m.group(2))
+
+    # ==========================================================================
+    @classmethod
+    def _read_blob(cls, blob_dir, digest):
+        with open(cls._blob_path(blob_dir, digest), 'rb') as blob_file:
+            return blob_file.read()
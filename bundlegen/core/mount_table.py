@@ -0,0 +1,130 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Consult Red
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from loguru import logger
+
+
+class MountTable:
+    """Ordered table of the OCI mounts of a bundle
+
+    Mounts are indexed by (destination, source, type, options), so checking
+    if a mount already exists and removing a mount do not need to compare
+    against every mount in the list. Mounts with the same destination but a
+    different source, type or options are reported as conflicts.
+
+    The table compares equal to the list of its mounts. Use to_list() to get
+    the OCI 'mounts' list back.
+    """
+    def __init__(self, mounts=None):
+        self._entries = {}
+        self._ids_by_key = {}
+        self._ids_by_destination = {}
+        self._next_id = 0
+        for mount in mounts or []:
+            self.append(mount)
+
+    # ==========================================================================
+    @staticmethod
+    def _key(mount):
+        options = mount.get('options')
+        others = {k: v for k, v in mount.items() if k not in ('destination', 'source', 'type', 'options')}
+        return (mount.get('destination'), mount.get('source'), mount.get('type'),
+                tuple(options) if isinstance(options, list) else options,
+                json.dumps(others, sort_keys=True) if others else None)
+
+    # ==========================================================================
+    def append(self, mount):
+        """Add a mount at the end of the table
+
+        Args:
+            mount (dict): OCI mount
+        """
+        key = self._key(mount)
+        destination = mount.get('destination')
+        destination_ids = self._ids_by_destination.setdefault(destination, [])
+        for mount_id in destination_ids:
+            if self._entries[mount_id][0] != key:
+                logger.warning(f"Conflicting mounts for {destination}: {self._entries[mount_id][1]} and {mount}")
+                break
+
+        mount_id = self._next_id
+        self._next_id += 1
+        self._entries[mount_id] = (key, mount)
+        self._ids_by_key.setdefault(key, []).append(mount_id)
+        destination_ids.append(mount_id)
+
+    # ==========================================================================
+    def remove(self, mount):
+        """Remove the first mount equal to the given mount
+
+        Args:
+            mount (dict): OCI mount
+
+        Raises:
+            ValueError: the mount is not in the table
+        """
+        key = self._key(mount)
+        ids = self._ids_by_key.get(key)
+        if not ids:
+            raise ValueError(f"Mount not in table: {mount}")
+
+        mount_id = ids.pop(0)
+        if not ids:
+            del self._ids_by_key[key]
+        destination = mount.get('destination')
+        self._ids_by_destination[destination].remove(mount_id)
+        if not self._ids_by_destination[destination]:
+            del self._ids_by_destination[destination]
+        del self._entries[mount_id]
+
+    # ==========================================================================
+    def get_by_destination(self, destination):
+        """Returns all mounts for a destination
+
+        Args:
+            destination (string): Mount destination inside the container
+
+        Returns:
+            list: mounts in insertion order
+        """
+        return [self._entries[mount_id][1] for mount_id in self._ids_by_destination.get(destination, [])]
+
+    # ==========================================================================
+    def to_list(self):
+        """Returns the mounts as OCI 'mounts' list
+        """
+        return [mount for _, mount in self._entries.values()]
+
+    def __contains__(self, mount):
+        return self._key(mount) in self._ids_by_key
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __eq__(self, other):
+        if isinstance(other, MountTable):
+            other = other.to_list()
+        if not isinstance(other, list):
+            return NotImplemented
+        return self.to_list() == other
+
+    def __repr__(self):
+        return repr(self.to_list())
@@ -0,0 +1,232 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Consult Red
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import copy
+import json
+import threading
+from hashlib import sha256
+from collections import OrderedDict
+from loguru import logger
+from bundlegen.core.lib_info import LibsTable
+
+
+class PlatformConfigCache:
+    """In-process LRU cache of parsed platform config files
+
+    Long running workers (RabbitMQ consumer, web UI) create a new STBPlatform
+    for every request. This cache avoids re-reading and re-parsing the same
+    template and _libs.json files every time. Entries are invalidated when the
+    file mtime/size changes and its content hash differs. Files are only
+    parsed when their data is needed, getting the content hash of a file (e.g.
+    a _libs.json file when dependency walking is disabled) never parses it.
+
+    Callers always get their own copy of the parsed data, so the bundle
+    processing (which modifies the platform config in place) can never
+    corrupt the cached version. The libs of _libs.json files can instead be
+    loaded as an immutable LibsTable, shared by all callers, which then
+    replaces the parsed lib entries in the cache. Indexes built from a file
+    are kept in its entry as well, see get_derived().
+    """
+    DEFAULT_SIZE = 16
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, max_entries=DEFAULT_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ==========================================================================
+    @classmethod
+    def get_instance(cls):
+        """Returns the process wide cache. The size can be set using the
+        BUNDLEGEN_PLATFORM_CACHE_SIZE environment variable (0 disables caching)
+
+        Returns:
+            PlatformConfigCache: the shared cache
+        """
+        with cls._instance_lock:
+            if not cls._instance:
+                try:
+                    max_entries = int(os.environ.get('BUNDLEGEN_PLATFORM_CACHE_SIZE', cls.DEFAULT_SIZE))
+                except ValueError:
+                    logger.warning("Invalid BUNDLEGEN_PLATFORM_CACHE_SIZE, using default")
+                    max_entries = cls.DEFAULT_SIZE
+                cls._instance = cls(max_entries)
+            return cls._instance
+
+    # ==========================================================================
+    def load(self, path):
+        """Load a platform config file, using the cached version if the file
+        did not change since it was parsed
+
+        Args:
+            path (string): Path to the json file
+
+        Returns:
+            dict: Parsed json, private copy for the caller
+        """
+        return self._copy_config(self._get_entry(path)['data'])
+
+    # ==========================================================================
+    def load_readonly(self, path):
+        """Load a platform config file without copying it. The returned data
+        is shared with the cache and must not be modified
+
+        Args:
+            path (string): Path to the json file
+
+        Returns:
+            dict: Parsed json
+        """
+        data = self._get_entry(path)['data']
+        if isinstance(data.get('libs'), LibsTable):
+            return dict(data, libs=data['libs'].to_list())
+        return data
+
+    # ==========================================================================
+    def load_libs(self, path):
+        """Load the libs section of a _libs.json file as a LibsTable. The
+        table is built once for every version of the file and kept in the
+        cache instead of the parsed lib entries
+
+        Args:
+            path (string): Path to the _libs.json file
+
+        Returns:
+            LibsTable: the libs, shared with the cache and other callers
+        """
+        entry = self._get_entry(path)
+        libs = entry['data'].get('libs', [])
+        if isinstance(libs, LibsTable):
+            return libs
+
+        table = LibsTable(libs)
+        with self._lock:
+            libs = entry['data'].get('libs', [])
+            if isinstance(libs, LibsTable):
+                return libs
+            entry['data'] = dict(entry['data'], libs=table)
+        logger.debug(f"Built libs table of {path} ({len(table)} libs)")
+        return table
+
+    # ==========================================================================
+    def get_derived(self, path, name, build):
+        """Returns data derived from a platform config file, e.g. an index
+        of its libs. The data is built once for every version of the file and
+        kept in its cache entry, so it is evicted together with the file
+
+        Args:
+            path (string): Path to the json file
+            name (string): Identifies the derived data
+            build (function): Builds the data, called without arguments
+
+        Returns:
+            The data, shared with the cache and other callers
+        """
+        entry = self._get_entry(path, parse=False)
+        with self._lock:
+            data = entry['derived'].get(name)
+        if data is None:
+            data = build()
+            with self._lock:
+                data = entry['derived'].setdefault(name, data)
+        return data
+
+    # ==========================================================================
+    def get_hash(self, path):
+        """Returns the sha256 of the content of a platform config file
+
+        Args:
+            path (string): Path to the json file
+
+        Returns:
+            string: hex digest of the file content
+        """
+        return self._get_entry(path, parse=False)['sha256']
+
+    # ==========================================================================
+    def clear(self):
+        """Drop all cached configs
+        """
+        with self._lock:
+            self._entries.clear()
+
+    # ==========================================================================
+    def _get_entry(self, path, parse=True):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry['mtime'] == stat.st_mtime_ns and entry['size'] == stat.st_size \
+                    and (not parse or entry['data'] is not None):
+                self.hits += 1
+                self._entries.move_to_end(path)
+                return entry
+
+        with open(path, 'rb') as config_file:
+            content = config_file.read()
+        digest = sha256(content).hexdigest()
+
+        with self._lock:
+            if entry and entry['sha256'] == digest:
+                # File was touched but content is the same
+                self.hits += 1
+            else:
+                self.misses += 1
+                entry = {
+                    'sha256': digest,
+                    'data': None,
+                    'derived': {}
+                }
+            if parse and entry['data'] is None:
+                entry['data'] = json.loads(content)
+            entry['mtime'] = stat.st_mtime_ns
+            entry['size'] = stat.st_size
+
+            if self.max_entries > 0:
+                self._entries[path] = entry
+                self._entries.move_to_end(path)
+                while len(self._entries) > self.max_entries:
+                    evicted, _ = self._entries.popitem(last=False)
+                    logger.trace(f"Evicted platform config {evicted} from cache")
+            return entry
+
+    # ==========================================================================
+    @staticmethod
+    def _copy_config(data):
+        """Copy parsed config data. The libs list can hold thousands of entries,
+        so only the entries themselves are copied. Matching code replaces the
+        lists inside an entry instead of modifying them.
+        """
+        if not isinstance(data, dict):
+            return copy.deepcopy(data)
+
+        config = {}
+        for key, value in data.items():
+            if key == 'libs' and isinstance(value, list):
+                config[key] = [dict(lib) for lib in value]
+            elif key == 'libs' and isinstance(value, LibsTable):
+                config[key] = value.to_list()
+            else:
+                config[key] = copy.deepcopy(value)
+        return config
@@ -16,16 +16,76 @@
 # limitations under the License.
 
 import os
+import mmap
+import struct
 from loguru import logger
-from bundlegen.core.utils import Utils
+from bundlegen.core.elf_cache import ElfInfoCache
+
 
 class ReadElf:
+    """Reads the dynamic linking info of ELF shared libraries in-process,
+    supporting 32 and 64 bit files of either endianness
+    """
+    ELF_MAGIC = b'\x7fELF'
+    ELFCLASS32 = 1
+    ELFCLASS64 = 2
+    ELFDATA2LSB = 1
+    ELFDATA2MSB = 2
+
+    SHT_DYNAMIC = 6
+    SHT_DYNSYM = 11
+    SHT_GNU_VERDEF = 0x6ffffffd
+    SHT_GNU_VERNEED = 0x6ffffffe
+    SHT_GNU_VERSYM = 0x6fffffff
+    PT_LOAD = 1
+    PT_DYNAMIC = 2
+    PT_INTERP = 3
+
+    DT_NULL = 0
+    DT_NEEDED = 1
+    DT_STRTAB = 5
+    DT_SONAME = 14
+    DT_RUNPATH = 29
+    DT_VERDEF = 0x6ffffffc
+    DT_VERDEFNUM = 0x6ffffffd
+
+    VER_FLG_BASE = 0x1
+    VERSYM_HIDDEN = 0x8000
+    VER_NDX_GLOBAL = 1
+
+    SHN_UNDEF = 0
+    STB_GLOBAL = 1
+    STB_WEAK = 2
+    STT_SECTION = 3
+    STT_FILE = 4
+
+    # Struct formats without byte order, see elf.h
+    FORMATS = {
+        ELFCLASS32: {
+            'ehdr': 'HHIIIIIHHHHHH',
+            'shdr': 'IIIIIIIIII',
+            'phdr': 'IIIIIIII',
+            'dyn': 'iI',
+            'sym': 'IIIBBH'
+        },
+        ELFCLASS64: {
+            'ehdr': 'HHIQQQIHHHHHH',
+            'shdr': 'IIQQQQIIQQ',
+            'phdr': 'IIQQQQQQ',
+            'dyn': 'qQ',
+            'sym': 'IBBHQQ'
+        }
+    }
+    VERDEF = 'HHHHIII'
+    VERDAUX = 'II'
+    VERNEED = 'HHIII'
+    VERNAUX = 'IHHII'
 
     # ==========================================================================
     @staticmethod
     def retrieve_apiversions(libfullpath):
-        """Retrieve version definitions from .so library
-           using readelf binary
+        """Retrieve version definitions from .so library. Results are cached
+           by library content, see ElfInfoCache
 
         Args:
             libfullpath (string): fullpath to .so library
@@ -33,25 +93,311 @@ class ReadElf:
         Returns:
             array[String]: version definitions
         """
-        if not os.path.exists(libfullpath):
+        elf_info = ElfInfoCache.get_instance().get(libfullpath, ReadElf.read_dynamic_info)
+        if not elf_info:
             return []
+        return elf_info['apiversions']
+
+    # ==========================================================================
+    @staticmethod
+    def read_dynamic_info(libfullpath):
+        """Read the version definitions (.gnu.version_d, except for the base
+           definition), the DT_NEEDED, DT_SONAME and DT_RUNPATH entries and the
+           program interpreter (PT_INTERP) of a library or executable
+
+        Args:
+            libfullpath (string): fullpath to .so library
+
+        Returns:
+            dict: {'apiversions': [...], 'needed': [...], 'soname': string or None,
+                   'runpath': string or None, 'interp': string or None}
+                  or None if the file is not a readable ELF file
+        """
+        if not os.path.isfile(libfullpath):
+            return None
+
+        try:
+            with open(libfullpath, 'rb') as elf_file:
+                if elf_file.read(4) != ReadElf.ELF_MAGIC:
+                    return None
+                with mmap.mmap(elf_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    return ReadElf._parse(buffer)
+        except (OSError, ValueError, IndexError, struct.error) as err:
+            logger.warning(f"Failed to read ELF file {libfullpath}: {err}")
+            return None
+
+    # ==========================================================================
+    @staticmethod
+    def parse_dynamic_info(data, name=None):
+        """Same as read_dynamic_info() for the content of a file already in
+           memory, e.g. read from an image layer tar
+
+        Args:
+            data (bytes): content of the file
+            name (string, optional): filename, only used for logging
+
+        Returns:
+            dict: {'apiversions': [...], 'needed': [...], 'soname': string or None,
+                   'runpath': string or None, 'interp': string or None}
+                  or None if the data is not a readable ELF file
+        """
+        if data[:4] != ReadElf.ELF_MAGIC:
+            return None
+
+        try:
+            return ReadElf._parse(data)
+        except (ValueError, IndexError, struct.error) as err:
+            logger.warning(f"Failed to read ELF file {name}: {err}")
+            return None
+
+    # ==========================================================================
+    @staticmethod
+    def _get_formats(buffer):
+        """Returns the ELF class and the struct formats for the file, see FORMATS
+        """
+        elf_class = buffer[4]
+        byte_order = {ReadElf.ELFDATA2LSB: '<', ReadElf.ELFDATA2MSB: '>'}.get(buffer[5])
+        if elf_class not in ReadElf.FORMATS or not byte_order:
+            raise ValueError(f"unsupported ELF class {elf_class} / data encoding {buffer[5]}")
+
+        formats = {name: struct.Struct(byte_order + fmt) for name, fmt in ReadElf.FORMATS[elf_class].items()}
+        for name in ['VERDEF', 'VERDAUX', 'VERNEED', 'VERNAUX']:
+            formats[name.lower()] = struct.Struct(byte_order + getattr(ReadElf, name))
+        formats['versym'] = struct.Struct(byte_order + 'H')
+        return elf_class, formats
+
+    # ==========================================================================
+    @staticmethod
+    def _get_sections(buffer, formats, e_shoff, e_shentsize, e_shnum):
+        """Returns (sh_type, sh_offset, sh_size, sh_link, sh_info) of every section
+        """
+        sections = []
+        if e_shoff:
+            if e_shnum == 0:
+                # Extended section numbering, real count is in sh_size of section 0
+                e_shnum = formats['shdr'].unpack_from(buffer, e_shoff)[5]
+            for i in range(e_shnum):
+                (_, sh_type, _, _, sh_offset, sh_size, sh_link, sh_info,
+                 _, _) = formats['shdr'].unpack_from(buffer, e_shoff + i * e_shentsize)
+                sections.append((sh_type, sh_offset, sh_size, sh_link, sh_info))
+        return sections
+
+    # ==========================================================================
+    @staticmethod
+    def _parse(buffer):
+        elf_class, formats = ReadElf._get_formats(buffer)
+        verdef = formats['verdef']
+        verdaux = formats['verdaux']
+
+        (_, _, _, _, e_phoff, e_shoff, _, _, e_phentsize, e_phnum,
+         e_shentsize, e_shnum, _) = formats['ehdr'].unpack_from(buffer, 16)
+        sections = ReadElf._get_sections(buffer, formats, e_shoff, e_shentsize, e_shnum)
+
+        # Locate the dynamic and version definition tables and their string
+        # tables, from the section headers like readelf does or from the
+        # dynamic segment for files without section headers
+        dynamic = None
+        verdefs = None
+        for sh_type, sh_offset, sh_size, sh_link, sh_info in sections:
+            if sh_type == ReadElf.SHT_DYNAMIC and sh_link < len(sections):
+                dynamic = (sh_offset, sh_size, sections[sh_link][1])
+            elif sh_type == ReadElf.SHT_GNU_VERDEF and sh_link < len(sections):
+                verdefs = (sh_offset, sh_info, sections[sh_link][1])
+
+        segments = []
+        for i in range(e_phnum if e_phoff else 0):
+            fields = formats['phdr'].unpack_from(buffer, e_phoff + i * e_phentsize)
+            if elf_class == ReadElf.ELFCLASS32:
+                p_type, p_offset, p_vaddr, _, p_filesz, _, _, _ = fields
+            else:
+                p_type, _, p_offset, p_vaddr, _, p_filesz, _, _ = fields
+            segments.append((p_type, p_offset, p_vaddr, p_filesz))
+
+        dyn_entries = []
+        if dynamic:
+            dyn_entries = ReadElf._read_dynamic(buffer, formats['dyn'], dynamic[0], dynamic[1])
+        elif not sections:
+            loads = []
+            for p_type, p_offset, p_vaddr, p_filesz in segments:
+                if p_type == ReadElf.PT_LOAD:
+                    loads.append((p_vaddr, p_offset, p_filesz))
+                elif p_type == ReadElf.PT_DYNAMIC:
+                    dyn_entries = ReadElf._read_dynamic(buffer, formats['dyn'], p_offset, p_filesz)
+
+            def vaddr_to_offset(vaddr):
+                for p_vaddr, p_offset, p_filesz in loads:
+                    if p_vaddr <= vaddr < p_vaddr + p_filesz:
+                        return vaddr - p_vaddr + p_offset
+                raise ValueError(f"address {vaddr:#x} not in a loaded segment")
+
+            tags = dict(dyn_entries)
+            if ReadElf.DT_STRTAB in tags:
+                dynamic = (None, None, vaddr_to_offset(tags[ReadElf.DT_STRTAB]))
+                if ReadElf.DT_VERDEF in tags:
+                    verdefs = (vaddr_to_offset(tags[ReadElf.DT_VERDEF]), tags.get(ReadElf.DT_VERDEFNUM, 0), dynamic[2])
+
+        elf_info = {
+            'apiversions': [],
+            'needed': [],
+            'soname': None,
+            'runpath': None,
+            'interp': None
+        }
+
+        for p_type, p_offset, _, _ in segments:
+            if p_type == ReadElf.PT_INTERP:
+                elf_info['interp'] = ReadElf._string(buffer, p_offset)
+
+        if dynamic:
+            for d_tag, d_val in dyn_entries:
+                if d_tag == ReadElf.DT_NEEDED:
+                    elf_info['needed'].append(ReadElf._string(buffer, dynamic[2] + d_val))
+                elif d_tag == ReadElf.DT_SONAME:
+                    elf_info['soname'] = ReadElf._string(buffer, dynamic[2] + d_val)
+                elif d_tag == ReadElf.DT_RUNPATH:
+                    elf_info['runpath'] = ReadElf._string(buffer, dynamic[2] + d_val)
+
+        if verdefs:
+            offset, count, strtab = verdefs
+            for _ in range(count):
+                _, vd_flags, _, vd_cnt, _, vd_aux, vd_next = verdef.unpack_from(buffer, offset)
+                # First aux entry holds the name of the version itself, the
+                # others its parents. The base definition is the soname.
+                if vd_cnt and not vd_flags & ReadElf.VER_FLG_BASE:
+                    vda_name, _ = verdaux.unpack_from(buffer, offset + vd_aux)
+                    elf_info['apiversions'].append(ReadElf._string(buffer, strtab + vda_name))
+                if not vd_next:
+                    break
+                offset += vd_next
+
+        return elf_info
+
+    # ==========================================================================
+    @staticmethod
+    def read_symbols(libfullpath):
+        """Read the dynamic symbol table of an ELF file, with the symbol versions
+
+        Args:
+            libfullpath (string): fullpath to the ELF file
 
-        apiversions = []
-        command = f"readelf -V {libfullpath}"
-        ## logger.debug(f"Executing command: {command}")
-        success, output = Utils.run_process_and_return_output(command)
-        if success == 0:
-            ## parses something like below to get out 'GLIBC_2.6' :
-            ## 0x005c: Rev: 1  Flags: none  Index: 4  Cnt: 2  Name: GLIBC_2.6
-            in_version_definition_section = False
-            for line in output.splitlines():
-                if (in_version_definition_section):
-                    if ("Version needs section" in line):
-                        in_version_definition_section = False
-                    TAG = "Name: "
-                    idx = line.find(TAG)
-                    if (line.startswith("  0x") and (idx > 0)):
-                        apiversions.append(line[idx+len(TAG):])
-                elif ("Version definition section" in line):
-                    in_version_definition_section = True
-        return apiversions
+        Returns:
+            dict: {'defined': [...], 'undefined': [[name, version, file], ...]}
+                  or None if the file is not a readable ELF file.
+                  Defined symbols are listed as 'name@version' for versioned
+                  symbols, plus 'name' if it is the default version.
+                  Undefined symbols have version and file None if unversioned,
+                  weak undefined symbols are not listed.
+        """
+        if not os.path.isfile(libfullpath):
+            return None
+
+        try:
+            with open(libfullpath, 'rb') as elf_file:
+                if elf_file.read(4) != ReadElf.ELF_MAGIC:
+                    return None
+                with mmap.mmap(elf_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    return ReadElf._parse_symbols(buffer)
+        except (OSError, ValueError, IndexError, struct.error) as err:
+            logger.warning(f"Failed to read symbols of ELF file {libfullpath}: {err}")
+            return None
+
+    # ==========================================================================
+    @staticmethod
+    def _parse_symbols(buffer):
+        elf_class, formats = ReadElf._get_formats(buffer)
+        (_, _, _, _, _, e_shoff, _, _, _, _,
+         e_shentsize, e_shnum, _) = formats['ehdr'].unpack_from(buffer, 16)
+        sections = ReadElf._get_sections(buffer, formats, e_shoff, e_shentsize, e_shnum)
+
+        dynsym = None
+        versym = None
+        versions = {}
+        for sh_type, sh_offset, sh_size, sh_link, sh_info in sections:
+            if sh_link >= len(sections):
+                continue
+            strtab = sections[sh_link][1]
+            if sh_type == ReadElf.SHT_DYNSYM:
+                dynsym = (sh_offset, sh_size, strtab)
+            elif sh_type == ReadElf.SHT_GNU_VERSYM:
+                versym = sh_offset
+            elif sh_type == ReadElf.SHT_GNU_VERDEF:
+                offset = sh_offset
+                for _ in range(sh_info):
+                    _, _, vd_ndx, vd_cnt, _, vd_aux, vd_next = formats['verdef'].unpack_from(buffer, offset)
+                    if vd_cnt:
+                        vda_name, _ = formats['verdaux'].unpack_from(buffer, offset + vd_aux)
+                        versions[vd_ndx] = (ReadElf._string(buffer, strtab + vda_name), None)
+                    if not vd_next:
+                        break
+                    offset += vd_next
+            elif sh_type == ReadElf.SHT_GNU_VERNEED:
+                offset = sh_offset
+                for _ in range(sh_info):
+                    _, vn_cnt, vn_file, vn_aux, vn_next = formats['verneed'].unpack_from(buffer, offset)
+                    file = ReadElf._string(buffer, strtab + vn_file)
+                    aux_offset = offset + vn_aux
+                    for _ in range(vn_cnt):
+                        _, _, vna_other, vna_name, vna_next = formats['vernaux'].unpack_from(buffer, aux_offset)
+                        versions[vna_other] = (ReadElf._string(buffer, strtab + vna_name), file)
+                        if not vna_next:
+                            break
+                        aux_offset += vna_next
+                    if not vn_next:
+                        break
+                    offset += vn_next
+
+        symbols = {'defined': [], 'undefined': []}
+        if not dynsym:
+            return symbols
+
+        sym = formats['sym']
+        offset, size, strtab = dynsym
+        defined = set()
+        # Entry 0 is always the undefined null symbol
+        for i in range(1, size // sym.size):
+            fields = sym.unpack_from(buffer, offset + i * sym.size)
+            if elf_class == ReadElf.ELFCLASS32:
+                st_name, _, _, st_info, _, st_shndx = fields
+            else:
+                st_name, st_info, _, st_shndx, _, _ = fields
+            bind = st_info >> 4
+            sym_type = st_info & 0xf
+
+            version_index = ReadElf.VER_NDX_GLOBAL
+            hidden = False
+            if versym is not None:
+                version_index, = formats['versym'].unpack_from(buffer, versym + i * 2)
+                hidden = bool(version_index & ReadElf.VERSYM_HIDDEN)
+                version_index &= ~ReadElf.VERSYM_HIDDEN
+            version, file = versions.get(version_index, (None, None)) if version_index > ReadElf.VER_NDX_GLOBAL else (None, None)
+            name = ReadElf._string(buffer, strtab + st_name)
+
+            if st_shndx == ReadElf.SHN_UNDEF:
+                if bind != ReadElf.STB_WEAK:
+                    symbols['undefined'].append([name, version, file])
+            elif bind in (ReadElf.STB_GLOBAL, ReadElf.STB_WEAK) and sym_type not in (ReadElf.STT_SECTION, ReadElf.STT_FILE):
+                if version:
+                    defined.add(f"{name}@{version}")
+                if not hidden:
+                    defined.add(name)
+        symbols['defined'] = sorted(defined)
+        return symbols
+
+    # ==========================================================================
+    @staticmethod
+    def _read_dynamic(buffer, dyn, offset, size):
+        entries = []
+        for entry_offset in range(offset, offset + size, dyn.size):
+            d_tag, d_val = dyn.unpack_from(buffer, entry_offset)
+            if d_tag == ReadElf.DT_NULL:
+                break
+            entries.append((d_tag, d_val))
+        return entries
+
+    # ==========================================================================
+    @staticmethod
+    def _string(buffer, offset):
+        end = buffer.find(b'\0', offset)
+        if end < 0:
+            raise ValueError(f"unterminated string at {offset:#x}")
+        return buffer[offset:end].decode('utf-8', errors='replace')
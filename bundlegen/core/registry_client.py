@@ -0,0 +1,678 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Consult Red
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+import json
+import time
+import fcntl
+import base64
+import hashlib
+import threading
+import http.client
+from urllib.parse import urlsplit, urljoin, urlencode
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from loguru import logger
+from bundlegen.core.image_reference import ImageReference
+
+OCI_MANIFEST = 'application/vnd.oci.image.manifest.v1+json'
+OCI_INDEX = 'application/vnd.oci.image.index.v1+json'
+OCI_CONFIG = 'application/vnd.oci.image.config.v1+json'
+DOCKER_MANIFEST = 'application/vnd.docker.distribution.manifest.v2+json'
+DOCKER_MANIFEST_LIST = 'application/vnd.docker.distribution.manifest.list.v2+json'
+
+# Media types of Docker schema 2 images and their OCI equivalent, as
+# converted by skopeo when copying to an OCI layout
+DOCKER_TO_OCI = {
+    DOCKER_MANIFEST: OCI_MANIFEST,
+    DOCKER_MANIFEST_LIST: OCI_INDEX,
+    'application/vnd.docker.container.image.v1+json': OCI_CONFIG,
+    'application/vnd.docker.image.rootfs.diff.tar.gzip': 'application/vnd.oci.image.layer.v1.tar+gzip',
+    'application/vnd.docker.image.rootfs.foreign.diff.tar.gzip': 'application/vnd.oci.image.layer.nondistributable.v1.tar+gzip'
+}
+
+
+class RegistryError(Exception):
+    """Raised when an image cannot be fetched from a registry
+    """
+
+
+class TransientRegistryError(RegistryError):
+    """Raised when the registry fails in a way worth retrying (5xx, 429)
+    """
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections, shared by all downloads of the process
+
+    Connections are kept per (scheme, host) and handed to one request at a
+    time, so concurrent downloads use one connection each. Idle connections
+    are reused by the next request to the same host, saving the TCP and TLS
+    setup.
+    """
+    TIMEOUT = 60
+
+    def __init__(self, max_idle=16):
+        self.max_idle = max_idle
+        self.opened = 0
+        self.reused = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    # ==========================================================================
+    @contextmanager
+    def request(self, method, url, headers=None):
+        """Send a request, reusing an idle connection to the host if there
+        is one. The response must be read completely to return the
+        connection to the pool
+
+        Args:
+            method (string): HTTP method
+            url (string): absolute URL
+            headers (dict): request headers
+
+        Yields:
+            http.client.HTTPResponse: the response
+        """
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path + (f"?{parts.query}" if parts.query else '')
+
+        for attempt in range(2):
+            conn, reused = self._acquire(key)
+            try:
+                conn.request(method, path, headers=headers or {})
+                response = conn.getresponse()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                # An idle connection may have been closed by the server
+                if not reused or attempt:
+                    raise
+            except BaseException:
+                conn.close()
+                raise
+
+        try:
+            yield response
+        except BaseException:
+            conn.close()
+            raise
+        if response.isclosed() and not response.will_close:
+            self._release(key, conn)
+        else:
+            conn.close()
+
+    # ==========================================================================
+    def _acquire(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self.reused += 1
+                return idle.pop(), True
+            self.opened += 1
+
+        scheme, netloc = key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(netloc, timeout=self.TIMEOUT), False
+        return http.client.HTTPConnection(netloc, timeout=self.TIMEOUT), False
+
+    # ==========================================================================
+    def _release(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(conn)
+                return
+        conn.close()
+
+    # ==========================================================================
+    def close(self):
+        """Close all idle connections
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+class RegistryClient:
+    """Client of the OCI distribution API, used by ImageDownloader as an
+    alternative to skopeo
+
+    Pulls the image manifest for a platform and its blobs into an OCI image
+    layout, as `skopeo --override-os/arch/variant copy docker://... oci:...`
+    does: manifest lists are resolved to the platform, Docker schema 2 media
+    types are converted to their OCI equivalent and every blob is verified
+    against its digest. The config and layers are downloaded in parallel over
+    the keep-alive connections of a pool shared by the process, and bearer
+    tokens are reused until they expire.
+
+    Blobs are downloaded into <hex>.partial next to where the blob goes, so
+    a download interrupted by a network error continues from the size of
+    the partial file with an HTTP range request, both when retried by the
+    client and when a later build (e.g. a requeued request) downloads the
+    same blob into the same blob store.
+    """
+    DOCKER_HUB = ImageReference.DOCKER_HUB
+    DOCKER_HUB_ENDPOINT = 'registry-1.docker.io'
+    DEFAULT_JOBS = 6
+    CHUNK_SIZE = 1024 * 1024
+    MAX_REDIRECTS = 5
+    PARTIAL_SUFFIX = '.partial'
+    # Attempts per blob after the first one, and the delay before the first
+    # retry, doubled for every further one
+    RETRIES = 4
+    RETRY_DELAY = 0.5
+    ACCEPT = ', '.join([OCI_MANIFEST, OCI_INDEX, DOCKER_MANIFEST, DOCKER_MANIFEST_LIST])
+    DIGEST_RE = re.compile(r"^sha256:([0-9a-f]{64})$")
+    AUTH_PARAM_RE = re.compile(r'(\w+)="([^"]*)"')
+
+    _pool = ConnectionPool()
+    # (registry, hash of the credentials, scope) -> (Authorization header, expiry)
+    # Expired tokens are dropped, at most MAX_TOKENS are kept
+    MAX_TOKENS = 256
+    _tokens = {}
+    _tokens_lock = threading.Lock()
+
+    def __init__(self, registry, creds=None, insecure=None, jobs=None):
+        self.registry = registry
+        self.creds = creds
+        if insecure is None:
+            insecure = registry in self.get_insecure_registries()
+        self.base_url = f"{'http' if insecure else 'https'}://{self._endpoint(registry)}"
+        self.jobs = jobs or self.DEFAULT_JOBS
+        self.stats = {'blobs_downloaded': 0, 'blobs_skipped': 0, 'bytes_downloaded': 0, 'bytes_resumed': 0, 'retries': 0}
+        self._stats_lock = threading.Lock()
+
+    # ==========================================================================
+    @staticmethod
+    def get_insecure_registries():
+        """Registries accessed over plain http, as a comma separated list of
+        host[:port] in BUNDLEGEN_INSECURE_REGISTRIES
+
+        Returns:
+            set: registries
+        """
+        value = os.environ.get('BUNDLEGEN_INSECURE_REGISTRIES', '')
+        return set(registry.strip() for registry in value.split(',') if registry.strip())
+
+    # ==========================================================================
+    @classmethod
+    def get_pool(cls):
+        """Returns the connection pool shared by all clients of the process
+        """
+        return cls._pool
+
+    # ==========================================================================
+    @staticmethod
+    def parse_url(url):
+        """Split a docker:// image URL into registry, repository and reference,
+        see ImageReference
+
+        Args:
+            url (string): e.g. docker://hello-world, docker://localhost:5000/app:1.0
+
+        Returns:
+            tuple: (registry, repository, digest if pinned, otherwise tag),
+                   None if the URL is not a valid docker:// URL
+        """
+        ref = ImageReference.parse(url)
+        if not ref or ref.transport != 'docker':
+            return None
+        return (ref.registry, ref.repository, ref.reference)
+
+    # ==========================================================================
+    @staticmethod
+    def select_manifest(manifests, platform):
+        """Select the manifest of a platform from a manifest list, preferring
+        the exact variant, then older compatible variants, like skopeo
+
+        Args:
+            manifests (list): descriptors of a manifest list or image index
+            platform (dict): os, arch and variant (None if not set)
+
+        Returns:
+            dict: descriptor or None if no manifest matches
+        """
+        arch = platform['arch']
+        variant = platform.get('variant') or ''
+        variants = [variant]
+        if arch == 'arm':
+            arm_variants = ['v8', 'v7', 'v6', 'v5']
+            if variant in arm_variants:
+                variants = arm_variants[arm_variants.index(variant):]
+        elif arch == 'arm64':
+            variants = [variant or 'v8']
+        variants.append('')
+
+        for wanted in variants:
+            for desc in manifests:
+                desc_platform = desc.get('platform', {})
+                if desc_platform.get('os') == platform['os'] and \
+                        desc_platform.get('architecture') == arch and \
+                        desc_platform.get('variant', '') == wanted:
+                    return desc
+        return None
+
+    # ==========================================================================
+    def resolve(self, repository, reference, platform):
+        """Fetch the image manifest of a platform
+
+        Args:
+            repository (string): e.g. library/hello-world
+            reference (string): tag or digest
+            platform (dict): os, arch and variant
+
+        Returns:
+            tuple: (media type, manifest bytes, digest) of the image manifest
+        """
+        media_type, raw, digest = self.get_manifest(repository, reference)
+        if media_type in (OCI_INDEX, DOCKER_MANIFEST_LIST):
+            desc = self.select_manifest(json.loads(raw).get('manifests', []), platform)
+            if not desc:
+                raise RegistryError(f"No manifest of {repository}:{reference} for {platform}")
+            media_type, raw, digest = self.get_manifest(repository, desc['digest'])
+
+        if media_type not in (OCI_MANIFEST, DOCKER_MANIFEST):
+            raise RegistryError(f"Unsupported manifest type {media_type} of {repository}:{reference}")
+        return (media_type, raw, digest)
+
+    # ==========================================================================
+    def get_manifest_digest(self, repository, reference):
+        """Returns the digest of the manifest (list) a tag points to, without
+        fetching it (HEAD request, not counted against pull rate limits)
+
+        Returns:
+            string: digest or None if the registry does not send it
+        """
+        url = f"{self.base_url}/v2/{repository}/manifests/{reference}"
+        with self._request('HEAD', url, repository, {'Accept': self.ACCEPT}) as response:
+            response.read()
+            digest = response.getheader('Docker-Content-Digest', '').strip()
+        return digest if self.DIGEST_RE.match(digest) else None
+
+    # ==========================================================================
+    def get_manifest(self, repository, reference):
+        """Fetch a manifest or manifest list
+
+        Returns:
+            tuple: (media type, manifest bytes, digest)
+        """
+        url = f"{self.base_url}/v2/{repository}/manifests/{reference}"
+        with self._request('GET', url, repository, {'Accept': self.ACCEPT}) as response:
+            raw = response.read()
+            media_type = response.getheader('Content-Type', '').split(';')[0].strip()
+
+        if not media_type or media_type == 'application/json':
+            media_type = json.loads(raw).get('mediaType', '')
+        digest = f"sha256:{hashlib.sha256(raw).hexdigest()}"
+        if self.DIGEST_RE.match(reference) and reference != digest:
+            raise RegistryError(f"Manifest {reference} of {repository} has digest {digest}")
+        return (media_type, raw, digest)
+
+    # ==========================================================================
+    def pull(self, repository, reference, platform, layout_path, tag, blob_dir=None):
+        """Download an image for a platform into an OCI image layout
+
+        Args:
+            repository (string): e.g. library/hello-world
+            reference (string): tag or digest
+            platform (dict): os, arch and variant
+            layout_path (string): Directory of the layout
+            tag (string): Name of the image in the layout (index.json)
+            blob_dir (string): Where to store the blobs instead of the blobs
+                               directory of the layout, e.g. a BlobStore
+
+        Returns:
+            string: digest of the manifest in the layout
+        """
+        media_type, raw, _ = self.resolve(repository, reference, platform)
+        manifest = json.loads(raw)
+        blob_dir = blob_dir or os.path.join(layout_path, 'blobs')
+
+        descriptors = [manifest['config']] + manifest.get('layers', [])
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            list(executor.map(lambda desc: self.fetch_blob(repository, desc, blob_dir), descriptors))
+
+        digest = self.write_layout(layout_path, blob_dir, media_type, raw, tag)
+
+        logger.debug(f"Pulled {repository}:{reference}: {self.stats}, "
+                     f"connections opened {self._pool.opened}, reused {self._pool.reused}")
+        return digest
+
+    # ==========================================================================
+    def fetch_blob(self, repository, desc, blob_dir):
+        """Download a blob into blob_dir/<algorithm>/<hex>, unless it is
+        already there. The content is verified against the digest.
+
+        The download goes to <hex>.partial first, locked so processes sharing
+        the blob directory download a blob only once. Data already in the
+        partial file, from an earlier attempt, is not downloaded again.
+
+        Args:
+            repository (string): e.g. library/hello-world
+            desc (dict): descriptor of the blob
+            blob_dir (string): Where to store the blob
+        """
+        digest = desc['digest']
+        m = self.DIGEST_RE.match(digest)
+        if not m:
+            raise RegistryError(f"Unsupported digest {digest}")
+        path = os.path.join(blob_dir, 'sha256', m.group(1))
+        if self._is_complete(path, desc):
+            with self._stats_lock:
+                self.stats['blobs_skipped'] += 1
+            return
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial_path = f"{path}{self.PARTIAL_SUFFIX}"
+        with self._lock_partial(partial_path) as partial:
+            try:
+                # Another process may have finished the blob while we waited
+                if self._is_complete(path, desc):
+                    self._remove(partial_path)
+                    with self._stats_lock:
+                        self.stats['blobs_skipped'] += 1
+                    return
+
+                hasher, size, resumed = self._download_partial(repository, desc, partial)
+                if f"sha256:{hasher.hexdigest()}" != digest or size != desc.get('size', size):
+                    # Nothing worth resuming from
+                    partial.truncate(0)
+                    self._remove(partial_path)
+                    raise RegistryError(f"Blob {digest} of {repository} does not match its digest")
+                os.replace(partial_path, path)
+            finally:
+                fcntl.flock(partial, fcntl.LOCK_UN)
+
+        with self._stats_lock:
+            self.stats['blobs_downloaded'] += 1
+            self.stats['bytes_downloaded'] += size - resumed
+            self.stats['bytes_resumed'] += resumed
+
+    # ==========================================================================
+    def _download_partial(self, repository, desc, partial):
+        """Download the rest of a blob into its locked partial file, retrying
+        with range requests after transient errors
+
+        Returns:
+            tuple: (sha256 hasher of the content, size, bytes that were
+                    already in the partial file)
+        """
+        digest = desc['digest']
+        url = f"{self.base_url}/v2/{repository}/blobs/{digest}"
+
+        hasher = hashlib.sha256()
+        partial.seek(0)
+        for chunk in iter(lambda: partial.read(self.CHUNK_SIZE), b''):
+            hasher.update(chunk)
+        offset = partial.tell()
+        if offset > desc.get('size', offset):
+            partial.truncate(0)
+            hasher = hashlib.sha256()
+            offset = 0
+        resumed = offset
+        if offset:
+            logger.debug(f"Resuming download of {digest} at {offset} bytes")
+
+        attempt = 0
+        while offset != desc.get('size'):
+            headers = {'Range': f"bytes={offset}-"} if offset else {}
+            try:
+                with self._request('GET', url, repository, headers) as response:
+                    if offset and response.status != 206:
+                        # Range not supported, start again
+                        partial.truncate(0)
+                        hasher = hashlib.sha256()
+                        offset = resumed = 0
+                    for chunk in iter(lambda: response.read1(self.CHUNK_SIZE), b''):
+                        partial.write(chunk)
+                        hasher.update(chunk)
+                        offset += len(chunk)
+                    if response.length:
+                        raise http.client.IncompleteRead(b'', response.length)
+                partial.flush()
+                break
+            except (OSError, http.client.HTTPException, TransientRegistryError) as err:
+                partial.flush()
+                if attempt >= self.RETRIES:
+                    raise RegistryError(f"Download of {digest} failed at {offset} bytes: {err!r}")
+                delay = self.RETRY_DELAY * 2 ** attempt
+                attempt += 1
+                with self._stats_lock:
+                    self.stats['retries'] += 1
+                logger.debug(f"Download of {digest} interrupted at {offset} bytes ({err!r}), "
+                             f"retrying in {delay}s")
+                time.sleep(delay)
+        return (hasher, offset, resumed)
+
+    # ==========================================================================
+    @staticmethod
+    def _lock_partial(partial_path):
+        """Open and exclusively lock the partial file of a blob. The file
+        may be renamed or removed by the process holding the lock, then the
+        current one is opened again
+
+        Returns:
+            file: the locked file, opened for appending
+        """
+        while True:
+            partial = open(partial_path, 'a+b')
+            fcntl.flock(partial, fcntl.LOCK_EX)
+            try:
+                if os.stat(partial_path).st_ino == os.fstat(partial.fileno()).st_ino:
+                    return partial
+            except FileNotFoundError:
+                pass
+            partial.close()
+
+    # ==========================================================================
+    @staticmethod
+    def _is_complete(path, desc):
+        try:
+            return os.path.getsize(path) == desc.get('size', -1)
+        except OSError:
+            return False
+
+    # ==========================================================================
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    # ==========================================================================
+    @contextmanager
+    def _request(self, method, url, repository, headers=None):
+        """Send a request to the registry, authenticating and following
+        redirects (blobs are often served by another host)
+
+        Yields:
+            http.client.HTTPResponse: the successful response
+        """
+        headers = dict(headers or {})
+        authorization = self._get_token(repository)
+        authenticated = False
+        for _ in range(self.MAX_REDIRECTS + 1):
+            request_headers = dict(headers)
+            # Credentials are only sent to the registry, not to redirect targets
+            if authorization and urlsplit(url)[:2] == urlsplit(self.base_url)[:2]:
+                request_headers['Authorization'] = authorization
+
+            with self._pool.request(method, url, request_headers) as response:
+                if response.status == 401 and not authenticated:
+                    challenge = response.getheader('WWW-Authenticate', '')
+                    response.read()
+                    authorization = self._authenticate(challenge, repository)
+                    authenticated = True
+                    continue
+                if response.status in (301, 302, 303, 307, 308):
+                    response.read()
+                    url = urljoin(url, response.getheader('Location'))
+                    continue
+                if response.status not in (200, 206):
+                    response.read()
+                    error = TransientRegistryError if response.status >= 500 or response.status == 429 else RegistryError
+                    raise error(f"{method} {url} failed: {response.status} {response.reason}")
+                yield response
+                return
+        raise RegistryError(f"{method} {url} failed: too many redirects or authentication failed")
+
+    # ==========================================================================
+    def _token_key(self, repository):
+        creds_hash = hashlib.sha256((self.creds or '').encode('utf-8')).hexdigest()
+        return (self.registry, creds_hash, f"repository:{repository}:pull")
+
+    # ==========================================================================
+    def _get_token(self, repository):
+        key = self._token_key(repository)
+        with self._tokens_lock:
+            token = self._tokens.get(key)
+            if token and token[1] <= time.monotonic():
+                del self._tokens[key]
+                token = None
+        return token[0] if token else None
+
+    # ==========================================================================
+    def _authenticate(self, challenge, repository):
+        """Answer the WWW-Authenticate challenge of the registry
+
+        Returns:
+            string: Authorization header value
+        """
+        scheme = challenge.split(' ', 1)[0].lower()
+        if scheme == 'basic':
+            if not self.creds:
+                raise RegistryError(f"Registry {self.registry} requires credentials")
+            authorization = f"Basic {base64.b64encode(self.creds.encode('utf-8')).decode('ascii')}"
+            expires_in = 24 * 60 * 60
+        elif scheme == 'bearer':
+            params = dict(self.AUTH_PARAM_RE.findall(challenge))
+            if 'realm' not in params:
+                raise RegistryError(f"Invalid authentication challenge from {self.registry}: {challenge}")
+            query = {'scope': f"repository:{repository}:pull"}
+            if params.get('service'):
+                query['service'] = params['service']
+            headers = {}
+            if self.creds:
+                headers['Authorization'] = f"Basic {base64.b64encode(self.creds.encode('utf-8')).decode('ascii')}"
+
+            with self._pool.request('GET', f"{params['realm']}?{urlencode(query)}", headers) as response:
+                body = response.read()
+                if response.status != 200:
+                    raise RegistryError(f"Cannot get a token from {params['realm']}: {response.status}")
+            token_info = json.loads(body)
+            token = token_info.get('token') or token_info.get('access_token')
+            if not token:
+                raise RegistryError(f"No token in the response of {params['realm']}")
+            authorization = f"Bearer {token}"
+            expires_in = token_info.get('expires_in', 60)
+        else:
+            raise RegistryError(f"Unsupported authentication {scheme} of {self.registry}")
+
+        key = self._token_key(repository)
+        now = time.monotonic()
+        with self._tokens_lock:
+            for expired in [k for k, token in self._tokens.items() if token[1] <= now]:
+                del self._tokens[expired]
+            # Oldest tokens first, drop them above the limit
+            self._tokens.pop(key, None)
+            while len(self._tokens) >= self.MAX_TOKENS:
+                del self._tokens[next(iter(self._tokens))]
+            # Expire tokens a bit early so they do not expire during a request
+            self._tokens[key] = (authorization, now + expires_in * 0.9)
+        return authorization
+
+    # ==========================================================================
+    @staticmethod
+    def to_oci_manifest(manifest):
+        """Convert a Docker schema 2 manifest to an OCI manifest, the blobs
+        are compatible
+        """
+        def convert(desc):
+            desc = dict(desc)
+            desc['mediaType'] = DOCKER_TO_OCI.get(desc.get('mediaType'), desc.get('mediaType'))
+            return desc
+
+        oci_manifest = {
+            'schemaVersion': 2,
+            'mediaType': OCI_MANIFEST,
+            'config': convert(manifest['config']),
+            'layers': [convert(layer) for layer in manifest.get('layers', [])]
+        }
+        if manifest.get('annotations'):
+            oci_manifest['annotations'] = manifest['annotations']
+        return oci_manifest
+
+    # ==========================================================================
+    @classmethod
+    def write_layout(cls, layout_path, blob_dir, media_type, raw, tag):
+        """Write the oci-layout and index.json of an image layout holding one
+        image, and its manifest blob. Docker schema 2 manifests are converted
+        to OCI
+
+        Args:
+            layout_path (string): Directory of the layout
+            blob_dir (string): Where the blobs of the image are
+            media_type (string): Media type of the image manifest
+            raw (bytes): Image manifest
+            tag (string): Name of the image in the layout
+
+        Returns:
+            string: digest of the manifest in the layout
+        """
+        if media_type == DOCKER_MANIFEST:
+            raw = json.dumps(cls.to_oci_manifest(json.loads(raw)), separators=(',', ':')).encode('utf-8')
+        digest = f"sha256:{hashlib.sha256(raw).hexdigest()}"
+        cls.write_blob(blob_dir, digest, raw)
+
+        os.makedirs(layout_path, exist_ok=True)
+        with open(os.path.join(layout_path, 'oci-layout'), 'w') as layout_file:
+            json.dump({'imageLayoutVersion': '1.0.0'}, layout_file)
+        index = {
+            'schemaVersion': 2,
+            'manifests': [{
+                'mediaType': OCI_MANIFEST,
+                'digest': digest,
+                'size': len(raw),
+                'annotations': {'org.opencontainers.image.ref.name': tag}
+            }]
+        }
+        with open(os.path.join(layout_path, 'index.json'), 'w') as index_file:
+            json.dump(index, index_file)
+        return digest
+
+    # ==========================================================================
+    @staticmethod
+    def write_blob(blob_dir, digest, data):
+        path = os.path.join(blob_dir, *digest.split(':', 1))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as blob_file:
+            blob_file.write(data)
+        os.replace(tmp_path, path)
+
+    # ==========================================================================
+    @staticmethod
+    def _endpoint(registry):
+        if registry == RegistryClient.DOCKER_HUB:
+            return RegistryClient.DOCKER_HUB_ENDPOINT
+        return registry
@@ -0,0 +1,227 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Consult Red
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import shutil
+import tarfile
+from hashlib import sha256
+from loguru import logger
+from bundlegen.core.sqlite_cache import SqliteCache
+
+
+class ResultCache(SqliteCache):
+    """Persistent cache of generated bundles
+
+    A bundle only depends on the image, the platform templates, the app
+    metadata and the generation options, so a build with the same inputs as
+    a previous one can reply with the bundle it produced without downloading
+    or unpacking anything. Entries are keyed by a hash of:
+
+        * the digest of the image manifest resolved for the platform
+        * the content hash of the platform templates
+        * the hash of the app metadata, if not embedded in the image
+        * the options changing the bundle (lib matching mode,
+          createmountpoints, crun, ...)
+        * the BundleGen version, including a hash of its sources
+
+    Only the path of the bundle is cached, the bundle itself stays where it was
+    generated (e.g. the bundle store of the web UI). A hit is only returned if
+    the file is still there with the same size and mtime. The database is in
+    the BundleGen cache directory, so the CLI, web UI and RabbitMQ workers of
+    a node share it. It is bounded to BUNDLEGEN_RESULT_CACHE_SIZE entries,
+    evicting the least recently used ones (the bundles are not deleted), see
+    SqliteCache.
+    """
+    DB_FILENAME = 'results.sqlite'
+    DEFAULT_SIZE = 10000
+    SIZE_ENV = 'BUNDLEGEN_RESULT_CACHE_SIZE'
+    NAME = 'Result cache'
+    TABLES = {
+        'results': ('key', "key TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL, "
+                           "mtime INTEGER NOT NULL, last_used INTEGER NOT NULL")
+    }
+    # Generation options that change the bundle, with the values used when
+    # a front end does not offer the option
+    OPTION_DEFAULTS = {
+        'appid': None,
+        'createmountpoints': False,
+        'crun': False,
+        'dedup_libs': False,
+        'ipk': False,
+        'ld_cache': False,
+        'libmatchingmode': 'normal',
+        'nodepwalking': False,
+        'prune_libs': 'off'
+    }
+
+    _version = None
+
+    # ==========================================================================
+    @classmethod
+    def get_version(cls):
+        """Returns the BundleGen version used in the keys: the package version
+        and a hash of the sources, so a changed BundleGen never gets the
+        bundles of another one
+
+        Returns:
+            string: version
+        """
+        if cls._version is None:
+            try:
+                from importlib.metadata import version, PackageNotFoundError
+                try:
+                    package_version = version('bundlegen')
+                except PackageNotFoundError:
+                    package_version = 'unknown'
+            except ImportError:
+                package_version = 'unknown'
+
+            package_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+            digest = sha256()
+            for root, dirs, files in os.walk(package_dir):
+                dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+                for name in sorted(files):
+                    if name.endswith(('.py', '.json')):
+                        path = os.path.join(root, name)
+                        digest.update(os.path.relpath(path, package_dir).encode('utf-8'))
+                        with open(path, 'rb') as source:
+                            digest.update(sha256(source.read()).digest())
+            cls._version = f"{package_version}+{digest.hexdigest()[:16]}"
+        return cls._version
+
+    # ==========================================================================
+    @classmethod
+    def make_key(cls, image_digest, platform_hash, app_metadata, **options):
+        """Returns the key of a bundle
+
+        Args:
+            image_digest (string): Digest of the image manifest for the platform
+            platform_hash (string): See STBPlatform.get_content_hash()
+            app_metadata (dict): App metadata, None if embedded in the image
+                                 (the image digest covers it then)
+            options: Generation options that change the bundle, see
+                     OPTION_DEFAULTS
+
+        Returns:
+            string: hex digest
+        """
+        metadata_hash = None
+        if app_metadata is not None:
+            metadata_hash = sha256(json.dumps(app_metadata, sort_keys=True).encode('utf-8')).hexdigest()
+
+        unknown = set(options) - set(cls.OPTION_DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown generation options {sorted(unknown)}")
+        all_options = dict(cls.OPTION_DEFAULTS)
+        all_options.update(options)
+
+        key = {
+            'image': image_digest,
+            'platform': platform_hash,
+            'appmetadata': metadata_hash,
+            'options': all_options,
+            'version': cls.get_version()
+        }
+        return sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+    # ==========================================================================
+    def get(self, key):
+        """Returns the bundle generated for a key
+
+        Args:
+            key (string): See make_key()
+
+        Returns:
+            string: path to the bundle or None if not cached or the bundle
+                    changed or is gone
+        """
+        if not self.db_path:
+            return None
+
+        row = self._lookup('results', key, 'path, size, mtime')
+        if row:
+            path, size, mtime = row
+            try:
+                stat = os.stat(path)
+                if stat.st_size == size and stat.st_mtime_ns == mtime:
+                    self.hits += 1
+                    return path
+            except OSError:
+                pass
+            logger.debug(f"Cached bundle {path} changed or was removed")
+            self._delete('results', key)
+
+        self.misses += 1
+        return None
+
+    # ==========================================================================
+    def put(self, key, path):
+        """Remember the bundle generated for a key
+
+        Args:
+            key (string): See make_key()
+            path (string): Path to the bundle, must not be modified afterwards
+        """
+        if not self.db_path:
+            return
+
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError as err:
+            logger.warning(f"Cannot cache bundle {path}: {err}")
+            return
+        self._store('results', key, path, stat.st_size, stat.st_mtime_ns)
+
+    # ==========================================================================
+    @staticmethod
+    def copy_bundle(path, dest):
+        """Copy a cached bundle to where a build wants its output. The
+        destination is replaced atomically
+
+        Args:
+            path (string): Cached bundle, see get()
+            dest (string): Output path of the build
+        """
+        dest = os.path.abspath(dest)
+        if dest == path:
+            return
+        tmp_path = f"{dest}.{os.getpid()}.tmp"
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, dest)
+
+    # ==========================================================================
+    @staticmethod
+    def extract_bundle(path, dest):
+        """Extract a cached bundle (.tar.gz or .ipk) into a directory, like
+        the bundle directory a build leaves next to its tarball
+
+        Args:
+            path (string): Cached bundle, see get()
+            dest (string): Directory to extract to, must not exist
+        """
+        # The bundles were created by BundleGen itself, rootfs symlinks may
+        # well be absolute
+        extract_args = {'filter': 'fully_trusted'} if hasattr(tarfile, 'fully_trusted_filter') else {}
+        os.makedirs(dest)
+        with tarfile.open(path) as tar:
+            if path.endswith('.ipk'):
+                with tarfile.open(fileobj=tar.extractfile('data.tar.gz')) as data:
+                    data.extractall(dest, **extract_args)
+            else:
+                tar.extractall(dest, **extract_args)
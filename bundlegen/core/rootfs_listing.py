@@ -0,0 +1,340 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Consult Red
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+import json
+import tarfile
+import posixpath
+from collections import deque
+from loguru import logger
+from bundlegen.core.readelf import ReadElf
+
+
+class RootfsListing:
+    """Listing of the files inside an OCI image rootfs, built from the tar
+    headers of the image layers without unpacking them
+
+    Layers are applied in order, including whiteouts, so the listing matches
+    the rootfs umoci will produce. Symlinks are resolved inside the rootfs.
+    Optionally the ELF info of the shared libraries is read from the layer
+    content while the layers are streamed.
+    """
+    DIRECTORY = 'dir'
+    FILE = 'file'
+    SYMLINK = 'symlink'
+
+    WHITEOUT_PREFIX = '.wh.'
+    OPAQUE_WHITEOUT = '.wh..wh..opq'
+    MAX_SYMLINKS = 40
+    SHARED_LIB_RE = re.compile(r"\.so(\.[0-9]+)*$")
+    REF_NAME_ANNOTATION = 'org.opencontainers.image.ref.name'
+
+    def __init__(self):
+        # path -> (kind, symlink target)
+        self.entries = {'/': (self.DIRECTORY, None)}
+        # path -> dynamic info, see ReadElf.read_dynamic_info()
+        self.elf_info = {}
+
+    # ==========================================================================
+    @classmethod
+    def from_oci_image(cls, image_path, tag, read_elf=False):
+        """Build the listing of an image in an OCI image layout directory, as
+        downloaded by ImageDownloader
+
+        Args:
+            image_path (string): Path to the OCI image layout
+            tag (string): Tag of the image inside the layout
+            read_elf (bool): Also read the ELF info of the shared libraries
+
+        Returns:
+            RootfsListing: the listing or None if the image could not be read
+        """
+        try:
+            layers = cls._get_layers(image_path, tag)
+            if layers is None:
+                return None
+
+            listing = cls()
+            for layer in layers:
+                digest_algorithm, digest = layer['digest'].split(':', 1)
+                blob_path = os.path.join(image_path, 'blobs', digest_algorithm, digest)
+                with tarfile.open(blob_path, mode='r|*') as layer_tar:
+                    listing.add_layer(layer_tar, read_elf)
+            logger.debug(f"Listed {len(listing.entries)} rootfs entries of {image_path}:{tag}")
+            return listing
+        except (OSError, ValueError, KeyError, tarfile.TarError) as err:
+            logger.warning(f"Failed to list rootfs of {image_path}:{tag}: {err}")
+            return None
+
+    # ==========================================================================
+    @classmethod
+    def from_directory(cls, rootfs_path):
+        """Build the listing of an unpacked rootfs
+
+        Args:
+            rootfs_path (string): Path to the rootfs
+
+        Returns:
+            RootfsListing: the listing
+        """
+        listing = cls()
+        # The file type comes from the directory entries, so only symlinks
+        # need another syscall
+        directories = [('/', rootfs_path)]
+        while directories:
+            parent, dirpath = directories.pop()
+            try:
+                dir_entries = list(os.scandir(dirpath))
+            except OSError as err:
+                logger.warning(f"Cannot list {dirpath}: {err}")
+                continue
+            for dir_entry in dir_entries:
+                path = posixpath.join(parent, dir_entry.name)
+                if dir_entry.is_symlink():
+                    listing.entries[path] = (cls.SYMLINK, os.readlink(dir_entry.path))
+                elif dir_entry.is_dir(follow_symlinks=False):
+                    listing.entries[path] = (cls.DIRECTORY, None)
+                    directories.append((path, dir_entry.path))
+                else:
+                    listing.entries[path] = (cls.FILE, None)
+        return listing
+
+    # ==========================================================================
+    def copy(self):
+        """Returns a copy of the listing that can be changed independently
+        """
+        listing = RootfsListing()
+        listing.entries = dict(self.entries)
+        listing.elf_info = dict(self.elf_info)
+        return listing
+
+    # ==========================================================================
+    @classmethod
+    def _get_layers(cls, image_path, tag):
+        """Returns the layer descriptors of the manifest of a tag, base layer first
+        """
+        with open(os.path.join(image_path, 'index.json')) as index_file:
+            index = json.load(index_file)
+
+        manifests = index.get('manifests', [])
+        manifest_desc = None
+        for desc in manifests:
+            if desc.get('annotations', {}).get(cls.REF_NAME_ANNOTATION) == tag:
+                manifest_desc = desc
+                break
+        if not manifest_desc and len(manifests) == 1:
+            manifest_desc = manifests[0]
+        if not manifest_desc:
+            logger.warning(f"Tag {tag} not found in {image_path}")
+            return None
+
+        digest_algorithm, digest = manifest_desc['digest'].split(':', 1)
+        with open(os.path.join(image_path, 'blobs', digest_algorithm, digest)) as manifest_file:
+            manifest = json.load(manifest_file)
+
+        for layer in manifest.get('layers', []):
+            if 'zstd' in layer.get('mediaType', ''):
+                logger.warning(f"Cannot list zstd compressed layer {layer['digest']}")
+                return None
+        return manifest.get('layers', [])
+
+    # ==========================================================================
+    def add_layer(self, layer_tar, read_elf=False):
+        """Apply a layer on top of the listing
+
+        Args:
+            layer_tar (TarFile): the layer, can be opened in stream mode
+            read_elf (bool): Also read the ELF info of the shared libraries
+        """
+        whiteouts = []
+        added = []
+        elf_info = {}
+        for member in layer_tar:
+            path = self._normalize(member.name)
+            dirname, basename = posixpath.split(path)
+            if basename == self.OPAQUE_WHITEOUT:
+                whiteouts.append((dirname, True))
+                continue
+            if basename.startswith(self.WHITEOUT_PREFIX):
+                whiteouts.append((posixpath.join(dirname, basename[len(self.WHITEOUT_PREFIX):]), False))
+                continue
+
+            if member.isdir():
+                added.append((path, self.DIRECTORY, None))
+            elif member.issym():
+                added.append((path, self.SYMLINK, member.linkname))
+            elif member.islnk():
+                # Hard links share the content of a file listed before
+                target = self._normalize(member.linkname)
+                added.append((path, self.FILE, None))
+                info = elf_info.get(target, self.elf_info.get(target))
+                if info:
+                    elf_info[path] = info
+            else:
+                added.append((path, self.FILE, None))
+                if read_elf and member.isreg() and self.SHARED_LIB_RE.search(basename):
+                    info = ReadElf.parse_dynamic_info(layer_tar.extractfile(member).read(), member.name)
+                    if info:
+                        elf_info[path] = info
+
+        # Whiteouts only hide the content of the layers below
+        for path, opaque in whiteouts:
+            if opaque:
+                self._remove_tree(path, keep_root=True)
+            else:
+                self._remove_tree(path)
+
+        for path, kind, linkname in added:
+            existing = self.entries.get(path)
+            if existing and existing[0] == self.DIRECTORY and kind != self.DIRECTORY:
+                self._remove_tree(path)
+            self._add_parents(path)
+            self.entries[path] = (kind, linkname)
+            self.elf_info.pop(path, None)
+        self.elf_info.update(elf_info)
+
+    # ==========================================================================
+    def resolve(self, path, links=None):
+        """Resolve all symlinks of a path inside the rootfs, like realpath
+
+        Args:
+            path (string): absolute path inside the rootfs
+            links (list, optional): the symlinks followed are added to it
+
+        Returns:
+            string: resolved path or None if it does not exist
+        """
+        parts = deque(path.split('/'))
+        current = '/'
+        links_followed = 0
+        while parts:
+            part = parts.popleft()
+            if part in ('', '.'):
+                continue
+            if part == '..':
+                current = posixpath.dirname(current)
+                continue
+
+            candidate = posixpath.join(current, part)
+            entry = self.entries.get(candidate)
+            if not entry:
+                return None
+            if entry[0] == self.SYMLINK:
+                links_followed += 1
+                if links_followed > self.MAX_SYMLINKS:
+                    return None
+                if links is not None:
+                    links.append(candidate)
+                if entry[1].startswith('/'):
+                    current = '/'
+                parts.extendleft(reversed(entry[1].split('/')))
+                continue
+            if parts and entry[0] != self.DIRECTORY:
+                return None
+            current = candidate
+        return current
+
+    # ==========================================================================
+    def exists(self, path):
+        """Same as os.path.exists() for a path inside the rootfs
+        """
+        return self.resolve(path) is not None
+
+    # ==========================================================================
+    def remove(self, path):
+        """Remove a file from the listing. If it is a link, also remove the
+        linked file. Same as LibraryMatching._remove_from_rootfs()
+
+        Args:
+            path (string): absolute path inside the rootfs
+        """
+        target = self.resolve(path)
+        parent = self.resolve(posixpath.dirname(path))
+        if parent:
+            self._remove_tree(posixpath.join(parent, posixpath.basename(path)))
+        if target:
+            self._remove_tree(target)
+
+    # ==========================================================================
+    def find_shared_libs(self):
+        """Returns the files and symlinks that look like a shared library
+
+        Returns:
+            dict: basename -> list of paths with that basename
+        """
+        libs = {}
+        for path, (kind, _) in self.entries.items():
+            basename = posixpath.basename(path)
+            if kind != self.DIRECTORY and self.SHARED_LIB_RE.search(basename):
+                libs.setdefault(basename, []).append(path)
+        return libs
+
+    # ==========================================================================
+    def get_elf_info(self, path):
+        """Returns the ELF info read from the layers for a file, following links
+
+        Args:
+            path (string): absolute path inside the rootfs
+
+        Returns:
+            dict: see ReadElf.read_dynamic_info(), or None if not read
+        """
+        target = self.resolve(path)
+        return self.elf_info.get(target) if target else None
+
+    # ==========================================================================
+    def get_apiversions(self, path):
+        """Same as ReadElf.retrieve_apiversions() for a file inside the rootfs
+        """
+        elf_info = self.get_elf_info(path)
+        if not elf_info:
+            return []
+        return elf_info['apiversions']
+
+    # ==========================================================================
+    def _add_parents(self, path):
+        """Layers do not always contain entries for all parent directories
+        """
+        parent = posixpath.dirname(path)
+        while parent not in self.entries:
+            self.entries[parent] = (self.DIRECTORY, None)
+            parent = posixpath.dirname(parent)
+
+    # ==========================================================================
+    def _remove_tree(self, path, keep_root=False):
+        """Remove an entry and everything below it. Only directories are
+        scanned for children
+        """
+        if path == '/':
+            keep_root = True
+        entry = self.entries.get(path)
+        if not keep_root:
+            self.entries.pop(path, None)
+            self.elf_info.pop(path, None)
+        if not entry or entry[0] != self.DIRECTORY:
+            return
+
+        prefix = path.rstrip('/') + '/'
+        for child in [child for child in self.entries if child.startswith(prefix)]:
+            del self.entries[child]
+            self.elf_info.pop(child, None)
+
+    # ==========================================================================
+    @staticmethod
+    def _normalize(name):
+        return posixpath.normpath('/' + name.lstrip('/'))
@@ -0,0 +1,162 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Consult Red
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import threading
+from hashlib import sha256
+from collections import OrderedDict
+from jsonschema.validators import validator_for
+from loguru import logger
+from bundlegen.core.sqlite_cache import SqliteCache
+
+
+class ValidationCache(SqliteCache):
+    """Persistent record of the documents that passed validation, keyed by
+    the hash of the schema and the content hash of the document, so platform
+    templates are validated once per node instead of once per process. The
+    size can be set using the BUNDLEGEN_VALIDATION_CACHE_SIZE environment
+    variable, see SqliteCache.
+    """
+    DB_FILENAME = 'validated.sqlite'
+    DEFAULT_SIZE = 10000
+    SIZE_ENV = 'BUNDLEGEN_VALIDATION_CACHE_SIZE'
+    NAME = 'Validation cache'
+    TABLES = {
+        'validated': ('key', "key TEXT PRIMARY KEY, last_used INTEGER NOT NULL")
+    }
+
+    # ==========================================================================
+    def contains(self, key):
+        """Returns true if a document with this key passed validation
+        """
+        if self._lookup('validated', key, 'key'):
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    # ==========================================================================
+    def add(self, key):
+        """Remember that a document with this key passed validation
+        """
+        self._store('validated', key)
+
+
+class SchemaValidator:
+    """Registry of compiled JSON schema validators
+
+    Each schema in bundlegen/schema is loaded and compiled once per process.
+    Documents that passed validation can be remembered by their content hash
+    so unchanged platform templates are never validated twice. The most
+    recently used hashes are kept in memory, all of them in the
+    ValidationCache shared by the builds on the node.
+    """
+    SCHEMA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'schema'))
+    MAX_VALIDATED = 1024
+
+    _validators = {}
+    _schema_hashes = {}
+    _validated = OrderedDict()
+    _lock = threading.Lock()
+
+    # ==========================================================================
+    @classmethod
+    def get_validator(cls, schema_name):
+        """Returns the compiled validator for a schema
+
+        Args:
+            schema_name (string): Filename of the schema inside bundlegen/schema
+
+        Returns:
+            jsonschema validator instance
+        """
+        with cls._lock:
+            validator = cls._validators.get(schema_name)
+            if validator:
+                return validator
+
+            schema_path = os.path.join(cls.SCHEMA_DIR, schema_name)
+            with open(schema_path, "rb") as f:
+                content = f.read()
+            schema = json.loads(content)
+
+            validator_class = validator_for(schema)
+            validator_class.check_schema(schema)
+            validator = validator_class(schema)
+            cls._validators[schema_name] = validator
+            cls._schema_hashes[schema_name] = sha256(content).hexdigest()
+            logger.trace(f"Compiled schema {schema_path}")
+            return validator
+
+    # ==========================================================================
+    @classmethod
+    def validate(cls, instance, schema_name, content_hash=None):
+        """Validate a document against a schema
+
+        Args:
+            instance (dict): Document to validate
+            schema_name (string): Filename of the schema inside bundlegen/schema
+            content_hash (string, optional): Hash of the document content. When set,
+                a document with the same hash that already passed is not validated again
+
+        Raises:
+            ValidationError: the document does not match the schema
+            IOError: the schema could not be read
+        """
+        if content_hash and cls.is_validated(schema_name, content_hash):
+            logger.trace(f"Already validated against {schema_name}: {content_hash}")
+            return
+
+        cls.get_validator(schema_name).validate(instance)
+
+        if content_hash:
+            key = cls._get_key(schema_name, content_hash)
+            cls._remember(key)
+            ValidationCache.get_instance().add(key)
+
+    # ==========================================================================
+    @classmethod
+    def is_validated(cls, schema_name, content_hash):
+        """Returns true if a document with this hash already passed validation
+        against the current version of the schema
+        """
+        key = cls._get_key(schema_name, content_hash)
+        with cls._lock:
+            if key in cls._validated:
+                cls._validated.move_to_end(key)
+                return True
+
+        if ValidationCache.get_instance().contains(key):
+            cls._remember(key)
+            return True
+        return False
+
+    # ==========================================================================
+    @classmethod
+    def _get_key(cls, schema_name, content_hash):
+        cls.get_validator(schema_name)
+        return f"{cls._schema_hashes[schema_name]}:{content_hash}"
+
+    # ==========================================================================
+    @classmethod
+    def _remember(cls, key):
+        with cls._lock:
+            cls._validated[key] = True
+            cls._validated.move_to_end(key)
+            while len(cls._validated) > cls.MAX_VALIDATED:
+                cls._validated.popitem(last=False)
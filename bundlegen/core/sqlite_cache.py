@@ -0,0 +1,202 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Consult Red
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import time
+import sqlite3
+import threading
+from loguru import logger
+from bundlegen.core.utils import Utils
+
+
+class SqliteCache:
+    """Base of the persistent caches stored as sqlite databases in the
+    BundleGen cache directory, shared by all builds on the node
+
+    Subclasses define their tables in TABLES as {name: (key column, column
+    definitions)}, the last column of every table being last_used. Every
+    table is bounded to max_entries rows, evicting the least recently used
+    ones when a new key is added. If the database cannot be used, the cache
+    is disabled for the rest of the process and the callers carry on without
+    it.
+    """
+    DB_FILENAME = None
+    DEFAULT_SIZE = 10000
+    # Environment variable overriding the size (0 disables caching)
+    SIZE_ENV = None
+    # Name of the cache in log messages
+    NAME = 'Cache'
+    TABLES = {}
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, db_path, max_entries=None):
+        self.db_path = db_path
+        self.max_entries = self.DEFAULT_SIZE if max_entries is None else max_entries
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        self._lock = threading.Lock()
+
+    # ==========================================================================
+    @classmethod
+    def get_instance(cls):
+        """Returns the process wide cache of the class, see SIZE_ENV
+
+        Returns:
+            SqliteCache: the shared cache
+        """
+        with cls._instance_lock:
+            if not cls._instance:
+                settings = cls._get_settings()
+                db_path = None
+                if settings['max_entries'] > 0:
+                    cache_dir = Utils.get_cache_dir()
+                    if cache_dir:
+                        db_path = os.path.join(cache_dir, cls.DB_FILENAME)
+                cls._instance = cls(db_path, **settings)
+            return cls._instance
+
+    # ==========================================================================
+    @classmethod
+    def _get_settings(cls):
+        """Returns the constructor arguments of the process wide cache, read
+        from the environment
+        """
+        return {'max_entries': cls._get_env_int(cls.SIZE_ENV, cls.DEFAULT_SIZE)}
+
+    # ==========================================================================
+    @staticmethod
+    def _get_env_int(env, default):
+        try:
+            return int(os.environ.get(env, default))
+        except ValueError:
+            logger.warning(f"Invalid {env}, using default")
+            return default
+
+    # ==========================================================================
+    def stats(self):
+        """Returns the hit/miss counters of this process and the number of
+        entries in the first table
+
+        Returns:
+            dict: {'hits': int, 'misses': int, 'entries': int}
+        """
+        table = next(iter(self.TABLES))
+        entries = self._run(lambda db: db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0], 0)
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries}
+
+    # ==========================================================================
+    def _run(self, operation, default=None):
+        """Run an operation on the database with the cache lock held
+
+        Args:
+            operation (function): Called with the sqlite connection
+            default: Returned when the cache is disabled or unavailable
+
+        Returns:
+            Result of the operation
+        """
+        if not self.db_path:
+            return default
+        try:
+            with self._lock:
+                return operation(self._connect())
+        except (sqlite3.Error, OSError) as err:
+            logger.warning(f"{self.NAME} unavailable, disabling it: {err}")
+            self.db_path = None
+            return default
+
+    # ==========================================================================
+    def _lookup(self, table, key, columns, touch=True):
+        """Returns the columns of the row of a key
+
+        Args:
+            table (string): Table name, see TABLES
+            key (string): Value of the key column
+            columns (string): Columns to return, comma separated
+            touch (bool): Mark the row as used
+
+        Returns:
+            tuple: column values or None if not cached
+        """
+        key_column = self.TABLES[table][0]
+
+        def lookup(db):
+            row = db.execute(f"SELECT {columns} FROM {table} WHERE {key_column} = ?", (key,)).fetchone()
+            if row and touch:
+                with db:
+                    db.execute(f"UPDATE {table} SET last_used = ? WHERE {key_column} = ?", (time.time_ns(), key))
+            return row
+
+        return self._run(lookup)
+
+    # ==========================================================================
+    def _store(self, table, key, *values):
+        """Insert or replace the row of a key, marked as used now. Adding a new
+        key evicts the least recently used rows above the size limit
+
+        Args:
+            table (string): Table name, see TABLES
+            key (string): Value of the key column
+            values: Values of the other columns except last_used
+        """
+        row = (key,) + values + (time.time_ns(),)
+        placeholders = ', '.join('?' * len(row))
+
+        def store(db):
+            with db:
+                if db.execute(f"INSERT OR IGNORE INTO {table} VALUES ({placeholders})", row).rowcount:
+                    self._evict(db, table)
+                else:
+                    db.execute(f"INSERT OR REPLACE INTO {table} VALUES ({placeholders})", row)
+
+        self._run(store)
+
+    # ==========================================================================
+    def _delete(self, table, key):
+        key_column = self.TABLES[table][0]
+
+        def delete(db):
+            with db:
+                db.execute(f"DELETE FROM {table} WHERE {key_column} = ?", (key,))
+
+        self._run(delete)
+
+    # ==========================================================================
+    def _connect(self):
+        if self._db is None:
+            db = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            with db:
+                for table, (_, columns) in self.TABLES.items():
+                    db.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+                    db.execute(f"CREATE INDEX IF NOT EXISTS {table}_last_used ON {table} (last_used)")
+            self._db = db
+        return self._db
+
+    # ==========================================================================
+    def _evict(self, db, table):
+        """Drop the least recently used rows of a table above the size limit
+        """
+        key_column = self.TABLES[table][0]
+        count = db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        if count > self.max_entries:
+            db.execute(f"DELETE FROM {table} WHERE {key_column} IN "
+                       f"(SELECT {key_column} FROM {table} ORDER BY last_used LIMIT ?)", (count - self.max_entries,))
+            logger.trace(f"Evicted {count - self.max_entries} entries from {table}")
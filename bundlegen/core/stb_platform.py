@@ -16,11 +16,14 @@
 # limitations under the License.
 
 import os
-import json
+import hashlib
 import click
 from loguru import logger
-from jsonschema import validate
 from jsonschema.exceptions import ValidationError
+from bundlegen.core.template_registry import TemplateRegistry
+from bundlegen.core.platform_cache import PlatformConfigCache
+from bundlegen.core.schema_validator import SchemaValidator
+from bundlegen.core.libs_index import LazyLibs
 
 class STBPlatform:
     def __init__(self, name, search_path=None):
@@ -44,47 +47,45 @@ class STBPlatform:
     def search_config(self):
         """Search for a config file for the specified platform
 
-        Config files should live in the templates directory or a custom directory
+        Config files should live in the templates directory or a custom directory.
+        The lookup goes through the template registry of the search path, so
+        the directory tree is only rescanned when it changed.
         """
-        # Loop through all the dirs, looking for a <platformname>.json and
-        # <platformname>_libs.json file
-        config_files = []
+        # Look up the <platformname>.json and <platformname>_libs.json files
+        config_files = TemplateRegistry.get(self.search_path).get_config_files(self.name)
 
-        for subdir, dirs, files in os.walk(self.search_path):
-            for file in files:
-                if (self.name + ".json" in file) or (self.name + "_libs.json" in file):
-                    # Found a suitable config file
-                    config_path = os.path.join(subdir, file)
-                    config_files.append(config_path)
-
-                    logger.debug(f"Found platform config {config_path}")
+        for config_path in config_files:
+            logger.debug(f"Found platform config {config_path}")
 
         self.config_files = config_files
 
    # ==========================================================================
     def validate_platform_config(self):
         if (len(self.config_files) > 0):
+            cache = PlatformConfigCache.get_instance()
             for fileName in self.config_files:
+                if("_libs.json" in fileName):
+                    schemaFile = "platform_libsSchema.json"
+                else:
+                    schemaFile = "platformSchema.json"
                 try:
-                    with open(fileName, "r") as file:
-                        jsonFile = json.load(file)
-                        if("_libs.json" in fileName):
-                            schemaFile = "bundlegen/schema/platform_libsSchema.json"
-                        else:
-                            schemaFile = "bundlegen/schema/platformSchema.json"
-                        try:
-                            with open(schemaFile, "r") as f:
-                                platformSchema = json.load(f)
-                                validate(instance=jsonFile, schema=platformSchema)
-                        except ValidationError :
-                            logger.error("ValidationError during templete platform schema ")
-                            return False
-                        except IOError:
-                            logger.error("IOError during platform schema open.")
-                            return False
+                    # Templates that already passed validation are skipped by hash,
+                    # so the large _libs.json is only parsed here once per content
+                    content_hash = cache.get_hash(fileName)
+                    if SchemaValidator.is_validated(schemaFile, content_hash):
+                        continue
+                    jsonFile = cache.load_readonly(fileName)
                 except IOError:
                     logger.error("IOError during platform config open.")
                     return False
+                try:
+                    SchemaValidator.validate(jsonFile, schemaFile, content_hash)
+                except ValidationError :
+                    logger.error("ValidationError during templete platform schema ")
+                    return False
+                except IOError:
+                    logger.error("IOError during platform schema open.")
+                    return False
 
         logger.success(f"Validated platform schema files here {self.config_files}")
         return True
@@ -95,11 +96,18 @@ class STBPlatform:
         """
         dictionary_list = []
 
-        # Load all the config files
+        # Load all the config files. Parsed files are cached for the lifetime
+        # of the process, we get our own copy of the data
+        cache = PlatformConfigCache.get_instance()
         for file in self.config_files:
-            with open(file) as jsonFile:
-                data = json.load(jsonFile)
-                dictionary_list.append(data)
+            if file.endswith("_libs.json"):
+                # Libs info is large and only needed for dependency walking,
+                # so it is loaded on first use
+                dictionary_list.append({'libs': LazyLibs(file)})
+                continue
+
+            data = cache.load(file)
+            dictionary_list.append(data)
 
         # Merge all the config files into one dictionary
         self.config = {}
@@ -122,3 +130,17 @@ class STBPlatform:
             dictionary: the config dictionary for the platform
         """
         return self.config
+
+    # ==========================================================================
+    def get_content_hash(self):
+        """Returns a hash of the content of all config files of the platform,
+        which changes whenever one of the templates is edited
+
+        Returns:
+            string: hex digest
+        """
+        cache = PlatformConfigCache.get_instance()
+        digest = hashlib.sha256()
+        for file in sorted(self.config_files):
+            digest.update(f"{os.path.basename(file)}:{cache.get_hash(file)}\n".encode('utf-8'))
+        return digest.hexdigest()
@@ -0,0 +1,246 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Consult Red
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import mmap
+import struct
+import threading
+from hashlib import blake2b
+from loguru import logger
+from bundlegen.core.readelf import ReadElf
+from bundlegen.core.rootfs_listing import RootfsListing
+
+
+class SymbolIndex:
+    """Compiled index of the symbols exported by the libs of a platform
+
+    Compiled from the sysroot of the platform firmware. Every symbol is stored
+    as a 64 bit hash of 'name@version' (and 'name' for default versions), so
+    checking if a host lib provides a set of symbols only needs set lookups.
+
+    File layout (all integers little endian):
+        header      magic, version, lib count
+        libs        one LIB record per lib name, sorted by name
+        names       utf-8 blob with the lib names
+        hashes      sorted u64 symbol hashes, shared by the names of the same file
+    """
+    MAGIC = b'BGSYMIDX'
+    VERSION = 1
+    SUFFIX = '_symbols.idx'
+
+    # magic, version, lib_count
+    HEADER = struct.Struct('<8sII')
+    # name_offset, name_size, hashes_offset, hash_count
+    LIB = struct.Struct('<IIII')
+
+    _loaded = {}
+    _loaded_lock = threading.Lock()
+
+    def __init__(self, path, buffer):
+        self.path = path
+        self._buffer = buffer
+        self._key = None
+        magic, version, self.lib_count = self.HEADER.unpack_from(buffer, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"{path} is not a symbol index version {self.VERSION}")
+
+        self._libs = {}
+        names_offset = self.HEADER.size + self.lib_count * self.LIB.size
+        names_end = names_offset
+        for i in range(self.lib_count):
+            name_offset, name_size, hashes_offset, hash_count = self.LIB.unpack_from(buffer, self.HEADER.size + i * self.LIB.size)
+            name = bytes(buffer[names_offset + name_offset:names_offset + name_offset + name_size]).decode('utf-8')
+            self._libs[name] = (hashes_offset, hash_count)
+            names_end = max(names_end, names_offset + name_offset + name_size)
+        # Hashes are 8 byte aligned
+        self.hashes_offset = names_end + (-names_end) % 8
+        self._symbols = {}
+        self._lock = threading.Lock()
+
+    # ==========================================================================
+    @staticmethod
+    def hash_symbol(symbol):
+        """Returns the hash stored for a symbol
+
+        Args:
+            symbol (string): 'name' or 'name@version'
+
+        Returns:
+            int: 64 bit hash
+        """
+        return int.from_bytes(blake2b(symbol.encode('utf-8'), digest_size=8).digest(), 'little')
+
+    # ==========================================================================
+    @classmethod
+    def index_path(cls, libs_json_path):
+        """Returns where the symbol index of a platform is stored, next to
+        its <platform>_libs.json file
+        """
+        if libs_json_path.endswith('_libs.json'):
+            return libs_json_path[:-len('_libs.json')] + cls.SUFFIX
+        return os.path.splitext(libs_json_path)[0] + cls.SUFFIX
+
+    # ==========================================================================
+    @classmethod
+    def load(cls, path):
+        """Map a symbol index into memory, shared as long as the file does not change
+
+        Args:
+            path (string): Path to the symbol index
+
+        Returns:
+            SymbolIndex: the index
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+
+        with cls._loaded_lock:
+            index = cls._loaded.get(path)
+            if index and index._key == key:
+                return index
+
+        with open(path, 'rb') as index_file:
+            buffer = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        index = cls(path, buffer)
+        index._key = key
+
+        with cls._loaded_lock:
+            cls._loaded[path] = index
+        logger.debug(f"Loaded symbol index {path} ({index.lib_count} libs)")
+        return index
+
+    # ==========================================================================
+    @classmethod
+    def load_for_libs(cls, libs_json_path):
+        """Load the symbol index of a platform if there is one
+
+        Args:
+            libs_json_path (string): Path to <platform>_libs.json
+
+        Returns:
+            SymbolIndex: the index or None
+        """
+        path = cls.index_path(libs_json_path)
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls.load(path)
+        except (OSError, ValueError, struct.error) as err:
+            logger.warning(f"Ignoring symbol index {path}: {err}")
+            return None
+
+    # ==========================================================================
+    @classmethod
+    def compile(cls, sysroot, path):
+        """Compile the symbols of all shared libs inside a sysroot into an index.
+        Libs are named by their path inside the sysroot, symlinks to a lib get
+        the symbols of the lib.
+
+        Args:
+            sysroot (string): Root of the platform firmware filesystem
+            path (string): Where to write the index
+        """
+        listing = RootfsListing.from_directory(sysroot)
+        hashes_by_target = {}
+        names = {}
+        for paths in listing.find_shared_libs().values():
+            for name in paths:
+                target = listing.resolve(name)
+                if not target:
+                    continue
+                if target not in hashes_by_target:
+                    symbols = ReadElf.read_symbols(os.path.join(sysroot, target.lstrip('/')))
+                    hashes_by_target[target] = sorted(set(cls.hash_symbol(symbol) for symbol in symbols['defined'])) if symbols else None
+                if hashes_by_target[target] is not None:
+                    names[name] = target
+
+        hashes = bytearray()
+        hashes_offsets = {}
+        for target in sorted(set(names.values())):
+            hashes_offsets[target] = len(hashes) // 8
+            hashes += struct.pack(f'<{len(hashes_by_target[target])}Q', *hashes_by_target[target])
+
+        records = bytearray()
+        name_blob = bytearray()
+        for name in sorted(names):
+            encoded = name.encode('utf-8')
+            target = names[name]
+            records += cls.LIB.pack(len(name_blob), len(encoded), hashes_offsets[target], len(hashes_by_target[target]))
+            name_blob += encoded
+
+        # Hashes are 8 byte aligned
+        header_size = cls.HEADER.size + len(records) + len(name_blob)
+        padding = (-header_size) % 8
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as index_file:
+            index_file.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, len(names)))
+            index_file.write(records)
+            index_file.write(name_blob)
+            index_file.write(bytes(padding))
+            index_file.write(hashes)
+        os.replace(tmp_path, path)
+
+        logger.info(f"Compiled symbols of {len(names)} libs ({len(hashes) // 8} symbols) into {path}")
+
+    # ==========================================================================
+    def get(self, name):
+        """Returns the symbol hashes of a lib
+
+        Args:
+            name (string): lib path as in *_libs.json
+
+        Returns:
+            frozenset: symbol hashes or None if the lib is unknown
+        """
+        with self._lock:
+            symbols = self._symbols.get(name)
+            if symbols is not None:
+                return symbols
+
+            lib = self._libs.get(name) or self._libs.get('/' + name.lstrip('/'))
+            if not lib:
+                return None
+            hashes_offset, hash_count = lib
+            offset = self.hashes_offset + hashes_offset * 8
+            symbols = frozenset(struct.unpack_from(f'<{hash_count}Q', self._buffer, offset))
+            self._symbols[name] = symbols
+            return symbols
+
+    # ==========================================================================
+    def provides(self, name, symbols):
+        """Check if a lib exports all the given symbols
+
+        Args:
+            name (string): lib path as in *_libs.json
+            symbols (iterable): 'name' or 'name@version' strings
+
+        Returns:
+            bool: True if all symbols are exported, False if not or the lib is unknown
+        """
+        exported = self.get(name)
+        if exported is None:
+            return False
+        return all(self.hash_symbol(symbol) in exported for symbol in symbols)
+
+    # ==========================================================================
+    def __contains__(self, name):
+        return name in self._libs
+
+    # ==========================================================================
+    def __len__(self):
+        return self.lib_count
@@ -0,0 +1,238 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Consult Red
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import threading
+from hashlib import sha256
+from loguru import logger
+from bundlegen.core.utils import Utils
+
+
+class TemplateRegistry:
+    """Index of the platform templates available under a search path
+
+    Maps each platform name to its <name>.json template and <name>_libs.json
+    file. The index is persisted in the BundleGen cache directory, one file
+    per search path, and only rebuilt when the mtime of one of the indexed
+    directories changes, so looking up a platform does not require walking
+    the whole templates tree.
+    """
+    CACHE_NAME = 'templates'
+    INDEX_VERSION = 1
+
+    _registries = {}
+    _registries_lock = threading.Lock()
+
+    def __init__(self, search_path):
+        self.search_path = os.path.abspath(search_path)
+        self.index_path = None
+        cache_dir = Utils.get_cache_dir(self.CACHE_NAME)
+        if cache_dir:
+            key = sha256(self.search_path.encode('utf-8')).hexdigest()
+            self.index_path = os.path.join(cache_dir, f"{key}.json")
+        self.dirs = {}
+        self.templates = {}
+        self._lock = threading.Lock()
+
+    # ==========================================================================
+    @classmethod
+    def get(cls, search_path):
+        """Returns the shared registry for the given search path
+
+        Args:
+            search_path (string): Directory to search for platform templates
+
+        Returns:
+            TemplateRegistry: registry for the search path
+        """
+        key = os.path.abspath(search_path)
+        with cls._registries_lock:
+            registry = cls._registries.get(key)
+            if not registry:
+                registry = cls(key)
+                cls._registries[key] = registry
+            return registry
+
+    # ==========================================================================
+    def lookup(self, name):
+        """Find the config files for the specified platform
+
+        Args:
+            name (string): Platform name, must match the template filename exactly
+
+        Returns:
+            dict: {'template': [path, mtime_ns, size], 'libs': [path, mtime_ns, size]}
+                  with None for a file that does not exist, or None if the
+                  platform is unknown
+        """
+        self.refresh()
+        entry = self.templates.get(name)
+        if not entry:
+            return None
+
+        # Index stores paths relative to the search path
+        result = {}
+        for kind in ('template', 'libs'):
+            item = entry.get(kind)
+            result[kind] = [os.path.join(self.search_path, item[0]), item[1], item[2]] if item else None
+        return result
+
+    # ==========================================================================
+    def get_config_files(self, name):
+        """Returns the config files found for the specified platform
+
+        Args:
+            name (string): Platform name
+
+        Returns:
+            list[string]: Paths to the template and libs files (template first)
+        """
+        entry = self.lookup(name)
+        if not entry:
+            return []
+        return [entry[kind][0] for kind in ('template', 'libs') if entry[kind]]
+
+    # ==========================================================================
+    def names(self):
+        """Returns the names of all platforms that have a template file
+
+        Returns:
+            list[string]: sorted platform names
+        """
+        self.refresh()
+        return sorted(name for name, entry in self.templates.items() if entry.get('template'))
+
+    # ==========================================================================
+    def refresh(self):
+        """Make sure the index is up to date, loading the persisted index or
+        rescanning the search path if any indexed directory changed
+        """
+        with self._lock:
+            if self.dirs and not self._is_stale():
+                return
+
+            if self._load_index() and not self._is_stale():
+                logger.debug(f"Loaded template index {self.index_path}")
+                return
+
+            self._scan()
+            self._save_index()
+
+    # ==========================================================================
+    def _is_stale(self):
+        """Returns true if any indexed directory was modified since the index was built
+        """
+        for directory, mtime in self.dirs.items():
+            try:
+                if os.stat(os.path.join(self.search_path, directory)).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    # ==========================================================================
+    def _scan(self):
+        """Walk the search path and rebuild the index
+        """
+        logger.debug(f"Indexing platform templates in {self.search_path}")
+        dirs = {}
+        templates = {}
+
+        for subdir, subdirs, files in os.walk(self.search_path):
+            subdirs.sort()
+            reldir = os.path.relpath(subdir, self.search_path)
+            try:
+                dirs[reldir] = os.stat(subdir).st_mtime_ns
+            except OSError:
+                continue
+
+            for file in sorted(files):
+                if file.startswith('.') or not file.endswith('.json'):
+                    continue
+
+                if file.endswith('_libs.json'):
+                    name = file[:-len('_libs.json')]
+                    kind = 'libs'
+                else:
+                    name = file[:-len('.json')]
+                    kind = 'template'
+
+                path = os.path.join(subdir, file)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+
+                entry = templates.setdefault(name, {'template': None, 'libs': None})
+                if entry[kind]:
+                    logger.warning(f"Ignoring duplicate platform config {path}")
+                    continue
+                entry[kind] = [os.path.relpath(path, self.search_path), stat.st_mtime_ns, stat.st_size]
+
+        self.dirs = dirs
+        self.templates = templates
+
+    # ==========================================================================
+    def _load_index(self):
+        """Load the index persisted for the search path
+
+        Returns:
+            bool: True if a usable index was loaded
+        """
+        if not self.index_path:
+            return False
+
+        try:
+            with open(self.index_path) as index_file:
+                index = json.load(index_file)
+        except (OSError, ValueError):
+            return False
+
+        if not isinstance(index, dict) or index.get('version') != self.INDEX_VERSION \
+                or index.get('search_path') != self.search_path:
+            return False
+
+        self.dirs = index.get('dirs', {})
+        self.templates = index.get('templates', {})
+        return bool(self.dirs)
+
+    # ==========================================================================
+    def _save_index(self):
+        """Persist the index in the cache directory. Without a usable cache
+        directory, the index is only kept in memory
+        """
+        if not self.index_path:
+            return
+
+        index = {
+            'version': self.INDEX_VERSION,
+            'search_path': self.search_path,
+            'dirs': self.dirs,
+            'templates': self.templates
+        }
+
+        tmp_path = f"{self.index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as index_file:
+                json.dump(index, index_file)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.index_path)
+        except OSError as err:
+            logger.debug(f"Could not persist template index {self.index_path}: {err}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
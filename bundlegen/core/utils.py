@@ -20,11 +20,15 @@ import shlex
 import uuid
 import tarfile
 import os
+import fcntl
+import shutil
 
 from loguru import logger
 
 
 class Utils:
+    # ioctl cloning a file on copy-on-write filesystems (btrfs, xfs)
+    FICLONE = 0x40049409
 
     # ==========================================================================
     @staticmethod
@@ -234,3 +238,62 @@ class Utils:
         os.remove(DEBIAN_BIN_NAME)
 
         return True
+
+    # ==========================================================================
+    @staticmethod
+    def get_cache_dir(name=None):
+        """Returns the directory BundleGen keeps its persistent caches in. This
+        is BUNDLEGEN_CACHE_DIR if set, otherwise bundlegen inside the user cache
+        directory (XDG_CACHE_HOME or ~/.cache). The directory is shared by all
+        builds running on the node.
+
+        Args:
+            name (string, optional): Sub directory for a specific cache
+
+        Returns:
+            string: Path to the directory or None if it cannot be created
+        """
+        cache_dir = os.environ.get('BUNDLEGEN_CACHE_DIR')
+        if not cache_dir:
+            user_cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+            cache_dir = os.path.join(user_cache_dir, 'bundlegen')
+        if name:
+            cache_dir = os.path.join(cache_dir, name)
+
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+        except OSError as err:
+            logger.warning(f"Cannot create cache directory {cache_dir}: {err}")
+            return None
+        return cache_dir
+
+    # ==========================================================================
+    @staticmethod
+    def link_or_copy(src, dst):
+        """Make dst share the content of src without copying the data where
+        possible: a hard link, or a reflink (copy-on-write clone) on
+        filesystems supporting it, otherwise a plain copy. dst is replaced if
+        it exists. Only for files that are never modified in place
+
+        Args:
+            src (string): Source file
+            dst (string): Destination path
+
+        Returns:
+            string: 'link', 'reflink' or 'copy'
+        """
+        if os.path.lexists(dst):
+            os.remove(dst)
+        try:
+            os.link(src, dst)
+            return 'link'
+        except OSError:
+            pass
+
+        with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+            try:
+                fcntl.ioctl(dst_file.fileno(), Utils.FICLONE, src_file.fileno())
+                return 'reflink'
+            except OSError:
+                shutil.copyfileobj(src_file, dst_file, 1024 * 1024)
+        return 'copy'
@@ -43,7 +43,8 @@ class Message():
                  searchpath: str,
                  outputdir: str,
                  createmountpoints: bool,
-                 app_id: str):
+                 app_id: str,
+                 bypass_cache: bool = False):
         self.uuid = uuid
         self.platform = platform
         self.image_url = image_url
@@ -52,6 +53,7 @@ class Message():
         self.outputdir = outputdir
         self.createmountpoints = createmountpoints
         self.app_id = app_id
+        self.bypass_cache = bypass_cache
 
         if app_metadata is None:
             self.app_metadata = {}
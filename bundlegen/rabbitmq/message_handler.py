@@ -30,6 +30,7 @@ from bundlegen.core.bundle_processor import BundleProcessor
 from bundlegen.core.image_unpacker import ImageUnpackager
 from bundlegen.core.image_downloader import ImageDownloader
 from bundlegen.core.stb_platform import STBPlatform
+from bundlegen.core.result_cache import ResultCache
 
 
 def message_decoder(obj):
@@ -46,7 +47,8 @@ def message_decoder(obj):
                           unpacked_obj["searchpath"],
                           unpacked_obj["outputdir"],
                           unpacked_obj["createmountpoints"],
-                          unpacked_obj["app_id"])
+                          unpacked_obj["app_id"],
+                          unpacked_obj.get("bypass_cache", False))
     return msg
 
 
@@ -143,8 +145,28 @@ def generate_bundle(options: message.Message) -> Tuple[Result, str]:
 
     creds = os.environ.get("RDK_OCI_REGISTRY_CREDS")
     img_downloader = ImageDownloader()
+
+    # Reply with the bundle of a previous request with the same inputs
+    result_cache = ResultCache.get_instance()
+    result_key = None
+    image_digest = None
+    if not options.bypass_cache:
+        image_digest = img_downloader.get_image_digest(
+            options.image_url, creds, selected_platform.get_config())
+        if image_digest:
+            result_key = ResultCache.make_key(image_digest,
+                                              selected_platform.get_content_hash(),
+                                              options.app_metadata or None,
+                                              appid=options.app_id,
+                                              createmountpoints=options.createmountpoints,
+                                              libmatchingmode=options.lib_match_mode.value)
+            cached_path = result_cache.get(result_key)
+            if cached_path:
+                logger.info(f"Found bundle {cached_path} in result cache")
+                return (Result.SUCCESS, _get_cached_bundle(cached_path, options))
+
     img_path = img_downloader.download_image(
-        options.image_url, creds, selected_platform.get_config())
+        options.image_url, creds, selected_platform.get_config(), digest=image_digest)
 
     if not img_path:
         logger.error("Failed to download image")
@@ -214,19 +236,31 @@ def generate_bundle(options: message.Message) -> Tuple[Result, str]:
     persistent_path = os.path.join(
         options.outputdir or os.environ.get('BUNDLE_STORE_DIR'), f"{tarball_name}.tar.gz")
 
-    tarball_settings = processor.platform_cfg.get('tarball')
-    file_ownership_user = tarball_settings.get('fileOwnershipSameAsUser') if tarball_settings else None
-    file_mask = tarball_settings.get('fileMask') if tarball_settings else None
-
-    container_uid_gid = processor.get_real_uid_gid()
-    uid = container_uid_gid[0] if container_uid_gid[0] and file_ownership_user else None
-    gid = container_uid_gid[1] if container_uid_gid[1] and file_ownership_user else None
-
-    Utils.create_tgz(outputdir, tmp_path, uid, gid, file_mask)
+    processor.create_tgz(tmp_path)
 
     # Move to persistent storage
     logger.debug(
         f"Moving '{tmp_path}' to {options.outputdir or os.environ.get('BUNDLE_STORE_DIR')}")
     shutil.move(tmp_path, options.outputdir or os.environ.get('BUNDLE_STORE_DIR'))
 
+    if result_key:
+        result_cache.put(result_key, persistent_path)
+
     return (Result.SUCCESS, persistent_path)
+
+
+def _get_cached_bundle(cached_path: str, options: message.Message) -> str:
+    """
+    Returns the cached bundle as it is, unless the request wants the bundle
+    under another name or in another directory, then a copy is made there
+    """
+    store_dir = os.path.abspath(options.outputdir or os.environ.get('BUNDLE_STORE_DIR'))
+    if options.output_filename:
+        persistent_path = os.path.join(store_dir, f"{options.output_filename}.tar.gz")
+    elif os.path.dirname(cached_path) == store_dir:
+        return cached_path
+    else:
+        persistent_path = os.path.join(store_dir, os.path.basename(cached_path))
+
+    ResultCache.copy_bundle(cached_path, persistent_path)
+    return persistent_path
@@ -22,6 +22,7 @@ setuptools.setup(
     version='0.1',
     long_description="RDK Component to generate extended OCI bundle*'s from OCI Images, ready to be run by Dobby",
     packages=setuptools.find_packages(),
+    package_data={'bundlegen': ['schema/*.json']},
     install_requires=[
         'click',
         'loguru',
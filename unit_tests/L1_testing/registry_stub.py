@@ -0,0 +1,205 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Consult Red
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# In-process stand-in for an OCI registry, used by the tests of the built-in
+# registry client
+
+import os
+import re
+import json
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class RegistryStub:
+    """Serves manifests and blobs with the OCI distribution API (v2) over http
+    on localhost, with optional bearer token authentication
+
+    Records the requests and the number of connections, so tests can check
+    what the client fetched and that connections are kept alive. Blobs are
+    served with range requests unless support_range is False, and downloads
+    can be interrupted, see drop_blob().
+    """
+    PATH_RE = re.compile(r"^/v2/(.+)/(manifests|blobs)/([^/]+)$")
+    RANGE_RE = re.compile(r"^bytes=(\d+)-$")
+
+    def __init__(self, token=None, support_range=True):
+        self.token = token
+        self.support_range = support_range
+        # digest -> list of byte counts, the next responses with the blob
+        # drop the connection after that many bytes of the body
+        self.drops = {}
+        # (repository, tag or digest) -> (media type, manifest bytes)
+        self.manifests = {}
+        # digest -> bytes
+        self.blobs = {}
+        # (method, path, Range header)
+        self.requests = []
+        self.connections = 0
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_HEAD(self):
+                stub._handle(self, send_body=False)
+
+            def do_GET(self):
+                stub._handle(self, send_body=True)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.address = f"127.0.0.1:{self.server.server_address[1]}"
+        self._thread = None
+
+    # ==========================================================================
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    # ==========================================================================
+    def add_blob(self, data):
+        digest = f"sha256:{hashlib.sha256(data).hexdigest()}"
+        self.blobs[digest] = data
+        return digest
+
+    # ==========================================================================
+    def drop_blob(self, digest, *sent):
+        """Drop the connection of the next responses with a blob, after the
+        given numbers of bytes of the body
+        """
+        self.drops.setdefault(digest, []).extend(sent)
+
+    # ==========================================================================
+    def add_manifest(self, repository, reference, manifest, media_type):
+        """Serve a manifest (dict) under a tag and its digest
+
+        Returns:
+            tuple: (digest, size)
+        """
+        data = json.dumps(manifest).encode('utf-8')
+        digest = f"sha256:{hashlib.sha256(data).hexdigest()}"
+        self.manifests[(repository, digest)] = (media_type, data)
+        if reference:
+            self.manifests[(repository, reference)] = (media_type, data)
+        return digest, len(data)
+
+    # ==========================================================================
+    def add_layout(self, repository, tag, layout_path):
+        """Serve the image of an OCI image layout under a tag
+
+        Returns:
+            dict: descriptor of the image manifest
+        """
+        with open(os.path.join(layout_path, 'index.json')) as index_file:
+            desc = json.load(index_file)['manifests'][0]
+        blob_dir = os.path.join(layout_path, 'blobs', 'sha256')
+        for name in os.listdir(blob_dir):
+            with open(os.path.join(blob_dir, name), 'rb') as blob_file:
+                self.add_blob(blob_file.read())
+        data = self.blobs[desc['digest']]
+        self.manifests[(repository, desc['digest'])] = (desc['mediaType'], data)
+        self.manifests[(repository, tag)] = (desc['mediaType'], data)
+        return desc
+
+    # ==========================================================================
+    def _handle(self, handler, send_body):
+        with self._lock:
+            self.requests.append((handler.command, handler.path, handler.headers.get('Range')))
+
+        if handler.path.startswith('/token'):
+            self._reply(handler, 200, json.dumps({'token': self.token, 'expires_in': 300}).encode('utf-8'),
+                        {'Content-Type': 'application/json'}, send_body)
+            return
+
+        if self.token and handler.headers.get('Authorization') != f"Bearer {self.token}":
+            challenge = f'Bearer realm="http://{self.address}/token",service="registry-stub"'
+            self._reply(handler, 401, b'', {'WWW-Authenticate': challenge}, send_body)
+            return
+
+        m = self.PATH_RE.match(handler.path)
+        if not m:
+            self._reply(handler, 200 if handler.path == '/v2/' else 404, b'', {}, send_body)
+            return
+
+        repository, kind, reference = m.groups()
+        if kind == 'manifests':
+            manifest = self.manifests.get((repository, reference))
+            if not manifest:
+                self._reply(handler, 404, b'', {}, send_body)
+                return
+            media_type, data = manifest
+            self._reply(handler, 200, data, {
+                'Content-Type': media_type,
+                'Docker-Content-Digest': f"sha256:{hashlib.sha256(data).hexdigest()}"
+            }, send_body)
+            return
+
+        data = self.blobs.get(reference)
+        if data is None:
+            self._reply(handler, 404, b'', {}, send_body)
+            return
+
+        status = 200
+        headers = {'Content-Type': 'application/octet-stream'}
+        m = self.RANGE_RE.match(handler.headers.get('Range') or '')
+        if m and self.support_range:
+            start = int(m.group(1))
+            if start >= len(data):
+                self._reply(handler, 416, b'', {'Content-Range': f"bytes */{len(data)}"}, send_body)
+                return
+            status = 206
+            headers['Content-Range'] = f"bytes {start}-{len(data) - 1}/{len(data)}"
+            data = data[start:]
+
+        with self._lock:
+            drops = self.drops.get(reference)
+            sent = drops.pop(0) if drops else None
+        self._reply(handler, status, data, headers, send_body, sent)
+
+    # ==========================================================================
+    @staticmethod
+    def _reply(handler, status, data, headers, send_body, sent=None):
+        handler.send_response(status)
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        if send_body:
+            if sent is None:
+                handler.wfile.write(data)
+            else:
+                # Connection lost in the middle of the body
+                handler.wfile.write(data[:sent])
+                handler.wfile.flush()
+                handler.close_connection = True
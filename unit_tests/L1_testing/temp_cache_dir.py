@@ -0,0 +1,53 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Consult Red
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+
+
+class TempCacheDir:
+    """Test case mixin pointing BUNDLEGEN_CACHE_DIR to a temporary directory
+    for the tests of the class, so the persistent caches (template indexes,
+    sqlite caches, blob store) stay out of the user cache directory
+
+    The process wide instances of the caches listed in CACHES are reset
+    before and after the tests, so they are opened in the temporary
+    directory. Test cases overriding tearDownClass must call
+    super().tearDownClass().
+    """
+    CACHES = ()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.cache_dir = tempfile.mkdtemp()
+        cls.saved_cache_dir = os.environ.get('BUNDLEGEN_CACHE_DIR')
+        os.environ['BUNDLEGEN_CACHE_DIR'] = cls.cache_dir
+        for cache in cls.CACHES:
+            cache._instance = None
+
+    @classmethod
+    def tearDownClass(cls):
+        for cache in cls.CACHES:
+            cache._instance = None
+        if cls.saved_cache_dir is None:
+            del os.environ['BUNDLEGEN_CACHE_DIR']
+        else:
+            os.environ['BUNDLEGEN_CACHE_DIR'] = cls.saved_cache_dir
+        shutil.rmtree(cls.cache_dir)
+        super().tearDownClass()
@@ -0,0 +1,175 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2021 RDK Management
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from get_L1_test_results import add_test_results
+from bundlegen.core.blob_store import BlobStore
+from bundlegen.core.image_downloader import ImageDownloader
+from loguru import logger
+
+#This class will test the functionality of API's in blob_store.py file.
+class TestBlobStore(unittest.TestCase):
+    def setUp(self):
+         logger.debug("Setup")
+         add_test_results.add_tests(self)
+
+    def tearDown(self):
+        logger.debug("tearDown")
+        if hasattr(self._outcome, 'errors'):
+            # Python 3.4 - 3.10  (These two methods have no side effects)
+            result = self.defaultTestResult()
+            self._feedErrorsToResult(result, self._outcome.errors)
+        else:
+            # Python 3.11+
+            result = self._outcome.result
+        ok = all(test != self for test, text in result.errors + result.failures)
+
+       # Demo output:  (print short info immediately - not important)
+        if ok:
+            logger.debug('\nOK: %s' % (self.id(),))
+            add_test_results.test_passed(self)
+
+        for typ, errors in (('ERROR', result.errors), ('FAIL', result.failures)):
+            for test, text in errors:
+                if test is self:
+                    #  the full traceback is in the variable `text`
+                    msg = [x for x in text.split('\n')[1:]
+                           if not x.startswith(' ')][0]
+                    logger.debug("\n\n%s: %s\n     %s" % (typ, self.id(), msg))
+                    add_test_results.test_failed(self, msg)
+
+    @classmethod
+    def tearDownClass(self):
+        add_test_results.end_results(self)
+
+    IMAGE_PATH = "./oci_images/dac-image-wayland-egl-test-oci"
+    PLATFORM = {'os': 'linux', 'arch': 'arm', 'variant': 'v7'}
+
+    def _download(self, store):
+        """Same result as skopeo copy with --dest-shared-blob-dir
+        """
+        layout_path = store.new_layout()
+        shutil.copytree(os.path.join(self.IMAGE_PATH, "blobs"), store.root, dirs_exist_ok=True)
+        for name in ["oci-layout", "index.json"]:
+            shutil.copy(os.path.join(self.IMAGE_PATH, name), layout_path)
+        return layout_path
+
+    def test_link_and_offline_layout(self):
+        logger.debug("-->checking that images are built from the blobs in the store")
+        store = BlobStore(tempfile.mkdtemp(), max_size=1024 ** 3)
+        try:
+            url = "docker://example.com/app:latest"
+            layout_path = self._download(store)
+            with store.lock():
+                self.assertTrue(store.link_layout(layout_path))
+            store.save_ref(url, self.PLATFORM, layout_path)
+
+            blobs = sorted(os.listdir(os.path.join(self.IMAGE_PATH, "blobs/sha256")))
+            self.assertEqual(sorted(os.listdir(os.path.join(layout_path, "blobs/sha256"))), blobs)
+            layer = os.path.join(layout_path, "blobs/sha256", blobs[0])
+            self.assertTrue(os.path.samefile(layer, store.blob_path("sha256:" + blobs[0])))
+
+            # Offline, only for the platform it was downloaded for
+            offline_path = store.new_layout()
+            self.assertTrue(store.create_layout(url, self.PLATFORM, offline_path))
+            self.assertEqual(sorted(os.listdir(os.path.join(offline_path, "blobs/sha256"))), blobs)
+            self.assertFalse(store.create_layout(url, dict(self.PLATFORM, arch='arm64'), store.new_layout()))
+
+            os.remove(store.blob_path("sha256:" + blobs[0]))
+            self.assertFalse(store.create_layout(url, self.PLATFORM, store.new_layout()))
+            self.assertIsNone(store.blob_path("sha256:../../etc"))
+        finally:
+            shutil.rmtree(store.root)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_evict_least_recently_used(self):
+        logger.debug("-->checking that the least recently used blobs are evicted")
+        store = BlobStore(tempfile.mkdtemp(), max_size=1000)
+        try:
+            self._download(store)
+            blobs = sorted(os.listdir(os.path.join(self.IMAGE_PATH, "blobs/sha256")))
+            layer, config, manifest = [store.blob_path("sha256:" + blob) for blob in blobs]
+            now = time.time()
+            for path, age in [(manifest, 100), (layer, 50), (config, 0)]:
+                os.utime(path, (now - age, now - age))
+
+            # Layer alone is over the limit, the manifest was used least recently
+            self.assertEqual(store.evict(), os.path.getsize(self.IMAGE_PATH + "/blobs/sha256/" + blobs[0]) + 420)
+            self.assertFalse(os.path.exists(layer))
+            self.assertFalse(os.path.exists(manifest))
+            self.assertTrue(os.path.exists(config))
+            self.assertEqual(store.evict(), 0)
+        finally:
+            shutil.rmtree(store.root)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_store_disabled_by_default(self):
+        logger.debug("-->checking that the blob store is only used when its size is set")
+        saved_size = os.environ.pop('BUNDLEGEN_BLOB_STORE_SIZE', None)
+        BlobStore._instance = None
+        try:
+            self.assertIsNone(BlobStore.get_instance())
+            os.environ['BUNDLEGEN_BLOB_STORE_SIZE'] = "0"
+            self.assertIsNone(BlobStore.get_instance())
+        finally:
+            os.environ.pop('BUNDLEGEN_BLOB_STORE_SIZE', None)
+            if saved_size is not None:
+                os.environ['BUNDLEGEN_BLOB_STORE_SIZE'] = saved_size
+            BlobStore._instance = None
+        logger.debug("-->Test was Successfully verified")
+
+    def test_offline_download(self):
+        logger.debug("-->checking that ImageDownloader creates images from the store in offline mode")
+        root = tempfile.mkdtemp()
+        os.environ['BUNDLEGEN_BLOB_STORE_DIR'] = root
+        os.environ['BUNDLEGEN_BLOB_STORE_SIZE'] = str(1024 ** 3)
+        BlobStore._instance = None
+        try:
+            store = BlobStore.get_instance()
+            url = "docker://example.com/app:latest"
+            platform_cfg = {"os": "linux", "arch": {"arch": "arm", "variant": "v7"}}
+            self.assertIsNone(ImageDownloader().download_image(url, None, platform_cfg, offline=True))
+            self.assertIsNone(ImageDownloader().get_image_digest(url, None, platform_cfg, offline=True))
+
+            layout_path = self._download(store)
+            store.save_ref(url, self.PLATFORM, layout_path)
+            with open(os.path.join(self.IMAGE_PATH, "index.json")) as index_file:
+                digest = json.load(index_file)["manifests"][0]["digest"]
+            self.assertEqual(ImageDownloader().get_image_digest(url, None, platform_cfg, offline=True), digest)
+            img_path = ImageDownloader().download_image(url, None, platform_cfg, offline=True)
+            self.assertTrue(img_path.startswith(store.layouts_dir))
+            self.assertTrue(os.path.exists(os.path.join(img_path, "index.json")))
+        finally:
+            del os.environ['BUNDLEGEN_BLOB_STORE_DIR']
+            del os.environ['BUNDLEGEN_BLOB_STORE_SIZE']
+            BlobStore._instance = None
+            shutil.rmtree(root)
+        logger.debug("-->Test was Successfully verified")
+
+
+if __name__ == "__main__":
+    unittest.main()
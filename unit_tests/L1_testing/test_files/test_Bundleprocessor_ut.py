@@ -21,15 +21,22 @@ import os
 import sys
 import unittest
 import shutil
+import tempfile
+import tarfile
+import struct
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from get_L1_test_results import add_test_results
+from temp_cache_dir import TempCacheDir
 from bundlegen.core.bundle_processor import BundleProcessor
 from bundlegen.core.library_matching import LibraryMatching
+from bundlegen.core.elf_cache import ElfInfoCache
 from loguru import logger
 
 #This class will test the functionality of API's in bundleprocessor.py file.
-class TestBundleProcessor(unittest.TestCase):
+class TestBundleProcessor(TempCacheDir, unittest.TestCase):
+    CACHES = (ElfInfoCache,)
+
     def setUp(self):
          logger.debug("Setup")
          add_test_results.add_tests(self)
@@ -62,6 +69,7 @@ class TestBundleProcessor(unittest.TestCase):
     @classmethod
     def tearDownClass(self):
         add_test_results.end_results(self)
+        super().tearDownClass()
 
     def test_process_oci_version(self):
     #When generate_compliant_config: True then it will parse the value of ociversion as 1.0.2
@@ -2781,5 +2789,170 @@ class TestBundleProcessor(unittest.TestCase):
 
         self.assertEqual(processor.oci_config, expected)
 
+    def test_checking_ld_cache(self):
+        logger.debug("-->checking the ld.so.cache and LD_LIBRARY_PATH of the bundle")
+        processor = BundleProcessor()
+        processor.rootfs_path = tempfile.mkdtemp()
+        for directory in ["usr/lib", "opt/app/lib", "opt/app/bin"]:
+            os.makedirs(os.path.join(processor.rootfs_path, directory))
+        shutil.copy("./test_data_files/dac-image-wayland-egl-test-bundle/libBrokenLocale-2.31.1",
+                    os.path.join(processor.rootfs_path, "opt/app/lib/libBrokenLocale.so.1"))
+        with open(os.path.join(processor.rootfs_path, "opt/app/bin/app"), "wb") as f:
+            f.write(self._build_elf("/lib/ld-linux-armhf.so.3"))
+        processor.platform_cfg = {"arch": {"arch": "arm", "variant": "v7"}}
+        processor.oci_config = {
+            "process": {"env": ["PATH=/usr/bin", "LD_LIBRARY_PATH=/opt/app/lib:/tmp/plugins:/usr/lib:/opt/app/lib"]},
+            "mounts": [{"source": "tmpfs", "destination": "/tmp", "type": "tmpfs", "options": ["nosuid", "nodev"]}]
+        }
+        processor._add_bind_mount("/usr/lib/libEGL.so.1", "/usr/lib/libEGL.so.1")
+        try:
+            processor._process_ld_cache()
+            # Only the directories after the last one not known from the rootfs are cached
+            self.assertEqual(processor.oci_config['process']['env'], ["PATH=/usr/bin", "LD_LIBRARY_PATH=/opt/app/lib:/tmp/plugins"])
+            with open(os.path.join(processor.rootfs_path, "etc/ld.so.cache"), "rb") as f:
+                cache = f.read()
+            self.assertTrue(cache.startswith(b'glibc-ld.so.cache1.1'))
+            self.assertIn(b'/usr/lib/libEGL.so.1\0', cache)
+            self.assertIn(b'/opt/app/lib/libBrokenLocale.so.1\0', cache)
+        finally:
+            shutil.rmtree(processor.rootfs_path)
+
+    def _build_elf(self, interp, runpath=None):
+        """Builds a minimal 64 bit little endian ELF executable with a PT_INTERP
+        segment and optionally a DT_RUNPATH entry
+        """
+        ehdr = struct.Struct('<HHIQQQIHHHHHH')
+        phdr = struct.Struct('<IIQQQQQQ')
+        shdr = struct.Struct('<IIQQQQIIQQ')
+        dyn = struct.Struct('<qQ')
+
+        interp = interp.encode() + b'\0'
+        dynstr = b'\0' + (runpath or '').encode() + b'\0'
+        dynamic = (dyn.pack(29, 1) if runpath else b'') + dyn.pack(0, 0)
+        interp_offset = 16 + ehdr.size + phdr.size
+        dynstr_offset = interp_offset + len(interp)
+        dynamic_offset = dynstr_offset + len(dynstr)
+        shdr_offset = dynamic_offset + len(dynamic)
+        sections = [
+            shdr.pack(0, 0, 0, 0, 0, 0, 0, 0, 0, 0),
+            shdr.pack(0, 3, 0, 0, dynstr_offset, len(dynstr), 0, 0, 1, 0),
+            shdr.pack(0, 6, 0, 0, dynamic_offset, len(dynamic), 1, 0, 8, dyn.size)
+        ]
+        ident = b'\x7fELF' + bytes([2, 1, 1]) + bytes(9)
+        header = ident + ehdr.pack(2, 0, 1, 0, 16 + ehdr.size, shdr_offset, 0, 16 + ehdr.size,
+                                   phdr.size, 1, shdr.size, len(sections), 0)
+        program_header = phdr.pack(3, 4, interp_offset, 0, 0, len(interp), len(interp), 1)
+        return header + program_header + interp + dynstr + dynamic + b''.join(sections)
+
+    def test_checking_ld_cache_with_runpath(self):
+        logger.debug("-->checking that LD_LIBRARY_PATH is kept when an ELF of the rootfs has a DT_RUNPATH")
+        processor = BundleProcessor()
+        processor.rootfs_path = tempfile.mkdtemp()
+        for directory in ["usr/lib", "opt/app/lib", "opt/app/bin"]:
+            os.makedirs(os.path.join(processor.rootfs_path, directory))
+        shutil.copy("./test_data_files/dac-image-wayland-egl-test-bundle/libBrokenLocale-2.31.1",
+                    os.path.join(processor.rootfs_path, "opt/app/lib/libBrokenLocale.so.1"))
+        with open(os.path.join(processor.rootfs_path, "opt/app/bin/app"), "wb") as f:
+            f.write(self._build_elf("/lib/ld-linux-armhf.so.3", "/usr/lib"))
+        processor.platform_cfg = {"arch": {"arch": "arm", "variant": "v7"}}
+        env = ["PATH=/usr/bin", "LD_LIBRARY_PATH=/opt/app/lib"]
+        processor.oci_config = {"process": {"env": list(env)}, "mounts": []}
+        try:
+            processor._process_ld_cache()
+            self.assertEqual(processor.oci_config['process']['env'], env)
+            with open(os.path.join(processor.rootfs_path, "etc/ld.so.cache"), "rb") as f:
+                cache = f.read()
+            self.assertNotIn(b'/opt/app/lib/libBrokenLocale.so.1\0', cache)
+        finally:
+            shutil.rmtree(processor.rootfs_path)
+
+    def test_checking_ld_cache_with_hwcaps(self):
+        logger.debug("-->checking that LD_LIBRARY_PATH directories with hwcap sub directories are kept")
+        processor = BundleProcessor()
+        processor.rootfs_path = tempfile.mkdtemp()
+        for directory in ["usr/lib", "opt/app/lib/tls", "opt/app/bin"]:
+            os.makedirs(os.path.join(processor.rootfs_path, directory))
+        shutil.copy("./test_data_files/dac-image-wayland-egl-test-bundle/libBrokenLocale-2.31.1",
+                    os.path.join(processor.rootfs_path, "opt/app/lib/tls/libBrokenLocale.so.1"))
+        with open(os.path.join(processor.rootfs_path, "opt/app/bin/app"), "wb") as f:
+            f.write(self._build_elf("/lib/ld-linux-armhf.so.3"))
+        processor.platform_cfg = {"arch": {"arch": "arm", "variant": "v7"}}
+        processor.oci_config = {"process": {"env": ["LD_LIBRARY_PATH=/opt/app/lib:/usr/lib"]}, "mounts": []}
+        try:
+            processor._process_ld_cache()
+            self.assertEqual(processor.oci_config['process']['env'], ["LD_LIBRARY_PATH=/opt/app/lib"])
+        finally:
+            shutil.rmtree(processor.rootfs_path)
+
+    def test_checking_ld_cache_with_musl(self):
+        logger.debug("-->checking that no ld.so.cache is written when the dynamic linker of the rootfs is not glibc")
+        processor = BundleProcessor()
+        processor.rootfs_path = tempfile.mkdtemp()
+        for directory in ["usr/lib", "opt/app/lib", "opt/app/bin"]:
+            os.makedirs(os.path.join(processor.rootfs_path, directory))
+        shutil.copy("./test_data_files/dac-image-wayland-egl-test-bundle/libBrokenLocale-2.31.1",
+                    os.path.join(processor.rootfs_path, "opt/app/lib/libBrokenLocale.so.1"))
+        with open(os.path.join(processor.rootfs_path, "opt/app/bin/app"), "wb") as f:
+            f.write(self._build_elf("/lib/ld-musl-armhf.so.1"))
+        processor.platform_cfg = {"arch": {"arch": "arm", "variant": "v7"}}
+        env = ["PATH=/usr/bin", "LD_LIBRARY_PATH=/opt/app/lib"]
+        processor.oci_config = {"process": {"env": list(env)}, "mounts": []}
+        try:
+            processor._process_ld_cache()
+            self.assertEqual(processor.oci_config['process']['env'], env)
+            self.assertFalse(os.path.exists(os.path.join(processor.rootfs_path, "etc/ld.so.cache")))
+        finally:
+            shutil.rmtree(processor.rootfs_path)
+
+    def test_checking_auto_libmatchingmode(self):
+        logger.debug("-->checking that libmatchingmode auto uses the plan of the selected mode")
+        processor = BundleProcessor()
+        processor.bundle_path = tempfile.mkdtemp()
+        processor.rootfs_path = os.path.join(processor.bundle_path, "rootfs")
+        os.makedirs(os.path.join(processor.rootfs_path, "usr/lib"))
+        shutil.copy("./test_data_files/dac-image-wayland-egl-test-bundle/libBrokenLocale-2.31.1",
+                    os.path.join(processor.rootfs_path, "usr/lib/libffi.so.7"))
+        processor.createmountpoints = False
+        processor.app_metadata = {}
+        processor.platform_cfg = {
+            "dobby": {"pluginDependencies": ["/usr/lib/libffi.so.7"]},
+            "libs": [{"name": "/usr/lib/libffi.so.7", "apiversions": ["GLIBC_2.4", "LIBFFI_BASE_7.0"], "deps": []}]
+        }
+        processor.oci_config = {"mounts": []}
+        processor.libmatcher = LibraryMatching(processor.platform_cfg, processor.bundle_path, processor._add_bind_mount, False, "auto", processor.createmountpoints)
+        try:
+            processor._select_library_matching_mode()
+            self.assertEqual(processor.libmatcher.libmatchingmode, "normal")
+            processor._process_dobby_plugin_dependencies()
+            self.assertFalse(processor.libmatcher.planned_steps)
+            self.assertEqual(processor.oci_config['mounts'], [{'source': '/usr/lib/libffi.so.7', 'destination': '/usr/lib/libffi.so.7', 'type': 'bind', 'options': ['rbind', 'nosuid', 'nodev', 'ro']}])
+            self.assertFalse(os.path.exists(os.path.join(processor.rootfs_path, "usr/lib/libffi.so.7")))
+        finally:
+            shutil.rmtree(processor.bundle_path)
+
+    def test_create_tgz_with_tarball_settings(self):
+        logger.debug("-->checking that the tarball gets the ownership and mask of the platform tarball settings")
+        processor = BundleProcessor()
+        processor.bundle_path = tempfile.mkdtemp()
+        processor.platform_cfg = {
+            "disableUserNamespacing": True,
+            "tarball": {"fileOwnershipSameAsUser": True, "fileMask": "770"}
+        }
+        processor.oci_config = {"process": {"user": {"uid": 1000, "gid": 1001}}}
+        dest = processor.bundle_path + "_out"
+        try:
+            with open(os.path.join(processor.bundle_path, "config.json"), "w") as config_file:
+                config_file.write("{}")
+            os.chmod(os.path.join(processor.bundle_path, "config.json"), 0o666)
+            self.assertTrue(processor.create_tgz(dest))
+            with tarfile.open(dest + ".tar.gz") as tar:
+                member = [m for m in tar.getmembers() if m.name.endswith("config.json")][0]
+            self.assertEqual((member.uid, member.gid, member.mode & 0o777), (1000, 1001, 0o660))
+        finally:
+            shutil.rmtree(processor.bundle_path)
+            if os.path.exists(dest + ".tar.gz"):
+                os.remove(dest + ".tar.gz")
+        logger.debug("-->Test was Successfully verified")
+
 if __name__ == "__main__":
     unittest.main()
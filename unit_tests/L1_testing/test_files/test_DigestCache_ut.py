@@ -0,0 +1,204 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2021 RDK Management
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from get_L1_test_results import add_test_results
+from registry_stub import RegistryStub
+from bundlegen.core.digest_cache import DigestCache
+from bundlegen.core.image_reference import ImageReference
+from bundlegen.core.image_downloader import ImageDownloader
+from bundlegen.core.blob_store import BlobStore
+from bundlegen.core.registry_client import OCI_INDEX, OCI_MANIFEST
+from loguru import logger
+
+#This class will test the functionality of API's in digest_cache.py file.
+class TestDigestCache(unittest.TestCase):
+    def setUp(self):
+         logger.debug("Setup")
+         add_test_results.add_tests(self)
+
+    def tearDown(self):
+        logger.debug("tearDown")
+        if hasattr(self._outcome, 'errors'):
+            # Python 3.4 - 3.10  (These two methods have no side effects)
+            result = self.defaultTestResult()
+            self._feedErrorsToResult(result, self._outcome.errors)
+        else:
+            # Python 3.11+
+            result = self._outcome.result
+        ok = all(test != self for test, text in result.errors + result.failures)
+
+       # Demo output:  (print short info immediately - not important)
+        if ok:
+            logger.debug('\nOK: %s' % (self.id(),))
+            add_test_results.test_passed(self)
+
+        for typ, errors in (('ERROR', result.errors), ('FAIL', result.failures)):
+            for test, text in errors:
+                if test is self:
+                    #  the full traceback is in the variable `text`
+                    msg = [x for x in text.split('\n')[1:]
+                           if not x.startswith(' ')][0]
+                    logger.debug("\n\n%s: %s\n     %s" % (typ, self.id(), msg))
+                    add_test_results.test_failed(self, msg)
+
+    @classmethod
+    def tearDownClass(self):
+        add_test_results.end_results(self)
+
+    IMAGE_PATH = "./oci_images/dac-image-wayland-egl-test-oci"
+    PLATFORM = {'os': 'linux', 'arch': 'arm', 'variant': 'v7'}
+    PLATFORM_CFG = {"os": "linux", "arch": {"arch": "arm", "variant": "v7"}}
+
+    def _make_cache(self, tmp_dir):
+        return DigestCache(os.path.join(tmp_dir, DigestCache.DB_FILENAME), max_entries=2)
+
+    def _add_index(self, stub, repository, tag, manifests):
+        """Serve a manifest list of the image manifests of the layout, the
+        manifest of another image (moved tag) if it is annotated
+        """
+        descs = []
+        for annotation in manifests:
+            desc = stub.add_layout(repository, "layout", self.IMAGE_PATH)
+            if annotation:
+                manifest = json.loads(stub.blobs[desc["digest"]])
+                manifest["annotations"] = {"build": annotation}
+                digest, size = stub.add_manifest(repository, None, manifest, OCI_MANIFEST)
+                desc = dict(desc, digest=digest, size=size)
+            descs.append(dict(desc, platform={"os": "linux", "architecture": "arm", "variant": "v7"}))
+        stub.add_manifest(repository, tag, {"schemaVersion": 2, "mediaType": OCI_INDEX, "manifests": descs}, OCI_INDEX)
+        return descs[0]["digest"]
+
+    def _manifest_requests(self, stub):
+        return [(method, path.rsplit("/", 1)[-1]) for method, path, _ in stub.requests if "/manifests/" in path]
+
+    def test_get_put(self):
+        logger.debug("-->checking that tags expire and digests do not")
+        tmp_dir = tempfile.mkdtemp()
+        cache = self._make_cache(tmp_dir)
+        tag = ImageReference.parse("docker://registry:5000/app:1.0")
+        pinned = tag.with_digest("sha256:" + "a" * 64)
+        try:
+            key = DigestCache.make_key(tag, self.PLATFORM)
+            self.assertIsNone(cache.get(key))
+            self.assertNotEqual(key, DigestCache.make_key(tag, self.PLATFORM, "user:password"))
+            self.assertNotEqual(key, DigestCache.make_key(tag, dict(self.PLATFORM, arch="arm64")))
+            self.assertNotEqual(key, DigestCache.make_key(pinned, self.PLATFORM))
+
+            cache.put(key, "sha256:1", "sha256:2")
+            self.assertEqual(cache.get(key), ("sha256:1", "sha256:2", True))
+            pinned_key = DigestCache.make_key(pinned, self.PLATFORM)
+            cache.put(pinned_key, "sha256:3", pinned=True)
+
+            cache.ttl = 0
+            self.assertEqual(cache.get(key), ("sha256:1", "sha256:2", False))
+            self.assertEqual(cache.get(pinned_key), ("sha256:3", None, True))
+
+            # Least recently used entry evicted
+            time.sleep(0.01)
+            cache.get(key)
+            cache.put("other", "sha256:4")
+            self.assertIsNone(cache.get(pinned_key))
+            self.assertEqual(cache.stats()["entries"], 2)
+
+            disabled = DigestCache(None)
+            disabled.put(key, "sha256:1")
+            self.assertIsNone(disabled.get(key))
+        finally:
+            shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_resolve_moving_tag(self):
+        logger.debug("-->checking that tags are only resolved again when they moved")
+        tmp_dir = tempfile.mkdtemp()
+        cache = DigestCache._instance = self._make_cache(tmp_dir)
+        try:
+            with RegistryStub() as stub:
+                os.environ['BUNDLEGEN_INSECURE_REGISTRIES'] = stub.address
+                first = self._add_index(stub, "app", "1.0", [None])
+                url = f"docker://{stub.address}/app:1.0"
+                downloader = ImageDownloader("native")
+                self.assertEqual(downloader.get_image_digest(url, None, self.PLATFORM_CFG), first)
+
+                # Within the TTL, the registry is not asked again
+                requests = len(stub.requests)
+                self.assertEqual(downloader.get_image_digest(url, None, self.PLATFORM_CFG), first)
+                self.assertEqual(len(stub.requests), requests)
+
+                # After it, a HEAD request shows that the tag did not move
+                cache.ttl = 0
+                self.assertEqual(downloader.get_image_digest(url, None, self.PLATFORM_CFG), first)
+                self.assertEqual(self._manifest_requests(stub)[-1:], [("HEAD", "1.0")])
+                self.assertEqual(len(stub.requests), requests + 1)
+
+                # The tag moved, the new manifest list is fetched by its digest
+                second = self._add_index(stub, "app", "1.0", ["2"])
+                self.assertNotEqual(second, first)
+                self.assertEqual(downloader.get_image_digest(url, None, self.PLATFORM_CFG), second)
+                self.assertEqual(self._manifest_requests(stub)[-3][0], "HEAD")
+                self.assertTrue(self._manifest_requests(stub)[-2][1].startswith("sha256:"))
+        finally:
+            os.environ.pop('BUNDLEGEN_INSECURE_REGISTRIES', None)
+            DigestCache._instance = None
+            shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_download_pinned_digest(self):
+        logger.debug("-->checking that images are downloaded by the digest they were resolved to")
+        tmp_dir = tempfile.mkdtemp()
+        DigestCache._instance = self._make_cache(tmp_dir)
+        os.environ['BUNDLEGEN_BLOB_STORE_DIR'] = os.path.join(tmp_dir, "blobs")
+        os.environ['BUNDLEGEN_BLOB_STORE_SIZE'] = str(1024 ** 3)
+        BlobStore._instance = None
+        try:
+            with RegistryStub() as stub:
+                os.environ['BUNDLEGEN_INSECURE_REGISTRIES'] = stub.address
+                first = self._add_index(stub, "app", "latest", [None])
+                url = f"docker://{stub.address}/app"
+                downloader = ImageDownloader("native")
+                digest = downloader.get_image_digest(url, None, self.PLATFORM_CFG)
+                self._add_index(stub, "app", "latest", ["2"])
+
+                img_path = downloader.download_image(url, None, self.PLATFORM_CFG, digest=digest)
+                with open(os.path.join(img_path, "index.json")) as index_file:
+                    desc = json.load(index_file)["manifests"][0]
+                self.assertEqual(desc["digest"], first)
+                self.assertEqual(desc["annotations"]["org.opencontainers.image.ref.name"], "latest")
+                # Offline builds find the image by the URL given by the user
+                self.assertEqual(BlobStore.get_instance().get_ref_digest(url, self.PLATFORM), first)
+        finally:
+            os.environ.pop('BUNDLEGEN_INSECURE_REGISTRIES', None)
+            del os.environ['BUNDLEGEN_BLOB_STORE_DIR']
+            del os.environ['BUNDLEGEN_BLOB_STORE_SIZE']
+            BlobStore._instance = None
+            DigestCache._instance = None
+            shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+
+if __name__ == "__main__":
+    unittest.main()
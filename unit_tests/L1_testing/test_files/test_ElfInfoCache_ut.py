@@ -0,0 +1,152 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2021 RDK Management
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from get_L1_test_results import add_test_results
+from bundlegen.core.elf_cache import ElfInfoCache
+from bundlegen.core.readelf import ReadElf
+from loguru import logger
+
+#This class will test the functionality of API's in elf_cache.py file.
+class TestElfInfoCache(unittest.TestCase):
+    def setUp(self):
+         logger.debug("Setup")
+         add_test_results.add_tests(self)
+
+    def tearDown(self):
+        logger.debug("tearDown")
+        if hasattr(self._outcome, 'errors'):
+            # Python 3.4 - 3.10  (These two methods have no side effects)
+            result = self.defaultTestResult()
+            self._feedErrorsToResult(result, self._outcome.errors)
+        else:
+            # Python 3.11+
+            result = self._outcome.result
+        ok = all(test != self for test, text in result.errors + result.failures)
+
+       # Demo output:  (print short info immediately - not important)
+        if ok:
+            logger.debug('\nOK: %s' % (self.id(),))
+            add_test_results.test_passed(self)
+
+        for typ, errors in (('ERROR', result.errors), ('FAIL', result.failures)):
+            for test, text in errors:
+                if test is self:
+                    #  the full traceback is in the variable `text`
+                    msg = [x for x in text.split('\n')[1:]
+                           if not x.startswith(' ')][0]
+                    logger.debug("\n\n%s: %s\n     %s" % (typ, self.id(), msg))
+                    add_test_results.test_failed(self, msg)
+
+    @classmethod
+    def tearDownClass(self):
+        add_test_results.end_results(self)
+
+    LIB = "./test_data_files/dac-image-wayland-egl-test-bundle/libBrokenLocale-2.31.1"
+
+    def test_cache_hit_by_content(self):
+        logger.debug("-->checking that libs are only read once for the same content")
+        tmp_dir = tempfile.mkdtemp()
+        cache = ElfInfoCache(os.path.join(tmp_dir, ElfInfoCache.DB_FILENAME))
+        expected = ReadElf.read_dynamic_info(self.LIB)
+        self.assertEqual(cache.get(self.LIB, ReadElf.read_dynamic_info), expected)
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+        # Same content at another path, and in another process sharing the database
+        copy_path = os.path.join(tmp_dir, "libBrokenLocale.so.1")
+        shutil.copy(self.LIB, copy_path)
+        cache = ElfInfoCache(os.path.join(tmp_dir, ElfInfoCache.DB_FILENAME))
+        self.assertEqual(cache.get(copy_path, lambda path: self.fail("lib read again")), expected)
+        self.assertEqual(cache.get_hash(copy_path), cache.get_hash(self.LIB))
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 0, 'entries': 1})
+
+        # Modified content is read again
+        with open(copy_path, "ab") as f:
+            f.write(b"\0")
+        self.assertEqual(cache.get(copy_path, ReadElf.read_dynamic_info), expected)
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'entries': 2})
+        shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_cache_lru_eviction(self):
+        logger.debug("-->checking that the least recently used entries are evicted")
+        tmp_dir = tempfile.mkdtemp()
+        cache = ElfInfoCache(os.path.join(tmp_dir, ElfInfoCache.DB_FILENAME), max_entries=2)
+        paths = []
+        for i in range(3):
+            path = os.path.join(tmp_dir, f"lib{i}.so")
+            with open(path, "w") as f:
+                f.write(f"not an elf file {i}")
+            paths.append(path)
+
+        cache.get(paths[0], ReadElf.read_dynamic_info)
+        cache.get(paths[1], ReadElf.read_dynamic_info)
+        cache.get(paths[0], ReadElf.read_dynamic_info)
+        cache.get(paths[2], ReadElf.read_dynamic_info)
+        self.assertEqual(cache.stats()['entries'], 2)
+
+        # lib1 was least recently used
+        cache.get(paths[0], ReadElf.read_dynamic_info)
+        cache.get(paths[2], ReadElf.read_dynamic_info)
+        self.assertEqual(cache.hits, 3)
+        cache.get(paths[1], ReadElf.read_dynamic_info)
+        self.assertEqual(cache.misses, 4)
+        shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_get_many_reads_misses_only(self):
+        logger.debug("-->checking that only the libs missing from the cache are given to the map function")
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            cache = ElfInfoCache(os.path.join(tmp_dir, ElfInfoCache.DB_FILENAME))
+            copy_path = os.path.join(tmp_dir, "libBrokenLocale.so.1")
+            shutil.copy(self.LIB, copy_path)
+            missing_path = os.path.join(tmp_dir, "missing.so")
+            expected = ReadElf.read_dynamic_info(self.LIB)
+            cache.get(self.LIB, ReadElf.read_dynamic_info)
+
+            mapped = []
+            def map_func(loader, paths):
+                mapped.extend(paths)
+                return map(loader, paths)
+
+            infos = cache.get_many([copy_path, missing_path, copy_path], ReadElf.read_dynamic_info, map_func)
+            self.assertEqual(infos, [expected, None, expected])
+            self.assertEqual(mapped, [missing_path])
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+        finally:
+            shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_cache_disabled(self):
+        logger.debug("-->checking that libs are read directly without a cache database")
+        cache = ElfInfoCache(None)
+        self.assertEqual(cache.get(self.LIB, ReadElf.read_dynamic_info)['apiversions'], ['GLIBC_2.4'])
+        self.assertEqual(cache.stats(), {'hits': 0, 'misses': 0, 'entries': 0})
+        logger.debug("-->Test was Successfully verified")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -24,12 +24,16 @@ import shutil
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from get_L1_test_results import add_test_results
+from temp_cache_dir import TempCacheDir
 from bundlegen.core.image_downloader import ImageDownloader
 from bundlegen.core.image_unpacker import ImageUnpackager
+from bundlegen.core.blob_store import BlobStore
 from loguru import logger
 
 #This class will test the functionality of API's in stbplatform.py file.
-class TestImageDownloader(unittest.TestCase):
+class TestImageDownloader(TempCacheDir, unittest.TestCase):
+    CACHES = (BlobStore,)
+
     def setUp(self):
          logger.debug("Setup")
          add_test_results.add_tests(self)
@@ -62,6 +66,7 @@ class TestImageDownloader(unittest.TestCase):
     @classmethod
     def tearDownClass(self):
         add_test_results.end_results(self)
+        super().tearDownClass()
 
     def test_oci_image_download(self):
         logger.debug("-->checking the image is been downloaded ")
@@ -138,7 +143,8 @@ class TestImageDownloader(unittest.TestCase):
     def test_negative_case_for_skopeo_not_found_error(self):
         img_downloader = ImageDownloader()
         img_downloader.skopeo_found = False
-        image = "oci:./oci_images/dac-image-wayland-egl-test-oci:latest"
+        # Local images are imported without skopeo
+        image = "docker://hello-world"
         creds = None
         img_downloader.platform_cfg = {
         }
@@ -0,0 +1,120 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2021 RDK Management
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from get_L1_test_results import add_test_results
+from bundlegen.core.image_reference import ImageReference
+from bundlegen.core.image_downloader import ImageDownloader
+from loguru import logger
+
+#This class will test the functionality of API's in image_reference.py file.
+class TestImageReference(unittest.TestCase):
+    def setUp(self):
+         logger.debug("Setup")
+         add_test_results.add_tests(self)
+
+    def tearDown(self):
+        logger.debug("tearDown")
+        if hasattr(self._outcome, 'errors'):
+            # Python 3.4 - 3.10  (These two methods have no side effects)
+            result = self.defaultTestResult()
+            self._feedErrorsToResult(result, self._outcome.errors)
+        else:
+            # Python 3.11+
+            result = self._outcome.result
+        ok = all(test != self for test, text in result.errors + result.failures)
+
+       # Demo output:  (print short info immediately - not important)
+        if ok:
+            logger.debug('\nOK: %s' % (self.id(),))
+            add_test_results.test_passed(self)
+
+        for typ, errors in (('ERROR', result.errors), ('FAIL', result.failures)):
+            for test, text in errors:
+                if test is self:
+                    #  the full traceback is in the variable `text`
+                    msg = [x for x in text.split('\n')[1:]
+                           if not x.startswith(' ')][0]
+                    logger.debug("\n\n%s: %s\n     %s" % (typ, self.id(), msg))
+                    add_test_results.test_failed(self, msg)
+
+    @classmethod
+    def tearDownClass(self):
+        add_test_results.end_results(self)
+
+    DIGEST = "sha256:" + "a" * 64
+
+    def _parts(self, url):
+        ref = ImageReference.parse(url)
+        return (ref.registry, ref.repository, ref.tag, ref.digest)
+
+    def test_parse_registry_references(self):
+        logger.debug("-->checking that docker:// references are parsed like the docker CLI")
+        self.assertEqual(self._parts("docker://hello-world"), ("docker.io", "library/hello-world", "latest", None))
+        self.assertEqual(self._parts("docker://rdk/app:1.0"), ("docker.io", "rdk/app", "1.0", None))
+        self.assertEqual(self._parts("docker://localhost:5000/app"), ("localhost:5000", "app", "latest", None))
+        self.assertEqual(self._parts("docker://localhost:5000/ns/app:2"), ("localhost:5000", "ns/app", "2", None))
+        self.assertEqual(self._parts("docker://localhost/app"), ("localhost", "app", "latest", None))
+        self.assertEqual(self._parts(f"docker://us.icr.io/app@{self.DIGEST}"), ("us.icr.io", "app", None, self.DIGEST))
+        self.assertEqual(self._parts(f"docker://registry:5000/app:1.0@{self.DIGEST}"),
+                         ("registry:5000", "app", "1.0", self.DIGEST))
+        self.assertEqual(ImageReference.parse(f"docker://app@{self.DIGEST}").reference, self.DIGEST)
+
+        for url in ["docker://", "docker://App", "docker://app:bad/tag", "docker://app@sha256:abc",
+                    "docker://app:", "hello-world", "docker:hello-world", "dir:/tmp/image"]:
+            self.assertIsNone(ImageReference.parse(url), url)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_parse_local_references(self):
+        logger.debug("-->checking that local references end their path at the first colon")
+        ref = ImageReference.parse("oci:/tmp/image:latest")
+        self.assertTrue(ref.is_local)
+        self.assertEqual((ref.transport, ref.path, ref.tag), ("oci", "/tmp/image", "latest"))
+        ref = ImageReference.parse("docker-archive:app.tar:app:1.0")
+        self.assertEqual((ref.path, ref.reference, ref.layout_tag), ("app.tar", "app:1.0", "1.0"))
+        self.assertEqual(ImageReference.parse("oci-archive:image.tar").layout_tag, "latest")
+        self.assertEqual(str(ref), "docker-archive:app.tar:app:1.0")
+        logger.debug("-->Test was Successfully verified")
+
+    def test_urls_and_layout_tags(self):
+        logger.debug("-->checking the URLs of pinned references and the tags in image layouts")
+        ref = ImageReference.parse("docker://localhost:5000/app:1.0")
+        self.assertEqual(ref.to_url(), "docker://localhost:5000/app:1.0")
+        pinned = ref.with_digest(self.DIGEST)
+        # skopeo does not accept a tag and a digest
+        self.assertEqual(pinned.to_url(), f"docker://localhost:5000/app@{self.DIGEST}")
+        self.assertEqual((pinned.reference, pinned.layout_tag), (self.DIGEST, "1.0"))
+        self.assertEqual(ref.reference, "1.0")
+        self.assertEqual(ImageReference.parse("docker://hello-world").to_url(),
+                         "docker://docker.io/library/hello-world:latest")
+
+        self.assertEqual(ImageDownloader.get_image_tag("docker://localhost:5000/app"), "latest")
+        self.assertEqual(ImageDownloader.get_image_tag(f"docker://app@{self.DIGEST}"), "latest")
+        self.assertEqual(ImageDownloader.get_image_tag(f"docker://app:2.1@{self.DIGEST}"), "2.1")
+        self.assertEqual(ImageDownloader.get_image_tag("oci:/tmp/image"), "latest")
+        self.assertEqual(ImageDownloader.get_image_tag("dir:/tmp/image:1.0"), "1.0")
+        logger.debug("-->Test was Successfully verified")
+
+
+if __name__ == "__main__":
+    unittest.main()
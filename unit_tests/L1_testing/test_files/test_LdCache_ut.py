@@ -0,0 +1,211 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2021 RDK Management
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import os
+import sys
+import shutil
+import struct
+import tempfile
+import unittest
+from functools import cmp_to_key
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from get_L1_test_results import add_test_results
+from temp_cache_dir import TempCacheDir
+from bundlegen.core.ld_cache import LdCache
+from bundlegen.core.elf_cache import ElfInfoCache
+from loguru import logger
+
+#This class will test the functionality of API's in ld_cache.py file.
+class TestLdCache(TempCacheDir, unittest.TestCase):
+    CACHES = (ElfInfoCache,)
+
+    def setUp(self):
+         logger.debug("Setup")
+         add_test_results.add_tests(self)
+
+    def tearDown(self):
+        logger.debug("tearDown")
+        if hasattr(self._outcome, 'errors'):
+            # Python 3.4 - 3.10  (These two methods have no side effects)
+            result = self.defaultTestResult()
+            self._feedErrorsToResult(result, self._outcome.errors)
+        else:
+            # Python 3.11+
+            result = self._outcome.result
+        ok = all(test != self for test, text in result.errors + result.failures)
+
+       # Demo output:  (print short info immediately - not important)
+        if ok:
+            logger.debug('\nOK: %s' % (self.id(),))
+            add_test_results.test_passed(self)
+
+        for typ, errors in (('ERROR', result.errors), ('FAIL', result.failures)):
+            for test, text in errors:
+                if test is self:
+                    #  the full traceback is in the variable `text`
+                    msg = [x for x in text.split('\n')[1:]
+                           if not x.startswith(' ')][0]
+                    logger.debug("\n\n%s: %s\n     %s" % (typ, self.id(), msg))
+                    add_test_results.test_failed(self, msg)
+
+    @classmethod
+    def tearDownClass(self):
+        add_test_results.end_results(self)
+        super().tearDownClass()
+
+    def _create_rootfs(self):
+        rootfs_path = tempfile.mkdtemp()
+        lib = "./test_data_files/dac-image-wayland-egl-test-bundle/libBrokenLocale-2.31.1"
+        for directory in ["usr/lib", "opt/app/lib", "etc/ld.so.conf.d"]:
+            os.makedirs(os.path.join(rootfs_path, directory))
+        os.symlink("usr/lib", os.path.join(rootfs_path, "lib"))
+        shutil.copy(lib, os.path.join(rootfs_path, "usr/lib/libBrokenLocale-2.31.so"))
+        os.symlink("libBrokenLocale-2.31.so", os.path.join(rootfs_path, "usr/lib/libBrokenLocale.so.1"))
+        os.symlink("libBrokenLocale.so.1", os.path.join(rootfs_path, "usr/lib/libBrokenLocale.so"))
+        with open(os.path.join(rootfs_path, "usr/lib/libc.so"), "w") as f:
+            f.write("GROUP ( /lib/libc.so.6 )\n")
+        shutil.copy(lib, os.path.join(rootfs_path, "opt/app/lib/libBrokenLocale.so.1"))
+        with open(os.path.join(rootfs_path, "etc/ld.so.conf"), "w") as f:
+            f.write("# comment\ninclude /etc/ld.so.conf.d/*.conf\n")
+        with open(os.path.join(rootfs_path, "etc/ld.so.conf.d/app.conf"), "w") as f:
+            f.write("/opt/app/lib\n")
+        return rootfs_path
+
+    def _build_elf(self, interp, runpath=None):
+        """Builds a minimal 64 bit little endian ELF executable with a PT_INTERP
+        segment and optionally a DT_RUNPATH entry
+        """
+        ehdr = struct.Struct('<HHIQQQIHHHHHH')
+        phdr = struct.Struct('<IIQQQQQQ')
+        shdr = struct.Struct('<IIQQQQIIQQ')
+        dyn = struct.Struct('<qQ')
+
+        interp = interp.encode() + b'\0'
+        dynstr = b'\0' + (runpath or '').encode() + b'\0'
+        dynamic = (dyn.pack(29, 1) if runpath else b'') + dyn.pack(0, 0)
+        interp_offset = 16 + ehdr.size + phdr.size
+        dynstr_offset = interp_offset + len(interp)
+        dynamic_offset = dynstr_offset + len(dynstr)
+        shdr_offset = dynamic_offset + len(dynamic)
+        sections = [
+            shdr.pack(0, 0, 0, 0, 0, 0, 0, 0, 0, 0),
+            shdr.pack(0, 3, 0, 0, dynstr_offset, len(dynstr), 0, 0, 1, 0),
+            shdr.pack(0, 6, 0, 0, dynamic_offset, len(dynamic), 1, 0, 8, dyn.size)
+        ]
+        ident = b'\x7fELF' + bytes([2, 1, 1]) + bytes(9)
+        header = ident + ehdr.pack(2, 0, 1, 0, 16 + ehdr.size, shdr_offset, 0, 16 + ehdr.size,
+                                   phdr.size, 1, shdr.size, len(sections), 0)
+        program_header = phdr.pack(3, 4, interp_offset, 0, 0, len(interp), len(interp), 1)
+        return header + program_header + interp + dynstr + dynamic + b''.join(sections)
+
+    def _read_cache(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, nlibs, _, flags, _ = LdCache.HEADER.unpack_from(data, 0)
+        self.assertEqual((magic, version, flags), (b'glibc-ld.so.cache', b'1.1', LdCache.ENDIAN_LITTLE))
+        string = lambda offset: data[offset:data.index(b'\0', offset)].decode()
+        entries = []
+        for i in range(nlibs):
+            entry_flags, key, value, _, _ = LdCache.ENTRY.unpack_from(data, LdCache.HEADER.size + i * LdCache.ENTRY.size)
+            entries.append((entry_flags, string(key), string(value)))
+        return entries
+
+    def test_write_cache(self):
+        logger.debug("-->checking the ld.so.cache written for rootfs and mounted libs")
+        rootfs_path = self._create_rootfs()
+        try:
+            ld_cache = LdCache(rootfs_path, 'arm')
+            self.assertFalse(ld_cache.exists())
+            directories = ld_cache.get_ld_so_conf_dirs()
+            self.assertEqual(directories, ['/opt/app/lib'])
+            ld_cache.add_directories(directories + ld_cache.get_default_dirs(), ['/usr/lib/libEGL.so.1'])
+            self.assertTrue(ld_cache.covers('/usr/lib'))
+            self.assertFalse(ld_cache.covers('/usr/lib/plugins'))
+            self.assertEqual(ld_cache.write(), 3)
+
+            # Descending order, first directory wins, symlinks listed by name
+            self.assertEqual(self._read_cache(os.path.join(rootfs_path, "etc/ld.so.cache")), [
+                (3, 'libEGL.so.1', '/lib/libEGL.so.1'),
+                (3, 'libBrokenLocale.so.1', '/opt/app/lib/libBrokenLocale.so.1'),
+                (3, 'libBrokenLocale.so', '/lib/libBrokenLocale.so')
+            ])
+            self.assertTrue(LdCache(rootfs_path, 'aarch64').exists())
+        finally:
+            shutil.rmtree(rootfs_path)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_has_hwcap_subdirs(self):
+        logger.debug("-->checking that directories with optimised lib sub directories are detected")
+        rootfs_path = self._create_rootfs()
+        try:
+            os.makedirs(os.path.join(rootfs_path, "opt/app/lib/glibc-hwcaps/x86-64-v3"))
+            os.makedirs(os.path.join(rootfs_path, "usr/lib/plugins"))
+            with open(os.path.join(rootfs_path, "usr/lib/tls"), "w") as f:
+                f.write("not a directory")
+            ld_cache = LdCache(rootfs_path, 'x86_64')
+            self.assertTrue(ld_cache.has_hwcap_subdirs('/opt/app/lib'))
+            self.assertFalse(ld_cache.has_hwcap_subdirs('/usr/lib'))
+            self.assertFalse(ld_cache.has_hwcap_subdirs('/lib/missing'))
+            os.symlink("plugins", os.path.join(rootfs_path, "usr/lib/neon"))
+            self.assertTrue(LdCache(rootfs_path, 'arm').has_hwcap_subdirs('/lib'))
+        finally:
+            shutil.rmtree(rootfs_path)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_check_interpreter(self):
+        logger.debug("-->checking that the cache is only written for the glibc dynamic linker")
+        rootfs_path = self._create_rootfs()
+        try:
+            self.assertEqual(LdCache(rootfs_path, 'arm').check_interpreter(), "no dynamically linked executable found")
+            os.makedirs(os.path.join(rootfs_path, "opt/app/bin"))
+            with open(os.path.join(rootfs_path, "opt/app/bin/app"), "wb") as f:
+                f.write(self._build_elf("/lib/ld-linux-armhf.so.3"))
+            self.assertIsNone(LdCache(rootfs_path, 'arm').check_interpreter())
+            with open(os.path.join(rootfs_path, "opt/app/bin/tool"), "wb") as f:
+                f.write(self._build_elf("/lib/ld-musl-armhf.so.1"))
+            self.assertEqual(LdCache(rootfs_path, 'arm').check_interpreter(),
+                             "dynamic linker /lib/ld-musl-armhf.so.1 is not the glibc one")
+        finally:
+            shutil.rmtree(rootfs_path)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_find_runpath(self):
+        logger.debug("-->checking that ELF files with a DT_RUNPATH are found")
+        rootfs_path = self._create_rootfs()
+        try:
+            self.assertIsNone(LdCache(rootfs_path, 'arm').find_runpath())
+            os.makedirs(os.path.join(rootfs_path, "opt/app/bin"))
+            with open(os.path.join(rootfs_path, "opt/app/bin/app"), "wb") as f:
+                f.write(self._build_elf("/lib/ld-linux-armhf.so.3", "$ORIGIN/../lib"))
+            self.assertEqual(LdCache(rootfs_path, 'arm').find_runpath(), "/opt/app/bin/app")
+        finally:
+            shutil.rmtree(rootfs_path)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_libcmp(self):
+        logger.debug("-->checking the glibc ordering of lib names")
+        names = ['libc.so.6', 'libz.so', 'libc.so.10', 'libz.so.1', 'libz2.so']
+        self.assertEqual(sorted(names, key=cmp_to_key(LdCache._libcmp), reverse=True),
+                         ['libz2.so', 'libz.so.1', 'libz.so', 'libc.so.10', 'libc.so.6'])
+        logger.debug("-->Test was Successfully verified")
+
+
+if __name__ == "__main__":
+    unittest.main()
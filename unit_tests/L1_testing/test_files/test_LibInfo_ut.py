@@ -0,0 +1,125 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2021 RDK Management
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from get_L1_test_results import add_test_results
+from temp_cache_dir import TempCacheDir
+from bundlegen.core.lib_info import LibInfo, LibsTable
+from bundlegen.core.platform_cache import PlatformConfigCache
+from bundlegen.core.stb_platform import STBPlatform
+from loguru import logger
+
+#This class will test the functionality of API's in lib_info.py file.
+class TestLibInfo(TempCacheDir, unittest.TestCase):
+    def setUp(self):
+         logger.debug("Setup")
+         add_test_results.add_tests(self)
+
+    def tearDown(self):
+        logger.debug("tearDown")
+        if hasattr(self._outcome, 'errors'):
+            # Python 3.4 - 3.10  (These two methods have no side effects)
+            result = self.defaultTestResult()
+            self._feedErrorsToResult(result, self._outcome.errors)
+        else:
+            # Python 3.11+
+            result = self._outcome.result
+        ok = all(test != self for test, text in result.errors + result.failures)
+
+       # Demo output:  (print short info immediately - not important)
+        if ok:
+            logger.debug('\nOK: %s' % (self.id(),))
+            add_test_results.test_passed(self)
+
+        for typ, errors in (('ERROR', result.errors), ('FAIL', result.failures)):
+            for test, text in errors:
+                if test is self:
+                    #  the full traceback is in the variable `text`
+                    msg = [x for x in text.split('\n')[1:]
+                           if not x.startswith(' ')][0]
+                    logger.debug("\n\n%s: %s\n     %s" % (typ, self.id(), msg))
+                    add_test_results.test_failed(self, msg)
+
+    @classmethod
+    def tearDownClass(self):
+        add_test_results.end_results(self)
+        super().tearDownClass()
+
+    def test_libs_table_records(self):
+        logger.debug("-->checking that lib records read like the libs json entries after sublibs processing")
+        libs = [
+            {'name': '/lib/libc.so.6', 'apiversions': ['GLIBC_2.4', 'GLIBC_2.5'], 'deps': ['/lib/ld-linux-armhf.so.3']},
+            {'name': '/lib/libm.so.6', 'apiversions': ['GLIBC_2.4'], 'deps': ['/lib/libc.so.6']},
+            {'name': '/usr/lib/libfoo.so.1', 'apiversions': ['FOO_1.0'], 'deps': ['/lib/libc.so.6'],
+             'sha256': 'ab' * 32, 'size': 42}
+        ]
+        table = LibsTable(libs)
+        self.assertEqual(len(table), 3)
+        libc, libm, libfoo = table
+
+        self.assertEqual(libc['name'], '/lib/libc.so.6')
+        self.assertEqual(libc['apiversions'], ('GLIBC_2.4', 'GLIBC_2.5'))
+        self.assertEqual(libc['sublibs'], ('/lib/libm.so.6',))
+        self.assertNotIn('parentlib', libc)
+        self.assertEqual(libm.get('parentlib'), '/lib/libc.so.6')
+        self.assertEqual(libm['apiversions'], ())
+        self.assertIsNone(libm.get('sublibs'))
+        self.assertEqual(libfoo['deps'], ('/lib/libc.so.6',))
+        self.assertIs(libfoo['deps'][0], libc['name'])
+        self.assertEqual(libfoo.get('sha256'), 'ab' * 32)
+        self.assertEqual(libfoo['size'], 42)
+        with self.assertRaises(KeyError):
+            libc['sha256']
+
+        with self.assertRaises(AttributeError):
+            libc.name = '/lib/libc.so.7'
+        with self.assertRaises(AttributeError):
+            libc['sublibs'].append('/lib/libfoo.so.1')
+
+        # The json entries are kept, including the apiversions of the sublibs
+        self.assertEqual(table.to_list(), libs)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_libs_table_shared_by_cache(self):
+        logger.debug("-->checking that the libs table replaces the libs json entries in the platform config cache")
+        cache = PlatformConfigCache.get_instance()
+        platform = STBPlatform("rpi3_reference_vc4_dunfell", "./test_data_files")
+        libs_json = platform.get_config()['libs'].path
+        table = platform.get_config()['libs'].materialize()
+        self.assertIsInstance(table, LibsTable)
+        self.assertIsInstance(table[0], LibInfo)
+
+        other_platform = STBPlatform("rpi3_reference_vc4_dunfell", "./test_data_files")
+        self.assertIs(other_platform.get_config()['libs'].materialize(), table)
+        self.assertIs(cache.load_libs(libs_json), table)
+
+        # Callers of the plain json still get their own dicts
+        libs = cache.load(libs_json)['libs']
+        self.assertIsInstance(libs[0], dict)
+        self.assertEqual(libs, table.to_list())
+        self.assertEqual(cache.load_readonly(libs_json)['libs'], libs)
+        logger.debug("-->Test was Successfully verified")
+
+
+if __name__ == "__main__":
+    unittest.main()
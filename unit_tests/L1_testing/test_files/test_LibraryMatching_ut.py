@@ -0,0 +1,249 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2021 RDK Management
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import os
+import sys
+import shutil
+import tarfile
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from get_L1_test_results import add_test_results
+from temp_cache_dir import TempCacheDir
+from bundlegen.core.library_matching import LibraryMatching, LibraryPlanner
+from bundlegen.core.rootfs_listing import RootfsListing
+from bundlegen.core.libs_index import LibsIndex
+from bundlegen.core.symbol_index import SymbolIndex
+from hashlib import sha256
+from bundlegen.core.readelf import ReadElf
+from bundlegen.core.elf_cache import ElfInfoCache
+from loguru import logger
+
+#This class will test the functionality of API's in library_matching.py file.
+class TestLibraryMatching(TempCacheDir, unittest.TestCase):
+    CACHES = (ElfInfoCache,)
+
+    def setUp(self):
+         logger.debug("Setup")
+         add_test_results.add_tests(self)
+
+    def tearDown(self):
+        logger.debug("tearDown")
+        if hasattr(self._outcome, 'errors'):
+            # Python 3.4 - 3.10  (These two methods have no side effects)
+            result = self.defaultTestResult()
+            self._feedErrorsToResult(result, self._outcome.errors)
+        else:
+            # Python 3.11+
+            result = self._outcome.result
+        ok = all(test != self for test, text in result.errors + result.failures)
+
+       # Demo output:  (print short info immediately - not important)
+        if ok:
+            logger.debug('\nOK: %s' % (self.id(),))
+            add_test_results.test_passed(self)
+
+        for typ, errors in (('ERROR', result.errors), ('FAIL', result.failures)):
+            for test, text in errors:
+                if test is self:
+                    #  the full traceback is in the variable `text`
+                    msg = [x for x in text.split('\n')[1:]
+                           if not x.startswith(' ')][0]
+                    logger.debug("\n\n%s: %s\n     %s" % (typ, self.id(), msg))
+                    add_test_results.test_failed(self, msg)
+
+    @classmethod
+    def tearDownClass(self):
+        add_test_results.end_results(self)
+        super().tearDownClass()
+
+    def _create_bundle(self):
+        bundle_path = tempfile.mkdtemp()
+        for lib in ["/lib/libBrokenLocale.so.1", "/usr/lib/libfoo.so.1"]:
+            rootfs_filepath = os.path.join(bundle_path, "rootfs", lib.lstrip('/'))
+            os.makedirs(os.path.dirname(rootfs_filepath), exist_ok=True)
+            shutil.copy("./test_data_files/dac-image-wayland-egl-test-bundle/libBrokenLocale-2.31.1", rootfs_filepath)
+        return bundle_path
+
+    def _create_libs(self):
+        return [
+            {'name': '/usr/lib/libEGL.so', 'apiversions': [], 'deps': ['/usr/lib/libfoo.so.1']},
+            {'name': '/usr/lib/libfoo.so.1', 'apiversions': ['GLIBC_2.4', 'FOO_1.0'], 'deps': ['/lib/libBrokenLocale.so.1']},
+            {'name': '/lib/libBrokenLocale.so.1', 'apiversions': ['GLIBC_2.4', 'GLIBC_2.5'], 'deps': []}
+        ]
+
+    def test_prefetch_rootfs_apiversions(self):
+        logger.debug("-->checking that rootfs libs are read upfront and matching gives the same result")
+        results = []
+        for jobs in [1, 4]:
+            bundle_path = self._create_bundle()
+            mounts = []
+            libmatcher = LibraryMatching({'libs': self._create_libs()}, bundle_path,
+                                         lambda src, dst, createmountpoint: mounts.append(dst), False, "normal", False, jobs)
+            libmatcher.prefetch(['/usr/lib/libEGL.so'])
+            if jobs > 1:
+                rootfs_path = os.path.join(bundle_path, "rootfs")
+                self.assertEqual(libmatcher.rootfs_apiversions, {
+                    os.path.join(rootfs_path, "usr/lib/libfoo.so.1"): ['GLIBC_2.4'],
+                    os.path.join(rootfs_path, "lib/libBrokenLocale.so.1"): ['GLIBC_2.4']
+                })
+                # The walk must not read rootfs libs anymore
+                retrieve_apiversions = ReadElf.retrieve_apiversions
+                ReadElf.retrieve_apiversions = lambda path: self.fail(f"{path} read during walk")
+            try:
+                libmatcher.mount('/usr/lib/libEGL.so', '/usr/lib/libEGL.so')
+            finally:
+                if jobs > 1:
+                    ReadElf.retrieve_apiversions = retrieve_apiversions
+            results.append((mounts, os.path.exists(os.path.join(bundle_path, "rootfs/usr/lib/libfoo.so.1"))))
+            shutil.rmtree(bundle_path)
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], (['/usr/lib/libEGL.so', '/usr/lib/libfoo.so.1', '/lib/libBrokenLocale.so.1'], False))
+        logger.debug("-->Test was Successfully verified")
+
+    def test_plan_matches_unpacked_rootfs(self):
+        logger.debug("-->checking that a plan made from the layer listing gives the same result as matching on the rootfs")
+        requests = [('mount', '/usr/lib/libEGL.so', '/usr/lib/libEGL.so'),
+                    ('mount_or_use_rootfs', '/lib/libBrokenLocale.so.1', '/lib/libBrokenLocale.so.1')]
+        for mode in ['normal', 'image', 'host']:
+            results = []
+            for planned in [False, True]:
+                bundle_path = self._create_bundle()
+                rootfs_path = os.path.join(bundle_path, "rootfs")
+                mounts = []
+                libmatcher = LibraryMatching({'libs': self._create_libs()}, bundle_path,
+                                             lambda src, dst, createmountpoint: mounts.append(dst), False, mode, False)
+                if planned:
+                    layer_path = os.path.join(bundle_path, "layer.tar")
+                    with tarfile.open(layer_path, 'w') as layer_tar:
+                        layer_tar.add(rootfs_path, arcname='.')
+                    listing = RootfsListing()
+                    with tarfile.open(layer_path, 'r|') as layer_tar:
+                        listing.add_layer(layer_tar, True)
+                    plan = LibraryPlanner({'libs': self._create_libs()}, bundle_path, listing, False, mode, False).plan(requests)
+                    libmatcher.use_plan(plan)
+                for call, srclib, dstlib in requests:
+                    getattr(libmatcher, call)(srclib, dstlib)
+                results.append((mounts, sorted(libmatcher.handled_libs),
+                                sorted(os.path.relpath(os.path.join(root, file), rootfs_path)
+                                       for root, _, files in os.walk(rootfs_path) for file in files)))
+                shutil.rmtree(bundle_path)
+
+            self.assertEqual(results[0], results[1], mode)
+            self.assertFalse(libmatcher.planned_steps)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_replace_identical_libs(self):
+        logger.debug("-->checking that rootfs files identical to a host lib are replaced by mounts")
+        with open("./test_data_files/dac-image-wayland-egl-test-bundle/libBrokenLocale-2.31.1", 'rb') as lib:
+            content = lib.read()
+        libs = self._create_libs()
+        libs[2]['sha256'] = sha256(content).hexdigest()
+        libs[2]['size'] = len(content)
+        # Same size, other content
+        libs[1]['sha256'] = sha256(b'other').hexdigest()
+        libs[1]['size'] = len(content)
+
+        index_dir = tempfile.mkdtemp()
+        index_path = os.path.join(index_dir, "libs.idx")
+        LibsIndex.compile(libs, index_path)
+        try:
+            for platform_libs in [libs, LibsIndex.load(index_path)]:
+                bundle_path = self._create_bundle()
+                with open(os.path.join(bundle_path, "rootfs/usr/lib/libother.so"), 'wb') as other:
+                    other.write(b'x' * len(content))
+                mounts = []
+                libmatcher = LibraryMatching({'libs': platform_libs}, bundle_path,
+                                             lambda src, dst, createmountpoint: mounts.append((src, dst)), True, "normal", False)
+                self.assertEqual(libmatcher.replace_identical_libs(), (2, 2 * len(content)))
+                self.assertEqual(mounts, [('/lib/libBrokenLocale.so.1', '/lib/libBrokenLocale.so.1'),
+                                          ('/lib/libBrokenLocale.so.1', '/usr/lib/libfoo.so.1')])
+                self.assertEqual(os.listdir(os.path.join(bundle_path, "rootfs/usr/lib")), ["libother.so"])
+                shutil.rmtree(bundle_path)
+        finally:
+            shutil.rmtree(index_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_symbols_decide_disjoint_apiversions(self):
+        logger.debug("-->checking that the symbol index takes host libs that provide all used symbols")
+        libs = self._create_libs()
+        # Host and rootfs lib both have apiversions the other one lacks
+        libs[2]['apiversions'] = ['GLIBC_2.5']
+        sysroot = tempfile.mkdtemp()
+        os.makedirs(os.path.join(sysroot, "lib"))
+        shutil.copy("./test_data_files/dac-image-wayland-egl-test-bundle/libBrokenLocale-2.31.1",
+                    os.path.join(sysroot, "lib/libBrokenLocale.so.1"))
+        index_path = os.path.join(sysroot, "rpi_symbols.idx")
+        SymbolIndex.compile(sysroot, index_path)
+        try:
+            results = []
+            for platform_cfg in [{'libs': libs}, {'libs': libs, 'symbols': SymbolIndex.load(index_path)}]:
+                bundle_path = self._create_bundle()
+                # The listing has no symbols, the plan leaves the decision to the unpacked rootfs
+                listing = RootfsListing.from_directory(os.path.join(bundle_path, "rootfs"))
+                listing.elf_info['/lib/libBrokenLocale.so.1'] = ReadElf.read_dynamic_info(
+                    "./test_data_files/dac-image-wayland-egl-test-bundle/libBrokenLocale-2.31.1")
+                planner = LibraryPlanner(platform_cfg, bundle_path, listing, False, "normal", False)
+                plan = planner.plan([('mount_or_use_rootfs', '/lib/libBrokenLocale.so.1', '/lib/libBrokenLocale.so.1')])
+                self.assertEqual(len(plan), 0 if 'symbols' in platform_cfg else 1)
+
+                mounts = []
+                libmatcher = LibraryMatching(platform_cfg, bundle_path,
+                                             lambda src, dst, createmountpoint: mounts.append(dst), False, "normal", False)
+                libmatcher.mount_or_use_rootfs('/lib/libBrokenLocale.so.1', '/lib/libBrokenLocale.so.1')
+                results.append((mounts, os.path.exists(os.path.join(bundle_path, "rootfs/lib/libBrokenLocale.so.1"))))
+                shutil.rmtree(bundle_path)
+        finally:
+            shutil.rmtree(sysroot)
+
+        self.assertEqual(results, [([], True), (['/lib/libBrokenLocale.so.1'], False)])
+        logger.debug("-->Test was Successfully verified")
+
+
+    def test_evaluate_modes(self):
+        logger.debug("-->checking the rootfs size and apiversion rules of every libmatchingmode")
+        libs = self._create_libs()
+        # Host libfoo has more apiversions than the rootfs one, host libBrokenLocale fewer
+        libs[2]['apiversions'] = ['GLIBC_2.3']
+        requests = [('mount_or_use_rootfs', '/usr/lib/libfoo.so.1', '/usr/lib/libfoo.so.1')]
+        bundle_path = self._create_bundle()
+        rootfs_path = os.path.join(bundle_path, "rootfs")
+        size = os.path.getsize(os.path.join(rootfs_path, "usr/lib/libfoo.so.1"))
+        try:
+            results = LibraryPlanner.evaluate_modes({'libs': libs}, bundle_path, requests, False)
+            self.assertEqual([(result['mode'], result['size'], result['violations']) for result in results], [
+                ('normal', size, []),
+                ('image', 2 * size, ['/usr/lib/libfoo.so.1']),
+                ('host', 0, ['/lib/libBrokenLocale.so.1'])
+            ])
+            self.assertEqual(results[0]['plan'][0]['actions'], [
+                {'action': 'remove', 'path': '/usr/lib/libfoo.so.1'},
+                {'action': 'mount', 'src': '/usr/lib/libfoo.so.1', 'dst': '/usr/lib/libfoo.so.1'}
+            ])
+            # Nothing touched
+            self.assertEqual(sorted(os.listdir(os.path.join(rootfs_path, "usr/lib"))), ["libfoo.so.1"])
+        finally:
+            shutil.rmtree(bundle_path)
+        logger.debug("-->Test was Successfully verified")
+
+
+if __name__ == "__main__":
+    unittest.main()
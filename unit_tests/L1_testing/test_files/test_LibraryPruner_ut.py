@@ -0,0 +1,172 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2021 RDK Management
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import os
+import sys
+import shutil
+import struct
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from get_L1_test_results import add_test_results
+from temp_cache_dir import TempCacheDir
+from bundlegen.core.library_pruning import LibraryPruner
+from bundlegen.core.elf_cache import ElfInfoCache
+from loguru import logger
+
+#This class will test the functionality of API's in library_pruning.py file.
+class TestLibraryPruner(TempCacheDir, unittest.TestCase):
+    CACHES = (ElfInfoCache,)
+
+    def setUp(self):
+         logger.debug("Setup")
+         add_test_results.add_tests(self)
+
+    def tearDown(self):
+        logger.debug("tearDown")
+        if hasattr(self._outcome, 'errors'):
+            # Python 3.4 - 3.10  (These two methods have no side effects)
+            result = self.defaultTestResult()
+            self._feedErrorsToResult(result, self._outcome.errors)
+        else:
+            # Python 3.11+
+            result = self._outcome.result
+        ok = all(test != self for test, text in result.errors + result.failures)
+
+       # Demo output:  (print short info immediately - not important)
+        if ok:
+            logger.debug('\nOK: %s' % (self.id(),))
+            add_test_results.test_passed(self)
+
+        for typ, errors in (('ERROR', result.errors), ('FAIL', result.failures)):
+            for test, text in errors:
+                if test is self:
+                    #  the full traceback is in the variable `text`
+                    msg = [x for x in text.split('\n')[1:]
+                           if not x.startswith(' ')][0]
+                    logger.debug("\n\n%s: %s\n     %s" % (typ, self.id(), msg))
+                    add_test_results.test_failed(self, msg)
+
+    @classmethod
+    def tearDownClass(self):
+        add_test_results.end_results(self)
+        super().tearDownClass()
+
+    def _build_elf(self, needed):
+        """Builds a minimal 64 bit little endian ELF file with DT_NEEDED entries
+        """
+        ehdr = struct.Struct('<HHIQQQIHHHHHH')
+        shdr = struct.Struct('<IIQQQQIIQQ')
+        dyn = struct.Struct('<qQ')
+
+        dynstr = b'\0' + b''.join(name.encode() + b'\0' for name in needed)
+        dynamic = b''.join(dyn.pack(1, dynstr.index(name.encode() + b'\0')) for name in needed) + dyn.pack(0, 0)
+
+        dynstr_offset = 16 + ehdr.size
+        dynamic_offset = dynstr_offset + len(dynstr)
+        shdr_offset = dynamic_offset + len(dynamic)
+        sections = [
+            shdr.pack(0, 0, 0, 0, 0, 0, 0, 0, 0, 0),
+            shdr.pack(0, 3, 0, 0, dynstr_offset, len(dynstr), 0, 0, 1, 0),
+            shdr.pack(0, 6, 0, 0, dynamic_offset, len(dynamic), 1, 0, 8, dyn.size)
+        ]
+        ident = b'\x7fELF' + bytes([2, 1, 1]) + bytes(9)
+        header = ident + ehdr.pack(3, 0, 1, 0, 0, shdr_offset, 0, 16 + ehdr.size, 0, 0, shdr.size, len(sections), 0)
+        return header + dynstr + dynamic + b''.join(sections)
+
+    def _create_rootfs(self):
+        rootfs_path = tempfile.mkdtemp()
+        files = {
+            "bin/app": self._build_elf(['libfoo.so.1', 'libpriv.so']),
+            "usr/lib/libfoo.so.1.0": self._build_elf(['libc.so.6']),
+            "usr/lib/libc.so.6": self._build_elf([]),
+            "usr/lib/libc.so": b"GROUP ( /lib/libc.so.6 )",
+            "usr/lib/ld-linux-x86-64.so.2": self._build_elf([]),
+            "usr/lib/libunused.so.2": self._build_elf(['libdep.so']),
+            "usr/lib/libdep.so": self._build_elf([]),
+            "usr/lib/libplugin.so": self._build_elf([]),
+            "usr/lib/libhost.so.1": self._build_elf([]),
+            "opt/app/lib/libpriv.so": self._build_elf([])
+        }
+        for path, content in files.items():
+            os.makedirs(os.path.join(rootfs_path, os.path.dirname(path)), exist_ok=True)
+            with open(os.path.join(rootfs_path, path), 'wb') as f:
+                f.write(content)
+        os.symlink("libfoo.so.1.0", os.path.join(rootfs_path, "usr/lib/libfoo.so.1"))
+        os.symlink("libunused.so.2", os.path.join(rootfs_path, "usr/lib/libunused.so"))
+        os.symlink("usr/lib", os.path.join(rootfs_path, "lib"))
+        return rootfs_path
+
+    def test_find_unused_libs(self):
+        logger.debug("-->checking that libs not reachable from the entrypoints are found")
+        rootfs_path = self._create_rootfs()
+        try:
+            pruner = LibraryPruner(rootfs_path)
+            self.assertEqual(pruner.find_entrypoint("app", ["HOME=/", "PATH=/usr/bin:/bin"]), "/bin/app")
+            self.assertEqual(pruner.find_entrypoint("/bin/app"), "/bin/app")
+            self.assertIsNone(pruner.find_entrypoint("missing"))
+
+            unused = pruner.find_unused(["/bin/app", "/lib/libhost.so.1"], ["libplug*"])
+            self.assertEqual(unused, ["/usr/lib/libdep.so", "/usr/lib/libunused.so", "/usr/lib/libunused.so.2"])
+            self.assertEqual(pruner.get_size("/usr/lib/libdep.so"), len(self._build_elf([])))
+
+            pruner.remove(unused)
+            self.assertEqual(sorted(os.listdir(os.path.join(rootfs_path, "usr/lib"))),
+                             ["ld-linux-x86-64.so.2", "libc.so", "libc.so.6", "libfoo.so.1", "libfoo.so.1.0",
+                              "libhost.so.1", "libplugin.so"])
+        finally:
+            shutil.rmtree(rootfs_path)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_dlopen_paths(self):
+        logger.debug("-->checking that dlopen entries can be absolute paths")
+        rootfs_path = self._create_rootfs()
+        try:
+            pruner = LibraryPruner(rootfs_path)
+            unused = pruner.find_unused(["/bin/app"], ["/usr/lib/libunused.so*"])
+            self.assertEqual(unused, ["/usr/lib/libhost.so.1", "/usr/lib/libplugin.so"])
+        finally:
+            shutil.rmtree(rootfs_path)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_check_entrypoint(self):
+        logger.debug("-->checking that only dynamically linked executables are accepted as entrypoints")
+        rootfs_path = self._create_rootfs()
+        try:
+            with open(os.path.join(rootfs_path, "bin/start.sh"), 'w') as f:
+                f.write("#!/bin/sh\nexec /bin/app\n")
+            with open(os.path.join(rootfs_path, "bin/busybox"), 'wb') as f:
+                f.write(self._build_elf(['libc.so.6']))
+            os.symlink("busybox", os.path.join(rootfs_path, "bin/sh"))
+
+            pruner = LibraryPruner(rootfs_path)
+            self.assertIsNone(pruner.check_entrypoint("/bin/app"))
+            self.assertEqual(pruner.check_entrypoint("/bin/start.sh"), "is not a dynamically linked executable")
+            self.assertEqual(pruner.check_entrypoint("/lib/libc.so.6"), "is not a dynamically linked executable")
+            self.assertEqual(pruner.check_entrypoint("/bin/sh"), "is a shell or interpreter (sh)")
+            self.assertEqual(pruner.check_entrypoint("/bin/busybox"), "is a shell or interpreter (busybox)")
+            self.assertEqual(pruner.check_entrypoint("/bin/missing"), "is not found in rootfs")
+        finally:
+            shutil.rmtree(rootfs_path)
+        logger.debug("-->Test was Successfully verified")
+
+
+if __name__ == "__main__":
+    unittest.main()
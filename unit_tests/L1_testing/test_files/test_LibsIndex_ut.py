@@ -0,0 +1,218 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2021 RDK Management
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from get_L1_test_results import add_test_results
+from temp_cache_dir import TempCacheDir
+from bundlegen.core.libs_index import LibsIndex, LibsNameIndex, LibsClosures, LazyLibs
+from bundlegen.core.lib_info import LibsTable
+from bundlegen.core.library_matching import LibraryMatching
+from bundlegen.core.stb_platform import STBPlatform
+from bundlegen.core.platform_cache import PlatformConfigCache
+from bundlegen.core.schema_validator import SchemaValidator, ValidationCache
+from loguru import logger
+
+#This class will test the functionality of API's in libs_index.py file.
+class TestLibsIndex(TempCacheDir, unittest.TestCase):
+    CACHES = (ValidationCache,)
+
+    def setUp(self):
+         logger.debug("Setup")
+         add_test_results.add_tests(self)
+
+    def tearDown(self):
+        logger.debug("tearDown")
+        if hasattr(self._outcome, 'errors'):
+            # Python 3.4 - 3.10  (These two methods have no side effects)
+            result = self.defaultTestResult()
+            self._feedErrorsToResult(result, self._outcome.errors)
+        else:
+            # Python 3.11+
+            result = self._outcome.result
+        ok = all(test != self for test, text in result.errors + result.failures)
+
+       # Demo output:  (print short info immediately - not important)
+        if ok:
+            logger.debug('\nOK: %s' % (self.id(),))
+            add_test_results.test_passed(self)
+
+        for typ, errors in (('ERROR', result.errors), ('FAIL', result.failures)):
+            for test, text in errors:
+                if test is self:
+                    #  the full traceback is in the variable `text`
+                    msg = [x for x in text.split('\n')[1:]
+                           if not x.startswith(' ')][0]
+                    logger.debug("\n\n%s: %s\n     %s" % (typ, self.id(), msg))
+                    add_test_results.test_failed(self, msg)
+
+    @classmethod
+    def tearDownClass(self):
+        add_test_results.end_results(self)
+        super().tearDownClass()
+
+    def _load_libs(self):
+        with open("./test_data_files/rpi3_reference_vc4_dunfell_libs.json") as f:
+            return json.load(f)['libs']
+
+    def test_compiled_index_matches_json(self):
+        logger.debug("-->checking that the compiled index gives the same libs info as the json")
+        tmp_dir = tempfile.mkdtemp()
+        index_path = os.path.join(tmp_dir, "rpi3_reference_vc4_dunfell_libs.idx")
+        LibsIndex.compile(self._load_libs(), index_path)
+        index = LibsIndex.load(index_path)
+
+        # Reference: json libs after libc/sublibs processing by LibraryMatching
+        libs = self._load_libs()
+        libmatcher = LibraryMatching({'libs': libs}, tmp_dir, None, False, "normal", False)
+        self.assertEqual(len(index), len(libs))
+        for lib in libs:
+            entry = index.get(lib['name'])
+            self.assertEqual(entry['apiversions'], sorted(lib['apiversions']))
+            self.assertEqual(entry['deps'], lib['deps'])
+            self.assertEqual(entry.get('sublibs'), lib.get('sublibs'))
+            self.assertEqual(entry.get('parentlib'), lib.get('parentlib'))
+        self.assertIsNone(index.get("/lib/libdoesnotexist.so.1"))
+
+        closures = LibsClosures.build([lib['name'] for lib in libs], libmatcher._get_api_info)
+        for lib in libs:
+            self.assertEqual(index.closure(lib['name']), closures.get(lib['name']))
+        shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_platform_prefers_newer_compiled_index(self):
+        logger.debug("-->checking that STBPlatform uses the compiled index only when it is newer")
+        tmp_dir = tempfile.mkdtemp()
+        for name in ["rpi3_reference_vc4_dunfell.json", "rpi3_reference_vc4_dunfell_libs.json"]:
+            shutil.copy(os.path.join("./test_data_files", name), tmp_dir)
+        libs_json = os.path.join(tmp_dir, "rpi3_reference_vc4_dunfell_libs.json")
+        LibsIndex.compile(self._load_libs(), LibsIndex.compiled_path(libs_json))
+
+        platform = STBPlatform("rpi3_reference_vc4_dunfell", tmp_dir)
+        self.assertIsInstance(platform.get_config()['libs'].materialize(), LibsIndex)
+        self.assertIn('gpu', platform.get_config())
+
+        os.utime(libs_json, (os.path.getmtime(libs_json) + 10, os.path.getmtime(libs_json) + 10))
+        platform = STBPlatform("rpi3_reference_vc4_dunfell", tmp_dir)
+        self.assertIsInstance(platform.get_config()['libs'].materialize(), LibsTable)
+        shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_libs_loaded_on_first_use(self):
+        logger.debug("-->checking that the libs json is only parsed when dependency walking needs it")
+        platform = STBPlatform("rpi3_reference_vc4_dunfell", "./test_data_files")
+        libs = platform.get_config()['libs']
+        self.assertIsInstance(libs, LazyLibs)
+
+        LibraryMatching(platform.get_config(), tempfile.gettempdir(), None, True, "normal", False)
+        self.assertIsNone(libs._libs)
+
+        libmatcher = LibraryMatching(platform.get_config(), tempfile.gettempdir(), None, False, "normal", False)
+        self.assertIsNotNone(libs._libs)
+        self.assertEqual(len(libs), len(self._load_libs()))
+        self.assertIsNotNone(libmatcher._get_api_info("/lib/libc.so.6").get('sublibs'))
+        logger.debug("-->Test was Successfully verified")
+
+    def test_invalid_libs_json_fails_validation(self):
+        logger.debug("-->checking that the libs json is validated up front, also without dependency walking")
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            shutil.copy(os.path.join("./test_data_files", "rpi3_reference_vc4_dunfell.json"), tmp_dir)
+            libs_json = os.path.join(tmp_dir, "rpi3_reference_vc4_dunfell_libs.json")
+            with open(libs_json, 'w') as f:
+                json.dump({"libs": [{"name": "/lib/libc.so.6"}]}, f)
+
+            platform = STBPlatform("rpi3_reference_vc4_dunfell", tmp_dir)
+            self.assertFalse(platform.validate_platform_config())
+
+            with open(libs_json, 'w') as f:
+                json.dump({"libs": [{"name": "/lib/libc.so.6", "deps": [], "apiversions": []}]}, f)
+            platform = STBPlatform("rpi3_reference_vc4_dunfell", tmp_dir)
+            self.assertTrue(platform.validate_platform_config())
+            content_hash = PlatformConfigCache.get_instance().get_hash(libs_json)
+            self.assertTrue(SchemaValidator.is_validated("platform_libsSchema.json", content_hash))
+        finally:
+            shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_name_index_aliases(self):
+        logger.debug("-->checking lib lookup by name, path and soname aliases")
+        libs = [
+            {'name': '/usr/lib/libfoo.so.1', 'apiversions': [], 'deps': []},
+            {'name': '/usr/lib/libbar.so.1', 'apiversions': [], 'deps': []},
+            {'name': '/usr/lib/libbar.so.2', 'apiversions': [], 'deps': []},
+            {'name': '/usr/lib/libfoo.so.1', 'apiversions': ['DUPLICATE'], 'deps': []}
+        ]
+        index = LibsNameIndex(lib['name'] for lib in libs)
+        self.assertEqual(index.find('/usr/lib/libfoo.so.1'), 0)
+        self.assertEqual(index.find('/usr/lib//libfoo.so.1'), 0)
+        self.assertEqual(index.find('/usr/lib/libfoo.so.1.2.3'), 0)
+        self.assertEqual(index.find('/usr/lib/libfoo.so'), 0)
+        self.assertEqual(index.find('/usr/lib/libbar.so.2.0'), 2)
+        # ambiguous
+        self.assertIsNone(index.find('/usr/lib/libbar.so'))
+        self.assertIsNone(index.find('/lib/libfoo.so.1'))
+        # Never across major versions (ABI)
+        self.assertIsNone(index.find('/usr/lib/libfoo.so.2'))
+        self.assertIsNone(index.find('/usr/lib/libfoo.so.2.1'))
+        self.assertIsNone(index.find('/usr/lib/libbar.so.3'))
+
+        tmp_dir = tempfile.mkdtemp()
+        index_path = os.path.join(tmp_dir, "libs.idx")
+        LibsIndex.compile(libs[:3], index_path)
+        self.assertEqual(LibsIndex.load(index_path).get('/usr/lib/libfoo.so.1.2.3')['name'], '/usr/lib/libfoo.so.1')
+        self.assertIsNone(LibsIndex.load(index_path).get('/usr/lib/libfoo.so.2'))
+        shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_dependency_closures(self):
+        logger.debug("-->checking dependency closures, cycles and deep dependency chains")
+        libs = [
+            {'name': '/usr/lib/libA.so.1', 'apiversions': [], 'deps': ['/usr/lib/libB.so.1', '/usr/lib/libC.so.1']},
+            {'name': '/usr/lib/libB.so.1', 'apiversions': [], 'deps': ['/usr/lib/libC.so.1', '/usr/lib/libD.so.1']},
+            {'name': '/usr/lib/libC.so.1', 'apiversions': [], 'deps': []},
+            {'name': '/usr/lib/libX.so.1', 'apiversions': [], 'deps': ['/usr/lib/libY.so.1']},
+            {'name': '/usr/lib/libY.so.1', 'apiversions': [], 'deps': ['/usr/lib/libX.so.1']}
+        ]
+        infos = {lib['name']: lib for lib in libs}
+        closures = LibsClosures.build(infos, infos.get)
+        self.assertEqual(closures.get('/usr/lib/libA.so.1'), ('/usr/lib/libB.so.1', '/usr/lib/libC.so.1', '/usr/lib/libD.so.1'))
+        self.assertEqual(closures.get('/usr/lib/libC.so.1'), ())
+        self.assertIsNone(closures.get('/usr/lib/libX.so.1'))
+
+        # Deeper than the recursion limit
+        depth = sys.getrecursionlimit() + 100
+        libs = [{'name': f'/usr/lib/lib{i}.so.1', 'apiversions': [], 'deps': [f'/usr/lib/lib{i + 1}.so.1']} for i in range(depth)]
+        for libmatchingmode in ["normal", "host"]:
+            mounts = []
+            libmatcher = LibraryMatching({'libs': [dict(lib) for lib in libs]}, tempfile.gettempdir(),
+                                         lambda src, dst, createmountpoint: mounts.append(dst), False, libmatchingmode, False)
+            libmatcher.mount('/usr/lib/lib0.so.1', '/usr/lib/lib0.so.1')
+            self.assertEqual(mounts, [f'/usr/lib/lib{i}.so.1' for i in range(depth + 1)])
+        logger.debug("-->Test was Successfully verified")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2021 RDK Management
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import os
+import sys
+import shutil
+import hashlib
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from get_L1_test_results import add_test_results
+from bundlegen.core.libs_scanner import LibsScanner
+from bundlegen.core.schema_validator import SchemaValidator
+from loguru import logger
+
+#This class will test the functionality of API's in libs_scanner.py file.
+class TestLibsScanner(unittest.TestCase):
+    def setUp(self):
+         logger.debug("Setup")
+         add_test_results.add_tests(self)
+
+    def tearDown(self):
+        logger.debug("tearDown")
+        if hasattr(self._outcome, 'errors'):
+            # Python 3.4 - 3.10  (These two methods have no side effects)
+            result = self.defaultTestResult()
+            self._feedErrorsToResult(result, self._outcome.errors)
+        else:
+            # Python 3.11+
+            result = self._outcome.result
+        ok = all(test != self for test, text in result.errors + result.failures)
+
+       # Demo output:  (print short info immediately - not important)
+        if ok:
+            logger.debug('\nOK: %s' % (self.id(),))
+            add_test_results.test_passed(self)
+
+        for typ, errors in (('ERROR', result.errors), ('FAIL', result.failures)):
+            for test, text in errors:
+                if test is self:
+                    #  the full traceback is in the variable `text`
+                    msg = [x for x in text.split('\n')[1:]
+                           if not x.startswith(' ')][0]
+                    logger.debug("\n\n%s: %s\n     %s" % (typ, self.id(), msg))
+                    add_test_results.test_failed(self, msg)
+
+    @classmethod
+    def tearDownClass(self):
+        add_test_results.end_results(self)
+
+    def _create_sysroot(self):
+        sysroot = tempfile.mkdtemp()
+        lib = "./test_data_files/dac-image-wayland-egl-test-bundle/libBrokenLocale-2.31.1"
+        for directory in ["usr/lib/plugins", "usr/bin"]:
+            os.makedirs(os.path.join(sysroot, directory))
+        os.symlink("usr/lib", os.path.join(sysroot, "lib"))
+        shutil.copy(lib, os.path.join(sysroot, "usr/lib/libBrokenLocale-2.31.so"))
+        os.symlink("libBrokenLocale-2.31.so", os.path.join(sysroot, "usr/lib/libBrokenLocale.so.1"))
+        shutil.copy(lib, os.path.join(sysroot, "usr/lib/libc.so.6"))
+        shutil.copy(lib, os.path.join(sysroot, "usr/lib/plugins/libplugin.so"))
+        shutil.copy(lib, os.path.join(sysroot, "usr/bin/libnotalib.so"))
+        with open(os.path.join(sysroot, "usr/lib/libc.so"), "w") as f:
+            f.write("GROUP ( /lib/libc.so.6 )\n")
+        return sysroot
+
+    def test_scan_sysroot(self):
+        logger.debug("-->checking the libs info generated from a sysroot")
+        sysroot = self._create_sysroot()
+        try:
+            libs = LibsScanner(sysroot, 2).scan()
+            SchemaValidator.validate({'libs': libs}, "platform_libsSchema.json")
+
+            self.assertEqual([lib['name'] for lib in libs], [
+                '/usr/lib/libBrokenLocale-2.31.so',
+                '/usr/lib/libBrokenLocale.so.1',
+                '/usr/lib/libc.so.6',
+                '/usr/lib/plugins/libplugin.so'
+            ])
+            lib_path = "./test_data_files/dac-image-wayland-egl-test-bundle/libBrokenLocale-2.31.1"
+            with open(lib_path, "rb") as f:
+                sha256 = hashlib.sha256(f.read()).hexdigest()
+            for lib in libs:
+                self.assertEqual(lib['apiversions'], ['GLIBC_2.4'])
+                # DT_NEEDED libc.so.6 is found through the /lib symlink
+                self.assertEqual(lib['deps'], ['/usr/lib/libc.so.6'])
+                self.assertEqual(lib['sha256'], sha256)
+                self.assertEqual(lib['size'], os.path.getsize(lib_path))
+        finally:
+            shutil.rmtree(sysroot)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_incremental_scan(self):
+        logger.debug("-->checking that an incremental scan only reads the changed libs")
+        sysroot = self._create_sysroot()
+        state_path = LibsScanner.state_path(os.path.join(sysroot, "platform_libs.json"))
+        try:
+            scanner = LibsScanner(sysroot, 1)
+            self.assertFalse(scanner.load_state(state_path))
+            libs = scanner.scan()
+            # 3 libs and the libc.so linker script
+            self.assertEqual(scanner.scanned, 4)
+            scanner.save_state(state_path)
+
+            scanner = LibsScanner(sysroot, 1)
+            self.assertTrue(scanner.load_state(state_path))
+            self.assertEqual(scanner.scan(), libs)
+            self.assertEqual(scanner.scanned, 0)
+
+            with open(os.path.join(sysroot, "usr/lib/plugins/libplugin.so"), "ab") as f:
+                f.write(b'\0')
+            os.remove(os.path.join(sysroot, "usr/lib/libBrokenLocale.so.1"))
+            scanner.save_state(state_path)
+            scanner = LibsScanner(sysroot, 1)
+            scanner.load_state(state_path)
+            libs = scanner.scan()
+            self.assertEqual(scanner.scanned, 1)
+            self.assertEqual(len(libs), 3)
+            self.assertEqual(libs[-1]['size'], os.path.getsize(os.path.join(sysroot, "usr/lib/plugins/libplugin.so")))
+
+            # State of another sysroot is not used
+            other_sysroot = self._create_sysroot()
+            self.assertFalse(LibsScanner(other_sysroot, 1).load_state(state_path))
+            shutil.rmtree(other_sysroot)
+        finally:
+            shutil.rmtree(sysroot)
+        logger.debug("-->Test was Successfully verified")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,259 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2021 RDK Management
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import os
+import sys
+import io
+import json
+import shutil
+import hashlib
+import tarfile
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from get_L1_test_results import add_test_results
+from bundlegen.core.blob_store import BlobStore
+from bundlegen.core.image_downloader import ImageDownloader
+from bundlegen.core.local_image import LocalImage, LocalImageError
+from loguru import logger
+
+#This class will test the functionality of API's in local_image.py file.
+class TestLocalImage(unittest.TestCase):
+    def setUp(self):
+         logger.debug("Setup")
+         add_test_results.add_tests(self)
+
+    def tearDown(self):
+        logger.debug("tearDown")
+        if hasattr(self._outcome, 'errors'):
+            # Python 3.4 - 3.10  (These two methods have no side effects)
+            result = self.defaultTestResult()
+            self._feedErrorsToResult(result, self._outcome.errors)
+        else:
+            # Python 3.11+
+            result = self._outcome.result
+        ok = all(test != self for test, text in result.errors + result.failures)
+
+       # Demo output:  (print short info immediately - not important)
+        if ok:
+            logger.debug('\nOK: %s' % (self.id(),))
+            add_test_results.test_passed(self)
+
+        for typ, errors in (('ERROR', result.errors), ('FAIL', result.failures)):
+            for test, text in errors:
+                if test is self:
+                    #  the full traceback is in the variable `text`
+                    msg = [x for x in text.split('\n')[1:]
+                           if not x.startswith(' ')][0]
+                    logger.debug("\n\n%s: %s\n     %s" % (typ, self.id(), msg))
+                    add_test_results.test_failed(self, msg)
+
+    @classmethod
+    def tearDownClass(self):
+        add_test_results.end_results(self)
+
+    IMAGE_PATH = "./oci_images/dac-image-wayland-egl-test-oci"
+    PLATFORM = {'os': 'linux', 'arch': 'arm', 'variant': 'v7'}
+
+    def _blobs(self, layout_path, blob_dir="blobs"):
+        return sorted(os.listdir(os.path.join(layout_path, blob_dir, "sha256")))
+
+    def _manifest_digest(self):
+        with open(os.path.join(self.IMAGE_PATH, "index.json")) as index_file:
+            return json.load(index_file)["manifests"][0]["digest"]
+
+    def _add(self, tar, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+
+    def test_parse_url(self):
+        logger.debug("-->checking the parsing of local image URLs")
+        self.assertEqual(LocalImage.parse_url("oci:/tmp/image:latest"), ("oci", "/tmp/image", "latest"))
+        self.assertEqual(LocalImage.parse_url("oci-archive:/tmp/image.tar"), ("oci-archive", "/tmp/image.tar", None))
+        self.assertEqual(LocalImage.parse_url("docker-archive:app.tar:app:1.0"), ("docker-archive", "app.tar", "app:1.0"))
+        self.assertIsNone(LocalImage.parse_url("docker://hello-world"))
+        self.assertIsNone(LocalImage.parse_url("oci:"))
+        logger.debug("-->Test was Successfully verified")
+
+    def test_import_layout_links_blobs(self):
+        logger.debug("-->checking that the blobs of an OCI layout are linked, not copied")
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            src = os.path.join(tmp_dir, "src")
+            shutil.copytree(self.IMAGE_PATH, src)
+            layout_path = os.path.join(tmp_dir, "layout")
+            digest = LocalImage.import_image(f"oci:{src}:latest", self.PLATFORM, layout_path, "latest")
+
+            self.assertEqual(digest, self._manifest_digest())
+            self.assertEqual(self._blobs(layout_path), self._blobs(src))
+            # The manifest is written by the import, the config and layers are linked
+            for blob in set(self._blobs(src)) - {digest.split(":")[1]}:
+                self.assertTrue(os.path.samefile(os.path.join(layout_path, "blobs/sha256", blob),
+                                                 os.path.join(src, "blobs/sha256", blob)))
+            with open(os.path.join(layout_path, "index.json")) as index_file:
+                manifests = json.load(index_file)["manifests"]
+            self.assertEqual(manifests[0]["annotations"][LocalImage.REF_NAME], "latest")
+            self.assertEqual(LocalImage.get_digest(f"oci:{src}:latest", self.PLATFORM), digest)
+
+            # The source layout is left as it was
+            with open(os.path.join(self.IMAGE_PATH, "index.json")) as orig, \
+                    open(os.path.join(src, "index.json")) as copy:
+                self.assertEqual(orig.read(), copy.read())
+
+            with self.assertRaises(LocalImageError):
+                LocalImage.import_image(f"oci:{src}:missing", self.PLATFORM, os.path.join(tmp_dir, "x"), "latest")
+        finally:
+            shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_import_layout_selects_platform(self):
+        logger.debug("-->checking that image indexes are resolved for the platform")
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            src = os.path.join(tmp_dir, "src")
+            shutil.copytree(self.IMAGE_PATH, src)
+            manifest = dict(json.load(open(os.path.join(self.IMAGE_PATH, "index.json")))["manifests"][0])
+            del manifest["annotations"]
+            other = dict(manifest, digest="sha256:" + "0" * 64, platform={"architecture": "amd64", "os": "linux"})
+            index = json.dumps({"schemaVersion": 2, "manifests": [other, manifest]}).encode()
+            index_digest = hashlib.sha256(index).hexdigest()
+            with open(os.path.join(src, "blobs/sha256", index_digest), "wb") as index_file:
+                index_file.write(index)
+            with open(os.path.join(src, "index.json"), "w") as index_file:
+                json.dump({"schemaVersion": 2, "manifests": [{
+                    "mediaType": "application/vnd.oci.image.index.v1+json", "size": len(index),
+                    "digest": "sha256:" + index_digest, "annotations": {LocalImage.REF_NAME: "1.0"}}]}, index_file)
+
+            url = f"oci:{src}:1.0"
+            self.assertEqual(LocalImage.get_digest(url, self.PLATFORM), manifest["digest"])
+            self.assertEqual(LocalImage.get_digest(url, dict(self.PLATFORM, arch="amd64", variant="")),
+                             other["digest"])
+            self.assertIsNone(LocalImage.get_digest(url, dict(self.PLATFORM, arch="riscv64")))
+            digest = LocalImage.import_image(url, self.PLATFORM, os.path.join(tmp_dir, "layout"), "1.0")
+            self.assertEqual(digest, manifest["digest"])
+        finally:
+            shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_import_oci_archive(self):
+        logger.debug("-->checking that OCI archives are imported without extracting them")
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            archive = os.path.join(tmp_dir, "image.tar.gz")
+            with tarfile.open(archive, "w:gz") as tar:
+                tar.add(self.IMAGE_PATH, arcname=".")
+            url = f"oci-archive:{archive}:latest"
+
+            layout_path = os.path.join(tmp_dir, "layout")
+            self.assertEqual(LocalImage.import_image(url, self.PLATFORM, layout_path, "latest"),
+                             self._manifest_digest())
+            self.assertEqual(self._blobs(layout_path), self._blobs(self.IMAGE_PATH))
+            self.assertIsNone(LocalImage.get_digest(url, self.PLATFORM))
+
+            # Blobs written to another directory, e.g. the blob store
+            blob_dir = os.path.join(tmp_dir, "store")
+            layout_path = os.path.join(tmp_dir, "layout2")
+            LocalImage.import_image(url, self.PLATFORM, layout_path, "latest", blob_dir)
+            self.assertEqual(self._blobs(blob_dir, ""), self._blobs(self.IMAGE_PATH))
+            self.assertTrue(os.path.exists(os.path.join(layout_path, "index.json")))
+
+            # A blob not matching its digest is never stored
+            corrupt = os.path.join(tmp_dir, "corrupt.tar")
+            blob = "blobs/sha256/" + self._blobs(self.IMAGE_PATH)[1]
+            with tarfile.open(corrupt, "w") as tar:
+                self._add(tar, blob, b"corrupt")
+            corrupt_dir = os.path.join(tmp_dir, "corrupt")
+            with self.assertRaises(LocalImageError):
+                LocalImage.import_image(f"oci-archive:{corrupt}", self.PLATFORM, corrupt_dir, "latest")
+            self.assertEqual(os.listdir(os.path.join(corrupt_dir, "blobs/sha256")), [])
+        finally:
+            shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_import_docker_archive(self):
+        logger.debug("-->checking that docker archives are converted to OCI images")
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            config = b'{"architecture":"arm","os":"linux"}'
+            layer = b"layer data"
+            archive = os.path.join(tmp_dir, "image.tar")
+            with tarfile.open(archive, "w") as tar:
+                self._add(tar, "config.json", config)
+                self._add(tar, "abc/layer.tar", layer)
+                link = tarfile.TarInfo("def/layer.tar")
+                link.type = tarfile.SYMTYPE
+                link.linkname = "../abc/layer.tar"
+                tar.addfile(link)
+                self._add(tar, "manifest.json", json.dumps([{
+                    "Config": "config.json", "RepoTags": ["app:1.0"],
+                    "Layers": ["abc/layer.tar", "def/layer.tar"]}]).encode())
+
+            layout_path = os.path.join(tmp_dir, "layout")
+            digest = LocalImage.import_image(f"docker-archive:{archive}:app:1.0", self.PLATFORM, layout_path, "1.0")
+            with open(os.path.join(layout_path, "blobs", *digest.split(":"))) as manifest_file:
+                manifest = json.load(manifest_file)
+            layer_digest = "sha256:" + hashlib.sha256(layer).hexdigest()
+            self.assertEqual(manifest["config"]["digest"], "sha256:" + hashlib.sha256(config).hexdigest())
+            self.assertEqual([desc["digest"] for desc in manifest["layers"]], [layer_digest, layer_digest])
+            self.assertEqual(manifest["layers"][0]["mediaType"], LocalImage.OCI_LAYER)
+
+            with self.assertRaises(LocalImageError):
+                LocalImage.import_image(f"docker-archive:{archive}:app:2.0", self.PLATFORM,
+                                        os.path.join(tmp_dir, "x"), "2.0")
+        finally:
+            shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_download_without_skopeo(self):
+        logger.debug("-->checking that ImageDownloader imports local images without skopeo")
+        root = tempfile.mkdtemp()
+        os.environ['BUNDLEGEN_BLOB_STORE_DIR'] = root
+        os.environ['BUNDLEGEN_BLOB_STORE_SIZE'] = str(1024 ** 3)
+        BlobStore._instance = None
+        try:
+            img_downloader = ImageDownloader()
+            img_downloader.skopeo_found = False
+            url = f"oci:{self.IMAGE_PATH}:latest"
+            platform_cfg = {"os": "linux", "arch": {"arch": "arm", "variant": "v7"}}
+            self.assertEqual(img_downloader.get_image_digest(url, None, platform_cfg), self._manifest_digest())
+
+            img_path = img_downloader.download_image(url, None, platform_cfg)
+            self.assertTrue(img_path.startswith(BlobStore.get_instance().layouts_dir))
+            self.assertEqual(self._blobs(img_path), self._blobs(self.IMAGE_PATH))
+
+            archive = os.path.join(root, "image.tar")
+            with tarfile.open(archive, "w") as tar:
+                tar.add(self.IMAGE_PATH, arcname=".")
+            img_path = img_downloader.download_image(f"oci-archive:{archive}:latest", None, platform_cfg)
+            self.assertEqual(self._blobs(img_path), self._blobs(self.IMAGE_PATH))
+            self.assertTrue(os.path.exists(BlobStore.get_instance().blob_path(self._manifest_digest())))
+
+            self.assertIsNone(img_downloader.download_image(f"oci-archive:{root}/missing.tar", None, platform_cfg))
+        finally:
+            del os.environ['BUNDLEGEN_BLOB_STORE_DIR']
+            del os.environ['BUNDLEGEN_BLOB_STORE_SIZE']
+            BlobStore._instance = None
+            shutil.rmtree(root)
+        logger.debug("-->Test was Successfully verified")
+
+
+if __name__ == "__main__":
+    unittest.main()
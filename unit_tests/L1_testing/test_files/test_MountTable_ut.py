@@ -0,0 +1,117 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2021 RDK Management
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from get_L1_test_results import add_test_results
+from bundlegen.core.mount_table import MountTable
+from bundlegen.core.bundle_processor import BundleProcessor
+from loguru import logger
+
+#This class will test the functionality of API's in mount_table.py file.
+class TestMountTable(unittest.TestCase):
+    def setUp(self):
+         logger.debug("Setup")
+         add_test_results.add_tests(self)
+
+    def tearDown(self):
+        logger.debug("tearDown")
+        if hasattr(self._outcome, 'errors'):
+            # Python 3.4 - 3.10  (These two methods have no side effects)
+            result = self.defaultTestResult()
+            self._feedErrorsToResult(result, self._outcome.errors)
+        else:
+            # Python 3.11+
+            result = self._outcome.result
+        ok = all(test != self for test, text in result.errors + result.failures)
+
+       # Demo output:  (print short info immediately - not important)
+        if ok:
+            logger.debug('\nOK: %s' % (self.id(),))
+            add_test_results.test_passed(self)
+
+        for typ, errors in (('ERROR', result.errors), ('FAIL', result.failures)):
+            for test, text in errors:
+                if test is self:
+                    #  the full traceback is in the variable `text`
+                    msg = [x for x in text.split('\n')[1:]
+                           if not x.startswith(' ')][0]
+                    logger.debug("\n\n%s: %s\n     %s" % (typ, self.id(), msg))
+                    add_test_results.test_failed(self, msg)
+
+    @classmethod
+    def tearDownClass(self):
+        add_test_results.end_results(self)
+
+    def _bind_mount(self, src, dst, options=None):
+        return {"source": src, "destination": dst, "type": "bind", "options": options or ["rbind", "nosuid", "nodev", "ro"]}
+
+    def test_mount_table_order_and_lookup(self):
+        logger.debug("-->checking insertion order, lookup and removal of mounts")
+        mounts = MountTable([self._bind_mount("/lib/libc.so.6", "/lib/libc.so.6")])
+        mounts.append(self._bind_mount("/usr/lib/libEGL.so", "/usr/lib/libEGL.so"))
+        mounts.append(self._bind_mount("/lib/libm.so.6", "/lib/libm.so.6"))
+
+        self.assertIn(self._bind_mount("/usr/lib/libEGL.so", "/usr/lib/libEGL.so"), mounts)
+        self.assertNotIn(self._bind_mount("/usr/lib/libEGL.so", "/usr/lib/libEGL.so", ["ro"]), mounts)
+
+        mounts.remove(self._bind_mount("/usr/lib/libEGL.so", "/usr/lib/libEGL.so"))
+        with self.assertRaises(ValueError):
+            mounts.remove(self._bind_mount("/usr/lib/libEGL.so", "/usr/lib/libEGL.so"))
+        mounts.append(self._bind_mount("/usr/lib/libEGL.so", "/usr/lib/libEGL.so"))
+
+        self.assertEqual(mounts, [
+            self._bind_mount("/lib/libc.so.6", "/lib/libc.so.6"),
+            self._bind_mount("/lib/libm.so.6", "/lib/libm.so.6"),
+            self._bind_mount("/usr/lib/libEGL.so", "/usr/lib/libEGL.so")
+        ])
+        self.assertEqual(len(mounts), 3)
+
+        # Same destination, other source
+        mounts.append(self._bind_mount("/usr/lib/libEGL.so.1", "/usr/lib/libEGL.so"))
+        self.assertEqual(len(mounts.get_by_destination("/usr/lib/libEGL.so")), 2)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_bind_mounts_written_as_list(self):
+        logger.debug("-->checking that bind mounts are deduplicated and written as OCI mounts list")
+        bundle_path = tempfile.mkdtemp()
+        processor = BundleProcessor()
+        processor.bundle_path = bundle_path
+        processor.oci_config = {"mounts": [self._bind_mount("/lib/libc.so.6", "/lib/libc.so.6")]}
+        for i in range(3):
+            processor._add_bind_mount("/lib/libc.so.6", "/lib/libc.so.6")
+            processor._add_bind_mount(f"/usr/lib/lib{i}.so", f"/usr/lib/lib{i}.so")
+        processor.write_config_json()
+
+        with open(os.path.join(bundle_path, "config.json")) as f:
+            config = json.load(f)
+        self.assertEqual(config["mounts"], [self._bind_mount("/lib/libc.so.6", "/lib/libc.so.6")] +
+                         [self._bind_mount(f"/usr/lib/lib{i}.so", f"/usr/lib/lib{i}.so") for i in range(3)])
+        shutil.rmtree(bundle_path)
+        logger.debug("-->Test was Successfully verified")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2021 RDK Management
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from get_L1_test_results import add_test_results
+from bundlegen.core.platform_cache import PlatformConfigCache
+from loguru import logger
+
+#This class will test the functionality of API's in platform_cache.py file.
+class TestPlatformConfigCache(unittest.TestCase):
+    def setUp(self):
+         logger.debug("Setup")
+         add_test_results.add_tests(self)
+
+    def tearDown(self):
+        logger.debug("tearDown")
+        if hasattr(self._outcome, 'errors'):
+            # Python 3.4 - 3.10  (These two methods have no side effects)
+            result = self.defaultTestResult()
+            self._feedErrorsToResult(result, self._outcome.errors)
+        else:
+            # Python 3.11+
+            result = self._outcome.result
+        ok = all(test != self for test, text in result.errors + result.failures)
+
+       # Demo output:  (print short info immediately - not important)
+        if ok:
+            logger.debug('\nOK: %s' % (self.id(),))
+            add_test_results.test_passed(self)
+
+        for typ, errors in (('ERROR', result.errors), ('FAIL', result.failures)):
+            for test, text in errors:
+                if test is self:
+                    #  the full traceback is in the variable `text`
+                    msg = [x for x in text.split('\n')[1:]
+                           if not x.startswith(' ')][0]
+                    logger.debug("\n\n%s: %s\n     %s" % (typ, self.id(), msg))
+                    add_test_results.test_failed(self, msg)
+
+    @classmethod
+    def tearDownClass(self):
+        add_test_results.end_results(self)
+
+    def _write_config(self, path, libs):
+        with open(path, 'w') as f:
+            json.dump({"libs": libs}, f)
+
+    def test_cache_hit_returns_private_copy(self):
+        logger.debug("-->checking that a cache hit cannot corrupt the cached config")
+        tmp_dir = tempfile.mkdtemp()
+        path = os.path.join(tmp_dir, 'rpi3_reference_libs.json')
+        self._write_config(path, [{"name": "/lib/libc.so.6", "apiversions": ["GLIBC_2.4"], "deps": []}])
+        cache = PlatformConfigCache(4)
+        first = cache.load(path)
+        first['libs'][0]['apiversions'] = []
+        first['libs'][0]['sublibs'] = ['/lib/libm.so.6']
+        second = cache.load(path)
+        self.assertEqual(second, {"libs": [{"name": "/lib/libc.so.6", "apiversions": ["GLIBC_2.4"], "deps": []}]})
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_cache_invalidated_on_change(self):
+        logger.debug("-->checking that a modified config file is parsed again")
+        tmp_dir = tempfile.mkdtemp()
+        path = os.path.join(tmp_dir, 'rpi3_reference_libs.json')
+        self._write_config(path, [])
+        cache = PlatformConfigCache(4)
+        cache.load(path)
+        self._write_config(path, [{"name": "/lib/libc.so.6", "apiversions": [], "deps": []}])
+        os.utime(path, ns=(0, 0))
+        self.assertEqual(len(cache.load(path)['libs']), 1)
+        self.assertEqual(cache.misses, 2)
+        shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_cache_lru_eviction(self):
+        logger.debug("-->checking that the least recently used config is evicted")
+        tmp_dir = tempfile.mkdtemp()
+        paths = [os.path.join(tmp_dir, f'platform{i}.json') for i in range(3)]
+        for path in paths:
+            self._write_config(path, [])
+        cache = PlatformConfigCache(2)
+        cache.load(paths[0])
+        cache.load(paths[1])
+        cache.load(paths[0])
+        cache.load(paths[2])
+        self.assertEqual(list(cache._entries.keys()), [paths[0], paths[2]])
+        shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_hash_does_not_parse(self):
+        logger.debug("-->checking that hashing a config file does not parse it")
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'rpi3_reference_libs.json')
+            with open(path, 'w') as f:
+                f.write('not json')
+            cache = PlatformConfigCache(4)
+            self.assertEqual(len(cache.get_hash(path)), 64)
+            self.assertIsNone(cache._entries[path]['data'])
+
+            self._write_config(path, [])
+            self.assertEqual(cache.load(path), {"libs": []})
+            self.assertEqual(cache.get_hash(path), cache._entries[path]['sha256'])
+        finally:
+            shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+
+    def test_derived_data_evicted_with_config(self):
+        logger.debug("-->checking that data derived from a config file is evicted with it")
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            paths = [os.path.join(tmp_dir, f'platform{i}_libs.json') for i in range(2)]
+            for path in paths:
+                self._write_config(path, [])
+            builds = []
+            build = lambda: builds.append(1) or object()
+            cache = PlatformConfigCache(1)
+            first = cache.get_derived(paths[0], 'name_index', build)
+            self.assertIs(cache.get_derived(paths[0], 'name_index', build), first)
+            self.assertEqual(len(builds), 1)
+
+            cache.get_derived(paths[1], 'name_index', build)
+            self.assertEqual(list(cache._entries.keys()), [paths[1]])
+            self.assertIsNot(cache.get_derived(paths[0], 'name_index', build), first)
+            self.assertEqual(len(builds), 3)
+
+            # A modified file gets new data
+            second = cache.get_derived(paths[0], 'name_index', build)
+            self._write_config(paths[0], [{"name": "/lib/libc.so.6", "apiversions": [], "deps": []}])
+            os.utime(paths[0], ns=(0, 0))
+            self.assertIsNot(cache.get_derived(paths[0], 'name_index', build), second)
+        finally:
+            shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+if __name__ == "__main__":
+    unittest.main()
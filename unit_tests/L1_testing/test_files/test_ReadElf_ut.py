@@ -18,16 +18,26 @@
 
 
 import os
+import io
 import sys
+import shutil
+import struct
+import tarfile
+import tempfile
 import unittest
+import subprocess
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from get_L1_test_results import add_test_results
+from temp_cache_dir import TempCacheDir
 from bundlegen.core.readelf import ReadElf
+from bundlegen.core.elf_cache import ElfInfoCache
 from loguru import logger
 
 #This class will test the functionality of API's in stbplatform.py file.
-class TestUtils(unittest.TestCase):
+class TestUtils(TempCacheDir, unittest.TestCase):
+    CACHES = (ElfInfoCache,)
+
     def setUp(self):
          logger.debug("Setup")
          add_test_results.add_tests(self)
@@ -60,6 +70,7 @@ class TestUtils(unittest.TestCase):
     @classmethod
     def tearDownClass(self):
         add_test_results.end_results(self)
+        super().tearDownClass()
 
     def test_readelf_fail_test_case(self):
         logger.debug("-->checking new api in readelf file ")
@@ -75,5 +86,134 @@ class TestUtils(unittest.TestCase):
         expected = {'GLIBC_2.4'}
         self.assertEqual(version_defs_by_rootfs_lib, expected)
 
+    def _readelf_reference(self, path):
+        """Version definitions and dynamic entries as reported by the readelf binary
+        """
+        apiversions = []
+        in_version_definition_section = False
+        output = subprocess.run(["readelf", "-V", path], capture_output=True, text=True).stdout
+        for line in output.splitlines():
+            if "Version needs section" in line:
+                in_version_definition_section = False
+            elif "Version definition section" in line:
+                in_version_definition_section = True
+            elif in_version_definition_section and "Flags: BASE" not in line and "Name: " in line:
+                apiversions.append(line[line.find("Name: ") + len("Name: "):])
+
+        needed = []
+        soname = None
+        runpath = None
+        output = subprocess.run(["readelf", "-d", path], capture_output=True, text=True).stdout
+        for line in output.splitlines():
+            if "(NEEDED)" in line:
+                needed.append(line[line.find("[") + 1:line.rfind("]")])
+            elif "(SONAME)" in line:
+                soname = line[line.find("[") + 1:line.rfind("]")]
+            elif "(RUNPATH)" in line:
+                runpath = line[line.find("[") + 1:line.rfind("]")]
+
+        interp = None
+        output = subprocess.run(["readelf", "-l", path], capture_output=True, text=True).stdout
+        for line in output.splitlines():
+            if "Requesting program interpreter: " in line:
+                interp = line[line.find(": ") + 2:line.rfind("]")]
+        return {'apiversions': apiversions, 'needed': needed, 'soname': soname, 'runpath': runpath, 'interp': interp}
+
+    def test_readelf_parity_with_readelf_binary(self):
+        logger.debug("-->checking the ELF reader against readelf on the libs of the sample OCI image")
+        if not shutil.which("readelf"):
+            self.skipTest("readelf not available")
+
+        tmp_dir = tempfile.mkdtemp()
+        count = 0
+        with tarfile.open("../L2_testing/oci_images/dac-image-wayland-egl-test-raspberrypi3-oci.tar") as image:
+            for blob in image.getmembers():
+                if not blob.isfile() or not blob.name.startswith("./blobs/"):
+                    continue
+                try:
+                    layer = tarfile.open(fileobj=io.BytesIO(image.extractfile(blob).read()))
+                    members = layer.getmembers()
+                except tarfile.TarError:
+                    # manifest or config blob
+                    continue
+                for member in members:
+                    if not member.isfile() or ".so" not in os.path.basename(member.name):
+                        continue
+                    content = layer.extractfile(member).read()
+                    path = os.path.join(tmp_dir, str(count))
+                    with open(path, "wb") as f:
+                        f.write(content)
+                    if not content.startswith(b'\x7fELF'):
+                        self.assertEqual(ReadElf.retrieve_apiversions(path), [])
+                        continue
+                    count += 1
+                    self.assertEqual(ReadElf.read_dynamic_info(path), self._readelf_reference(path), member.name)
+
+        self.assertGreater(count, 0)
+        shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def _build_elf(self, elf_class, byte_order):
+        """Builds a minimal shared library ELF header with dynamic and version definition sections
+        """
+        word = 'I' if elf_class == 1 else 'Q'
+        ehdr = struct.Struct(byte_order + ('HHIIIIIHHHHHH' if elf_class == 1 else 'HHIQQQIHHHHHH'))
+        shdr = struct.Struct(byte_order + ('IIIIIIIIII' if elf_class == 1 else 'IIQQQQIIQQ'))
+        dyn = struct.Struct(byte_order + ('iI' if elf_class == 1 else 'qQ'))
+        verdef = struct.Struct(byte_order + 'HHHHIII')
+        verdaux = struct.Struct(byte_order + 'II')
+
+        dynstr = b'\0libfoo.so.1\0libc.so.6\0FOO_1.0\0FOO_1.1\0$ORIGIN/../lib\0'
+        dynamic = dyn.pack(1, dynstr.index(b'libc')) + dyn.pack(14, dynstr.index(b'libfoo')) + \
+            dyn.pack(29, dynstr.index(b'$ORIGIN')) + dyn.pack(0, 0)
+        versions = [(1, [b'libfoo.so.1']), (0, [b'FOO_1.0']), (0, [b'FOO_1.1', b'FOO_1.0'])]
+        verdefs = b''
+        for i, (flags, names) in enumerate(versions):
+            size = verdef.size + verdaux.size * len(names)
+            verdefs += verdef.pack(1, flags, i + 1, len(names), 0, verdef.size, size if i < len(versions) - 1 else 0)
+            for j, name in enumerate(names):
+                verdefs += verdaux.pack(dynstr.index(name), verdaux.size if j < len(names) - 1 else 0)
+
+        dynstr_offset = 16 + ehdr.size
+        dynamic_offset = dynstr_offset + len(dynstr)
+        verdef_offset = dynamic_offset + len(dynamic)
+        shdr_offset = verdef_offset + len(verdefs)
+        sections = [
+            shdr.pack(0, 0, 0, 0, 0, 0, 0, 0, 0, 0),
+            shdr.pack(0, 3, 0, 0, dynstr_offset, len(dynstr), 0, 0, 1, 0),
+            shdr.pack(0, 6, 0, 0, dynamic_offset, len(dynamic), 1, 0, 4, dyn.size),
+            shdr.pack(0, 0x6ffffffd, 0, 0, verdef_offset, len(verdefs), 1, len(versions), 4, 0)
+        ]
+        ident = b'\x7fELF' + bytes([elf_class, 1 if byte_order == '<' else 2, 1]) + bytes(9)
+        header = ident + ehdr.pack(3, 0, 1, 0, 0, shdr_offset, 0, 16 + ehdr.size, 0, 0, shdr.size, len(sections), 0)
+        return header + dynstr + dynamic + verdefs + b''.join(sections)
+
+    def test_readelf_classes_and_byte_orders(self):
+        logger.debug("-->checking the ELF reader on 32/64 bit, little/big endian files")
+        expected = {'apiversions': ['FOO_1.0', 'FOO_1.1'], 'needed': ['libc.so.6'], 'soname': 'libfoo.so.1',
+                    'runpath': '$ORIGIN/../lib', 'interp': None}
+        tmp_dir = tempfile.mkdtemp()
+        for elf_class in [1, 2]:
+            for byte_order in ['<', '>']:
+                path = os.path.join(tmp_dir, f"libfoo_{elf_class}_{byte_order == '<'}.so.1")
+                with open(path, "wb") as f:
+                    f.write(self._build_elf(elf_class, byte_order))
+                self.assertEqual(ReadElf.read_dynamic_info(path), expected)
+                self.assertEqual(ReadElf.retrieve_apiversions(path), ['FOO_1.0', 'FOO_1.1'])
+
+        # Not an ELF file
+        self.assertEqual(ReadElf.retrieve_apiversions("./test_data_files/vagrant.json"), [])
+        shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_read_symbols(self):
+        logger.debug("-->checking the versioned dynamic symbols read from a lib")
+        symbols = ReadElf.read_symbols("./test_data_files/dac-image-wayland-egl-test-bundle/libBrokenLocale-2.31.1")
+        self.assertIn('__ctype_get_mb_cur_max', symbols['defined'])
+        self.assertIn('__ctype_get_mb_cur_max@GLIBC_2.4', symbols['defined'])
+        self.assertEqual(symbols['undefined'], [['nl_langinfo', 'GLIBC_2.4', 'libc.so.6']])
+        self.assertIsNone(ReadElf.read_symbols("./test_data_files/vagrant.json"))
+        logger.debug("-->Test was Successfully verified")
+
 if __name__ == "__main__":
     unittest.main()
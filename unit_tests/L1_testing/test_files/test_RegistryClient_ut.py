@@ -0,0 +1,338 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2021 RDK Management
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from get_L1_test_results import add_test_results
+from temp_cache_dir import TempCacheDir
+from registry_stub import RegistryStub
+from bundlegen.core.registry_client import RegistryClient, RegistryError, DOCKER_MANIFEST, DOCKER_MANIFEST_LIST, OCI_MANIFEST
+from bundlegen.core.image_downloader import ImageDownloader
+from bundlegen.core.blob_store import BlobStore
+from bundlegen.core.digest_cache import DigestCache
+from loguru import logger
+
+#This class will test the functionality of API's in registry_client.py file.
+class TestRegistryClient(TempCacheDir, unittest.TestCase):
+    CACHES = (DigestCache,)
+
+    def setUp(self):
+         logger.debug("Setup")
+         add_test_results.add_tests(self)
+
+    def tearDown(self):
+        logger.debug("tearDown")
+        if hasattr(self._outcome, 'errors'):
+            # Python 3.4 - 3.10  (These two methods have no side effects)
+            result = self.defaultTestResult()
+            self._feedErrorsToResult(result, self._outcome.errors)
+        else:
+            # Python 3.11+
+            result = self._outcome.result
+        ok = all(test != self for test, text in result.errors + result.failures)
+
+       # Demo output:  (print short info immediately - not important)
+        if ok:
+            logger.debug('\nOK: %s' % (self.id(),))
+            add_test_results.test_passed(self)
+
+        for typ, errors in (('ERROR', result.errors), ('FAIL', result.failures)):
+            for test, text in errors:
+                if test is self:
+                    #  the full traceback is in the variable `text`
+                    msg = [x for x in text.split('\n')[1:]
+                           if not x.startswith(' ')][0]
+                    logger.debug("\n\n%s: %s\n     %s" % (typ, self.id(), msg))
+                    add_test_results.test_failed(self, msg)
+
+    @classmethod
+    def tearDownClass(self):
+        add_test_results.end_results(self)
+        super().tearDownClass()
+
+    IMAGE_PATH = "./oci_images/dac-image-wayland-egl-test-oci"
+    PLATFORM = {'os': 'linux', 'arch': 'arm', 'variant': 'v7'}
+
+    def _blobs(self, blob_dir):
+        return sorted(os.listdir(os.path.join(blob_dir, "sha256")))
+
+    def test_parse_url(self):
+        logger.debug("-->checking that docker:// URLs are split like skopeo does")
+        self.assertEqual(RegistryClient.parse_url("docker://hello-world"),
+                         ("docker.io", "library/hello-world", "latest"))
+        self.assertEqual(RegistryClient.parse_url("docker://rdk/app:1.0"), ("docker.io", "rdk/app", "1.0"))
+        self.assertEqual(RegistryClient.parse_url("docker://localhost:5000/app"), ("localhost:5000", "app", "latest"))
+        self.assertEqual(RegistryClient.parse_url("docker://us.icr.io/ns/flutter:2"), ("us.icr.io", "ns/flutter", "2"))
+        digest = "sha256:" + "a" * 64
+        self.assertEqual(RegistryClient.parse_url(f"docker://us.icr.io/app@{digest}"), ("us.icr.io", "app", digest))
+        self.assertIsNone(RegistryClient.parse_url("oci:/tmp/image:latest"))
+
+    def test_expired_tokens_dropped(self):
+        logger.debug("-->checking that expired registry tokens are dropped and the tokens are bounded")
+        saved_tokens = dict(RegistryClient._tokens)
+        RegistryClient._tokens.clear()
+        try:
+            client = RegistryClient("registry.example.com", creds="user:secret", insecure=True)
+            expired_key = ("other.example.com", "0" * 64, "repository:app:pull")
+            RegistryClient._tokens[expired_key] = ("Bearer old", time.monotonic() - 1)
+            authorization = client._authenticate('Basic realm="registry"', "rdk/app")
+            self.assertEqual(list(RegistryClient._tokens), [client._token_key("rdk/app")])
+            self.assertEqual(client._get_token("rdk/app"), authorization)
+
+            RegistryClient._tokens[client._token_key("rdk/app")] = (authorization, time.monotonic() - 1)
+            self.assertIsNone(client._get_token("rdk/app"))
+            self.assertEqual(RegistryClient._tokens, {})
+
+            with mock.patch.object(RegistryClient, 'MAX_TOKENS', 2):
+                for repository in ("rdk/a", "rdk/b", "rdk/c"):
+                    client._authenticate('Basic realm="registry"', repository)
+            self.assertEqual(list(RegistryClient._tokens), [client._token_key("rdk/b"), client._token_key("rdk/c")])
+        finally:
+            RegistryClient._tokens.clear()
+            RegistryClient._tokens.update(saved_tokens)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_select_manifest(self):
+        logger.debug("-->checking that manifest lists are resolved like skopeo --override-* does")
+        manifests = [
+            {"digest": "amd64", "platform": {"os": "linux", "architecture": "amd64"}},
+            {"digest": "armv6", "platform": {"os": "linux", "architecture": "arm", "variant": "v6"}},
+            {"digest": "armv7", "platform": {"os": "linux", "architecture": "arm", "variant": "v7"}},
+            {"digest": "arm64", "platform": {"os": "linux", "architecture": "arm64", "variant": "v8"}}
+        ]
+        select = lambda arch, variant=None: (RegistryClient.select_manifest(
+            manifests, {"os": "linux", "arch": arch, "variant": variant}) or {}).get("digest")
+        self.assertEqual(select("arm", "v7"), "armv7")
+        self.assertEqual(select("arm", "v6"), "armv6")
+        self.assertIsNone(select("arm", "v5"))
+        self.assertEqual(select("arm64"), "arm64")
+        self.assertEqual(select("amd64"), "amd64")
+        self.assertIsNone(select("386"))
+        # Older compatible variant when the exact one is not there
+        self.assertEqual(RegistryClient.select_manifest(manifests[:2], self.PLATFORM)["digest"], "armv6")
+
+    def test_pull_with_token(self):
+        logger.debug("-->checking that images are pulled into an OCI layout over kept alive connections")
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            with RegistryStub(token="secret") as stub:
+                desc = stub.add_layout("rdk/app", "1.0", self.IMAGE_PATH)
+                client = RegistryClient(stub.address, insecure=True, jobs=2)
+                layout_path = os.path.join(tmp_dir, "layout")
+                digest = client.pull("rdk/app", "1.0", self.PLATFORM, layout_path, "1.0")
+
+                self.assertEqual(digest, desc["digest"])
+                self.assertEqual(self._blobs(os.path.join(layout_path, "blobs")),
+                                 self._blobs(os.path.join(self.IMAGE_PATH, "blobs")))
+                with open(os.path.join(layout_path, "index.json")) as index_file:
+                    index = json.load(index_file)
+                self.assertEqual(index["manifests"][0]["digest"], digest)
+                self.assertEqual(index["manifests"][0]["annotations"]["org.opencontainers.image.ref.name"], "1.0")
+                self.assertEqual(client.stats["blobs_downloaded"], 2)
+                self.assertEqual(client.stats["bytes_downloaded"], 1903610 + 551)
+
+                # Blobs already there are not downloaded again, the token is reused
+                requests = len(stub.requests)
+                client = RegistryClient(stub.address, insecure=True)
+                client.pull("rdk/app", "1.0", self.PLATFORM, os.path.join(tmp_dir, "layout2"), "1.0",
+                            os.path.join(layout_path, "blobs"))
+                self.assertEqual(client.stats["blobs_skipped"], 2)
+                self.assertEqual(len(stub.requests), requests + 1)
+                self.assertLess(stub.connections, len(stub.requests))
+        finally:
+            shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_pull_manifest_list_docker_image(self):
+        logger.debug("-->checking that Docker manifest lists are resolved and converted to OCI")
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            with RegistryStub() as stub:
+                config = stub.add_blob(b'{"architecture": "arm", "os": "linux"}')
+                layer = stub.add_blob(b"layer")
+                other_layer = stub.add_blob(b"arm64 layer")
+                manifests = []
+                for arch, variant, layer_digest in [("arm64", "v8", other_layer), ("arm", "v7", layer)]:
+                    manifest = {
+                        "schemaVersion": 2,
+                        "mediaType": DOCKER_MANIFEST,
+                        "config": {"mediaType": "application/vnd.docker.container.image.v1+json",
+                                   "digest": config, "size": len(stub.blobs[config])},
+                        "layers": [{"mediaType": "application/vnd.docker.image.rootfs.diff.tar.gzip",
+                                    "digest": layer_digest, "size": len(stub.blobs[layer_digest])}]
+                    }
+                    digest, size = stub.add_manifest("app", None, manifest, DOCKER_MANIFEST)
+                    manifests.append({"mediaType": DOCKER_MANIFEST, "digest": digest, "size": size,
+                                      "platform": {"os": "linux", "architecture": arch, "variant": variant}})
+                stub.add_manifest("app", "latest", {"schemaVersion": 2, "mediaType": DOCKER_MANIFEST_LIST,
+                                                    "manifests": manifests}, DOCKER_MANIFEST_LIST)
+
+                client = RegistryClient(stub.address, insecure=True)
+                self.assertEqual(client.resolve("app", "latest", self.PLATFORM)[2], manifests[1]["digest"])
+                layout_path = os.path.join(tmp_dir, "layout")
+                digest = client.pull("app", "latest", self.PLATFORM, layout_path, "latest")
+
+                with open(os.path.join(layout_path, "blobs", *digest.split(":"))) as manifest_file:
+                    manifest = json.load(manifest_file)
+                self.assertEqual(manifest["mediaType"], OCI_MANIFEST)
+                self.assertEqual(manifest["config"]["mediaType"], "application/vnd.oci.image.config.v1+json")
+                self.assertEqual(manifest["layers"][0]["mediaType"], "application/vnd.oci.image.layer.v1.tar+gzip")
+                self.assertEqual(manifest["layers"][0]["digest"], layer)
+                self.assertNotIn(other_layer.split(":")[1], self._blobs(os.path.join(layout_path, "blobs")))
+
+                with self.assertRaises(RegistryError):
+                    client.resolve("app", "latest", {"os": "linux", "arch": "386", "variant": None})
+        finally:
+            shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_corrupt_blob(self):
+        logger.debug("-->checking that blobs not matching their digest are rejected")
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            with RegistryStub() as stub:
+                desc = stub.add_layout("app", "latest", self.IMAGE_PATH)
+                with open(os.path.join(self.IMAGE_PATH, "blobs", *desc["digest"].split(":"))) as manifest_file:
+                    config_digest = json.load(manifest_file)["config"]["digest"]
+                stub.blobs[config_digest] = stub.blobs[config_digest].replace(b"arm", b"x86")
+
+                client = RegistryClient(stub.address, insecure=True)
+                with self.assertRaises(RegistryError):
+                    client.pull("app", "latest", self.PLATFORM, os.path.join(tmp_dir, "layout"), "latest")
+                self.assertNotIn(config_digest.split(":")[1], self._blobs(os.path.join(tmp_dir, "layout", "blobs")))
+        finally:
+            shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    LAYER = "sha256:6994d54a3a8c01cd947dd83677654411b59337bb90d30c04167a682b18212620"
+    LAYER_SIZE = 1903610
+
+    def _client(self, stub, retries=RegistryClient.RETRIES):
+        client = RegistryClient(stub.address, insecure=True)
+        client.RETRIES = retries
+        client.RETRY_DELAY = 0
+        return client
+
+    def _layer_ranges(self, stub):
+        return [request[2] for request in stub.requests if request[1].endswith(self.LAYER)]
+
+    def test_resume_after_dropped_connection(self):
+        logger.debug("-->checking that an interrupted blob download continues with a range request")
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            with RegistryStub() as stub:
+                stub.add_layout("app", "latest", self.IMAGE_PATH)
+                stub.drop_blob(self.LAYER, 700000, 300000)
+                client = self._client(stub)
+                client.pull("app", "latest", self.PLATFORM, os.path.join(tmp_dir, "layout"), "latest")
+
+                self.assertEqual(self._layer_ranges(stub), [None, "bytes=700000-", "bytes=1000000-"])
+                self.assertEqual(client.stats["retries"], 2)
+                self.assertEqual(client.stats["bytes_downloaded"], self.LAYER_SIZE + 551)
+                self.assertEqual(self._blobs(os.path.join(tmp_dir, "layout", "blobs")),
+                                 self._blobs(os.path.join(self.IMAGE_PATH, "blobs")))
+        finally:
+            shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_resume_across_attempts(self):
+        logger.debug("-->checking that a later download of the same blob resumes the partial file")
+        tmp_dir = tempfile.mkdtemp()
+        blob_dir = os.path.join(tmp_dir, "store")
+        try:
+            with RegistryStub() as stub:
+                stub.add_layout("app", "latest", self.IMAGE_PATH)
+                stub.drop_blob(self.LAYER, 500000)
+                with self.assertRaises(RegistryError):
+                    self._client(stub, retries=0).pull("app", "latest", self.PLATFORM,
+                                                       os.path.join(tmp_dir, "layout"), "latest", blob_dir)
+                partial_path = os.path.join(blob_dir, "sha256", self.LAYER.split(":")[1] + RegistryClient.PARTIAL_SUFFIX)
+                self.assertEqual(os.path.getsize(partial_path), 500000)
+
+                # e.g. the requeued request, in a new layout sharing the blob store
+                client = self._client(stub, retries=0)
+                client.pull("app", "latest", self.PLATFORM, os.path.join(tmp_dir, "layout2"), "latest", blob_dir)
+                self.assertEqual(self._layer_ranges(stub), [None, "bytes=500000-"])
+                self.assertEqual(client.stats["bytes_resumed"], 500000)
+                self.assertEqual(client.stats["bytes_downloaded"], self.LAYER_SIZE - 500000)
+                self.assertFalse(os.path.exists(partial_path))
+                self.assertEqual(os.path.getsize(os.path.join(blob_dir, "sha256", self.LAYER.split(":")[1])), self.LAYER_SIZE)
+        finally:
+            shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_resume_without_range_support(self):
+        logger.debug("-->checking that downloads start again if the registry ignores range requests")
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            with RegistryStub(support_range=False) as stub:
+                stub.add_layout("app", "latest", self.IMAGE_PATH)
+                stub.drop_blob(self.LAYER, 500000)
+                client = self._client(stub)
+                client.pull("app", "latest", self.PLATFORM, os.path.join(tmp_dir, "layout"), "latest")
+                self.assertEqual(self._layer_ranges(stub), [None, "bytes=500000-"])
+                self.assertEqual(client.stats["bytes_resumed"], 0)
+                self.assertEqual(os.path.getsize(os.path.join(tmp_dir, "layout", "blobs", "sha256",
+                                                              self.LAYER.split(":")[1])), self.LAYER_SIZE)
+        finally:
+            shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_image_downloader_native(self):
+        logger.debug("-->checking that ImageDownloader downloads into the blob store with the native backend")
+        root = tempfile.mkdtemp()
+        os.environ['BUNDLEGEN_BLOB_STORE_DIR'] = root
+        os.environ['BUNDLEGEN_BLOB_STORE_SIZE'] = str(1024 ** 3)
+        BlobStore._instance = None
+        try:
+            with RegistryStub() as stub:
+                os.environ['BUNDLEGEN_INSECURE_REGISTRIES'] = stub.address
+                desc = stub.add_layout("rdk/app", "1.0", self.IMAGE_PATH)
+                url = f"docker://{stub.address}/rdk/app:1.0"
+                platform_cfg = {"os": "linux", "arch": {"arch": "arm", "variant": "v7"}}
+
+                downloader = ImageDownloader("native")
+                self.assertEqual(downloader.get_image_digest(url, None, platform_cfg), desc["digest"])
+                img_path = downloader.download_image(url, None, platform_cfg)
+                self.assertTrue(img_path.startswith(BlobStore.get_instance().layouts_dir))
+                self.assertEqual(self._blobs(os.path.join(img_path, "blobs")),
+                                 self._blobs(os.path.join(self.IMAGE_PATH, "blobs")))
+                self.assertTrue(os.path.exists(BlobStore.get_instance().blob_path(desc["digest"])))
+
+                self.assertIsNone(downloader.download_image(f"docker://{stub.address}/rdk/missing:1.0",
+                                                            None, platform_cfg))
+        finally:
+            del os.environ['BUNDLEGEN_BLOB_STORE_DIR']
+            del os.environ['BUNDLEGEN_BLOB_STORE_SIZE']
+            os.environ.pop('BUNDLEGEN_INSECURE_REGISTRIES', None)
+            BlobStore._instance = None
+            shutil.rmtree(root)
+        logger.debug("-->Test was Successfully verified")
+
+
+if __name__ == "__main__":
+    unittest.main()
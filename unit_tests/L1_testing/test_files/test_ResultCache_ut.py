@@ -0,0 +1,193 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2021 RDK Management
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import os
+import sys
+import shutil
+import tarfile
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from get_L1_test_results import add_test_results
+from bundlegen.core.result_cache import ResultCache
+from bundlegen.core.utils import Utils
+from loguru import logger
+
+#This class will test the functionality of API's in result_cache.py file.
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+         logger.debug("Setup")
+         add_test_results.add_tests(self)
+
+    def tearDown(self):
+        logger.debug("tearDown")
+        if hasattr(self._outcome, 'errors'):
+            # Python 3.4 - 3.10  (These two methods have no side effects)
+            result = self.defaultTestResult()
+            self._feedErrorsToResult(result, self._outcome.errors)
+        else:
+            # Python 3.11+
+            result = self._outcome.result
+        ok = all(test != self for test, text in result.errors + result.failures)
+
+       # Demo output:  (print short info immediately - not important)
+        if ok:
+            logger.debug('\nOK: %s' % (self.id(),))
+            add_test_results.test_passed(self)
+
+        for typ, errors in (('ERROR', result.errors), ('FAIL', result.failures)):
+            for test, text in errors:
+                if test is self:
+                    #  the full traceback is in the variable `text`
+                    msg = [x for x in text.split('\n')[1:]
+                           if not x.startswith(' ')][0]
+                    logger.debug("\n\n%s: %s\n     %s" % (typ, self.id(), msg))
+                    add_test_results.test_failed(self, msg)
+
+    @classmethod
+    def tearDownClass(self):
+        add_test_results.end_results(self)
+
+    DIGEST = "sha256:" + "ab" * 32
+
+    def make_bundle(self, directory, name="app.tar.gz", content=b"bundle"):
+        path = os.path.join(directory, name)
+        with open(path, 'wb') as bundle:
+            bundle.write(content)
+        return path
+
+    def test_key_inputs(self):
+        logger.debug("-->checking that every input of a bundle changes its key")
+        metadata = {"id": "com.rdk.app", "graphics": True}
+        key = ResultCache.make_key(self.DIGEST, "p1", metadata, libmatchingmode="normal")
+        self.assertEqual(key, ResultCache.make_key(self.DIGEST, "p1", dict(reversed(list(metadata.items())))))
+        self.assertNotEqual(key, ResultCache.make_key("sha256:" + "cd" * 32, "p1", metadata))
+        self.assertNotEqual(key, ResultCache.make_key(self.DIGEST, "p2", metadata))
+        self.assertNotEqual(key, ResultCache.make_key(self.DIGEST, "p1", {"id": "com.rdk.other"}))
+        self.assertNotEqual(key, ResultCache.make_key(self.DIGEST, "p1", None))
+        self.assertNotEqual(key, ResultCache.make_key(self.DIGEST, "p1", metadata, libmatchingmode="host"))
+        self.assertNotEqual(key, ResultCache.make_key(self.DIGEST, "p1", metadata, createmountpoints=True))
+        self.assertNotEqual(key, ResultCache.make_key(self.DIGEST, "p1", metadata, crun=True))
+        with self.assertRaises(ValueError):
+            ResultCache.make_key(self.DIGEST, "p1", metadata, unknown=True)
+
+    def test_hit_and_shared_database(self):
+        logger.debug("-->checking that a bundle is found by another process sharing the database")
+        tmp_dir = tempfile.mkdtemp()
+        db_path = os.path.join(tmp_dir, ResultCache.DB_FILENAME)
+        key = ResultCache.make_key(self.DIGEST, "p1", None)
+        bundle = self.make_bundle(tmp_dir)
+
+        cache = ResultCache(db_path)
+        self.assertIsNone(cache.get(key))
+        cache.put(key, bundle)
+
+        cache = ResultCache(db_path)
+        self.assertEqual(cache.get(key), bundle)
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 0, 'entries': 1})
+        shutil.rmtree(tmp_dir)
+
+    def test_changed_or_removed_bundle(self):
+        logger.debug("-->checking that a modified or removed bundle is not returned")
+        tmp_dir = tempfile.mkdtemp()
+        cache = ResultCache(os.path.join(tmp_dir, ResultCache.DB_FILENAME))
+        key = ResultCache.make_key(self.DIGEST, "p1", None)
+        bundle = self.make_bundle(tmp_dir)
+
+        cache.put(key, bundle)
+        self.make_bundle(tmp_dir, content=b"other bundle")
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(cache.stats()['entries'], 0)
+
+        cache.put(key, bundle)
+        os.remove(bundle)
+        self.assertIsNone(cache.get(key))
+        shutil.rmtree(tmp_dir)
+
+    def test_extract_bundle(self):
+        logger.debug("-->checking that cached tarballs and ipks are extracted like the bundle directory of a build")
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            bundle_dir = os.path.join(tmp_dir, "bundle")
+            os.makedirs(os.path.join(bundle_dir, "rootfs", "bin"))
+            with open(os.path.join(bundle_dir, "config.json"), "w") as config_file:
+                config_file.write("{}")
+            os.symlink("/bin/busybox", os.path.join(bundle_dir, "rootfs", "bin", "sh"))
+            Utils.create_tgz(bundle_dir, os.path.join(tmp_dir, "app"))
+
+            ipk_path = os.path.join(tmp_dir, "app.ipk")
+            with tarfile.open(ipk_path, "w:gz") as ipk:
+                ipk.add(os.path.join(tmp_dir, "app.tar.gz"), arcname="data.tar.gz")
+
+            for path in [os.path.join(tmp_dir, "app.tar.gz"), ipk_path]:
+                dest = os.path.join(tmp_dir, "out")
+                ResultCache.extract_bundle(path, dest)
+                with open(os.path.join(dest, "config.json")) as config_file:
+                    self.assertEqual(config_file.read(), "{}")
+                self.assertEqual(os.readlink(os.path.join(dest, "rootfs", "bin", "sh")), "/bin/busybox")
+                shutil.rmtree(dest)
+        finally:
+            shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_eviction(self):
+        logger.debug("-->checking that the least recently used bundles are evicted")
+        tmp_dir = tempfile.mkdtemp()
+        cache = ResultCache(os.path.join(tmp_dir, ResultCache.DB_FILENAME), max_entries=2)
+        bundles = [self.make_bundle(tmp_dir, f"app{i}.tar.gz") for i in range(3)]
+        keys = [ResultCache.make_key(self.DIGEST, f"p{i}", None) for i in range(3)]
+
+        cache.put(keys[0], bundles[0])
+        cache.put(keys[1], bundles[1])
+        self.assertEqual(cache.get(keys[0]), bundles[0])
+        cache.put(keys[2], bundles[2])
+
+        self.assertEqual(cache.get(keys[0]), bundles[0])
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertEqual(cache.get(keys[2]), bundles[2])
+        # Evicting an entry does not remove the bundle
+        self.assertTrue(os.path.exists(bundles[1]))
+        shutil.rmtree(tmp_dir)
+
+    def test_disabled(self):
+        logger.debug("-->checking that a disabled cache never returns a bundle")
+        tmp_dir = tempfile.mkdtemp()
+        cache = ResultCache(None)
+        key = ResultCache.make_key(self.DIGEST, "p1", None)
+        cache.put(key, self.make_bundle(tmp_dir))
+        self.assertIsNone(cache.get(key))
+        shutil.rmtree(tmp_dir)
+
+    def test_copy_bundle(self):
+        logger.debug("-->checking that a cached bundle is copied to the output")
+        tmp_dir = tempfile.mkdtemp()
+        bundle = self.make_bundle(tmp_dir)
+        dest = os.path.join(tmp_dir, "out.tar.gz")
+        ResultCache.copy_bundle(bundle, dest)
+        with open(dest, 'rb') as copy:
+            self.assertEqual(copy.read(), b"bundle")
+        # Copying a bundle onto itself is a no-op
+        ResultCache.copy_bundle(bundle, bundle)
+        self.assertTrue(os.path.exists(bundle))
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
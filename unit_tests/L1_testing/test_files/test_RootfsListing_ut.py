@@ -0,0 +1,177 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2021 RDK Management
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import os
+import sys
+import io
+import json
+import shutil
+import tarfile
+import tempfile
+from hashlib import sha256
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from get_L1_test_results import add_test_results
+from bundlegen.core.rootfs_listing import RootfsListing
+from loguru import logger
+
+#This class will test the functionality of API's in rootfs_listing.py file.
+class TestRootfsListing(unittest.TestCase):
+    def setUp(self):
+         logger.debug("Setup")
+         add_test_results.add_tests(self)
+
+    def tearDown(self):
+        logger.debug("tearDown")
+        if hasattr(self._outcome, 'errors'):
+            # Python 3.4 - 3.10  (These two methods have no side effects)
+            result = self.defaultTestResult()
+            self._feedErrorsToResult(result, self._outcome.errors)
+        else:
+            # Python 3.11+
+            result = self._outcome.result
+        ok = all(test != self for test, text in result.errors + result.failures)
+
+       # Demo output:  (print short info immediately - not important)
+        if ok:
+            logger.debug('\nOK: %s' % (self.id(),))
+            add_test_results.test_passed(self)
+
+        for typ, errors in (('ERROR', result.errors), ('FAIL', result.failures)):
+            for test, text in errors:
+                if test is self:
+                    #  the full traceback is in the variable `text`
+                    msg = [x for x in text.split('\n')[1:]
+                           if not x.startswith(' ')][0]
+                    logger.debug("\n\n%s: %s\n     %s" % (typ, self.id(), msg))
+                    add_test_results.test_failed(self, msg)
+
+    @classmethod
+    def tearDownClass(self):
+        add_test_results.end_results(self)
+
+    def _create_layer(self, entries, compression=''):
+        """entries: (name, content) for files, (name, None) for dirs,
+        (name, '->target') for symlinks and (name, '=>target') for hard links
+        """
+        layer = io.BytesIO()
+        with tarfile.open(fileobj=layer, mode='w' + (':' + compression if compression else '')) as layer_tar:
+            for name, content in entries:
+                member = tarfile.TarInfo(name)
+                if content is None:
+                    member.type = tarfile.DIRTYPE
+                    layer_tar.addfile(member)
+                elif isinstance(content, str) and content.startswith('->'):
+                    member.type = tarfile.SYMTYPE
+                    member.linkname = content[2:]
+                    layer_tar.addfile(member)
+                elif isinstance(content, str) and content.startswith('=>'):
+                    member.type = tarfile.LNKTYPE
+                    member.linkname = content[2:]
+                    layer_tar.addfile(member)
+                else:
+                    member.size = len(content)
+                    layer_tar.addfile(member, io.BytesIO(content))
+        return layer.getvalue()
+
+    def _read_lib(self):
+        with open("./test_data_files/dac-image-wayland-egl-test-bundle/libBrokenLocale-2.31.1", 'rb') as lib:
+            return lib.read()
+
+    def _apply_layer(self, listing, entries):
+        with tarfile.open(fileobj=io.BytesIO(self._create_layer(entries))) as layer_tar:
+            listing.add_layer(layer_tar, True)
+
+    def test_layers_whiteouts_and_links(self):
+        logger.debug("-->checking the listing of layers with whiteouts, symlinks and hard links")
+        listing = RootfsListing()
+        self._apply_layer(listing, [
+            ('./usr/', None),
+            ('./usr/lib/', None),
+            ('./usr/lib/libfoo.so.1.2', self._read_lib()),
+            ('./usr/lib/libfoo.so.1', '->libfoo.so.1.2'),
+            ('./usr/lib/libfoo-copy.so', '=>usr/lib/libfoo.so.1.2'),
+            ('./lib', '->usr/lib'),
+            ('./etc/old/a', b'a'),
+            ('./opt/x/y', b'y'),
+            ('./opt/x/z', b'z')
+        ])
+        self._apply_layer(listing, [
+            ('opt/x/.wh.y', b''),
+            ('etc/old/.wh..wh..opq', b''),
+            ('etc/old/b', b'b'),
+            ('usr/lib/loop', '->/usr/lib/loop')
+        ])
+
+        self.assertEqual(listing.resolve('/lib/libfoo.so.1'), '/usr/lib/libfoo.so.1.2')
+        self.assertEqual(listing.get_apiversions('/lib/libfoo.so.1'), ['GLIBC_2.4'])
+        self.assertEqual(listing.get_apiversions('/usr/lib/libfoo-copy.so'), ['GLIBC_2.4'])
+        self.assertEqual(listing.get_apiversions('/etc/old/b'), [])
+        self.assertTrue(listing.exists('/opt/x/z'))
+        self.assertFalse(listing.exists('/opt/x/y'))
+        self.assertFalse(listing.exists('/etc/old/a'))
+        self.assertTrue(listing.exists('/etc/old/b'))
+        self.assertFalse(listing.exists('/usr/lib/loop'))
+        self.assertFalse(listing.exists('/etc/old/b/c'))
+
+        # Removing a link also removes the linked file
+        listing.remove('/lib/libfoo.so.1')
+        self.assertFalse(listing.exists('/usr/lib/libfoo.so.1'))
+        self.assertFalse(listing.exists('/usr/lib/libfoo.so.1.2'))
+        self.assertTrue(listing.exists('/usr/lib/libfoo-copy.so'))
+        self.assertTrue(listing.exists('/lib'))
+        logger.debug("-->Test was Successfully verified")
+
+    def test_from_oci_image(self):
+        logger.debug("-->checking the listing of an OCI image layout")
+        image_path = tempfile.mkdtemp()
+        try:
+            blobs_path = os.path.join(image_path, 'blobs', 'sha256')
+            os.makedirs(blobs_path)
+
+            def add_blob(content):
+                digest = sha256(content).hexdigest()
+                with open(os.path.join(blobs_path, digest), 'wb') as blob:
+                    blob.write(content)
+                return {'digest': f'sha256:{digest}', 'size': len(content)}
+
+            layers = [
+                add_blob(self._create_layer([('usr/lib/libfoo.so.1', self._read_lib())], 'gz')),
+                add_blob(self._create_layer([('usr/lib/.wh.libfoo.so.1', b''), ('usr/bin/app', b'app')]))
+            ]
+            layers[0]['mediaType'] = 'application/vnd.oci.image.layer.v1.tar+gzip'
+            layers[1]['mediaType'] = 'application/vnd.oci.image.layer.v1.tar'
+            manifest = add_blob(json.dumps({'schemaVersion': 2, 'layers': layers}).encode())
+            manifest['annotations'] = {RootfsListing.REF_NAME_ANNOTATION: 'latest'}
+            with open(os.path.join(image_path, 'index.json'), 'w') as index:
+                json.dump({'schemaVersion': 2, 'manifests': [manifest]}, index)
+
+            listing = RootfsListing.from_oci_image(image_path, 'latest', True)
+            self.assertTrue(listing.exists('/usr/bin/app'))
+            self.assertFalse(listing.exists('/usr/lib/libfoo.so.1'))
+
+            self.assertIsNone(RootfsListing.from_oci_image(os.path.join(image_path, 'missing'), 'latest'))
+        finally:
+            shutil.rmtree(image_path)
+        logger.debug("-->Test was Successfully verified")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -23,11 +23,12 @@ import unittest
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from get_L1_test_results import add_test_results
+from temp_cache_dir import TempCacheDir
 from bundlegen.core.stb_platform import STBPlatform
 from loguru import logger
 
 #This class will test the functionality of API's in stbplatform.py file.
-class TestStbPlatform(unittest.TestCase):
+class TestStbPlatform(TempCacheDir, unittest.TestCase):
     def setUp(self):
          logger.debug("Setup")
          add_test_results.add_tests(self)
@@ -60,6 +61,7 @@ class TestStbPlatform(unittest.TestCase):
     @classmethod
     def tearDownClass(self):
         add_test_results.end_results(self)
+        super().tearDownClass()
 
     def test_platform_config_schema(self):
         ''''this test is to check is jsonschema of tempete platform schema is proper.
@@ -0,0 +1,124 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2021 RDK Management
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from get_L1_test_results import add_test_results
+from temp_cache_dir import TempCacheDir
+from bundlegen.core.schema_validator import SchemaValidator, ValidationCache
+from jsonschema.exceptions import ValidationError
+from loguru import logger
+
+#This class will test the functionality of API's in schema_validator.py file.
+class TestSchemaValidator(TempCacheDir, unittest.TestCase):
+    CACHES = (ValidationCache,)
+
+    def setUp(self):
+         logger.debug("Setup")
+         add_test_results.add_tests(self)
+
+    def tearDown(self):
+        logger.debug("tearDown")
+        if hasattr(self._outcome, 'errors'):
+            # Python 3.4 - 3.10  (These two methods have no side effects)
+            result = self.defaultTestResult()
+            self._feedErrorsToResult(result, self._outcome.errors)
+        else:
+            # Python 3.11+
+            result = self._outcome.result
+        ok = all(test != self for test, text in result.errors + result.failures)
+
+       # Demo output:  (print short info immediately - not important)
+        if ok:
+            logger.debug('\nOK: %s' % (self.id(),))
+            add_test_results.test_passed(self)
+
+        for typ, errors in (('ERROR', result.errors), ('FAIL', result.failures)):
+            for test, text in errors:
+                if test is self:
+                    #  the full traceback is in the variable `text`
+                    msg = [x for x in text.split('\n')[1:]
+                           if not x.startswith(' ')][0]
+                    logger.debug("\n\n%s: %s\n     %s" % (typ, self.id(), msg))
+                    add_test_results.test_failed(self, msg)
+
+    @classmethod
+    def tearDownClass(self):
+        add_test_results.end_results(self)
+        super().tearDownClass()
+
+    def test_validator_compiled_once(self):
+        logger.debug("-->checking that each schema is compiled only once")
+        first = SchemaValidator.get_validator("platform_libsSchema.json")
+        second = SchemaValidator.get_validator("platform_libsSchema.json")
+        self.assertIs(first, second)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_validate_independent_of_cwd(self):
+        logger.debug("-->checking that schemas are found from any working directory")
+        cwd = os.getcwd()
+        os.chdir('/')
+        try:
+            SchemaValidator.validate({"libs": []}, "platform_libsSchema.json")
+            with self.assertRaises(ValidationError):
+                SchemaValidator.validate({"libs": [{"name": "/lib/libc.so.6"}]}, "platform_libsSchema.json")
+        finally:
+            os.chdir(cwd)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_validation_result_cached_by_hash(self):
+        logger.debug("-->checking that a validated document hash is remembered")
+        content_hash = "0123456789abcdef"
+        self.assertFalse(SchemaValidator.is_validated("platform_libsSchema.json", content_hash))
+        SchemaValidator.validate({"libs": []}, "platform_libsSchema.json", content_hash)
+        self.assertTrue(SchemaValidator.is_validated("platform_libsSchema.json", content_hash))
+        self.assertFalse(SchemaValidator.is_validated("platformSchema.json", content_hash))
+        logger.debug("-->Test was Successfully verified")
+
+    def test_validated_hashes_persisted(self):
+        logger.debug("-->checking that validated hashes are shared through the cache directory")
+        content_hash = "fedcba9876543210"
+        SchemaValidator.validate({"libs": []}, "platform_libsSchema.json", content_hash)
+
+        # Another process only has the database
+        SchemaValidator._validated.clear()
+        ValidationCache._instance = None
+        self.assertTrue(SchemaValidator.is_validated("platform_libsSchema.json", content_hash))
+        self.assertEqual(ValidationCache.get_instance().stats()['hits'], 1)
+        self.assertIn(SchemaValidator._get_key("platform_libsSchema.json", content_hash), SchemaValidator._validated)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_validated_hashes_bounded_in_memory(self):
+        logger.debug("-->checking that only the most recently validated hashes are kept in memory")
+        max_validated = SchemaValidator.MAX_VALIDATED
+        SchemaValidator.MAX_VALIDATED = 2
+        try:
+            for content_hash in ["hash1", "hash2", "hash3"]:
+                SchemaValidator.validate({"libs": []}, "platform_libsSchema.json", content_hash)
+            self.assertEqual(list(SchemaValidator._validated),
+                             [SchemaValidator._get_key("platform_libsSchema.json", h) for h in ["hash2", "hash3"]])
+        finally:
+            SchemaValidator.MAX_VALIDATED = max_validated
+        logger.debug("-->Test was Successfully verified")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2021 RDK Management
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from get_L1_test_results import add_test_results
+from bundlegen.core.sqlite_cache import SqliteCache
+from loguru import logger
+
+#This class will test the functionality of API's in sqlite_cache.py file.
+class TestSqliteCache(unittest.TestCase):
+    def setUp(self):
+         logger.debug("Setup")
+         add_test_results.add_tests(self)
+
+    def tearDown(self):
+        logger.debug("tearDown")
+        if hasattr(self._outcome, 'errors'):
+            # Python 3.4 - 3.10  (These two methods have no side effects)
+            result = self.defaultTestResult()
+            self._feedErrorsToResult(result, self._outcome.errors)
+        else:
+            # Python 3.11+
+            result = self._outcome.result
+        ok = all(test != self for test, text in result.errors + result.failures)
+
+       # Demo output:  (print short info immediately - not important)
+        if ok:
+            logger.debug('\nOK: %s' % (self.id(),))
+            add_test_results.test_passed(self)
+
+        for typ, errors in (('ERROR', result.errors), ('FAIL', result.failures)):
+            for test, text in errors:
+                if test is self:
+                    #  the full traceback is in the variable `text`
+                    msg = [x for x in text.split('\n')[1:]
+                           if not x.startswith(' ')][0]
+                    logger.debug("\n\n%s: %s\n     %s" % (typ, self.id(), msg))
+                    add_test_results.test_failed(self, msg)
+
+    @classmethod
+    def tearDownClass(self):
+        add_test_results.end_results(self)
+
+    class TestCache(SqliteCache):
+        DB_FILENAME = 'test.sqlite'
+        TABLES = {
+            'entries': ('key', "key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used INTEGER NOT NULL")
+        }
+
+    def test_evict_only_for_new_keys(self):
+        logger.debug("-->checking that replacing an entry does not evict another one")
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            cache = self.TestCache(os.path.join(tmp_dir, self.TestCache.DB_FILENAME), max_entries=2)
+            cache._store('entries', 'a', '1')
+            cache._store('entries', 'b', '1')
+            cache._store('entries', 'a', '2')
+            self.assertEqual(cache._lookup('entries', 'a', 'value'), ('2',))
+            self.assertEqual(cache._lookup('entries', 'b', 'value'), ('1',))
+
+            # a was used last
+            cache._lookup('entries', 'a', 'value')
+            cache._store('entries', 'c', '1')
+            self.assertIsNone(cache._lookup('entries', 'b', 'value'))
+            self.assertEqual(cache.stats()['entries'], 2)
+        finally:
+            shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_disabled_when_unavailable(self):
+        logger.debug("-->checking that an unusable database disables the cache")
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            db_path = os.path.join(tmp_dir, self.TestCache.DB_FILENAME)
+            with open(db_path, 'w') as f:
+                f.write("not a database" * 100)
+            cache = self.TestCache(db_path)
+            self.assertIsNone(cache._lookup('entries', 'a', 'value'))
+            self.assertIsNone(cache.db_path)
+            cache._store('entries', 'a', '1')
+            self.assertEqual(cache.stats(), {'hits': 0, 'misses': 0, 'entries': 0})
+        finally:
+            shutil.rmtree(tmp_dir)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_size_from_environment(self):
+        logger.debug("-->checking that the size of the shared cache is read from the environment")
+        class EnvCache(self.TestCache):
+            SIZE_ENV = 'BUNDLEGEN_TEST_CACHE_SIZE'
+        os.environ['BUNDLEGEN_TEST_CACHE_SIZE'] = '0'
+        try:
+            cache = EnvCache.get_instance()
+            self.assertIs(EnvCache.get_instance(), cache)
+            self.assertIsNone(SqliteCache._instance)
+            self.assertEqual(cache.max_entries, 0)
+            self.assertIsNone(cache.db_path)
+        finally:
+            del os.environ['BUNDLEGEN_TEST_CACHE_SIZE']
+        logger.debug("-->Test was Successfully verified")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2021 RDK Management
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from get_L1_test_results import add_test_results
+from bundlegen.core.symbol_index import SymbolIndex
+from loguru import logger
+
+#This class will test the functionality of API's in symbol_index.py file.
+class TestSymbolIndex(unittest.TestCase):
+    def setUp(self):
+         logger.debug("Setup")
+         add_test_results.add_tests(self)
+
+    def tearDown(self):
+        logger.debug("tearDown")
+        if hasattr(self._outcome, 'errors'):
+            # Python 3.4 - 3.10  (These two methods have no side effects)
+            result = self.defaultTestResult()
+            self._feedErrorsToResult(result, self._outcome.errors)
+        else:
+            # Python 3.11+
+            result = self._outcome.result
+        ok = all(test != self for test, text in result.errors + result.failures)
+
+       # Demo output:  (print short info immediately - not important)
+        if ok:
+            logger.debug('\nOK: %s' % (self.id(),))
+            add_test_results.test_passed(self)
+
+        for typ, errors in (('ERROR', result.errors), ('FAIL', result.failures)):
+            for test, text in errors:
+                if test is self:
+                    #  the full traceback is in the variable `text`
+                    msg = [x for x in text.split('\n')[1:]
+                           if not x.startswith(' ')][0]
+                    logger.debug("\n\n%s: %s\n     %s" % (typ, self.id(), msg))
+                    add_test_results.test_failed(self, msg)
+
+    @classmethod
+    def tearDownClass(self):
+        add_test_results.end_results(self)
+
+    def test_compile_and_lookup(self):
+        logger.debug("-->checking the symbols compiled from a sysroot")
+        sysroot = tempfile.mkdtemp()
+        os.makedirs(os.path.join(sysroot, "lib"))
+        shutil.copy("./test_data_files/dac-image-wayland-egl-test-bundle/libBrokenLocale-2.31.1",
+                    os.path.join(sysroot, "lib/libBrokenLocale.so.1"))
+        os.symlink("libBrokenLocale.so.1", os.path.join(sysroot, "lib/libBrokenLocale.so"))
+        shutil.copy("./test_data_files/vagrant.json", os.path.join(sysroot, "lib/libnotelf.so"))
+        libs_json_path = os.path.join(sysroot, "rpi_libs.json")
+        index_path = SymbolIndex.index_path(libs_json_path)
+        self.assertEqual(index_path, os.path.join(sysroot, "rpi_symbols.idx"))
+        try:
+            SymbolIndex.compile(sysroot, index_path)
+            index = SymbolIndex.load_for_libs(libs_json_path)
+            self.assertIs(index, SymbolIndex.load(index_path))
+            self.assertEqual(len(index), 2)
+            self.assertNotIn('/lib/libnotelf.so', index)
+            # Symlinks share the symbols of their target, leading slash optional
+            self.assertEqual(index.get('/lib/libBrokenLocale.so'), index.get('lib/libBrokenLocale.so.1'))
+            self.assertTrue(index.provides('/lib/libBrokenLocale.so.1', ['__ctype_get_mb_cur_max@GLIBC_2.4', '__ctype_get_mb_cur_max']))
+            self.assertFalse(index.provides('/lib/libBrokenLocale.so.1', ['__ctype_get_mb_cur_max@GLIBC_2.5']))
+            self.assertFalse(index.provides('/lib/libBrokenLocale.so.1', ['nl_langinfo']))
+            self.assertFalse(index.provides('/lib/libc.so.6', []))
+            self.assertIsNone(SymbolIndex.load_for_libs(os.path.join(sysroot, "other_libs.json")))
+        finally:
+            shutil.rmtree(sysroot)
+        logger.debug("-->Test was Successfully verified")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2021 RDK Management
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from get_L1_test_results import add_test_results
+from temp_cache_dir import TempCacheDir
+from bundlegen.core.template_registry import TemplateRegistry
+from loguru import logger
+
+#This class will test the functionality of API's in template_registry.py file.
+class TestTemplateRegistry(TempCacheDir, unittest.TestCase):
+    def setUp(self):
+         logger.debug("Setup")
+         add_test_results.add_tests(self)
+
+    def tearDown(self):
+        logger.debug("tearDown")
+        if hasattr(self._outcome, 'errors'):
+            # Python 3.4 - 3.10  (These two methods have no side effects)
+            result = self.defaultTestResult()
+            self._feedErrorsToResult(result, self._outcome.errors)
+        else:
+            # Python 3.11+
+            result = self._outcome.result
+        ok = all(test != self for test, text in result.errors + result.failures)
+
+       # Demo output:  (print short info immediately - not important)
+        if ok:
+            logger.debug('\nOK: %s' % (self.id(),))
+            add_test_results.test_passed(self)
+
+        for typ, errors in (('ERROR', result.errors), ('FAIL', result.failures)):
+            for test, text in errors:
+                if test is self:
+                    #  the full traceback is in the variable `text`
+                    msg = [x for x in text.split('\n')[1:]
+                           if not x.startswith(' ')][0]
+                    logger.debug("\n\n%s: %s\n     %s" % (typ, self.id(), msg))
+                    add_test_results.test_failed(self, msg)
+
+    @classmethod
+    def tearDownClass(self):
+        add_test_results.end_results(self)
+        super().tearDownClass()
+
+    def _create_search_path(self):
+        search_path = tempfile.mkdtemp()
+        os.makedirs(os.path.join(search_path, 'generic'))
+        for name in ['rpi3_reference.json', 'rpi3_reference_libs.json', 'rpi3_reference_dunfell.json']:
+            with open(os.path.join(search_path, 'generic', name), 'w') as f:
+                f.write('{}')
+        return search_path
+
+    def test_lookup_exact_match(self):
+        logger.debug("-->checking that only the exact platform name is matched")
+        search_path = self._create_search_path()
+        registry = TemplateRegistry(search_path)
+        actual = registry.get_config_files('rpi3_reference')
+        expected = [os.path.join(search_path, 'generic', 'rpi3_reference.json'),
+                    os.path.join(search_path, 'generic', 'rpi3_reference_libs.json')]
+        self.assertEqual(actual, expected)
+        self.assertEqual(registry.get_config_files('rpi3'), [])
+        self.assertEqual(registry.names(), ['rpi3_reference', 'rpi3_reference_dunfell'])
+        shutil.rmtree(search_path)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_index_persisted(self):
+        logger.debug("-->checking that the index is reused by a new registry")
+        search_path = self._create_search_path()
+        TemplateRegistry(search_path).refresh()
+        registry = TemplateRegistry(search_path)
+        self.assertTrue(registry.index_path.startswith(self.cache_dir))
+        self.assertEqual(os.stat(registry.index_path).st_mode & 0o777, 0o644)
+        self.assertEqual(os.listdir(search_path), ['generic'])
+        self.assertTrue(registry._load_index())
+        self.assertFalse(registry._is_stale())
+        self.assertEqual(len(registry.get_config_files('rpi3_reference_dunfell')), 1)
+        shutil.rmtree(search_path)
+        logger.debug("-->Test was Successfully verified")
+
+    def test_index_invalidated_on_new_template(self):
+        logger.debug("-->checking that a new template invalidates the index")
+        search_path = self._create_search_path()
+        registry = TemplateRegistry(search_path)
+        self.assertEqual(registry.get_config_files('rpi4_reference'), [])
+        os.makedirs(os.path.join(search_path, 'lgi'))
+        with open(os.path.join(search_path, 'lgi', 'rpi4_reference.json'), 'w') as f:
+            f.write('{}')
+        self.assertEqual(registry.get_config_files('rpi4_reference'),
+                         [os.path.join(search_path, 'lgi', 'rpi4_reference.json')])
+        shutil.rmtree(search_path)
+        logger.debug("-->Test was Successfully verified")
+
+
+if __name__ == "__main__":
+    unittest.main()
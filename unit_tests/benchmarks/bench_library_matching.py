@@ -0,0 +1,94 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Consult Red
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Measures the library dependency walk of LibraryMatching on the shipped
+# platform templates, comparing the name index with the former linear search.
+
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+from loguru import logger
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)))
+from bundlegen.core.stb_platform import STBPlatform
+from bundlegen.core.library_matching import LibraryMatching
+
+TEMPLATES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, 'templates'))
+DEFAULT_PLATFORMS = ['rpi3_reference_vc4_dunfell', '7218c_reference_dunfell']
+
+
+class LinearLibraryMatching(LibraryMatching):
+    """Library matching using the linear search it did before the name index
+    """
+    def _get_api_info(self, srclib):
+        api_info = [x for x in self._get_libs() if x['name'] == srclib]
+        if not api_info:
+            return None
+        return api_info[0]
+
+
+def walk(matcher_class, name, bundle_path, libmatchingmode):
+    """Walk the deps of every gfx lib and of every lib of the platform, the
+    bundle has no rootfs so every lib is taken from the host. Like bundle
+    generation, every walk starts from a freshly loaded platform config.
+    """
+    platform_cfg = STBPlatform(name, TEMPLATES_DIR).get_config()
+    matcher = matcher_class(platform_cfg, bundle_path, lambda src, dst, create: None, False, libmatchingmode, False)
+    for lib in platform_cfg.get('gpu', {}).get('gfxLibs', []):
+        matcher.mount(lib['src'], lib['dst'])
+    for lib in platform_cfg['libs']:
+        matcher.mount_or_use_rootfs(lib['name'], lib['name'])
+    return len(matcher.handled_libs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the library dependency walk")
+    parser.add_argument('platforms', nargs='*', default=DEFAULT_PLATFORMS)
+    parser.add_argument('-n', '--number', type=int, default=5, help="Walks per measurement")
+    parser.add_argument('-m', '--libmatchingmode', default='normal', choices=['normal', 'host'])
+    args = parser.parse_args()
+
+    logger.remove()
+    bundle_path = tempfile.mkdtemp()
+
+    print(f"{'platform':<32} {'libs':>6} {'walked':>7} {'linear ms':>10} {'indexed ms':>11} {'speedup':>8}")
+    for name in args.platforms:
+        platform = STBPlatform(name, TEMPLATES_DIR)
+        if not platform.found_config():
+            print(f"{name}: platform template not found")
+            continue
+        libs_count = len(platform.get_config()['libs'])
+
+        results = {}
+        for label, matcher_class in (('linear', LinearLibraryMatching), ('indexed', LibraryMatching)):
+            walked = walk(matcher_class, name, bundle_path, args.libmatchingmode)
+            seconds = min(timeit.repeat(lambda: walk(matcher_class, name, bundle_path, args.libmatchingmode),
+                                        number=args.number, repeat=3))
+            results[label] = (walked, seconds * 1000 / args.number)
+
+        walked, linear_ms = results['linear']
+        indexed_ms = results['indexed'][1]
+        assert results['indexed'][0] == walked, "indexed walk visited a different set of libs"
+        print(f"{name:<32} {libs_count:>6} {walked:>7} {linear_ms:>10.2f} {indexed_ms:>11.2f} {linear_ms / indexed_ms:>7.1f}x")
+
+    os.rmdir(bundle_path)
+
+
+if __name__ == "__main__":
+    main()
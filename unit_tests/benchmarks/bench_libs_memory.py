@@ -0,0 +1,129 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Consult Red
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Measures the memory used by the libs info of all platform templates, as
+# plain json dicts (one copy per platform config, as before LibsTable) and as
+# LibInfo records shared through the platform config cache. Every
+# representation is measured in a fresh process.
+
+import argparse
+import gc
+import os
+import subprocess
+import sys
+import tracemalloc
+from loguru import logger
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)))
+from bundlegen.core.stb_platform import STBPlatform
+from bundlegen.core.platform_cache import PlatformConfigCache
+
+TEMPLATES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, 'templates'))
+REPRESENTATIONS = ('dicts', 'records')
+
+
+def find_platforms():
+    """Returns the names of all platforms with a _libs.json file
+    """
+    names = set()
+    for root, _, files in os.walk(TEMPLATES_DIR):
+        for name in files:
+            if name.endswith('_libs.json') and os.path.exists(os.path.join(root, name[:-len('_libs.json')] + '.json')):
+                names.add(name[:-len('_libs.json')])
+    return sorted(names)
+
+
+def get_rss():
+    """Resident memory of the process in bytes
+    """
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def load_libs(representation, platforms, copies):
+    """Load the libs info of every platform, keeping `copies` platform configs
+    of every platform alive like concurrent bundle generations do
+    """
+    configs = []
+    for name in platforms:
+        for _ in range(copies):
+            config = STBPlatform(name, TEMPLATES_DIR).get_config()
+            if representation == 'dicts':
+                config['libs'] = PlatformConfigCache.get_instance().load(config['libs'].path)['libs']
+            else:
+                config['libs'] = config['libs'].materialize()
+            configs.append(config)
+    return configs
+
+
+def measure(representation, platforms, copies, trace):
+    """Measure one representation, run in its own process
+    """
+    # Import everything the loading needs before the baseline
+    load_libs(representation, platforms[:1], 1)
+    PlatformConfigCache.get_instance().clear()
+    gc.collect()
+
+    if trace:
+        tracemalloc.start()
+    before = get_rss()
+    configs = load_libs(representation, platforms, copies)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] if trace else get_rss() - before
+    libs = sum(len(config['libs']) for config in configs) // copies
+    print(f"{libs} {used}")
+
+
+def run_child(representation, args, trace):
+    command = [sys.executable, __file__, '--child', representation, '-c', str(args.copies)] + args.platforms
+    if trace:
+        command.append('--trace')
+    libs, used = subprocess.check_output(command, text=True).split()
+    return int(libs), int(used)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the memory used by the libs info of all templates")
+    parser.add_argument('platforms', nargs='*', help="Platforms to load, defaults to all templates")
+    parser.add_argument('-c', '--copies', type=int, default=1, help="Platform configs kept alive per platform")
+    parser.add_argument('--child', choices=REPRESENTATIONS, help=argparse.SUPPRESS)
+    parser.add_argument('--trace', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logger.remove()
+    if not args.platforms:
+        args.platforms = find_platforms()
+    if args.child:
+        measure(args.child, args.platforms, args.copies, args.trace)
+        return
+
+    results = {}
+    for representation in REPRESENTATIONS:
+        libs, rss = run_child(representation, args, False)
+        _, traced = run_child(representation, args, True)
+        results[representation] = (libs, rss, traced)
+
+    print(f"{len(args.platforms)} platforms, {results['dicts'][0]} libs, {args.copies} config(s) per platform")
+    print(f"{'libs info':<10} {'RSS MiB':>9} {'heap MiB':>9} {'bytes/lib':>10}")
+    for representation, (libs, rss, traced) in results.items():
+        print(f"{representation:<10} {rss / 2**20:>9.1f} {traced / 2**20:>9.1f} {traced / libs:>10.0f}")
+    dicts, records = results['dicts'], results['records']
+    print(f"{'reduction':<10} {1 - records[1] / dicts[1]:>9.0%} {1 - records[2] / dicts[2]:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# If not stated otherwise in this file or this component's license file the
+# following copyright and licenses apply:
+#
+# Copyright 2020 Consult Red
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Measures reading the ELF info of rootfs libs as done by
+# LibraryMatching.prefetch, comparing a serial read, a pool of threads and the
+# pool of processes used by prefetch. The ELF info cache is disabled so every
+# lib is read.
+
+import argparse
+import glob
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)))
+from bundlegen.core.elf_cache import ElfInfoCache
+from bundlegen.core.library_matching import LibraryMatching
+from bundlegen.core.readelf import ReadElf
+
+DEFAULT_IMAGE = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'L2_testing', 'oci_images',
+                                             'dac-image-wayland-egl-test-raspberrypi3-oci.tar'))
+
+
+class ThreadedLibraryMatching(LibraryMatching):
+    """Library matching reading the libs with the pool of threads it used
+    before the pool of processes
+    """
+    def _map_jobs(self, func, items):
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            return list(executor.map(func, items))
+
+
+def extract_libs(image, work_dir, copies):
+    """Extract the shared libs of all layers of an OCI image tarball and
+    make copies of them, so there are enough libs to keep the pool busy
+    """
+    image_dir = os.path.join(work_dir, 'image')
+    with tarfile.open(image) as tar:
+        tar.extractall(image_dir)
+
+    libs_dir = os.path.join(work_dir, 'libs')
+    os.makedirs(libs_dir)
+    for blob in glob.glob(os.path.join(image_dir, 'blobs', 'sha256', '*')):
+        if not tarfile.is_tarfile(blob):
+            continue
+        with tarfile.open(blob) as layer:
+            for member in layer.getmembers():
+                if member.isfile() and '.so' in os.path.basename(member.name):
+                    with layer.extractfile(member) as src:
+                        data = src.read()
+                    if not data.startswith(b'\x7fELF'):
+                        continue
+                    for copy in range(copies):
+                        path = os.path.join(libs_dir, f"{copy}_{os.path.basename(member.name)}")
+                        with open(path, 'wb') as dst:
+                            dst.write(data)
+    return sorted(glob.glob(os.path.join(libs_dir, '*')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark reading rootfs libs when prefetching")
+    parser.add_argument('image', nargs='?', default=DEFAULT_IMAGE, help="OCI image tarball")
+    parser.add_argument('-c', '--copies', type=int, default=20, help="Copies of every lib read")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('-n', '--number', type=int, default=3, help="Reads per measurement")
+    args = parser.parse_args()
+
+    logger.remove()
+    work_dir = tempfile.mkdtemp()
+    try:
+        paths = extract_libs(args.image, work_dir, args.copies)
+        cache = ElfInfoCache(None)
+        bundle_path = os.path.join(work_dir, 'bundle')
+
+        readers = [('serial', map)]
+        for label, matcher_class in (('threads', ThreadedLibraryMatching), ('processes', LibraryMatching)):
+            matcher = matcher_class({}, bundle_path, lambda src, dst, create: None, True, 'normal', False, args.jobs)
+            readers.append((label, matcher._map_jobs))
+
+        print(f"{len(paths)} libs, {args.jobs} jobs, {os.cpu_count()} cpus")
+        print(f"{'reader':<12} {'ms':>10} {'speedup':>8}")
+        serial_ms = None
+        expected = None
+        for label, map_func in readers:
+            infos = cache.get_many(paths, ReadElf.read_dynamic_info, map_func)
+            expected = expected or infos
+            assert infos == expected, f"{label} read different ELF info"
+            seconds = min(timeit.repeat(lambda: cache.get_many(paths, ReadElf.read_dynamic_info, map_func),
+                                        number=args.number, repeat=3))
+            ms = seconds * 1000 / args.number
+            serial_ms = serial_ms or ms
+            print(f"{label:<12} {ms:>10.2f} {serial_ms / ms:>7.1f}x")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
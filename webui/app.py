@@ -20,10 +20,10 @@ from bundlegen.core.bundle_processor import BundleProcessor
 from bundlegen.core.image_unpacker import ImageUnpackager
 from bundlegen.core.image_downloader import ImageDownloader
 from bundlegen.core.stb_platform import STBPlatform
+from bundlegen.core.template_registry import TemplateRegistry
+from bundlegen.core.result_cache import ResultCache
 from loguru import logger
 import socket
-import tempfile
-import tarfile
 import json
 import shutil
 import os
@@ -41,6 +41,7 @@ monkey.patch_all()
 TMP_DIR = '/tmp/bundlegen'
 UPLOAD_FOLDER = '/tmp/uploads'
 BUNDLE_STORE_DIR = '/bundlestore'
+TEMPLATES_DIR = '../templates'
 
 app = Flask(__name__)
 
@@ -76,6 +77,7 @@ class GenerateForm(FlaskForm):
     platform = SelectField()
     app_metadata = TextAreaField()
     lib_match = SelectField(choices=[("normal", "Normal (recommended)"), ("image", "Image"), ("host", "Host")])
+    bypass_cache = BooleanField()
 
 
 def log_msg(msg):
@@ -97,16 +99,8 @@ if not os.path.exists(BUNDLE_STORE_DIR):
 
 
 def get_templates():
-    templates = glob.glob('../templates/**/*.json')
-
-    selectItems = []
-
-    for template in templates:
-        if template.endswith('.json') and not template.endswith('_libs.json'):
-            filename = os.path.basename(template)
-            selectItems.append(filename.replace('.json', ''))
-
-    return [(x, x) for x in selectItems]
+    names = TemplateRegistry.get(TEMPLATES_DIR).names()
+    return [(x, x) for x in names]
 
 
 def allowed_file(filename):
@@ -135,7 +129,6 @@ def handle_app_error(error):
 
 @app.route('/', methods=["GET", "POST"])
 def index():
-    get_templates()
     form = GenerateForm()
     form.platform.choices = get_templates()
 
@@ -156,6 +149,7 @@ def index():
 
         img_url = ""
         creds = ""
+        upload_filepath = None
         if form.image_url.data:
             # If downloading from URL, just use that as-is
             img_url = form.image_url.data
@@ -172,46 +166,48 @@ def index():
             )
             f.save(upload_filepath)
 
-            # Extract tar
-            # Extract the .tar to a temp directory
-            # Safe extraction code from Trellix
-            # Here licensed under the MIT License
-            img_temp_path = tempfile.mkdtemp()
-            with tarfile.open(upload_filepath) as tar:
-               def is_within_directory(directory, target):
-
-                    abs_directory = os.path.abspath(directory)
-                    abs_target = os.path.abspath(target)
-
-                    prefix = os.path.commonprefix([abs_directory, abs_target])
-
-                    return prefix == abs_directory
-
-                def safe_extract(tar, path=".", members=None, *, numeric_owner=False):
-
-                    for member in tar.getmembers():
-                        member_path = os.path.join(path, member.name)
-                        if not is_within_directory(path, member_path):
-                            raise Exception("Attempted Path Traversal in Tar File")
-
-                    tar.extractall(path, members, numeric_owner=numeric_owner) 
-
-                safe_extract(tar, img_temp_path)
-
-            # Delete tar
-            os.remove(upload_filepath)
-
-            img_url = f"oci:{img_temp_path}:latest"
+            # The archive of the OCI image layout is imported as it is, its
+            # blobs are not extracted
+            img_url = f"oci-archive:{upload_filepath}:latest"
             creds = None
 
         if not img_url:
             print("IMG URL is empty")
             raise AppError("Image URL cannot be empty")
 
-        # Download Image
         img_downloader = ImageDownloader()
-        img_path = img_downloader.download_image(
-            img_url, creds, selected_platform.get_config())
+
+        # Reply with the bundle of a previous generation with the same inputs.
+        # The CLI and RabbitMQ workers on this node share the cache
+        result_cache = ResultCache.get_instance()
+        result_key = None
+        image_digest = None
+        if not form.bypass_cache.data:
+            try:
+                custom_app_metadata = json.loads(form.app_metadata.data) if form.app_metadata.data else None
+            except ValueError:
+                custom_app_metadata = None
+            image_digest = img_downloader.get_image_digest(img_url, creds, selected_platform.get_config())
+            if image_digest and (custom_app_metadata is not None or not form.app_metadata.data):
+                result_key = ResultCache.make_key(image_digest, selected_platform.get_content_hash(),
+                                                  custom_app_metadata, libmatchingmode=form.lib_match.data)
+                cached_path = result_cache.get(result_key)
+                if cached_path:
+                    bundle_path = os.path.join(BUNDLE_STORE_DIR, os.path.basename(cached_path))
+                    ResultCache.copy_bundle(cached_path, bundle_path)
+                    logger.success(f"Bundle already generated at {bundle_path}")
+                    if upload_filepath:
+                        os.remove(upload_filepath)
+                    return jsonify(success=True)
+
+        # Download Image
+        try:
+            img_path = img_downloader.download_image(
+                img_url, creds, selected_platform.get_config(), digest=image_digest)
+        finally:
+            # Delete tar
+            if upload_filepath:
+                os.remove(upload_filepath)
 
         if not img_path:
             logger.error("Failed to download image")
@@ -261,7 +257,8 @@ def index():
 
         tarball_name = app_metadata_dict["id"] + Utils.get_random_string(6)
 
-        Utils.create_tgz(outputdir, tarball_name)
+        # Same tarball settings as the CLI and RabbitMQ, they share the result cache
+        processor.create_tgz(tarball_name)
         logger.success(
             f"Successfully generated bundle at {tarball_name}.tar.gz")
 
@@ -269,6 +266,9 @@ def index():
         print(f"Moving '{tarball_name}.tar.gz' to {BUNDLE_STORE_DIR}")
         shutil.move(f'{tarball_name}.tar.gz', BUNDLE_STORE_DIR)
 
+        if result_key:
+            result_cache.put(result_key, os.path.join(BUNDLE_STORE_DIR, f'{tarball_name}.tar.gz'))
+
         return jsonify(success=True)
 
 